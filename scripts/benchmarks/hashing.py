@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+"""Benchmarks the signature hashing of modules with large parameter sets.
+
+Compares the former sha1 path (one hash object per item, fed piece by
+piece) with the current Hasher for each available digest, without and
+with memoized parameter/function signatures.
+
+Usage: python hashing.py [nb_modules [nb_functions [nb_params]]]
+"""
+
+from __future__ import division
+
+import sys
+import timeit
+
+import vistrails.core.application
+from vistrails.core.cache import utils as cache_utils
+from vistrails.core.cache.hasher import Hasher
+from vistrails.core.system import get_vistrails_basic_pkg_id
+from vistrails.core.vistrail.module import Module
+from vistrails.core.vistrail.module_function import ModuleFunction
+from vistrails.core.vistrail.module_param import ModuleParam
+
+
+def sha1_parameter_signature(p, constant_hasher_map={}):
+    hasher = cache_utils.sha_hash()
+    u = hasher.update
+    u(p.type)
+    u(p.identifier)
+    u(p.namespace or "")
+    u(p.strValue)
+    u(p.name)
+    u(p.evaluatedStrValue)
+    return hasher.digest()
+
+def sha1_hash_list(lst, hasher_f, constant_hasher_map={}):
+    hasher = cache_utils.sha_hash()
+    hash_l = [hasher_f(el, constant_hasher_map) for el in lst]
+    hash_l.sort()
+    for hel in hash_l: hasher.update(hel)
+    return hasher.digest()
+
+def sha1_function_signature(function, constant_hasher_map={}):
+    hasher = cache_utils.sha_hash()
+    u = hasher.update
+    u(function.name)
+    u(function.returnType)
+    u(sha1_hash_list(function.params, sha1_parameter_signature,
+                     constant_hasher_map))
+    return hasher.digest()
+
+def sha1_module_signature(obj, constant_hasher_map={}):
+    hasher = cache_utils.sha_hash()
+    u = hasher.update
+    u(obj.module_descriptor.name)
+    u(obj.module_descriptor.package)
+    u(obj.module_descriptor.namespace or '')
+    u(obj.module_descriptor.package_version or '')
+    u(obj.module_descriptor.version or '')
+    u(sha1_hash_list(obj.functions, sha1_function_signature,
+                     constant_hasher_map))
+    u(sha1_hash_list(obj.control_parameters, Hasher.control_param_signature,
+                     constant_hasher_map))
+    u(sha1_hash_list(obj.port_spec_list, Hasher.port_spec_signature,
+                     constant_hasher_map))
+    return hasher.digest()
+
+
+def make_modules(nb_modules, nb_functions, nb_params):
+    """make_modules(nb_modules, nb_functions, nb_params) -> list of Module
+
+    Creates PythonSource modules with many functions of many parameters.
+    """
+    basic_pkg = get_vistrails_basic_pkg_id()
+    modules = []
+    for i in xrange(nb_modules):
+        functions = []
+        for j in xrange(nb_functions):
+            params = [ModuleParam(pos=k, type='String',
+                                  val='value %d %d %d' % (i, j, k))
+                      for k in xrange(nb_params)]
+            functions.append(ModuleFunction(pos=j, name='f%d' % j,
+                                            parameters=params))
+        module = Module(id=i, package=basic_pkg, name='PythonSource',
+                        functions=functions)
+        module.module_descriptor # resolve it before timing
+        modules.append(module)
+    return modules
+
+
+def forget(modules):
+    for module in modules:
+        for function in module.functions:
+            function.__dict__.pop('_signature', None)
+            for param in function.params:
+                param.__dict__.pop('_signature', None)
+
+
+def time_signatures(modules, module_signature, memoized=False, repeat=5):
+    def run():
+        if not memoized:
+            forget(modules)
+        start = timeit.default_timer()
+        for module in modules:
+            module_signature(module)
+        return timeit.default_timer() - start
+    run()
+    return min(run() for i in xrange(repeat))
+
+
+def run(nb_modules=200, nb_functions=20, nb_params=10):
+    vistrails.core.application.init({'batch': True})
+    modules = make_modules(nb_modules, nb_functions, nb_params)
+    nb_items = nb_modules * nb_functions * nb_params
+    print "%d modules, %d parameters" % (nb_modules, nb_items)
+
+    reference = time_signatures(modules, sha1_module_signature)
+    print "%-20s %.3fs (%d params/s)" % ("sha1 (former)", reference,
+                                         nb_items / reference)
+    for name in sorted(cache_utils.hash_algorithms):
+        cache_utils.set_hash_algorithm(name)
+        for memoized in (False, True):
+            t = time_signatures(modules, Hasher.module_signature, memoized)
+            print "%-20s %.3fs (%d params/s, x%.1f)" % (
+                    name + (" (memoized)" if memoized else ""),
+                    t, nb_items / t, reference / t)
+    cache_utils.set_hash_algorithm('sha1')
+
+if __name__ == '__main__':
+    run(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+"""Benchmarks VisTrails startup with and without lazyPackageLoading.
+
+Each run starts a new Python process that initializes VisTrails in batch
+mode with the given packages enabled, in a temporary .vistrails
+directory. A first run writes the package manifests; the following runs
+compare initializing every package with registering them from their
+manifests. Packages that are not installed are simply disabled.
+
+Usage: python package_startup.py [nb_runs [codepath ...]]
+"""
+
+from __future__ import division
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import vistrails
+
+
+DEFAULT_PACKAGES = ['controlflow', 'tabledata', 'pythonCalc', 'URL',
+                    'matplotlib', 'sklearn', 'vtk']
+
+STARTUP_XML = """<?xml version="1.0" ?>
+<startup version="0.1">
+  <packages>
+%s
+  </packages>
+  <disabledpackages/>
+  <configuration/>
+</startup>
+"""
+
+CHILD = """
+import json, sys, timeit
+start = timeit.default_timer()
+sys.path.insert(0, %(root)r)
+import vistrails.core.application
+vistrails.core.application.init({'dotVistrails': %(dot)r, 'batch': True,
+                                 'lazyPackageLoading': %(lazy)r})
+elapsed = timeit.default_timer() - start
+from vistrails.core.packagemanager import get_package_manager
+packages = get_package_manager().enabled_package_list()
+sys.stdout.write('\\n' + json.dumps(
+        [elapsed, sorted(p.codepath for p in packages if p.is_lazy()),
+         sorted(p.codepath for p in packages)]) + '\\n')
+"""
+
+
+def start_vistrails(dot_vistrails, lazy):
+    """start_vistrails(dot_vistrails: str, lazy: bool) -> (float, list, list)
+
+    Returns the startup time, the lazily registered packages and the
+    enabled packages.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(
+            vistrails.__file__)))
+    code = CHILD % {'root': root, 'dot': dot_vistrails, 'lazy': lazy}
+    with open(os.devnull, 'wb') as devnull:
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         stderr=devnull)
+    return json.loads(output.rstrip().rsplit('\n', 1)[-1])
+
+
+def run(nb_runs=5, *codepaths):
+    codepaths = codepaths or DEFAULT_PACKAGES
+    dot_vistrails = tempfile.mkdtemp(prefix='vt_startup_')
+    try:
+        with open(os.path.join(dot_vistrails, 'startup.xml'), 'wb') as f:
+            f.write(STARTUP_XML % '\n'.join('    <package name="%s"/>' % c
+                                            for c in codepaths))
+        # writes the manifests and disables the packages that fail to load
+        start_vistrails(dot_vistrails, True)
+        eager = min(start_vistrails(dot_vistrails, False)[0]
+                    for i in xrange(nb_runs))
+        results = [start_vistrails(dot_vistrails, True)
+                   for i in xrange(nb_runs)]
+        lazy = min(r[0] for r in results)
+        print "enabled packages: %s" % ', '.join(results[-1][2])
+        print "lazy packages:    %s" % ', '.join(results[-1][1])
+        print "startup, all packages initialized: %.3fs" % eager
+        print "startup, lazy package loading:     %.3fs (x%.1f)" % (
+                lazy, eager / lazy)
+    finally:
+        shutil.rmtree(dot_vistrails, ignore_errors=True)
+
+if __name__ == '__main__':
+    run(*([int(a) for a in sys.argv[1:2]] + sys.argv[2:]))
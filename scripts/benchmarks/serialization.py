@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+"""Benchmarks reading and writing large vistrails and logs in the XML and
+binary formats.
+
+The vistrail has one action per module, each adding the module, its
+location and its functions; the log has one workflow execution per
+version, each with an execution for every module added so far (up to
+100).
+
+Usage: python serialization.py [nb_actions [nb_functions [nb_execs]]]
+"""
+
+from __future__ import division
+
+from datetime import datetime
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import vistrails.core.application
+from vistrails.db.domain import DBVistrail, DBAction, DBAdd, DBModule, \
+    DBLocation, DBFunction, DBParameter, DBLog, DBWorkflowExec, DBModuleExec
+from vistrails.db.services import io
+
+
+def make_vistrail(nb_actions, nb_functions):
+    """make_vistrail(nb_actions, nb_functions) -> DBVistrail"""
+    vistrail = DBVistrail(version='1.0.5', name='benchmark')
+    ids = vistrail.idScope
+    prev_id = 0
+    for i in xrange(nb_actions):
+        module = DBModule(id=ids.getNewId('module'), name='PythonSource',
+                          package='org.vistrails.vistrails.basic',
+                          version='1.6', cache=1)
+        ops = [DBAdd(id=ids.getNewId('operation'), what='module',
+                     objectId=module.db_id, data=module)]
+        location = DBLocation(id=ids.getNewId('location'), x=i * 1.5, y=-i)
+        ops.append(DBAdd(id=ids.getNewId('operation'), what='location',
+                         objectId=location.db_id, parentObjId=module.db_id,
+                         parentObjType='module', data=location))
+        for j in xrange(nb_functions):
+            function = DBFunction(id=ids.getNewId('function'), pos=j,
+                                  name='f%d' % j)
+            ops.append(DBAdd(id=ids.getNewId('operation'), what='function',
+                             objectId=function.db_id,
+                             parentObjId=module.db_id,
+                             parentObjType='module', data=function))
+            param = DBParameter(id=ids.getNewId('parameter'), pos=0,
+                                type='org.vistrails.vistrails.basic:String',
+                                val='value %d %d' % (i, j), alias='')
+            ops.append(DBAdd(id=ids.getNewId('operation'), what='parameter',
+                             objectId=param.db_id,
+                             parentObjId=function.db_id,
+                             parentObjType='function', data=param))
+        action = DBAction(id=ids.getNewId('action'), prevId=prev_id,
+                          date=datetime(2014, 1, 1), session=1,
+                          user='benchmark', operations=ops)
+        vistrail.db_add_action(action)
+        prev_id = action.db_id
+    return vistrail
+
+
+def make_log(nb_execs):
+    """make_log(nb_execs) -> DBLog"""
+    log = DBLog()
+    for i in xrange(nb_execs):
+        item_execs = [DBModuleExec(id=j, module_id=j, module_name='PythonSource',
+                                   ts_start=datetime(2014, 1, 1),
+                                   ts_end=datetime(2014, 1, 1), cached=0,
+                                   completed=1)
+                      for j in xrange(min(i + 1, 100))]
+        log.db_add_workflow_exec(DBWorkflowExec(
+                id=i, user='benchmark', ip='127.0.0.1', vt_version='2.2',
+                ts_start=datetime(2014, 1, 1), ts_end=datetime(2014, 1, 1),
+                parent_version=i + 1, completed=1, item_execs=item_execs))
+    return log
+
+
+def best_time(f, repeat=3):
+    times = []
+    for i in xrange(repeat):
+        start = timeit.default_timer()
+        f()
+        times.append(timeit.default_timer() - start)
+    return min(times)
+
+
+def run(nb_actions=5000, nb_functions=4, nb_execs=1000):
+    vistrails.core.application.init({'batch': True})
+    vistrail = make_vistrail(nb_actions, nb_functions)
+    log = make_log(nb_execs)
+    print "%d actions, %d workflow executions" % (nb_actions, nb_execs)
+
+    tmpdir = tempfile.mkdtemp(prefix='vt_bench')
+    try:
+        xml_fname = os.path.join(tmpdir, 'vistrail.xml')
+        bin_fname = os.path.join(tmpdir, 'vistrail.bin')
+        xml_log = os.path.join(tmpdir, 'log.xml')
+        bin_log = os.path.join(tmpdir, 'log.bin')
+        results = [
+            ('vistrail save', xml_fname, bin_fname,
+             lambda: io.save_vistrail_to_xml(vistrail, xml_fname),
+             lambda: io.save_vistrail_to_binary(vistrail, bin_fname)),
+            ('vistrail load', xml_fname, bin_fname,
+             lambda: io.open_vistrail_from_xml(xml_fname),
+             lambda: io.open_vistrail_from_binary(
+                     open(bin_fname, 'rb').read())),
+            ('log save', xml_log, bin_log,
+             lambda: io.save_log_to_xml(log, xml_log),
+             lambda: io.save_log_to_binary(log, bin_log)),
+            ('log load', xml_log, bin_log,
+             lambda: io.open_log_from_xml(xml_log),
+             lambda: io.open_log_from_binary(bin_log))]
+        for name, xml_file, bin_file, xml_f, bin_f in results:
+            xml_t = best_time(xml_f)
+            bin_t = best_time(bin_f)
+            print "%-14s xml %.3fs  binary %.3fs  (x%.1f)" % (
+                    name, xml_t, bin_t, xml_t / bin_t)
+        for name, xml_file, bin_file in [('vistrail', xml_fname, bin_fname),
+                                         ('log', xml_log, bin_log)]:
+            print "%-14s xml %.1fMB  binary %.1fMB" % (
+                    name + " size", os.path.getsize(xml_file) / 2**20,
+                    os.path.getsize(bin_file) / 2**20)
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    run(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+"""Benchmarks Pipeline.refresh_signatures() on large generated pipelines.
+
+Simulates a parameter exploration: a parameter of one module is changed
+through an action on a copy of the pipeline, then the signatures are
+refreshed, either incrementally or from scratch.
+
+Usage: python signatures.py [nb_modules [nb_steps]]
+"""
+
+from __future__ import division
+
+import copy
+import random
+import sys
+import timeit
+
+import vistrails.core.application
+from vistrails.core.db.action import create_action
+from vistrails.core.system import get_vistrails_basic_pkg_id
+from vistrails.core.vistrail.connection import Connection
+from vistrails.core.vistrail.module import Module
+from vistrails.core.vistrail.module_function import ModuleFunction
+from vistrails.core.vistrail.module_param import ModuleParam
+from vistrails.core.vistrail.pipeline import Pipeline
+from vistrails.core.vistrail.port import Port
+from vistrails.db.domain import IdScope
+
+
+def make_pipeline(nb_modules, id_scope, fan_in=2):
+    """make_pipeline(nb_modules: int, id_scope: IdScope) -> Pipeline
+
+    Creates a DAG of Float modules, each one connected to up to fan_in
+    random modules created before it.
+    """
+    basic_pkg = get_vistrails_basic_pkg_id()
+    pipeline = Pipeline()
+    module_ids = []
+    for i in xrange(nb_modules):
+        param = ModuleParam(id=id_scope.getNewId(ModuleParam.vtType),
+                            type='Float',
+                            val=str(i))
+        function = ModuleFunction(id=id_scope.getNewId(ModuleFunction.vtType),
+                                  name='value',
+                                  parameters=[param])
+        module = Module(id=id_scope.getNewId(Module.vtType),
+                        package=basic_pkg,
+                        name='Float',
+                        functions=[function])
+        pipeline.add_module(module)
+        for source_id in random.sample(module_ids,
+                                       min(fan_in, len(module_ids))):
+            source = Port(id=id_scope.getNewId(Port.vtType),
+                          type='source',
+                          moduleId=source_id,
+                          moduleName='Float',
+                          name='value')
+            destination = Port(id=id_scope.getNewId(Port.vtType),
+                               type='destination',
+                               moduleId=module.id,
+                               moduleName='Float',
+                               name='value')
+            pipeline.add_connection(Connection(
+                    id=id_scope.getNewId(Connection.vtType),
+                    ports=[source, destination]))
+        module_ids.append(module.id)
+    return pipeline
+
+
+def change_parameter_action(pipeline, id_scope, module_id, value):
+    function = pipeline.modules[module_id].functions[0]
+    param = ModuleParam(id=id_scope.getNewId(ModuleParam.vtType),
+                        type='Float',
+                        val=str(value))
+    return create_action([('change', function.params[0], param,
+                           function.vtType, function.real_id)])
+
+
+def run(nb_modules=2000, nb_steps=20):
+    vistrails.core.application.init({'batch': True})
+    random.seed(0)
+    id_scope = IdScope()
+    pipeline = make_pipeline(nb_modules, id_scope)
+    pipeline.refresh_signatures()
+    # pick modules at random; most have a small downstream closure
+    steps = [(module_id,
+              change_parameter_action(pipeline, id_scope, module_id, -step))
+             for step, module_id in enumerate(
+                 random.sample(sorted(pipeline.modules), nb_steps))]
+
+    def explore(incremental):
+        pipelines = []
+        for module_id, action in steps:
+            p = copy.copy(pipeline)
+            p.perform_action(action)
+            if not incremental:
+                p.mark_signatures_dirty()
+            pipelines.append(p)
+        start = timeit.default_timer()
+        for p in pipelines:
+            p.refresh_signatures()
+        return timeit.default_timer() - start
+
+    print "%d modules, %d connections, %d steps" % (
+            len(pipeline.modules), len(pipeline.connections), nb_steps)
+    full = min(explore(False) for i in xrange(3))
+    incremental = min(explore(True) for i in xrange(3))
+    print "full refresh:        %.3fs" % full
+    print "incremental refresh: %.3fs (x%.1f)" % (incremental,
+                                                  full / incremental)
+
+if __name__ == '__main__':
+    run(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,254 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Eviction policies bounding the cached interpreter's persistent pipeline.
+
+The cached interpreter keeps every module it has computed, along with its
+outputs, until it is explicitly cleaned. The policies in this module track how
+the cached modules are used so the interpreter can pick which ones to discard
+when the cache goes over its budget (number of modules or estimated memory).
+"""
+
+from __future__ import division
+
+import heapq
+import itertools
+import sys
+
+##############################################################################
+
+def estimate_size(value, _seen=None):
+    """estimate_size(value) -> int
+
+    Estimates the memory used by a value, in bytes. This follows containers
+    but not the attributes of arbitrary objects; arrays exposing 'nbytes'
+    (e.g. NumPy) are accounted for with their buffer size.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, (int, long)):
+        return nbytes
+    try:
+        size = sys.getsizeof(value, 0)
+    except TypeError:
+        size = 0
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen)
+                    for k, v in value.iteritems())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(e, _seen) for e in value)
+    return size
+
+
+def estimate_outputs_size(obj):
+    """estimate_outputs_size(obj: Module) -> int
+
+    Estimates the memory used by the outputs of a module.
+    """
+    seen = set([id(obj)])
+    return sum(estimate_size(value, seen)
+               for port, value in obj.outputPorts.iteritems()
+               if port != 'self')
+
+##############################################################################
+
+class CacheEntryStats(object):
+    def __init__(self, size=0, cost=0.0):
+        self.size = size
+        self.cost = cost
+        self.last_used = 0
+        self.priority = 0.0
+
+
+class LRUEvictionPolicy(object):
+    """Evicts the least recently used modules first.
+    """
+    name = 'lru'
+
+    def __init__(self):
+        self.entries = {}
+        self._total_size = 0
+        # Heap of (priority, last_used, module_id), with stale items (whose
+        # entry was touched again or discarded since) skipped when popped
+        self._heap = []
+        self._clock = itertools.count(1)
+
+    def touch(self, module_id, size=None, cost=None):
+        """touch(module_id: int, size: int, cost: float) -> None
+
+        Records that a cached module was used by an execution. size and cost
+        (time in seconds it took to compute) are updated if given.
+        """
+        entry = self.entries.get(module_id)
+        if entry is None:
+            entry = self.entries[module_id] = CacheEntryStats()
+        if size is not None:
+            self._total_size += size - entry.size
+            entry.size = size
+        if cost is not None:
+            entry.cost = cost
+        entry.last_used = self._clock.next()
+        self.update_priority(entry)
+        if len(self._heap) > 2 * len(self.entries) + 16:
+            self._heap = [(e.priority, e.last_used, i)
+                          for i, e in self.entries.iteritems()]
+            heapq.heapify(self._heap)
+        else:
+            heapq.heappush(self._heap,
+                           (entry.priority, entry.last_used, module_id))
+
+    def update_priority(self, entry):
+        entry.priority = entry.last_used
+
+    def discard(self, module_id):
+        entry = self.entries.pop(module_id, None)
+        if entry is not None:
+            self._total_size -= entry.size
+            self.evicted(entry)
+
+    def evicted(self, entry):
+        pass
+
+    def clear(self):
+        self.entries = {}
+        self._total_size = 0
+        self._heap = []
+
+    def total_size(self):
+        return self._total_size
+
+    def next_victim(self):
+        """next_victim() -> int
+
+        Returns the id of the module that should be evicted next.
+        """
+        heap = self._heap
+        while heap:
+            priority, last_used, module_id = heap[0]
+            entry = self.entries.get(module_id)
+            if entry is not None and entry.last_used == last_used:
+                return module_id
+            heapq.heappop(heap)
+        return None
+
+
+class CostAwareEvictionPolicy(LRUEvictionPolicy):
+    """Evicts the modules that are cheap to recompute for their size first.
+
+    This is the GreedyDual-Size algorithm: a module's priority is its cost
+    (compute time) divided by its size, plus an inflation value that is
+    raised to the priority of each evicted module, so that modules that were
+    not used for a long time eventually get evicted even if expensive.
+    """
+    name = 'cost'
+
+    def __init__(self):
+        LRUEvictionPolicy.__init__(self)
+        self.inflation = 0.0
+
+    def update_priority(self, entry):
+        entry.priority = self.inflation + entry.cost / max(entry.size, 1)
+
+    def evicted(self, entry):
+        self.inflation = max(self.inflation, entry.priority)
+
+    def clear(self):
+        LRUEvictionPolicy.clear(self)
+        self.inflation = 0.0
+
+
+eviction_policies = dict((p.name, p) for p in [LRUEvictionPolicy,
+                                               CostAwareEvictionPolicy])
+
+##############################################################################
+
+import unittest
+
+
+class TestEviction(unittest.TestCase):
+    def test_estimate_size(self):
+        small = estimate_size([1, 2])
+        big = estimate_size([1, 2, 'x' * 10000])
+        self.assertGreater(big - small, 10000)
+        l = []
+        l.append(l)
+        self.assertGreater(estimate_size(l), 0)
+
+    def test_lru(self):
+        policy = LRUEvictionPolicy()
+        policy.touch(1, 10, 1.0)
+        policy.touch(2, 10, 1.0)
+        policy.touch(3, 10, 1.0)
+        policy.touch(1)
+        self.assertEqual(policy.next_victim(), 2)
+        policy.discard(2)
+        self.assertEqual(policy.next_victim(), 3)
+        self.assertEqual(policy.total_size(), 20)
+
+    def test_cost(self):
+        policy = CostAwareEvictionPolicy()
+        policy.touch(1, 1000, 10.0) # expensive
+        policy.touch(2, 1000, 0.1)  # cheap
+        policy.touch(3, 100, 0.8)   # cheap but small
+        self.assertEqual(policy.next_victim(), 2)
+        policy.discard(2)
+        self.assertEqual(policy.next_victim(), 3)
+        policy.discard(3)
+        # Recomputed after the inflation was raised, now outlives 1
+        policy.touch(3, 100, 0.8)
+        self.assertEqual(policy.next_victim(), 1)
+
+    def test_total_size(self):
+        policy = LRUEvictionPolicy()
+        for i in xrange(100):
+            policy.touch(i, 10, 1.0)
+        policy.touch(5, 30)
+        policy.touch(6)
+        self.assertEqual(policy.total_size(), 1020)
+        victims = []
+        while policy.total_size() > 500:
+            victims.append(policy.next_victim())
+            policy.discard(victims[-1])
+        self.assertEqual(victims, range(5) + range(7, 54))
+        self.assertEqual(policy.total_size(), 500)
+        self.assertEqual(policy.total_size(),
+                         sum(e.size for e in policy.entries.itervalues()))
+        policy.clear()
+        self.assertEqual(policy.total_size(), 0)
+        self.assertIsNone(policy.next_victim())
@@ -37,72 +37,74 @@
 from __future__ import division
 
 import unittest
-from vistrails.core.cache.utils import hash_list
+from vistrails.core.cache import utils as cache_utils
+from vistrails.core.cache.utils import hash_list, hash_strings
 
-try:
-    import hashlib
-    sha_hash = hashlib.sha1
-except ImportError:
-    import sha
-    sha_hash = sha.new
+# Kept for modules importing it from here
+sha_hash = cache_utils.sha_hash
 
 ##############################################################################
 
 class Hasher(object):
+    """Computes the signatures of pipeline objects.
+
+    Parameter and function digests are memoized on the objects, in their
+    _signature attribute. ModuleParam's setters drop it when one of the
+    hashed fields is assigned; a function memo stores the digests of its
+    parameters and is only reused if they still match. Both also record
+    the hash algorithm they were computed with.
+
+    """
 
     @staticmethod
     def parameter_signature(p, constant_hasher_map={}):
         k = (p.identifier, p.type, p.namespace)
         custom_hasher = constant_hasher_map.get(k, None)
         if custom_hasher:
+            # Not memoized: a custom signature can depend on external state
             return custom_hasher(p)
-        else:
-            hasher = sha_hash()
-            u = hasher.update
-            u(p.type)
-            u(p.identifier)
-            u(p.namespace or "")
-            u(p.strValue)
-            u(p.name)
-            u(p.evaluatedStrValue)
-            return hasher.digest()
+        algorithm = cache_utils._hash_algorithm
+        memo = p.__dict__.get('_signature')
+        if memo is not None and memo[0] == algorithm:
+            return memo[1]
+        sig = hash_strings((k[1],
+                            k[0],
+                            k[2] or "",
+                            p.strValue,
+                            p.name,
+                            p.evaluatedStrValue))
+        p.__dict__['_signature'] = (algorithm, sig)
+        return sig
 
     @staticmethod
     def function_signature(function, constant_hasher_map={}):
-        hasher = sha_hash()
-        u = hasher.update
-        u(function.name)
-        u(function.returnType)
-        u(hash_list(function.params,
-                    Hasher.parameter_signature,
-                    constant_hasher_map))
-        return hasher.digest()
+        # The digests get sorted; skip the sort done by function.params
+        param_sigs = [Hasher.parameter_signature(p, constant_hasher_map)
+                      for p in function.db_parameters]
+        param_sigs.sort()
+        key = (cache_utils._hash_algorithm, function.name,
+               function.returnType, param_sigs)
+        memo = function.__dict__.get('_signature')
+        if memo is not None and memo[0] == key:
+            return memo[1]
+        sig = hash_strings((function.name,
+                            function.returnType,
+                            hash_strings(param_sigs)))
+        function.__dict__['_signature'] = (key, sig)
+        return sig
 
     @staticmethod
     def control_param_signature(control_param, constant_hasher_map={}):
-        hasher = sha_hash()
-        u = hasher.update
-        u(control_param.name)
-        u(control_param.value)
-        return hasher.digest()
+        return hash_strings((control_param.name, control_param.value))
 
     @staticmethod
     def connection_signature(c):
-        hasher = sha_hash()
-        u = hasher.update
-        u(c.source.name)
-        u(c.destination.name)
-        return hasher.digest()
+        return hash_strings((c.source.name, c.destination.name))
 
     @staticmethod
     def port_spec_signature(ps, constant_hasher_map={}):
-        hasher = sha_hash()
-        u = hasher.update
-        u(ps.type)
-        u(ps.name)
-        u(ps.sigstring)
-        u('%d' % ps.depth)
-        return hasher.digest()
+        return hash_strings((ps.type, ps.name, ps.sigstring,
+                             '%d' % ps.depth))
 
     @staticmethod
     def connection_subpipeline_signature(c, source_sig, dest_sig):
@@ -110,29 +112,26 @@ class Hasher(object):
         subpipelines
 
         """
-        hasher = sha_hash()
-        u = hasher.update
-        u(Hasher.connection_signature(c))
-        u(source_sig)
-        u(dest_sig)
-        return hasher.digest()
+        return hash_strings((Hasher.connection_signature(c),
+                             source_sig,
+                             dest_sig))
 
     @staticmethod
     def module_signature(obj, constant_hasher_map={}):
-        hasher = sha_hash()
-        u = hasher.update
-        u(obj.module_descriptor.name)
-        u(obj.module_descriptor.package)
-        u(obj.module_descriptor.namespace or '')
-        u(obj.module_descriptor.package_version or '')
-        u(obj.module_descriptor.version or '')
-        u(hash_list(obj.functions, Hasher.function_signature,
-                    constant_hasher_map))
-        u(hash_list(obj.control_parameters, Hasher.control_param_signature,
-                    constant_hasher_map))
-        u(hash_list(obj.port_spec_list, Hasher.port_spec_signature,
-                    constant_hasher_map))
-        return hasher.digest()
+        descriptor = obj.module_descriptor
+        return hash_strings((
+                descriptor.name,
+                descriptor.package,
+                descriptor.namespace or '',
+                descriptor.package_version or '',
+                descriptor.version or '',
+                hash_list(obj.functions, Hasher.function_signature,
+                          constant_hasher_map),
+                hash_list(obj.control_parameters,
+                          Hasher.control_param_signature,
+                          constant_hasher_map),
+                hash_list(obj.port_spec_list, Hasher.port_spec_signature,
+                          constant_hasher_map)))
 
     @staticmethod
     def subpipeline_signature(module_sig, upstream_sigs):
@@ -142,12 +141,9 @@ class Hasher(object):
         WARNING: For efficiency, upstream_sigs is mutated!
 
         """
-        hasher = sha_hash()
-        hasher.update(module_sig)
         upstream_sigs.sort()
-        for pipeline_connection_sig in upstream_sigs:
-            hasher.update(pipeline_connection_sig)
-        return hasher.digest()
+        upstream_sigs.insert(0, module_sig)
+        return hash_strings(upstream_sigs)
 
     @staticmethod
     def compound_signature(sig_list):
@@ -156,10 +152,7 @@ class Hasher(object):
         signatures, assuming the list order is irrelevant
 
         """
-        hasher = sha_hash()
-        for h in sorted(sig_list):
-            hasher.update(h)
-        return hasher.digest()
+        return hash_strings(sorted(sig_list))
 
 
 ##############################################################################
@@ -191,3 +184,49 @@ class TestCacheHash(unittest.TestCase):
         api.add_connection(ps.id, 'b', so.id, 'value')
         # will fail if outputportspec is not hashed and cache is reused
         self.assertEqual(c.execute_current_workflow()[0][0].errors, {})
+
+    def test_memoized_signatures(self):
+        """Test that memoized parameter and function signatures follow
+        changes to the objects.
+        """
+        from vistrails.core.vistrail.module_function import ModuleFunction
+        from vistrails.core.vistrail.module_param import ModuleParam
+        p = ModuleParam(type='Integer', val='1', name='<no description>')
+        f = ModuleFunction(name='value', parameters=[p])
+        sig1 = Hasher.function_signature(f)
+        self.assertIn('_signature', p.__dict__)
+        self.assertEqual(Hasher.function_signature(f), sig1)
+
+        p.strValue = '2'
+        self.assertIsNone(p.__dict__['_signature'])
+        sig2 = Hasher.function_signature(f)
+        self.assertNotEqual(sig2, sig1)
+
+        p.evaluatedStrValue = '2'
+        sig3 = Hasher.function_signature(f)
+        self.assertNotEqual(sig3, sig2)
+
+        p.type = 'Float'
+        self.assertIsNone(p.__dict__['_signature'])
+        self.assertNotEqual(Hasher.function_signature(f), sig3)
+
+        # The memo is copied but still checked against the parameters
+        f2 = f.do_copy()
+        self.assertEqual(Hasher.function_signature(f2),
+                         Hasher.function_signature(f))
+        f2.params.append(ModuleParam(type='Integer', val='3', pos=1))
+        self.assertNotEqual(Hasher.function_signature(f2),
+                            Hasher.function_signature(f))
+
+    def test_hash_algorithm(self):
+        """Test that changing the digest recomputes memoized signatures.
+        """
+        from vistrails.core.vistrail.module_param import ModuleParam
+        p = ModuleParam(type='Integer', val='1')
+        sig = Hasher.parameter_signature(p)
+        try:
+            cache_utils.set_hash_algorithm('md5')
+            self.assertEqual(len(Hasher.parameter_signature(p)), 16)
+        finally:
+            cache_utils.set_hash_algorithm('sha1')
+        self.assertEqual(Hasher.parameter_signature(p), sig)
@@ -0,0 +1,338 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Disk-backed store for module results.
+
+The cached interpreter keeps the results of a module in memory, keyed by the
+signature of its subpipeline, but they are lost when the process exits. The
+ResultStore persists the outputs of the modules that can be serialized to a
+directory, using the same subpipeline signatures as keys, so that later runs
+(for instance, repeated batch executions of the same workflows) can reuse
+them. The total size of the store is bounded; least recently used results get
+evicted first.
+"""
+
+from __future__ import division
+
+import cPickle as pickle
+import os
+import tempfile
+import time
+
+from vistrails.core import debug
+from vistrails.core.configuration import get_vistrails_configuration
+from vistrails.core.modules.basic_modules import Generator, PathObject
+from vistrails.core.modules.vistrails_module import Module
+from vistrails.core.system import get_vistrails_directory
+
+##############################################################################
+
+class NotStorable(Exception):
+    """Raised when an output value cannot be persisted.
+    """
+
+
+class StoreEntry(object):
+    def __init__(self, signature, abs_name, size, time):
+        self.signature = signature
+        self.abs_name = abs_name
+        self.size = size
+        self.time = time
+
+
+class ResultStore(object):
+    """Persists module outputs on disk, keyed by subpipeline signature.
+
+    Values are pickled; outputs that reference modules, streams or files
+    (PathObject, that could point to temporary files or to files whose
+    content changes) are never stored.
+    """
+
+    SUFFIX = '.result'
+
+    def __init__(self, directory, max_size):
+        """ResultStore(directory: str, max_size: int) -> ResultStore
+
+        max_size is the maximum total size of the stored results, in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.elements = {}
+        self.total_size = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.init_store()
+
+    def init_store(self):
+        for fname in os.listdir(self.directory):
+            if not fname.endswith(self.SUFFIX):
+                continue
+            abs_name = os.path.join(self.directory, fname)
+            statinfo = os.stat(abs_name)
+            signature = fname[:-len(self.SUFFIX)]
+            self.elements[signature] = StoreEntry(signature, abs_name,
+                                                  statinfo.st_size,
+                                                  statinfo.st_mtime)
+            self.total_size += statinfo.st_size
+
+    def size(self):
+        return self.total_size
+
+    def __contains__(self, signature):
+        return signature in self.elements
+
+    def get(self, signature):
+        """get(signature: str) -> dict or None
+
+        Returns the outputs stored for this signature, as a dict mapping port
+        names to values, or None.
+        """
+        entry = self.elements.get(signature)
+        if entry is None:
+            return None
+        try:
+            with open(entry.abs_name, 'rb') as fp:
+                outputs = pickle.load(fp)
+            # Record the access time, used to evict the least recently used
+            # results
+            entry.time = time.time()
+            os.utime(entry.abs_name, (entry.time, entry.time))
+        except Exception, e:
+            debug.warning("Could not read stored result %s" % signature, e)
+            self.remove(signature)
+            return None
+        return outputs
+
+    @staticmethod
+    def _persistent_id(obj):
+        if isinstance(obj, (Module, Generator, PathObject)):
+            raise NotStorable(type(obj).__name__)
+        return None
+
+    def put(self, signature, outputs):
+        """put(signature: str, outputs: dict) -> bool
+
+        Stores the outputs of a module. Returns False if some of the values
+        could not be serialized, in which case nothing is stored.
+        """
+        fd, tmp_name = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                pickler = pickle.Pickler(fp, pickle.HIGHEST_PROTOCOL)
+                pickler.persistent_id = self._persistent_id
+                pickler.dump(outputs)
+        except Exception:
+            os.unlink(tmp_name)
+            return False
+        size = os.path.getsize(tmp_name)
+        if size > self.max_size:
+            os.unlink(tmp_name)
+            return False
+        self.remove(signature)
+        abs_name = os.path.join(self.directory, signature + self.SUFFIX)
+        os.rename(tmp_name, abs_name)
+        self.elements[signature] = StoreEntry(signature, abs_name, size,
+                                              os.path.getmtime(abs_name))
+        self.total_size += size
+        self.remove_lru()
+        return True
+
+    def remove_lru(self):
+        """Removes the least recently used results until the store fits in
+        its maximum size.
+        """
+        if self.total_size <= self.max_size:
+            return
+        elements = self.elements.values()
+        elements.sort(key=lambda entry: entry.time)
+        for entry in elements:
+            if self.total_size <= self.max_size:
+                break
+            self.remove(entry.signature)
+
+    def remove(self, signature):
+        entry = self.elements.pop(signature, None)
+        if entry is not None:
+            self.total_size -= entry.size
+            try:
+                os.unlink(entry.abs_name)
+            except OSError, e:
+                debug.warning("Could not remove file %s" % entry.abs_name, e)
+
+    def clear(self):
+        for signature in self.elements.keys():
+            self.remove(signature)
+
+##############################################################################
+
+_store = None
+
+def get_result_store():
+    """get_result_store() -> ResultStore or None
+
+    Returns the ResultStore set up from the 'resultCache' configuration, or
+    None if storing results on disk is disabled.
+    """
+    global _store
+    conf = get_vistrails_configuration()
+    if conf is None or not conf.has_deep_value('resultCache.enabled') or \
+            not conf.get_deep_value('resultCache.enabled'):
+        return None
+    directory = get_vistrails_directory('resultCache.cacheDir', conf)
+    if directory is None:
+        return None
+    max_size = conf.get_deep_value('resultCache.cacheSize') * 1024 * 1024
+    if _store is None or _store.directory != directory:
+        try:
+            _store = ResultStore(directory, max_size)
+        except (IOError, OSError), e:
+            debug.warning("Could not open result cache in %s" % directory, e)
+            _store = None
+            return None
+    elif _store.max_size != max_size:
+        _store.max_size = max_size
+        _store.remove_lru()
+    return _store
+
+##############################################################################
+
+import shutil
+import unittest
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='vt_results_')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_store(self):
+        store = ResultStore(self.directory, 1024 * 1024)
+        self.assertTrue(store.put('abc', {'value': 42, 'other': [1, 'a']}))
+        self.assertIn('abc', store)
+        self.assertEqual(store.get('abc'), {'value': 42, 'other': [1, 'a']})
+        self.assertIsNone(store.get('def'))
+        # A new store finds the results from disk
+        store = ResultStore(self.directory, 1024 * 1024)
+        self.assertEqual(store.get('abc'), {'value': 42, 'other': [1, 'a']})
+
+    def test_not_storable(self):
+        store = ResultStore(self.directory, 1024 * 1024)
+        self.assertFalse(store.put('abc', {'value': PathObject('/tmp/f')}))
+        self.assertFalse(store.put('def', {'value': [lambda: 1]}))
+        self.assertEqual(store.size(), 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_lru(self):
+        value = 'x' * 1000
+        store = ResultStore(self.directory, 2500)
+        store.put('a', {'value': value})
+        store.put('b', {'value': value})
+        store.elements['a'].time -= 10
+        store.elements['b'].time -= 20
+        store.get('b')
+        store.put('c', {'value': value})
+        self.assertNotIn('a', store)
+        self.assertIn('b', store)
+        self.assertIn('c', store)
+        self.assertLessEqual(store.size(), 2500)
+
+    def test_size(self):
+        store = ResultStore(self.directory, 2500)
+        store.put('a', {'value': 'x' * 1000})
+        store.put('a', {'value': 'x' * 500})
+        store.put('b', {'value': 'x' * 1000})
+        store.put('c', {'value': 'x' * 1000})
+        on_disk = sum(os.path.getsize(os.path.join(self.directory, f))
+                      for f in os.listdir(self.directory))
+        self.assertEqual(store.size(), on_disk)
+        self.assertEqual(ResultStore(self.directory, 2500).size(), on_disk)
+        store.clear()
+        self.assertEqual(store.size(), 0)
+
+    def test_interpreter(self):
+        """Results are reused by a new interpreter after a restart.
+        """
+        from vistrails.core.modules.basic_modules import ConcatenateString
+        from vistrails.tests.utils import execute, intercept_result
+
+        conf = get_vistrails_configuration()
+        old_conf = (conf.resultCache.enabled, conf.resultCache.cacheDir)
+        conf.resultCache.enabled = True
+        conf.resultCache.cacheDir = self.directory
+        modules = [('ConcatenateString', 'org.vistrails.vistrails.basic', [
+                        ('str1', [('String', 'abc')]),
+                        ('str2', [('String', 'def')])]),
+                   ('ConcatenateString', 'org.vistrails.vistrails.basic', [
+                        ('str2', [('String', 'ghi')])])]
+        connections = [(0, 'value', 1, 'str1')]
+        computed = []
+        old_compute = ConcatenateString.compute
+        def compute(module):
+            computed.append(module)
+            old_compute(module)
+        ConcatenateString.compute = compute
+        try:
+            with intercept_result(ConcatenateString, 'value') as results:
+                self.assertFalse(execute(modules, connections))
+            self.assertEqual(len(computed), 2)
+            self.assertEqual(results, ['abcdef', 'abcdefghi'])
+            self.assertEqual(len(get_result_store().elements), 2)
+
+            # The non-caching interpreter discards its in-memory results
+            del computed[:]
+            result = execute(modules, connections, full_results=True)
+            self.assertFalse(result.errors)
+            self.assertEqual(computed, [])
+            self.assertEqual(result.objects[1].get_output('value'),
+                             'abcdefghi')
+
+            # An entry missing a port connected downstream is not restored
+            store = get_result_store()
+            for signature in list(store.elements):
+                outputs = store.get(signature)
+                if outputs['value'] == 'abcdef':
+                    del outputs['value']
+                    store.put(signature, outputs)
+            del computed[:]
+            result = execute(modules, connections, full_results=True)
+            self.assertFalse(result.errors)
+            self.assertEqual(len(computed), 2)
+            self.assertEqual(result.objects[1].get_output('value'),
+                             'abcdefghi')
+        finally:
+            ConcatenateString.compute = old_compute
+            conf.resultCache.enabled, conf.resultCache.cacheDir = old_conf
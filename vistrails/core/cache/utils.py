@@ -44,11 +44,110 @@ except ImportError:
     import sha
     sha_hash = sha.new
 
+import unittest
+
+##############################################################################
+# Hashing backends
+#
+# Signatures only need to be consistent within a session (they index the
+# cache), so the digest used to compute them can be traded for speed. sha1
+# remains the default.
+
+hash_algorithms = {'sha1': sha_hash}
+
+try:
+    hash_algorithms['md5'] = hashlib.md5
+except NameError:
+    pass
+
+try:
+    from hashlib import blake2b as _blake2b
+except ImportError:
+    try:
+        from pyblake2 import blake2b as _blake2b
+    except ImportError:
+        _blake2b = None
+if _blake2b is not None:
+    def blake2b_hash(data=''):
+        # Same digest size as sha1
+        return _blake2b(data, digest_size=20)
+    hash_algorithms['blake2b'] = blake2b_hash
+
+try:
+    import xxhash
+except ImportError:
+    pass
+else:
+    hash_algorithms['xxhash'] = getattr(xxhash, 'xxh128', xxhash.xxh64)
+
+_hash_algorithm = 'sha1'
+_hash = sha_hash
+
+def get_hash_algorithm():
+    """get_hash_algorithm() -> str
+
+    Returns the name of the digest currently used for signatures.
+    """
+    return _hash_algorithm
+
+def set_hash_algorithm(name):
+    """set_hash_algorithm(name: str) -> None
+
+    Selects the digest used for signatures. Raises ValueError if it is
+    unknown or not available on this system.
+    """
+    global _hash_algorithm, _hash
+    if name not in hash_algorithms:
+        raise ValueError("Hash algorithm %r is not available (available: "
+                         "%s)" % (name, ', '.join(sorted(hash_algorithms))))
+    _hash_algorithm = name
+    _hash = hash_algorithms[name]
+
+def hash_strings(strings):
+    """hash_strings(strings: list of str) -> str
+
+    Returns the digest of the concatenation of the strings, hashed in a
+    single call. This is the same as feeding them to update() in turn.
+    """
+    try:
+        data = ''.join(strings)
+    except UnicodeDecodeError:
+        data = ''.join(s.encode('utf-8') if isinstance(s, unicode) else s
+                       for s in strings)
+    try:
+        return _hash(data).digest()
+    except UnicodeEncodeError:
+        return _hash(data.encode('utf-8')).digest()
+
 ##############################################################################
 
 def hash_list(lst, hasher_f, constant_hasher_map={}):
-    hasher = sha_hash()
     hash_l = [hasher_f(el, constant_hasher_map) for el in lst]
     hash_l.sort()
-    for hel in hash_l: hasher.update(hel)
-    return hasher.digest()
+    return hash_strings(hash_l)
+
+##############################################################################
+
+class TestHashBackends(unittest.TestCase):
+    def tearDown(self):
+        set_hash_algorithm('sha1')
+
+    def test_hash_strings(self):
+        hasher = sha_hash()
+        for s in ['Float', 'org.vistrails.vistrails.basic', u'value', '']:
+            hasher.update(s)
+        self.assertEqual(hash_strings(['Float',
+                                       'org.vistrails.vistrails.basic',
+                                       u'value', '']),
+                         hasher.digest())
+        # Non-ASCII unicode is hashed as UTF-8
+        self.assertEqual(hash_strings([u'\xe9t\xe9', '\xc3\xa9']),
+                         sha_hash('\xc3\xa9t\xc3\xa9\xc3\xa9').digest())
+
+    def test_set_algorithm(self):
+        for name in hash_algorithms:
+            set_hash_algorithm(name)
+            self.assertEqual(get_hash_algorithm(), name)
+            self.assertEqual(hash_strings(['a', 'b']),
+                             hash_algorithms[name]('ab').digest())
+        self.assertRaises(ValueError, set_hash_algorithm, 'nosuchhash')
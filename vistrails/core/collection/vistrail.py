@@ -349,7 +349,9 @@ class VistrailEntity(Entity):
             # read persisted log entries
             log = None
             try:
-                log = vistrail.get_persisted_log()
+                # only the executions of versions of the tree can be indexed,
+                # see add_wf_exec_entity()
+                log = vistrail.get_persisted_log(vistrail.actionMap)
             except Exception, e:
                 debug.unexpected_exception(e)
                 debug.critical("Failed to read log", debug.format_exc())
@@ -66,6 +66,9 @@ autoConnect: Automatically connect dragged in modules
 autoSave: Automatically save backup vistrails every two minutes
 batch: Run in batch mode instead of interactive mode
 cache: Cache previous results so they may be used in future computations
+cacheEvictionPolicy: Which cached modules to discard first (lru or cost)
+cacheMaxMemory: Maximum size of the cached results (MB)
+cacheMaxModules: Maximum number of cached modules
 customVersionColors: Allow setting custom colors for versions
 dataDir: Default data directory
 db: The name for the database to load the vistrail from
@@ -78,6 +81,9 @@ enablePackagesSilently: Automatically enable packages when needed
 errorLog: Write errors to a log file
 NoExecute: Do not execute specified workflows
 executionLog: Track execution provenance when running workflows
+executionLogLevel: Detail of the execution log (full, summary or off)
+executionThreads: Number of threads used to run independent modules
+explorationProcesses: Number of processes used to run parameter explorations
 fileDir: Default vistrail directory
 fixedCustomVersionColorSaturation: Don't vary custom color with age
 fixedSpreadsheetCells: Draw spreadsheet cells at a fixed size
@@ -92,8 +98,12 @@ jobAutorun: Run jobs automatically when they finish
 jobCheckInterval: How often to check for jobs (in seconds)
 jobList: List running workflows
 jobInfo: List jobs in running workflow
+lazyPackageLoading: Register packages from cached manifests, import on use
+lazyVistrailLoading: Only read the operations of versions when needed
 loadPackages: Whether to load the packages enabled in the configuration file
 logDir: Log files directory
+logSegmentSize: Size of execution log segments in .vt files (MB)
+loopThreads: Number of threads used to iterate modules over input lists
 maxRecentVistrails: Number of recent vistrails
 maximizeWindows: VisTrails windows should be maximized
 migrateTags: Move tags to upgraded versions
@@ -103,20 +113,29 @@ outputDirectory: Directory in which to place output files
 outputPipelineGraph: Output the workflow graph as an image
 outputVersionTree: Output the version tree as an image
 packageDir: System packages directory
+packageManifestDir: Directory for cached package manifests
 parameterExploration: Run parameter exploration instead of workflow
 parameters: List of parameters to use when running workflow
+pipelineCacheSize: Maximum number of workflow objects kept in cached pipelines
 port: The port for the database to load the vistrail from
 reportUsage: Report anonymous usage statistics to the developers
+resultCache.cacheDir: Directory for results stored across sessions
+resultCache.cacheSize: Size of the stored results (MB)
+resultCache.enabled: Store module results on disk to reuse them across sessions
 enableUsage: Enable sending anonymous usage statistics
 disableUsage: Disable sending anonymous usage statistics
 repositoryHTTPURL: Remote package repository URL
 repositoryLocalPath: Local package repository directory
 rootDirectory: Directory that contains the VisTrails source code
+rpcCacheSize: Maximum number of workflow objects kept in the server's vistrail cache
 rpcConfig: Config file for server connection options
 rpcInstances: Number of other instances that vistrails should start
 rpcLogFile: Log file for XML RPC server
 rpcPort: Port where this xml rpc server will work
 rpcServer: Hostname or ip address where this xml rpc server will work
+rpcWorkerMaxMemory: Memory (MB) after which a server worker process is replaced
+rpcWorkerMaxRequests: Number of requests after which a server worker process is replaced
+rpcWorkers: Number of worker processes executing the server's workflows
 shell.fontFace: Console Font
 shell.fontSize: Console Font Size
 showConnectionErrors: Show error when input value doesn't match type during execution
@@ -128,11 +147,14 @@ showSpreadsheetOnly: Hides the VisTrails main window
 showVariantErrors: Show error when variant input value doesn't match type during execution
 showVistrailsNews: Show news from VisTrails (once per message)
 showWindow: Show the main window
+signatureHashAlgorithm: Digest used to compute cache signatures
 singleInstance: Do not allow more than one instance of VisTrails to run at once
 spreadsheetDumpCells: Defines the location for generated cells
 spreadsheetDumpPDF: Whether the spreadsheet should dump images in PDF format
 staticRegistry: XML registry file
 stopOnError: Stop all workflow execution immediately after first error
+streamChunkSize: Number of values passed at once between streaming modules
+streamSpillThreshold: Number of accumulated stream values kept in memory
 subworkflowsDir: Local subworkflows directory
 temporaryDir: Temporary files directory
 thumbs.autoSave: Save thumbnails of visual results
@@ -146,7 +168,11 @@ upgrades: Attempt to automatically upgrade old workflows
 useMacBrushedMetalStyle: Use a brushed metal interface (MacOS X only)
 user: The username for the database to the load vistrail from
 userPackageDir: Local packages directory
+versionCheckpoints.interval: Number of actions between workflow checkpoints
+versionCheckpoints.maxOperations: Maximum number of operations kept in workflow checkpoints
+versionCheckpoints.save: Save workflow checkpoints in .vt files
 viewOnLoad: Whether to show pipeline or history view when opening vistrail
+vtFileFormat: Format of the vistrail and log in .vt files (xml or binary)
 webRepositoryURL: Web repository URL
 webRepositoryUser: Web repository username
 """
@@ -169,6 +195,23 @@ cache: Boolean
 
     Cache previous results so they may be used in future computations.
 
+cacheEvictionPolicy: String
+
+    How cached modules are discarded when the cache goes over
+    cacheMaxModules or cacheMaxMemory: 'lru' discards the least recently
+    used modules first, 'cost' discards the modules that are the cheapest
+    to recompute for the memory they use first.
+
+cacheMaxMemory: Integer
+
+    Maximum estimated size (in MB) of the results kept in the cache
+    between executions (0 for no limit).
+
+cacheMaxModules: Integer
+
+    Maximum number of modules kept in the cache between executions (0 for
+    no limit).
+
 customVersionColors: Boolean
 
     Allow setting custom colors for versions, and display these colors in the
@@ -222,6 +265,27 @@ executionLog: Boolean
 
     Track execution provenance when running workflows.
 
+executionLogLevel: String
+
+    How much of the execution provenance is logged when executionLog is
+    on: 'full' logs every module execution, loop iteration and
+    annotation; 'summary' only logs workflow executions, with per-module
+    counts and timings and the module executions that failed; 'off'
+    logs nothing.
+
+executionThreads: Integer
+
+    Number of worker threads used to update independent modules of a
+    workflow concurrently (0 updates modules sequentially).
+
+explorationProcesses: Integer
+
+    Number of worker processes used to execute the cells of a parameter
+    exploration (0 executes them one by one). If results are stored on
+    disk (resultCache), modules shared by several cells are computed
+    once, before the workers start. Not used for explorations displayed
+    in the spreadsheet, nor for workflows using subworkflows.
+
 fileDir: Path
 
     The location that VisTrails uses as a default directory for
@@ -281,6 +345,20 @@ jobInfo: Boolean
 
     List jobs in running workflow.
 
+lazyPackageLoading: Boolean
+
+    Register the modules and ports of enabled packages from manifests
+    cached in packageManifestDir, and only import a package's code when
+    one of its modules is executed or configured. Manifests are written
+    the first time a package is loaded and refreshed when its files
+    change.
+
+lazyVistrailLoading: Boolean
+
+    When opening a .vt file, read the version tree (versions, tags and
+    annotations) first and only read the changes made by a version when
+    it is used, e.g. to build a workflow.
+
 loadPackages: Boolean
 
     Whether to load the packages enabled in the configuration file.
@@ -289,10 +367,25 @@ logDir: Path
 
     The path that indicates where log files should be stored.
 
+logSegmentSize: Integer
+
+    If positive, the execution log of .vt files is stored as segments
+    of this size (in MB) with an index by version, time and user, so
+    that queries and filtered reads only parse the segments they need.
+    An existing single-file log becomes the first segment the next time
+    executions are saved. 0 keeps the log in a single file.
+
 logger: ConfigurationObject
 
     *Deprecated*
 
+loopThreads: Integer
+
+    Number of worker threads used when a module iterates over the
+    elements of input lists (0 iterates on a single thread). The
+    loop_threads control parameter of a module overrides it. Modules
+    that are not thread-safe always iterate on a single thread.
+
 maximizeWindows: Boolean
 
     Whether the VisTrails windows should take up the entire screen space.
@@ -354,6 +447,11 @@ packageDir: Path
     The directory to look for VisTrails core packages (use
     userPackageDir for user-defined packages).
 
+packageManifestDir: Path
+
+    The directory where the manifests used by lazyPackageLoading are
+    stored.
+
 parameterExploration: Boolean
 
     Open and execute parameter exploration specified by the
@@ -363,6 +461,13 @@ parameters: String
 
     List of parameters to use when running workflow.
 
+pipelineCacheSize: Integer
+
+    The maximum number of workflow objects (modules, connections,
+    functions, parameters...) in the pipelines a vistrail keeps to switch
+    between versions quickly. Pipelines of tagged versions are always
+    kept and don't count towards this limit.
+
 port: Integer
 
     The port for the database to load the vistrail from.
@@ -395,6 +500,25 @@ repositoryLocalPath: Path
 
     Path used to locate packages available to be installed.
 
+resultCache: ConfigurationObject
+
+    Settings for storing module results on disk, so they can be reused in
+    later sessions.
+
+resultCache.cacheDir: Path
+
+    The directory where module results are stored.
+
+resultCache.cacheSize: Integer
+
+    The maximum size (in MB) of the stored module results. The least
+    recently used results are removed first.
+
+resultCache.enabled: Boolean
+
+    Whether to store the results of modules on disk, so that executions in
+    later sessions can reuse them instead of computing them again.
+
 reviewMode: Boolean
 
     *Deprecated* Used to interactively export a pipeline.
@@ -403,6 +527,12 @@ rootDirectory: Path
 
     Directory that contains the VisTrails source code.
 
+rpcCacheSize: Integer
+
+    Maximum number of workflow objects (vistrail actions and pipeline
+    modules, connections, functions...) kept in the cache of vistrails
+    the server loaded from databases. 0 disables the cache.
+
 rpcConfig: String
 
     Config file for server connection options.
@@ -423,6 +553,25 @@ rpcServer: URL
 
     Hostname or ip address where this xml rpc server will work.
 
+rpcWorkerMaxMemory: Integer
+
+    Resident memory, in megabytes, above which a server worker process
+    is replaced by a fresh one after finishing its request. 0 means no
+    limit.
+
+rpcWorkerMaxRequests: Integer
+
+    Number of requests after which a server worker process is replaced
+    by a fresh one. 0 means no limit.
+
+rpcWorkers: Integer
+
+    Number of worker processes the server starts to execute workflows.
+    This is also the number of workflows that can run at the same time;
+    other requests wait for a free worker. 0 executes the workflows in
+    the server process. Each worker logs to its own file, named after
+    rpcLogFile with a '.worker<N>' suffix.
+
 runningJobsList: String
 
     Storage for recent vistrails; users should not edit.
@@ -483,6 +632,13 @@ showWindow: Boolean
 
     Show the main VisTrails window.
 
+signatureHashAlgorithm: String
+
+    The digest used to compute the signatures that identify cached
+    results: 'sha1', 'md5', 'blake2b' (if hashlib or pyblake2 provides
+    it) or 'xxhash' (if the xxhash module is installed). Signatures are
+    not persisted, so a faster digest can be chosen freely.
+
 singleInstance: Boolean
 
     Whether or not VisTrails should only allow one instance to be
@@ -507,6 +663,20 @@ stopOnError: Boolean
     Whether or not VisTrails stops executing the rest of the workflow
     if it encounters an error in one module.
 
+streamChunkSize: Integer
+
+    Number of values a streaming source passes downstream at once (1
+    passes them one by one). Modules iterating over a chunked stream
+    compute whole chunks with compute_batch() when they implement it.
+    Custom streaming code reading Generator.next() directly receives
+    lists of values and should use Generator.next_chunk() instead.
+
+streamSpillThreshold: Integer
+
+    Number of values kept in memory when a stream is accumulated for a
+    module that does not support streaming. Past it, the values are
+    pickled to a temporary file (0 keeps them all in memory).
+
 subworkflowsDir: Path
 
     The location where a user's local subworkflows are stored.
@@ -567,11 +737,39 @@ userPackageDir: Boolean
     The location for user-installed packages (defaults to
     ~/.vistrails/userpackages).
 
+versionCheckpoints: ConfigurationObject
+
+    Settings for the snapshots used to speed up materializing workflows
+    from deep versions of a vistrail.
+
+versionCheckpoints.interval: Integer
+
+    A snapshot of the workflow is kept every this many actions when
+    materializing a version, so that later materializations only replay
+    the actions after the closest snapshot. 0 disables the snapshots.
+
+versionCheckpoints.maxOperations: Integer
+
+    The maximum number of operations referenced by the snapshots of a
+    vistrail. The least recently used snapshots are discarded first.
+
+versionCheckpoints.save: Boolean
+
+    Whether to save the snapshots in .vt files, so they can be used after
+    reopening the file. Files containing snapshots cannot be opened by
+    older versions of VisTrails.
+
 viewOnLoad: String
 
     Whether to show pipeline or history view when opening vistrail.
     Can be either appropriate/pipeline/history.
 
+vtFileFormat: String
+
+    How the vistrail and its execution log are stored in .vt files:
+    'xml', or 'binary', which is faster to read and write for large
+    vistrails but cannot be read by older versions of VisTrails.
+
 webRepositoryURL: URL
 
     The URL of the web repository that should be attached to VisTrails
@@ -691,6 +889,10 @@ base_config = {
      ConfigField('rpcLogFile', os.path.join(system.vistrails_root_directory(),
                        'rpcserver.log'), ConfigPath, ConfigType.COMMAND_LINE),
      ConfigField('rpcInstances', 0, int, ConfigType.COMMAND_LINE),
+     ConfigField('rpcWorkers', 0, int, ConfigType.COMMAND_LINE),
+     ConfigField('rpcWorkerMaxMemory', 0, int, ConfigType.COMMAND_LINE),
+     ConfigField('rpcWorkerMaxRequests', 0, int, ConfigType.COMMAND_LINE),
+     ConfigField('rpcCacheSize', 1000000, int, ConfigType.COMMAND_LINE),
      ConfigField('multithread', None, bool, ConfigType.COMMAND_LINE_FLAG),
      ConfigField('rpcConfig', os.path.join(system.vistrails_root_directory(),
                       'server.cfg'), ConfigPath, ConfigType.COMMAND_LINE)],
@@ -698,13 +900,40 @@ base_config = {
     [ConfigField('autoSave', True, bool, ConfigType.ON_OFF),
      ConfigField('dbDefault', False, bool, ConfigType.ON_OFF),
      ConfigField('cache', True, bool, ConfigType.ON_OFF),
+     ConfigField('cacheMaxModules', 0, int),
+     ConfigField('cacheMaxMemory', 0, int),
+     ConfigField('cacheEvictionPolicy', 'lru', str, widget_type="combo",
+                 widget_options={"allowed_values": ["lru", "cost"],
+                                 "label": "Cache eviction policy",
+                                 "remap": {"lru": "Least Recently Used",
+                                           "cost": "Cost-Aware"}}),
+     ConfigField('pipelineCacheSize', 100000, int),
+     ConfigField('signatureHashAlgorithm', 'sha1', str),
      ConfigField('stopOnError', True, bool, ConfigType.ON_OFF),
      ConfigField('executionLog', True, bool, ConfigType.ON_OFF),
+     ConfigField('executionLogLevel', 'full', str, widget_type="combo",
+                 widget_options={"allowed_values": ["full", "summary",
+                                                    "off"],
+                                 "label": "Execution log level",
+                                 "remap": {"full": "Full provenance",
+                                           "summary": "Summary only",
+                                           "off": "Off"}}),
+     ConfigField('logSegmentSize', 0, int),
+     ConfigField('executionThreads', 0, int),
+     ConfigField('explorationProcesses', 0, int),
+     ConfigField('loopThreads', 0, int),
+     ConfigField('streamChunkSize', 1, int),
+     ConfigField('streamSpillThreshold', 100000, int),
      ConfigField('errorLog', True, bool, ConfigType.ON_OFF),
      ConfigField('defaultFileType', system.vistrails_default_file_type(), str,
                  widget_type="combo",
                  widget_options={"allowed_values": [".vt", ".xml"],
                                  "label": "Default File Type/Extension"}),
+     ConfigField('vtFileFormat', 'xml', str, widget_type="combo",
+                 widget_options={"allowed_values": ["xml", "binary"],
+                                 "label": "Format of .vt files",
+                                 "remap": {"xml": "XML",
+                                           "binary": "Binary"}}),
      ConfigField('debugLevel', 0, int,
                  flag='-v',
                  widget_type="combo",
@@ -766,6 +995,7 @@ base_config = {
     "Packages":
     [ConfigField('enablePackagesSilently', False, bool, ConfigType.ON_OFF),
      ConfigField('loadPackages', True, bool, ConfigType.ON_OFF),
+     ConfigField('lazyPackageLoading', False, bool, ConfigType.ON_OFF),
      ConfigField('installBundles', True, bool, ConfigType.ON_OFF),
      ConfigField('installBundlesWithPip', False, bool, ConfigType.ON_OFF,
                  depends_on="installBundles"),
@@ -778,13 +1008,23 @@ base_config = {
      ConfigField('subworkflowsDir', "subworkflows", ConfigPath),
      ConfigField('dataDir', None, ConfigPath),
      ConfigField('packageDir', None, ConfigPath),
+     ConfigField('packageManifestDir', "package_manifests", ConfigPath),
      ConfigField('userPackageDir', "userpackages", ConfigPath),
      ConfigField('fileDir', None, ConfigPath),
      ConfigField('logDir', "logs", ConfigPath),
      ConfigField('temporaryDir', None,  ConfigPath)],
     "Advanced":
     [ConfigField('singleInstance', True, bool, ConfigType.ON_OFF),
-     ConfigField('staticRegistry', None, ConfigPath)],
+     ConfigField('staticRegistry', None, ConfigPath),
+     ConfigFieldParent('resultCache',
+        [ConfigField('enabled', False, bool, ConfigType.ON_OFF),
+         ConfigField('cacheDir', "results", ConfigPath),
+         ConfigField('cacheSize', 1024, int)]),
+     ConfigFieldParent('versionCheckpoints',
+        [ConfigField('interval', 100, int),
+         ConfigField('maxOperations', 200000, int),
+         ConfigField('save', False, bool, ConfigType.ON_OFF)]),
+     ConfigField('lazyVistrailLoading', True, bool, ConfigType.ON_OFF)],
     "Web Sharing":
     [ConfigField('webRepositoryURL', "http://www.crowdlabs.org", ConfigURL),
      ConfigField('webRepositoryUser', None, str)],
@@ -298,6 +298,26 @@ def run_parameter_exploration(locator, pe_id, extra_info = {},
         except Exception, e:
             return (locator, pe_id,
                     debug.format_exception(e), debug.format_exc())
+    else:
+        try:
+            (v, abstractions , thumbnails, mashups)  = load_vistrail(locator)
+            controller = VistrailController(v, locator, abstractions,
+                                            thumbnails, mashups)
+            try:
+                pe_id = int(pe_id)
+                pe = controller.vistrail.get_paramexp(pe_id)
+            except ValueError:
+                pe = controller.vistrail.get_named_paramexp(pe_id)
+            errors = controller.execute_parameter_exploration(
+                    pe, extra_info=extra_info, reason=reason)
+        except Exception, e:
+            return (locator, pe_id,
+                    debug.format_exception(e), debug.format_exc())
+        if errors:
+            return (locator, pe_id,
+                    '\n'.join('%s_%s_%s: %s' % (pos + (error.msg,))
+                              for pos, error in errors),
+                    '')
 
 def run_parameter_explorations(w_list, extra_info = {},
                        reason="Console Mode Parameter Exploration Execution"):
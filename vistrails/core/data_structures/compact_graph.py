@@ -0,0 +1,699 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Array-backed graph for large, mostly growing graphs such as version
+trees."""
+from __future__ import division
+
+from array import array
+from collections import deque, Mapping
+import copy
+import unittest
+
+from vistrails.core.data_structures.graph import Graph, GraphException, \
+    GraphContainsCycles
+import vistrails.core.data_structures.graph
+
+################################################################################
+# CompactGraph
+
+class _VertexView(Mapping):
+    """Read-only mapping from vertex id to vertex data."""
+
+    __slots__ = ('_graph',)
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __contains__(self, v):
+        return v in self._graph._index
+
+    def __getitem__(self, v):
+        return self._graph._data.get(self._graph._index[v])
+
+    def __iter__(self):
+        return iter(self._graph._index)
+
+    def __len__(self):
+        return len(self._graph._index)
+
+
+class _AdjacencyView(Mapping):
+    """Read-only mapping from vertex id to the list of (vertex, edge id)
+    tuples of its outgoing (or incoming) edges, built on access."""
+
+    __slots__ = ('_graph', '_inverse')
+
+    def __init__(self, graph, inverse):
+        self._graph = graph
+        self._inverse = inverse
+
+    def __getitem__(self, v):
+        if self._inverse:
+            return self._graph.edges_to(v)
+        else:
+            return self._graph.edges_from(v)
+
+    def __iter__(self):
+        return iter(self._graph._index)
+
+    def __len__(self):
+        return len(self._graph._index)
+
+
+class CompactGraph(Graph):
+    """CompactGraph has the same interface as Graph but stores the
+    structure in flat arrays instead of dictionaries of lists of tuples,
+    which uses a fraction of the memory for large graphs.
+
+    Vertices get a dense index. Edges are numbered in creation order; for
+    each edge, the source and destination indexes and the next edge in the
+    outgoing (and incoming) list of its source (destination) are kept in
+    arrays, each vertex referencing the first and last edge of its lists.
+    Adding a vertex or an edge is O(1); removing an edge is
+    O(degree) and leaves a hole in the arrays.
+
+    inverse_immutable() is O(1): it returns a view sharing the arrays, with
+    the roles of the outgoing and incoming arrays swapped.
+
+    vertices, adjacency_list and inverse_adjacency_list are read-only
+    views; adjacency lists are built when accessed.
+
+    """
+
+    ##########################################################################
+    # Constructor
+
+    def __init__(self):
+        """ CompactGraph() -> CompactGraph
+        Initialize an empty graph and return nothing
+
+        """
+        self._index = {}  # vertex id -> index
+        self._ids = []    # index -> vertex id (None if deleted)
+        self._data = {}   # index -> data, if not None
+        # Per vertex: first and last edge out of/into it, -1 if none
+        self._out_head = array('i')
+        self._out_tail = array('i')
+        self._in_head = array('i')
+        self._in_tail = array('i')
+        self._out_degree = array('i')
+        self._in_degree = array('i')
+        # Per edge: endpoints (-1 if deleted), id and next edge in the lists
+        self._src = array('i')
+        self._dst = array('i')
+        self._edge_ids = []
+        self._out_next = array('i')
+        self._in_next = array('i')
+
+    vertices = property(lambda self: _VertexView(self))
+    adjacency_list = property(lambda self: _AdjacencyView(self, False))
+    inverse_adjacency_list = property(lambda self: _AdjacencyView(self, True))
+
+    @staticmethod
+    def map_vertices(graph, vertex_map=None, edge_map=None):
+        """ map_vertices(graph: Graph, vertex_map: dict): CompactGraph
+
+        Creates a new graph that is a mapping of vertex ids through
+        vertex_map.
+
+        """
+        result = CompactGraph()
+        for v in graph.vertices:
+            result.add_vertex(v if vertex_map is None else vertex_map[v])
+        for (vfrom, vto, eid) in graph.iter_all_edges():
+            if vertex_map is not None:
+                vfrom, vto = vertex_map[vfrom], vertex_map[vto]
+            if edge_map is not None:
+                eid = edge_map[eid]
+            result.add_edge(vfrom, vto, eid)
+        return result
+
+    ##########################################################################
+    # Accessors
+
+    def _swapped(self, result):
+        result._src, result._dst = result._dst, result._src
+        result._out_head, result._in_head = result._in_head, result._out_head
+        result._out_tail, result._in_tail = result._in_tail, result._out_tail
+        result._out_next, result._in_next = result._in_next, result._out_next
+        result._out_degree, result._in_degree = (result._in_degree,
+                                                 result._out_degree)
+        return result
+
+    def inverse(self):
+        """inverse() -> CompactGraph
+        Inverse all edge directions on the graph and return a CompactGraph
+
+        """
+        return self._swapped(copy.copy(self))
+
+    def inverse_immutable(self):
+        """inverse_immutable() -> CompactGraph
+
+        O(1) inverse view: the result shares its arrays with self, so it
+        reflects later changes to self and must not be mutated.
+        """
+        result = CompactGraph.__new__(CompactGraph)
+        result.__dict__.update(self.__dict__)
+        return self._swapped(result)
+
+    def undirected_immutable(self):
+        """undirected_immutable() -> CompactGraph
+
+        Creates an undirected version of self, where each edge is present
+        in both directions.
+        """
+        result = CompactGraph()
+        ids, src, dst, edge_ids = self._ids, self._src, self._dst, \
+            self._edge_ids
+        for v in ids:
+            if v is not None:
+                result.add_vertex(v)
+        for e in xrange(len(src)):
+            if src[e] != -1:
+                result.add_edge(ids[src[e]], ids[dst[e]], edge_ids[e])
+                result.add_edge(ids[dst[e]], ids[src[e]], edge_ids[e])
+        return result
+
+    def out_degree(self, froom):
+        """ out_degree(froom: id type) -> int
+        Compute the number of edges leaving 'froom' and return an int
+
+        """
+        return self._out_degree[self._index[froom]]
+
+    def in_degree(self, to):
+        """ in_degree(to: id type) -> int
+        Compute the number of edges entering 'to' and return an int
+
+        """
+        return self._in_degree[self._index[to]]
+
+    def sinks(self):
+        """ sinks() -> list(id type)
+        Find all vertices whose out_degree is zero and return a list of ids
+
+        """
+        degree = self._out_degree
+        return [v for v, i in self._index.iteritems() if not degree[i]]
+
+    def sources(self):
+        """ sources() -> list(id type)
+        Find all vertices whose in_degree is zero and return a list of ids
+
+        """
+        degree = self._in_degree
+        return [v for v, i in self._index.iteritems() if not degree[i]]
+
+    def _edges(self, e, next, other):
+        ids, edge_ids = self._ids, self._edge_ids
+        result = []
+        while e != -1:
+            result.append((ids[other[e]], edge_ids[e]))
+            e = next[e]
+        return result
+
+    def edges_to(self, id):
+        """ edges_to(id: id type) -> list(list)
+        Find edges entering a vertex id and return a list of tuples (id,id)
+
+        """
+        return self._edges(self._in_head[self._index[id]],
+                           self._in_next, self._src)
+
+    def edges_from(self, id):
+        """ edges_from(id: id type) -> list(list)
+        Find edges leaving a vertex id and return a list of tuples (id,id)
+
+        """
+        return self._edges(self._out_head[self._index[id]],
+                           self._out_next, self._dst)
+
+    def _find_edge(self, frm, to, id=None, use_id=False):
+        """_find_edge(frm, to, id, use_id) -> int
+
+        Returns the number of the first edge frm->to (with the given id if
+        use_id), or -1.
+        """
+        index = self._index
+        if to not in index:
+            return -1
+        t = index[to]
+        dst, next, edge_ids = self._dst, self._out_next, self._edge_ids
+        e = self._out_head[index[frm]]
+        while e != -1:
+            if dst[e] == t and (not use_id or edge_ids[e] == id):
+                return e
+            e = next[e]
+        return -1
+
+    def get_edge(self, frm, to):
+        """ get_edge(frm, to) -> edge_id
+
+        Returns the id from the edge from->to."""
+        e = self._find_edge(frm, to)
+        if e != -1:
+            return self._edge_ids[e]
+
+    def has_edge(self, frm, to):
+        """ has_edge(frm, to) -> bool
+
+        True if there exists an edge (frm, to)"""
+        return self._find_edge(frm, to) != -1
+
+    ##########################################################################
+    # Mutate graph
+
+    def add_vertex(self, id, data=None):
+        """ add_vertex(id: id type, data) -> None
+        Add a vertex to the graph if it is not already in the graph
+        and return nothing
+
+        """
+        if id not in self._index:
+            i = len(self._ids)
+            self._index[id] = i
+            self._ids.append(id)
+            if data is not None:
+                self._data[i] = data
+            for a in (self._out_head, self._out_tail,
+                      self._in_head, self._in_tail):
+                a.append(-1)
+            self._out_degree.append(0)
+            self._in_degree.append(0)
+
+    @staticmethod
+    def _append_to_list(e, v, head, tail, next, degree):
+        if tail[v] == -1:
+            head[v] = e
+        else:
+            next[tail[v]] = e
+        tail[v] = e
+        degree[v] += 1
+
+    @staticmethod
+    def _remove_from_list(e, v, head, tail, next, degree):
+        prev, cur = -1, head[v]
+        while cur != e:
+            prev, cur = cur, next[cur]
+        if prev == -1:
+            head[v] = next[e]
+        else:
+            next[prev] = next[e]
+        if tail[v] == e:
+            tail[v] = prev
+        next[e] = -1
+        degree[v] -= 1
+
+    def add_edge(self, froom, to, id=None):
+        """ add_edge(froom: id type, to: id type, id: id type) -> None
+        Add an edge from vertex 'froom' to vertex 'to' and return nothing
+
+        """
+        self.add_vertex(froom)
+        self.add_vertex(to)
+        f, t = self._index[froom], self._index[to]
+        e = len(self._src)
+        self._src.append(f)
+        self._dst.append(t)
+        self._edge_ids.append(id)
+        self._out_next.append(-1)
+        self._in_next.append(-1)
+        self._append_to_list(e, f, self._out_head, self._out_tail,
+                             self._out_next, self._out_degree)
+        self._append_to_list(e, t, self._in_head, self._in_tail,
+                             self._in_next, self._in_degree)
+
+    def _delete_edge(self, e):
+        self._remove_from_list(e, self._src[e], self._out_head,
+                               self._out_tail, self._out_next,
+                               self._out_degree)
+        self._remove_from_list(e, self._dst[e], self._in_head,
+                               self._in_tail, self._in_next,
+                               self._in_degree)
+        self._src[e] = self._dst[e] = -1
+        self._edge_ids[e] = None
+
+    def delete_vertex(self, id):
+        """ delete_vertex(id: id type) -> None
+        Remove a vertex from graph and return nothing
+
+        """
+        i = self._index[id]
+        while self._out_head[i] != -1:
+            self._delete_edge(self._out_head[i])
+        while self._in_head[i] != -1:
+            self._delete_edge(self._in_head[i])
+        del self._index[id]
+        self._ids[i] = None
+        self._data.pop(i, None)
+
+    def rename_vertex(self, old_vertex, new_vertex):
+        """ rename_vertex(old_vertex, new_vertex) -> None
+
+        renames old_vertex to new_vertex in the graph, keeping its
+        edges. Will raise exception if new_vertex exists in graph.
+
+        """
+        if not (old_vertex in self._index):
+            raise self.RenameVertexError("vertex '%s' does not exist" %
+                                         old_vertex)
+        if new_vertex in self._index:
+            raise self.RenameVertexError("vertex '%s' already exists" %
+                                         new_vertex)
+        i = self._index.pop(old_vertex)
+        self._index[new_vertex] = i
+        self._ids[i] = new_vertex
+
+    def change_edge(self, old_froom, old_to, new_to, old_id=None, new_id=None):
+        """ change_edge(old_froom: id, old_to: id, new_to: id,
+                        old_id: id, new_id: id) -> None
+        Changes the destination of an edge in a graph **in place**
+
+        """
+        e = self._find_edge(old_froom, old_to, old_id, old_id is not None)
+        if e == -1:
+            raise ValueError("No edge to %r" % old_to)
+        t = self._index[new_to]
+        self._remove_from_list(e, self._dst[e], self._in_head,
+                               self._in_tail, self._in_next,
+                               self._in_degree)
+        self._dst[e] = t
+        self._edge_ids[e] = new_id
+        self._append_to_list(e, t, self._in_head, self._in_tail,
+                             self._in_next, self._in_degree)
+
+    def delete_edge(self, froom, to, id=None):
+        """ delete_edge(froom: id type, to: id type, id: id type) -> None
+        Remove an edge from graph and return nothing
+
+        """
+        e = self._find_edge(froom, to, id, id is not None)
+        if e == -1:
+            raise GraphException("delete_edge didn't find edge (%s,%s)"%
+                                 (froom, to))
+        self._delete_edge(e)
+
+    ##########################################################################
+    # Graph algorithms
+
+    def closest_vertex(self, frm, target_list):
+        """ closest_vertex(frm, target_list) -> id Uses bfs-like
+        algorithm to find closest vertex to frm in target_list
+
+        """
+        if frm in target_list:
+            return frm
+        index, ids = self._index, self._ids
+        targets = set(index[v] for v in target_list if v in index)
+        head, next, dst = self._out_head, self._out_next, self._dst
+        start = index[frm]
+        visited = bytearray(len(ids))
+        visited[start] = 1
+        q = deque([start])
+        while q:
+            e = head[q.popleft()]
+            while e != -1:
+                to = dst[e]
+                if to in targets:
+                    return ids[to]
+                if not visited[to]:
+                    visited[to] = 1
+                    q.append(to)
+                e = next[e]
+        raise GraphException("no vertices reachable: %s %s" %
+                             (frm, list(target_list)))
+
+    def bfs(self, frm):
+        """ bfs(frm:id type) -> dict(id type)
+        Perform Breadth-First-Search and return a dict of parent id
+
+        """
+        ids = self._ids
+        head, next, dst = self._out_head, self._out_next, self._dst
+        start = self._index[frm]
+        visited = bytearray(len(ids))
+        visited[start] = 1
+        parent = {}
+        q = deque([start])
+        while q:
+            current = q.popleft()
+            e = head[current]
+            while e != -1:
+                to = dst[e]
+                if not visited[to]:
+                    visited[to] = 1
+                    parent[ids[to]] = ids[current]
+                    q.append(to)
+                e = next[e]
+        return parent
+
+    def _dfs(self, vertex_set, raise_if_cyclic, enter_vertex, leave_vertex):
+        """_dfs(...) -> (discovery, parent, finish, finish_order)
+
+        Same as dfs(), also returning the vertices in finishing order.
+        """
+        if not vertex_set:
+            vertex_set = self._index
+        index, ids = self._index, self._ids
+        head, next, dst = self._out_head, self._out_next, self._dst
+        discovery = {}
+        parents = {}
+        finish = {}
+        finish_order = []
+        t = 0
+        # 0: not visited, 1: on the stack, 2: finished
+        state = bytearray(len(ids))
+        for vertex in vertex_set:
+            v = index[vertex]
+            if state[v]:
+                continue
+            t += 1
+            discovery[vertex] = t
+            if enter_vertex:
+                enter_vertex(vertex)
+            state[v] = 1
+            stack = [v]
+            edges = [head[v]]
+            while stack:
+                e = edges[-1]
+                if e != -1:
+                    edges[-1] = next[e]
+                    child = dst[e]
+                    t += 1
+                    if state[child]:
+                        if state[child] == 1 and raise_if_cyclic:
+                            raise GraphContainsCycles(ids[stack[-1]],
+                                                      ids[child])
+                    else:
+                        child_id = ids[child]
+                        discovery[child_id] = t
+                        if enter_vertex:
+                            enter_vertex(child_id)
+                        parents[child_id] = ids[stack[-1]]
+                        state[child] = 1
+                        stack.append(child)
+                        edges.append(head[child])
+                else:
+                    w = stack.pop()
+                    edges.pop()
+                    state[w] = 2
+                    t += 1
+                    w_id = ids[w]
+                    finish[w_id] = t
+                    finish_order.append(w_id)
+                    if leave_vertex:
+                        leave_vertex(w_id)
+        return discovery, parents, finish, finish_order
+
+    def dfs(self,
+            vertex_set=None,
+            raise_if_cyclic=False,
+            enter_vertex=None,
+            leave_vertex=None):
+        """ dfs(self,vertex_set=None,raise_if_cyclic=False,enter_vertex=None,
+                leave_vertex=None) -> (discovery, parent, finish)
+        Performs a depth-first search on a graph and returns three
+        dictionaries with relevant information. See Graph.dfs().
+
+        """
+        return self._dfs(vertex_set, raise_if_cyclic,
+                         enter_vertex, leave_vertex)[:3]
+
+    def parent(self, v):
+        """ parent(v: id type) -> id type
+        Find the parent of vertex v and return an id
+
+        raises VertexHasNoParentError is vertex has no parent
+
+        raises KeyError is vertex is not on graph
+
+        """
+        e = self._in_tail[self._index[v]]
+        if e == -1:
+            raise self.VertexHasNoParentError(v)
+        return self._ids[self._src[e]]
+
+    def vertices_topological_sort(self, vertex_set=None):
+        """ vertices_topological_sort(self,vertex_set=None) ->
+        sequence(vertices) Returns a sequence of all vertices, so that
+        they are in topological sort order. vertex_set is optionally a
+        list of vertices on which to perform the topological sort.
+
+        This is O(n), the reverse of the finishing order of the DFS.
+        """
+        finish_order = self._dfs(vertex_set, True, None, None)[3]
+        finish_order.reverse()
+        return finish_order
+
+    ##########################################################################
+    # Subgraphs
+
+    def subgraph(self, vertex_set):
+        """ subgraph(vertex_set) -> CompactGraph.
+
+        Returns a subgraph of self containing all vertices and
+        connections between them."""
+        result = CompactGraph()
+        vertex_set = set(vertex_set)
+        for vertex in vertex_set:
+            result.add_vertex(vertex)
+        for vertex_from in vertex_set:
+            for (vertex_to, edge_id) in self.edges_from(vertex_from):
+                if vertex_to in vertex_set:
+                    result.add_edge(vertex_from, vertex_to, edge_id)
+        return result
+
+    ##########################################################################
+    # Iterators
+
+    def iter_all_edges(self):
+        """iter_all_edges() -> iterable
+
+        Returns an iterator over all edges in the graph in the form
+        (vert_from, vert_to, edge_id)."""
+        ids, src, dst, edge_ids = self._ids, self._src, self._dst, \
+            self._edge_ids
+        return ((ids[src[e]], ids[dst[e]], edge_ids[e])
+                for e in xrange(len(src)) if src[e] != -1)
+
+    def iter_vertices(self):
+        """iter_vertices() -> iterable
+
+        Returns an iterator over all vertex ids of the graph."""
+        return self._index.iterkeys()
+
+    ##########################################################################
+    # Special Python methods
+
+    def __copy__(self):
+        """ __copy__() -> CompactGraph
+        Make a copy of the graph and return a CompactGraph
+
+        """
+        cp = CompactGraph.__new__(CompactGraph)
+        for k, v in self.__dict__.iteritems():
+            cp.__dict__[k] = copy.copy(v)
+        return cp
+
+    @staticmethod
+    def from_graph(graph):
+        """from_graph(graph: Graph) -> CompactGraph
+
+        Creates a CompactGraph with the same vertices, data and edges as
+        graph.
+        """
+        result = CompactGraph()
+        for v, data in graph.vertices.iteritems():
+            result.add_vertex(v, data)
+        for (vfrom, vto, eid) in graph.iter_all_edges():
+            result.add_edge(vfrom, vto, eid)
+        return result
+
+################################################################################
+# Unit testing
+
+
+class TestCompactGraph(vistrails.core.data_structures.graph.TestGraph):
+    """Runs the Graph tests on CompactGraph."""
+
+    graph_class = CompactGraph
+
+    def test_copy_not_share(self):
+        g = self.make_linear(10)
+        g2 = copy.copy(g)
+        g2.add_edge(0, 5, 100)
+        g2.delete_edge(3, 4)
+        self.assertEqual(g.adjacency_list[0], [(1, 0)])
+        self.assertEqual(g.inverse_adjacency_list[4], [(3, 3)])
+
+    def test_inverse_view(self):
+        g = self.make_linear(5)
+        inv = g.inverse_immutable()
+        self.assertEqual(inv.adjacency_list[2], [(1, 1)])
+        self.assertEqual(inv.parent(2), 3)
+        self.assertEqual(inv.vertices_topological_sort(), [4, 3, 2, 1, 0])
+        # The view follows the graph
+        g.add_edge(0, 4, 10)
+        self.assertEqual(inv.edges_from(4), [(3, 3), (0, 10)])
+        self.assertEqual(inv.in_degree(0), 2)
+        self.assertEqual(g.in_degree(0), 0)
+
+    def test_change_edge(self):
+        g = self.make_linear(4)
+        g.change_edge(0, 1, 3, 0, 7)
+        self.assertEqual(g.edges_from(0), [(3, 7)])
+        self.assertEqual(g.edges_to(1), [])
+        self.assertEqual(g.edges_to(3), [(2, 2), (0, 7)])
+        self.assertEqual(g.parent(3), 0)
+        self.assertRaises(ValueError, g.change_edge, 0, 1, 2)
+
+    def test_from_graph(self):
+        g = Graph()
+        g.add_vertex(0, 'root')
+        g.add_edge(0, 1, 'a')
+        g.add_edge(0, 2, 'b')
+        g.add_edge(2, 3, 'c')
+        cg = CompactGraph.from_graph(g)
+        self.assertEqual(cg.vertices[0], 'root')
+        self.assertIsNone(cg.vertices[3])
+        self.assertEqual(sorted(cg.iter_all_edges()),
+                         sorted(g.iter_all_edges()))
+        self.assertEqual(cg.bfs(0), g.bfs(0))
+        self.assertEqual(cg.sinks(), [1, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -723,9 +723,12 @@ class TestGraph(unittest.TestCase):
     
     """
 
+    # Subclassed to run the same tests on other implementations
+    graph_class = Graph
+
     def make_complete(self, v):
         """returns a complete graph with v verts."""
-        g = Graph()
+        g = self.graph_class()
         for x in xrange(v):
             g.add_vertex(x)
         for f in xrange(v):
@@ -736,7 +739,7 @@ class TestGraph(unittest.TestCase):
     def make_linear(self, v, bw=False):
         """returns a linear graph with v verts. if bw=True, add
         backward links."""
-        g = Graph()
+        g = self.graph_class()
         for x in xrange(v):
             g.add_vertex(x)
         for x,y in izip(xrange(v-1), xrange(1, v)):
@@ -746,7 +749,7 @@ class TestGraph(unittest.TestCase):
         return g
 
     def get_default_graph(self):
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex(0)
         g.add_vertex(1)
         g.add_vertex(2)
@@ -761,7 +764,7 @@ class TestGraph(unittest.TestCase):
     
     def test1(self):
         """Test adding edges and vertices"""
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex('0')
         g.add_vertex('1')
         g.add_vertex('2')
@@ -789,7 +792,7 @@ class TestGraph(unittest.TestCase):
         
     def test3(self):
         """Test sink and source degree consistency"""
-        g = Graph()
+        g = self.graph_class()
         for i in xrange(100):
             g.add_vertex(i)
         for i in xrange(1000):
@@ -822,7 +825,7 @@ class TestGraph(unittest.TestCase):
         r = g.vertices_topological_sort()
         assert r == [0,1,2,3,4,5,6,7,8,9]
 
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex('a')
         g.add_vertex('b')
         g.add_vertex('c')
@@ -846,12 +849,12 @@ class TestGraph(unittest.TestCase):
 
     def test_print_empty_graph(self):
         """Test print on empty graph"""
-        g = Graph()
+        g = self.graph_class()
         g.__str__()
 
     def test_delete(self):
         """Tests consistency of data structure after deletion."""
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex(0)
         g.add_vertex(1)
         g.add_vertex(2)
@@ -862,7 +865,7 @@ class TestGraph(unittest.TestCase):
 
     def test_raising_DFS(self):
         """Tests if DFS with cycle-checking will raise exceptions."""
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex(0)
         g.add_vertex(1)
         g.add_vertex(2)
@@ -874,7 +877,7 @@ class TestGraph(unittest.TestCase):
 
     def test_call_inverse(self):
         """Test if calling inverse methods work."""
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex(0)
         g.add_vertex(1)
         g.add_vertex(2)
@@ -926,7 +929,7 @@ class TestGraph(unittest.TestCase):
         sub = g.subgraph([1, 3])
         assert not g.topologically_contractible(sub)
 
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex(0)
         g.add_vertex(1)
         g.add_vertex(2)
@@ -953,7 +956,7 @@ class TestGraph(unittest.TestCase):
 
     def test_iter_edges_empty(self):
         """Test iterators on empty parts of the graph."""
-        g = Graph()
+        g = self.graph_class()
         for a in g.iter_vertices():
             assert False
         g.add_vertex(0)
@@ -965,7 +968,7 @@ class TestGraph(unittest.TestCase):
             assert False
 
     def test_get_edge_none(self):
-        g = Graph()
+        g = self.graph_class()
         g.add_vertex(0)
         g.add_vertex(1)
         assert g.get_edge(0, 1) is None
@@ -1069,9 +1072,9 @@ class TestGraph(unittest.TestCase):
     def test_map_vertices(self):
         g = self.make_linear(5)
         m = {0: 0, 1: 1, 2: 2, 3: 3, 4: 4}
-        assert g == Graph.map_vertices(g, m)
+        assert g == self.graph_class.map_vertices(g, m)
         m = {0: 5, 1: 6, 2: 7, 3: 8, 4: 9}
-        assert g <> Graph.map_vertices(g, m)
+        assert g <> self.graph_class.map_vertices(g, m)
         
 if __name__ == '__main__':
     unittest.main()
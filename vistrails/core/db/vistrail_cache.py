@@ -0,0 +1,291 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Cache of vistrails loaded from a database, with the pipelines
+materialized from them, shared by the requests of the XML-RPC server."""
+from __future__ import division
+
+from collections import OrderedDict
+import threading
+import unittest
+
+from vistrails.core.db import io
+from vistrails.core.vistrail.pipeline_cache import pipeline_size
+
+
+def vistrail_size(vistrail):
+    """vistrail_size(vistrail: Vistrail) -> int
+    Returns the number of actions in a vistrail. Operations are not counted
+    as they may not be loaded yet.
+
+    """
+    return len(vistrail.actionMap)
+
+
+class _VistrailEntry(object):
+    def __init__(self, locator, bundle, mod_time):
+        self.locator = locator
+        self.bundle = bundle
+        self.mod_time = mod_time
+        self.pipelines = {}
+        self.size = vistrail_size(bundle[0])
+        # held while materializing pipelines, which updates the vistrail
+        self.lock = threading.Lock()
+
+
+class VistrailCache(object):
+    """Vistrails opened from a database, keyed by (host, port, database,
+    vistrail id), and the pipelines materialized for their versions.
+
+    An entry is used only while the modification time of the vistrail in the
+    database is the one it was loaded with, which costs a single query
+    instead of loading the whole vistrail. The cache holds at most max_size
+    workflow objects (actions of the vistrails and objects of the pipelines);
+    the least recently used vistrails are evicted first, along with their
+    pipelines.
+
+    The vistrails and pipelines returned are shared between requests and
+    must not be modified.
+    """
+
+    def __init__(self, max_size=1000000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def size(self):
+        """size() -> int
+        Returns the number of objects in the cache.
+        """
+        return self._size
+
+    @staticmethod
+    def key(locator):
+        return (locator.host, locator.port, locator.db, locator.obj_id)
+
+    def _get_entry(self, locator):
+        key = self.key(locator)
+        mod_time = locator.get_db_modification_time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                if entry.mod_time == mod_time:
+                    self._entries[key] = entry
+                    return entry
+                self._remove(entry)
+        bundle = io.load_vistrail(locator)
+        entry = _VistrailEntry(locator, bundle, mod_time)
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._remove(old_entry)
+            self._entries[key] = entry
+            self._size += entry.size
+            self._evict()
+        return entry
+
+    def get_vistrail(self, locator):
+        """get_vistrail(locator: DBLocator) -> (Vistrail, list, list, list)
+        Returns the vistrail, abstractions, thumbnails and mashups of
+        locator, like io.load_vistrail().
+        """
+        return self._get_entry(locator).bundle
+
+    def get_pipeline(self, locator, version):
+        """get_pipeline(locator: DBLocator, version: long) -> Pipeline
+        Returns the pipeline of a version of the vistrail of locator.
+        """
+        return self.get_pipelines(locator, [version])[0]
+
+    def get_pipelines(self, locator, versions):
+        """get_pipelines(locator: DBLocator, versions: list) -> list
+        Returns the pipelines of some versions of the vistrail of locator,
+        checking the vistrail in the database only once.
+        """
+        entry = self._get_entry(locator)
+        pipelines = []
+        with entry.lock:
+            for version in versions:
+                pipeline = entry.pipelines.get(version)
+                if pipeline is None:
+                    pipeline = entry.bundle[0].getPipeline(version)
+                    entry.pipelines[version] = pipeline
+                    size = pipeline_size(pipeline)
+                    with self._lock:
+                        entry.size += size
+                        if self._entries.get(self.key(locator)) is entry:
+                            self._size += size
+                            self._evict()
+                pipelines.append(pipeline)
+        return pipelines
+
+    def discard(self, locator):
+        """discard(locator: DBLocator) -> None
+        Removes the vistrail of locator and its pipelines from the cache.
+        """
+        with self._lock:
+            entry = self._entries.pop(self.key(locator), None)
+            if entry is not None:
+                self._remove(entry)
+
+    def set_max_size(self, max_size):
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def _remove(self, entry):
+        self._size -= entry.size
+        # the database layer keeps its own copy of the loaded bundles
+        entry.locator.clear_cache()
+
+    def _evict(self):
+        # the most recently used vistrail is kept even if it is too big
+        while self._size > self.max_size and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self._remove(entry)
+
+
+################################################################################
+
+
+class TestVistrailCache(unittest.TestCase):
+    class FakeVistrail(object):
+        def __init__(self, nb_actions):
+            self.actionMap = dict((i, None) for i in xrange(nb_actions))
+            self.materialized = []
+            self.running = 0
+            self.max_running = 0
+
+        def getPipeline(self, version):
+            import time
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            time.sleep(0.01)
+            self.running -= 1
+            self.materialized.append(version)
+            return TestVistrailCache.FakePipeline(version)
+
+    class FakePipeline(object):
+        def __init__(self, size):
+            self.objects = dict((i, None) for i in xrange(size))
+
+    class FakeLocator(object):
+        host = 'localhost'
+        port = 3306
+        db = 'vistrails'
+
+        def __init__(self, obj_id, nb_actions, mod_time=1):
+            self.obj_id = obj_id
+            self.nb_actions = nb_actions
+            self.mod_time = mod_time
+            self.loads = 0
+            self.cleared = 0
+
+        def get_db_modification_time(self):
+            return self.mod_time
+
+        def load(self):
+            self.loads += 1
+            return TestVistrailCache.FakeVistrail(self.nb_actions)
+
+        def clear_cache(self):
+            self.cleared += 1
+
+    def test_reuse_and_staleness(self):
+        cache = VistrailCache()
+        locator = self.FakeLocator(1, 10)
+        vistrail = cache.get_vistrail(locator)[0]
+        self.assertIs(cache.get_vistrail(locator)[0], vistrail)
+        self.assertEqual(locator.loads, 1)
+        self.assertIs(cache.get_pipeline(locator, 5),
+                      cache.get_pipeline(locator, 5))
+        self.assertEqual(vistrail.materialized, [5])
+        self.assertEqual(cache.size(), 15)
+        pipelines = cache.get_pipelines(locator, [2, 5])
+        self.assertEqual([len(p.objects) for p in pipelines], [2, 5])
+        self.assertEqual(vistrail.materialized, [5, 2])
+        self.assertEqual(cache.size(), 17)
+
+        # the vistrail was modified in the database
+        locator.mod_time = 2
+        self.assertIsNot(cache.get_vistrail(locator)[0], vistrail)
+        self.assertEqual(locator.loads, 2)
+        self.assertEqual(locator.cleared, 1)
+        self.assertEqual(cache.size(), 10)
+
+        cache.discard(locator)
+        self.assertEqual((len(cache), cache.size()), (0, 0))
+
+    def test_eviction(self):
+        cache = VistrailCache(100)
+        locators = [self.FakeLocator(i, 30) for i in xrange(3)]
+        for locator in locators:
+            cache.get_vistrail(locator)
+        cache.get_vistrail(locators[0])
+        self.assertEqual(cache.size(), 90)
+        # pipelines count towards the size; 1 is the least recently used
+        cache.get_pipeline(locators[2], 20)
+        self.assertEqual(cache.size(), 80)
+        self.assertEqual(locators[1].cleared, 1)
+        cache.get_vistrail(locators[0])
+        self.assertEqual(locators[0].loads, 1)
+        # a vistrail bigger than the cache is kept until the next one
+        cache.set_max_size(10)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size(), 30)
+        self.assertEqual(locators[2].cleared, 1)
+
+    def test_concurrent_pipelines(self):
+        """Pipelines of a vistrail are materialized one at a time."""
+        cache = VistrailCache()
+        locator = self.FakeLocator(1, 10)
+        vistrail = cache.get_vistrail(locator)[0]
+        results = []
+        def get_pipelines(versions):
+            results.append(cache.get_pipelines(locator, versions))
+        threads = [threading.Thread(target=get_pipelines, args=(versions,))
+                   for versions in ([1, 2], [2, 3], [3, 1], [2])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(vistrail.max_running, 1)
+        self.assertEqual(sorted(vistrail.materialized), [1, 2, 3])
+        self.assertEqual(len(set(id(p) for ps in results for p in ps)), 3)
+        self.assertEqual(cache.size(), 16)
@@ -100,6 +100,7 @@ class BaseInterpreter(object):
                 info = pipeline.aliases[alias]
                 param = pipeline.db_get_object(info[0],info[1])
                 param.strValue = str(aliases[alias])
+                pipeline.mark_signatures_dirty(info[0], info[1])
             except KeyError:
                 pass
                     
@@ -118,6 +119,7 @@ class BaseInterpreter(object):
                 try:
                     param = pipeline.db_get_object(vttype,oId)
                     param.strValue = str(strval)
+                    pipeline.mark_signatures_dirty(vttype, oId)
                 except Exception, e:
                     debug.debug("Problem when updating params", e)
 
@@ -131,6 +133,7 @@ class BaseInterpreter(object):
                 for func in m.functions:
                     if func.name == 'value':
                         func.params[0].strValue = strValue
+                pipeline.mark_signatures_dirty(m.vtType, m.id)
 
     def set_done_summon_hook(self, hook):
         """ set_done_summon_hook(hook: function(pipeline, objects)) -> None
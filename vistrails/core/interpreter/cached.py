@@ -44,10 +44,16 @@ import cPickle as pickle
 import time
 
 from vistrails.core.common import InstanceObject, VistrailsInternalError
+from vistrails.core.cache.eviction import LRUEvictionPolicy, \
+    eviction_policies, estimate_outputs_size
+from vistrails.core.cache.result_store import get_result_store
+from vistrails.core.configuration import get_vistrails_configuration
 from vistrails.core.data_structures.bijectivedict import Bidict
 from vistrails.core import debug
 import vistrails.core.interpreter.base
 from vistrails.core.interpreter.base import AbortExecution
+from vistrails.core.interpreter.scheduler import ParallelScheduler, \
+    UPDATE_EXCEPTIONS
 from vistrails.core.log.controller import DummyLogController
 from vistrails.core.modules.basic_modules import identifier as basic_pkg, \
                                                  Generator
@@ -91,6 +97,8 @@ class ViewUpdatingLogController(object):
         self.executed = {}
         self.suspended = {}
         self.cached = {}
+        self.compute_start = {}
+        self.compute_times = {}
 
     def signalSuccess(self, obj):
         self.executed[obj.id] = True
@@ -107,6 +115,7 @@ class ViewUpdatingLogController(object):
     def begin_compute(self, obj):
         i = self.remap_id(obj.id)
         self.view.set_module_computing(i)
+        self.compute_start.setdefault(obj.id, time.time())
 
         reg = get_module_registry()
         module_name = reg.get_descriptor(obj.__class__).name
@@ -157,6 +166,9 @@ class ViewUpdatingLogController(object):
                     self.end_update(child.module, child, was_suspended=True)
         elif error is None:
             self.view.set_module_success(i)
+            if obj.id in self.compute_start:
+                self.compute_times[obj.id] = (time.time() -
+                                              self.compute_start[obj.id])
         else:
             self.view.set_module_error(i, error.msg, error.errorTrace)
 
@@ -215,6 +227,7 @@ class CachedInterpreter(vistrails.core.interpreter.base.BaseInterpreter):
         self._objects = {}
         self.filePool = self._file_pool
         self._streams = []
+        self._cache_policy = LRUEvictionPolicy()
 
     def clear(self):
         self._file_pool.cleanup()
@@ -222,6 +235,7 @@ class CachedInterpreter(vistrails.core.interpreter.base.BaseInterpreter):
         for obj in self._objects.itervalues():
             obj.clear()
         self._objects = {}
+        self._cache_policy.clear()
 
     def __del__(self):
         self.clear()
@@ -240,6 +254,78 @@ class CachedInterpreter(vistrails.core.interpreter.base.BaseInterpreter):
         for v in dependencies:
             self._persistent_pipeline.delete_module(v)
             del self._objects[v]
+            self._cache_policy.discard(v)
+
+    def get_cache_budget(self):
+        """get_cache_budget() -> (int, int)
+
+        Returns the maximum number of modules and the maximum estimated size
+        (in bytes) of the outputs that the persistent pipeline can hold, from
+        the configuration. 0 means no limit.
+        """
+        conf = get_vistrails_configuration()
+        max_modules = getattr(conf, 'cacheMaxModules', 0) or 0
+        max_memory = (getattr(conf, 'cacheMaxMemory', 0) or 0) * 1024 * 1024
+        policy_name = getattr(conf, 'cacheEvictionPolicy', None) or 'lru'
+        if policy_name != self._cache_policy.name:
+            if policy_name not in eviction_policies:
+                debug.warning("Unknown cache eviction policy %r" %
+                              policy_name)
+            else:
+                # Switch policy, keeping the usage order
+                old_policy = self._cache_policy
+                self._cache_policy = eviction_policies[policy_name]()
+                for i, entry in sorted(old_policy.entries.iteritems(),
+                                       key=lambda (i, e): e.last_used):
+                    self._cache_policy.touch(i, entry.size, entry.cost)
+        return max_modules, max_memory
+
+    def update_cache_stats(self, tmp_id_to_module_map, logging_obj):
+        """update_cache_stats(tmp_id_to_module_map: dict,
+                              logging_obj: ViewUpdatingLogController) -> None
+
+        Records the use of the modules of an execution in the eviction
+        policy, with the size of the outputs and compute time of the modules
+        that got computed.
+        """
+        max_modules, max_memory = self.get_cache_budget()
+        if not max_modules and not max_memory:
+            return
+        for obj in tmp_id_to_module_map.itervalues():
+            if obj.id not in self._objects:
+                continue
+            if obj.id in logging_obj.compute_times:
+                self._cache_policy.touch(obj.id,
+                                         estimate_outputs_size(obj),
+                                         logging_obj.compute_times[obj.id])
+            elif obj.id in self._cache_policy.entries:
+                self._cache_policy.touch(obj.id)
+            else:
+                self._cache_policy.touch(obj.id, estimate_outputs_size(obj))
+
+    def enforce_cache_budget(self):
+        """enforce_cache_budget() -> None
+
+        Evicts modules (and the modules that depend on them) from the
+        persistent pipeline until it fits in the budget set by the
+        cacheMaxModules and cacheMaxMemory configuration options.
+        """
+        max_modules, max_memory = self.get_cache_budget()
+        if not max_modules and not max_memory:
+            return
+        policy = self._cache_policy
+        for i, obj in self._objects.iteritems():
+            if i not in policy.entries:
+                policy.touch(i, estimate_outputs_size(obj))
+        while ((max_modules and len(self._objects) > max_modules) or
+               (max_memory and policy.total_size() > max_memory)):
+            victim = policy.next_victim()
+            if victim is None:
+                break
+            elif victim not in self._objects:
+                policy.discard(victim)
+            else:
+                self.clean_modules([victim])
 
     def clean_non_cacheable_modules(self):
         """clean_non_cacheable_modules() -> None
@@ -513,47 +599,40 @@ class CachedInterpreter(vistrails.core.interpreter.base.BaseInterpreter):
         # Note that we accept any module in 'sinks', even if it's not actually
         # a sink in the graph
         if sinks is not None:
-            persistent_sinks = [tmp_id_to_module_map[sink]
-                                for sink in sinks
-                                if sink in tmp_id_to_module_map]
+            sinks = [sink for sink in sinks if sink in tmp_id_to_module_map]
         else:
-            persistent_sinks = [tmp_id_to_module_map[sink]
-                                for sink in pipeline.graph.sinks()]
+            sinks = pipeline.graph.sinks()
+        persistent_sinks = [tmp_id_to_module_map[sink] for sink in sinks]
+
+        # Restore results persisted by previous runs
+        result_store = get_result_store()
+        if result_store is not None:
+            self.load_stored_results(pipeline, tmp_id_to_module_map,
+                                     result_store)
 
         self._streams.append(Generator.generators)
         Generator.generators = []
 
         # Update new sinks
-        for obj in persistent_sinks:
-            abort = False
-            try:
-                obj.update()
-                continue
-            except ModuleWasSuspended:
-                continue
-            except ModuleHadError:
-                pass
-            except AbortExecution:
-                break
-            except ModuleSuspended, ms:
-                ms.module.logging.end_update(ms.module, ms,
-                                             was_suspended=True)
-                continue
-            except ModuleErrors, mes:
-                for me in mes.module_errors:
-                    me.module.logging.end_update(me.module, me)
-                    logging_obj.signalError(me.module, me)
-                    abort = abort or me.abort
-            except ModuleError, me:
-                me.module.logging.end_update(me.module, me, me.errorTrace)
-                logging_obj.signalError(me.module, me)
-                abort = me.abort
-            except ModuleBreakpoint, mb:
-                mb.module.logging.end_update(mb.module)
-                logging_obj.signalError(mb.module, mb)
-                abort = True
-            if stop_on_error or abort:
-                break
+        nb_threads = getattr(get_vistrails_configuration(),
+                             'executionThreads', 0)
+        if nb_threads > 0:
+            scheduler = ParallelScheduler(nb_threads)
+            main_thread_logging = scheduler.wrap_logging(logging_obj)
+            for obj in tmp_id_to_module_map.itervalues():
+                obj.logging = main_thread_logging
+            scheduler.execute(
+                    pipeline.graph, tmp_id_to_module_map, sinks,
+                    lambda e: self.report_update_error(e, logging_obj),
+                    stop_on_error)
+        else:
+            for obj in persistent_sinks:
+                try:
+                    obj.update()
+                except UPDATE_EXCEPTIONS, e:
+                    abort = self.report_update_error(e, logging_obj)
+                    if abort is not None and (stop_on_error or abort):
+                        break
 
         if Generator.generators:
             record_usage(generators=len(Generator.generators))
@@ -593,6 +672,11 @@ class CachedInterpreter(vistrails.core.interpreter.base.BaseInterpreter):
 
         Generator.generators = self._streams.pop()
 
+        if result_store is not None:
+            self.store_results(tmp_id_to_module_map, logging_obj,
+                               result_store)
+        self.update_cache_stats(tmp_id_to_module_map, logging_obj)
+
         if self.done_update_hook:
             self.done_update_hook(self._persistent_pipeline, self._objects)
                 
@@ -634,6 +718,87 @@ class CachedInterpreter(vistrails.core.interpreter.base.BaseInterpreter):
 
         return (to_delete, objs, errs, execs, suspends, caches, parameter_changes)
 
+    def load_stored_results(self, pipeline, tmp_id_to_module_map, store):
+        """load_stored_results(pipeline: Pipeline,
+                               tmp_id_to_module_map: dict,
+                               store: ResultStore) -> None
+
+        Restores the outputs of modules from the disk-backed result store.
+
+        A module is only restored if all of its upstream modules are up to
+        date, so that updating it doesn't trigger any upstream computation.
+        """
+        graph = pipeline.graph
+        for tmp_id in graph.vertices_topological_sort():
+            obj = tmp_id_to_module_map[tmp_id]
+            if obj.upToDate or not obj.is_cacheable():
+                continue
+            if not all(tmp_id_to_module_map[src_id].upToDate
+                       for src_id, _ in graph.edges_to(tmp_id)):
+                continue
+            outputs = store.get(obj.signature)
+            if outputs is None:
+                continue
+            # The stored results need to provide every connected port
+            if any(pipeline.connections[conn_id].source.name not in outputs
+                   for _, conn_id in graph.edges_from(tmp_id)):
+                continue
+            for port, value in outputs.iteritems():
+                obj.set_output(port, value)
+            obj.upToDate = True
+
+    def store_results(self, tmp_id_to_module_map, logging_obj, store):
+        """store_results(tmp_id_to_module_map: dict,
+                         logging_obj: ViewUpdatingLogController,
+                         store: ResultStore) -> None
+
+        Persists the outputs of the modules that were computed successfully.
+        """
+        for obj in tmp_id_to_module_map.itervalues():
+            if (obj.upToDate and obj.is_cacheable() and
+                    obj.id in logging_obj.executed and
+                    obj.id not in logging_obj.errors):
+                store.put(obj.signature,
+                          dict((port, value)
+                               for port, value in obj.outputPorts.iteritems()
+                               if port != 'self'))
+
+    def report_update_error(self, e, logging_obj):
+        """report_update_error(e: Exception,
+                               logging_obj: ViewUpdatingLogController
+                               ) -> bool or None
+
+        Reports an exception raised while updating a module to the logger.
+
+        Returns None if the execution can go on, False if a module failed
+        (execution stops if stopOnError is set), and True if the execution
+        must be aborted.
+        """
+        if isinstance(e, ModuleWasSuspended):
+            return None
+        elif isinstance(e, ModuleHadError):
+            return False
+        elif isinstance(e, AbortExecution):
+            return True
+        elif isinstance(e, ModuleSuspended):
+            e.module.logging.end_update(e.module, e, was_suspended=True)
+            return None
+        elif isinstance(e, ModuleErrors):
+            abort = False
+            for me in e.module_errors:
+                me.module.logging.end_update(me.module, me)
+                logging_obj.signalError(me.module, me)
+                abort = abort or me.abort
+            return abort
+        elif isinstance(e, ModuleError):
+            e.module.logging.end_update(e.module, e, e.errorTrace)
+            logging_obj.signalError(e.module, e)
+            return e.abort
+        else: # ModuleBreakpoint
+            e.module.logging.end_update(e.module)
+            logging_obj.signalError(e.module, e)
+            return True
+
     def finalize_pipeline(self, pipeline, to_delete, objs, errs, execs,
                           suspended, cached, **kwargs):
         def fetch(name, default):
@@ -761,6 +926,7 @@ class CachedInterpreter(vistrails.core.interpreter.base.BaseInterpreter):
             for (i, error) in errors.iteritems():
                 view.set_module_error(i, error.msg, error.errorTrace)
         self.finalize_pipeline(pipeline, *(res[:-1]), **new_kwargs)
+        self.enforce_cache_budget()
         time_end = time.time()
 
         result = InstanceObject(objects=res[1],
@@ -958,6 +1124,53 @@ class TestCachedInterpreter(unittest.TestCase):
         finally:
             StandardOutput.compute = old_compute
 
+    def test_cache_budget(self):
+        """Test that the persistent pipeline is bounded by cacheMaxModules.
+        """
+        from vistrails.core.db.locator import XMLFileLocator
+        from vistrails.core.vistrail.controller import VistrailController
+        from vistrails.core.db.io import load_vistrail
+
+        locator = XMLFileLocator(vistrails.core.system.vistrails_root_directory() +
+                            '/tests/resources/dummy.xml')
+        (v, abstractions, thumbnails, mashups) = load_vistrail(locator)
+        controller = VistrailController(v, locator, abstractions,
+                                        thumbnails,  mashups)
+        n = v.get_version_number('int chain')
+        controller.change_selected_version(n)
+        controller.flush_delayed_actions()
+        pipeline = controller.current_pipeline
+
+        from vistrails.core.modules.basic_modules import StandardOutput
+        old_compute = StandardOutput.compute
+        StandardOutput.compute = lambda s: None
+        conf = get_vistrails_configuration()
+        old_conf = conf.cacheMaxModules, conf.cacheEvictionPolicy
+        CachedInterpreter.flush()
+        interpreter = CachedInterpreter.get()
+        try:
+            interpreter.execute(pipeline, locator=v, current_version=n)
+            nb_modules = len(interpreter._objects)
+            self.assertGreater(nb_modules, 2)
+            for policy in ('lru', 'cost'):
+                conf.cacheMaxModules = nb_modules - 1
+                conf.cacheEvictionPolicy = policy
+                interpreter.execute(pipeline, locator=v, current_version=n)
+                persistent = interpreter._persistent_pipeline
+                self.assertLessEqual(len(interpreter._objects),
+                                     nb_modules - 1)
+                self.assertEqual(set(interpreter._objects),
+                                 set(persistent.modules))
+                self.assertEqual(set(interpreter._cache_policy.entries),
+                                 set(persistent.modules))
+                for conn in persistent.connections.itervalues():
+                    self.assertIn(conn.sourceId, persistent.modules)
+                    self.assertIn(conn.destinationId, persistent.modules)
+        finally:
+            conf.cacheMaxModules, conf.cacheEvictionPolicy = old_conf
+            CachedInterpreter.flush()
+            StandardOutput.compute = old_compute
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -35,6 +35,8 @@
 ###############################################################################
 from __future__ import division
 
+from vistrails.core import debug
+import vistrails.core.cache.utils
 import vistrails.core.interpreter.cached
 import vistrails.core.interpreter.noncached
 
@@ -53,8 +55,21 @@ def set_cache_configuration(field, value):
     else:
         set_default_interpreter(noncached_interpreter)
 
+def set_hash_configuration(field, value):
+    assert field == 'signatureHashAlgorithm'
+    try:
+        vistrails.core.cache.utils.set_hash_algorithm(value)
+    except ValueError, e:
+        debug.warning("Keeping %s for signatures" %
+                      vistrails.core.cache.utils.get_hash_algorithm(),
+                      e)
+
 def connect_to_configuration(configuration):
     configuration.subscribe('cache', set_cache_configuration)
+    configuration.subscribe('signatureHashAlgorithm', set_hash_configuration)
+    if configuration.check('signatureHashAlgorithm'):
+        set_hash_configuration('signatureHashAlgorithm',
+                               configuration.signatureHashAlgorithm)
 
 def get_default_interpreter():
     """Returns an instance of the default interpreter class."""
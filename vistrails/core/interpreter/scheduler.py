@@ -0,0 +1,642 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Concurrent execution of the modules of a pipeline.
+
+The default execution strategy of the interpreter is to call update() on each
+sink, which recursively updates the upstream modules depth-first, on a single
+thread. The ParallelScheduler in this module instead walks the pipeline graph
+and updates each module once all of its upstream modules are done, running the
+ready modules concurrently on a pool of worker threads.
+
+Logging and view callbacks are forwarded to the thread that runs the
+scheduler, so that loggers and (GUI) views never get called concurrently.
+Modules that are not thread-safe (see Module.is_thread_safe()) are run on the
+scheduling thread as well. Modules that drive the update of their upstream
+themselves (e.g. control flow modules overriding update_upstream()) have no
+dependencies in the schedule, since they decide which upstream modules run;
+they are run on the scheduling thread once no worker is running, so that they
+never update a module at the same time as a worker.
+
+The IterationPool similarly runs the iterations of Module.compute_all() over
+the elements of input lists on worker threads (loop_threads control
+parameter, loopThreads configuration option).
+"""
+
+from __future__ import division
+
+import Queue
+import sys
+import threading
+
+from vistrails.core.interpreter.base import AbortExecution
+from vistrails.core.modules.vistrails_module import Module, \
+    ModuleBreakpoint, ModuleError, ModuleErrors, ModuleHadError
+
+
+# Exceptions raised by Module.update() that the interpreter reports and
+# recovers from; anything else aborts the execution
+UPDATE_EXCEPTIONS = (ModuleHadError, AbortExecution, ModuleError,
+                     ModuleErrors, ModuleBreakpoint)
+
+
+##############################################################################
+
+class _CallRequest(object):
+    """A call made from a worker that should happen on the main thread.
+    """
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.exc_info = None
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.function(*self.args, **self.kwargs)
+        except Exception:
+            self.exc_info = sys.exc_info()
+        self.done.set()
+
+
+class MainThreadLogging(object):
+    """Wraps a logging object so that it is only called from the main thread.
+
+    Calls made from a worker thread are queued to the scheduler and the worker
+    blocks until the main thread has processed them.
+    """
+    def __init__(self, logging, scheduler):
+        self._logging = logging
+        self._scheduler = scheduler
+
+    def __getattr__(self, name):
+        attr = getattr(self._logging, name)
+        if not callable(attr):
+            return attr
+        scheduler = self._scheduler
+        def wrapper(*args, **kwargs):
+            result = scheduler.call_in_main_thread(attr, *args, **kwargs)
+            if name == 'begin_loop_execution':
+                # loop objects get called during compute_all()
+                result = MainThreadLogging(result, scheduler)
+            return result
+        return wrapper
+
+
+def updates_own_upstream(obj):
+    """updates_own_upstream(obj: Module) -> bool
+
+    Returns whether the module decides itself which upstream modules get
+    updated, in which case they should not be scheduled ahead of it.
+    """
+    update_upstream = getattr(type(obj), 'update_upstream', None)
+    if getattr(update_upstream, 'im_func', None) is not \
+            Module.update_upstream.im_func:
+        return True
+    return bool(obj.useJobCache())
+
+
+class MainThreadPool(object):
+    """Base class for the pools of worker threads updating modules.
+
+    The thread creating the pool is its main thread; while it waits for the
+    workers, it has to run the 'call' requests they put on self._events.
+    """
+
+    def __init__(self, nb_threads):
+        self.nb_threads = nb_threads
+        self._main_thread = threading.current_thread()
+        self._events = Queue.Queue()
+
+    def call_in_main_thread(self, function, *args, **kwargs):
+        """Calls function on the scheduling thread and returns its result.
+        """
+        if threading.current_thread() is self._main_thread:
+            return function(*args, **kwargs)
+        request = _CallRequest(function, args, kwargs)
+        self._events.put(('call', request))
+        request.done.wait()
+        if request.exc_info is not None:
+            raise request.exc_info[0], request.exc_info[1], \
+                request.exc_info[2]
+        return request.result
+
+    def wrap_logging(self, logging):
+        return MainThreadLogging(logging, self)
+
+    @staticmethod
+    def _update(obj):
+        try:
+            obj.update()
+        except Exception:
+            return sys.exc_info()
+        return None
+
+
+class ParallelScheduler(MainThreadPool):
+    """Updates the modules of a pipeline concurrently.
+
+    The scheduler is created by the interpreter for a single execution, from
+    the thread that logging calls get forwarded to. Its worker threads are
+    stopped when execute() returns.
+    """
+
+    def _worker(self, tasks):
+        while True:
+            obj = tasks.get()
+            if obj is None:
+                return
+            self._events.put(('done', obj, self._update(obj)))
+
+    def build_dependencies(self, graph, tmp_id_to_module_map, sinks):
+        """build_dependencies(graph: Graph, tmp_id_to_module_map: dict,
+                              sinks: list) -> (dict, dict)
+
+        Finds the modules that need to be updated to compute the given sinks
+        (pipeline ids), and their dependencies. Returns a dict mapping
+        persistent ids to the module objects, and a dict mapping persistent
+        ids to the set of persistent ids of the upstream modules.
+        """
+        objs = {}
+        upstream = {}
+        seen = set()
+        to_visit = list(sinks)
+        while to_visit:
+            tmp_id = to_visit.pop()
+            if tmp_id in seen:
+                continue
+            seen.add(tmp_id)
+            obj = tmp_id_to_module_map[tmp_id]
+            objs[obj.id] = obj
+            deps = upstream.setdefault(obj.id, set())
+            if updates_own_upstream(obj):
+                continue
+            for src_id, _ in graph.edges_to(tmp_id):
+                deps.add(tmp_id_to_module_map[src_id].id)
+                to_visit.append(src_id)
+        return objs, upstream
+
+    def execute(self, graph, tmp_id_to_module_map, sinks, report_error,
+                stop_on_error=True):
+        """execute(graph: Graph, tmp_id_to_module_map: dict, sinks: list,
+                   report_error: callable, stop_on_error: bool) -> None
+
+        Updates the modules upstream of sinks (pipeline ids), respecting the
+        dependencies from graph.
+
+        report_error is called on the main thread with the exception raised
+        by a module's update(); it should return None if the execution can go
+        on, False if a module failed, and True if the execution must be
+        aborted. It has the same semantics as the error handling in the
+        interpreter's sequential loop over the sinks.
+        """
+        objs, upstream = self.build_dependencies(graph, tmp_id_to_module_map,
+                                                 sinks)
+        downstream = dict((i, []) for i in objs)
+        pending = {}
+        for i, deps in upstream.iteritems():
+            pending[i] = len(deps)
+            for dep in deps:
+                downstream[dep].append(i)
+        ready = [i for i, n in pending.iteritems() if n == 0]
+        worker_ready = []
+        main_ready = []
+        # modules updating their own upstream, which wait for the workers
+        # to be idle; no new task is started while one is waiting
+        exclusive_ready = []
+
+        tasks = Queue.Queue()
+        workers = []
+        for _ in xrange(self.nb_threads):
+            worker = threading.Thread(target=self._worker, args=(tasks,))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        running = 0
+        stop = False
+        unexpected = None
+        try:
+            while True:
+                if not stop:
+                    for i in ready:
+                        obj = objs[i]
+                        if updates_own_upstream(obj):
+                            exclusive_ready.append(i)
+                        elif obj.is_thread_safe():
+                            worker_ready.append(i)
+                        else:
+                            main_ready.append(i)
+                    del ready[:]
+                    if not exclusive_ready:
+                        for i in worker_ready:
+                            tasks.put(objs[i])
+                            running += 1
+                        del worker_ready[:]
+
+                if main_ready and not stop:
+                    obj = objs[main_ready.pop(0)]
+                    exc_info = self._update(obj)
+                elif exclusive_ready and not running and not stop:
+                    obj = objs[exclusive_ready.pop(0)]
+                    exc_info = self._update(obj)
+                elif running:
+                    event = self._events.get()
+                    if event[0] == 'call':
+                        event[1].run()
+                        continue
+                    running -= 1
+                    obj, exc_info = event[1:]
+                else:
+                    break
+
+                if exc_info is not None:
+                    if not isinstance(exc_info[1], UPDATE_EXCEPTIONS):
+                        # Stop scheduling, this will be re-raised once the
+                        # running modules are done
+                        stop = True
+                        if unexpected is None:
+                            unexpected = exc_info
+                        continue
+                    res = report_error(exc_info[1])
+                    if res is not None and (stop_on_error or res):
+                        stop = True
+                for d in downstream[obj.id]:
+                    pending[d] -= 1
+                    if pending[d] == 0:
+                        ready.append(d)
+        finally:
+            for _ in workers:
+                tasks.put(None)
+            if not running:
+                for worker in workers:
+                    worker.join()
+
+        if unexpected is not None:
+            raise unexpected[0], unexpected[1], unexpected[2]
+
+
+def in_iteration_worker():
+    """in_iteration_worker() -> bool
+
+    Returns whether the current thread is running a loop iteration for an
+    IterationPool; nested loops should then iterate on that thread.
+    """
+    return getattr(threading.current_thread(), 'iteration_worker', False)
+
+
+class IterationPool(MainThreadPool):
+    """Updates the module copies of a loop on worker threads.
+
+    Module.compute_all() creates a pool when a module iterating over input
+    lists is thread-safe and more than one thread is configured for it.
+    Logging calls are forwarded to the thread that created the pool, as
+    with the ParallelScheduler.
+    """
+
+    def _worker(self, tasks):
+        threading.current_thread().iteration_worker = True
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            key, module = task
+            self._events.put(('done', key, self._update(module)))
+
+    def imap(self, iterations):
+        """imap(iterations: iterable of (int, Module))
+                -> iterator over (int, Module, exc_info)
+
+        Updates the modules of iterations on the worker threads. Yields each
+        one with the exception info raised by its update() (None if it
+        succeeded), in the order of iterations. iterations is consumed on
+        this thread, at most 2 * nb_threads items ahead of the results.
+        """
+        tasks = Queue.Queue()
+        workers = []
+        for _ in xrange(self.nb_threads):
+            worker = threading.Thread(target=self._worker, args=(tasks,))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        iterations = iter(iterations)
+        pending = {} # index -> (key, module) of submitted iterations
+        results = {} # index -> exc_info of the updated ones
+        nb_submitted = 0
+        nb_done = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and \
+                        nb_submitted - nb_done < 2 * self.nb_threads:
+                    try:
+                        key, module = next(iterations)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    tasks.put((nb_submitted, module))
+                    pending[nb_submitted] = key, module
+                    nb_submitted += 1
+                if nb_done in results:
+                    key, module = pending.pop(nb_done)
+                    exc_info = results.pop(nb_done)
+                    nb_done += 1
+                    yield key, module, exc_info
+                elif nb_done == nb_submitted:
+                    break
+                else:
+                    event = self._events.get()
+                    if event[0] == 'call':
+                        event[1].run()
+                    else:
+                        results[event[1]] = event[2]
+        finally:
+            # Don't start the remaining iterations, but let the running ones
+            # finish: they might be waiting on this thread
+            running = nb_submitted - nb_done - len(results)
+            while True:
+                try:
+                    tasks.get_nowait()
+                except Queue.Empty:
+                    break
+                running -= 1
+            while running > 0:
+                event = self._events.get()
+                if event[0] == 'call':
+                    event[1].run()
+                else:
+                    running -= 1
+            for _ in workers:
+                tasks.put(None)
+            for worker in workers:
+                worker.join()
+
+
+##############################################################################
+
+import contextlib
+import time
+import unittest
+
+
+@contextlib.contextmanager
+def execution_threads(nb_threads):
+    from vistrails.core.configuration import get_vistrails_configuration
+    configuration = get_vistrails_configuration()
+    old_value = configuration.executionThreads
+    configuration.executionThreads = nb_threads
+    try:
+        yield
+    finally:
+        configuration.executionThreads = old_value
+
+
+@contextlib.contextmanager
+def loop_threads(nb_threads):
+    from vistrails.core.configuration import get_vistrails_configuration
+    configuration = get_vistrails_configuration()
+    old_value = configuration.loopThreads
+    configuration.loopThreads = nb_threads
+    try:
+        yield
+    finally:
+        configuration.loopThreads = old_value
+
+
+class TestParallelScheduler(unittest.TestCase):
+    calc = 'org.vistrails.vistrails.pythoncalc'
+
+    @classmethod
+    def setUpClass(cls):
+        # Make sure the package is enabled before patching PythonCalc
+        from vistrails.tests.utils import enable_package
+        enable_package(cls.calc)
+
+    def make_modules(self):
+        def calc(op, *values):
+            return ('PythonCalc', self.calc,
+                    [('op', [('String', op)])] +
+                    [('value%d' % (i + 1), [('Float', str(v))])
+                     for i, v in enumerate(values)])
+        return [calc('+', 1.0, 2.0),
+                calc('*', 3.0, 4.0),
+                calc('-', None, 1.0),
+                calc('+'),
+                calc('/', 5.0, 2.0)]
+
+    def make_connections(self):
+        return [(0, 'value', 2, 'value1'),
+                (1, 'value', 3, 'value1'),
+                (2, 'value', 3, 'value2')]
+
+    def run_pipeline(self, nb_threads, modules):
+        from vistrails.packages.pythonCalc.init import PythonCalc
+        from vistrails.tests.utils import execute, intercept_result
+
+        modules = [(n, p, [(f, ps) for f, ps in funcs if ps[0][1] != 'None'])
+                   for n, p, funcs in modules]
+        threads = set()
+        old_compute = PythonCalc.compute
+        def compute(module):
+            threads.add(threading.current_thread())
+            time.sleep(0.05)
+            old_compute(module)
+        PythonCalc.compute = compute
+        try:
+            with execution_threads(nb_threads):
+                with intercept_result(PythonCalc, 'value') as results:
+                    result = execute(modules, self.make_connections(),
+                                     full_results=True)
+        finally:
+            PythonCalc.compute = old_compute
+        return result, sorted(results), threads
+
+    def test_results(self):
+        """Parallel execution gives the same results as the sequential one.
+        """
+        serial, serial_results, serial_threads = self.run_pipeline(
+                0, self.make_modules())
+        self.assertFalse(serial.errors)
+        self.assertEqual(len(serial_threads), 1)
+        parallel, parallel_results, parallel_threads = self.run_pipeline(
+                3, self.make_modules())
+        self.assertFalse(parallel.errors)
+        self.assertEqual(parallel_results, serial_results)
+        self.assertEqual(parallel_results, [2.0, 2.5, 3.0, 12.0, 14.0])
+        self.assertEqual(sorted(parallel.executed.keys()), range(5))
+        self.assertGreater(len(parallel_threads), 1)
+        self.assertNotIn(threading.current_thread(), parallel_threads)
+
+    def test_error(self):
+        """A failing module is reported and its downstream doesn't run.
+        """
+        modules = self.make_modules()
+        modules[2] = ('PythonCalc', self.calc,
+                      [('op', [('String', '/')]),
+                       ('value2', [('Float', '0.0')])])
+        result, results, _ = self.run_pipeline(2, modules)
+        self.assertIn(2, result.errors)
+        self.assertFalse(result.executed[3])
+        self.assertTrue(result.errors[2].msg)
+
+    def test_updates_own_upstream(self):
+        """Modules updating their own upstream run while workers are idle.
+        """
+        from vistrails.core.data_structures.graph import Graph
+
+        lock = threading.Lock()
+        active = [0]
+        seen_active = []
+        class Slow(Module):
+            def update(self):
+                with lock:
+                    active[0] += 1
+                time.sleep(0.05)
+                with lock:
+                    active[0] -= 1
+                self.computed = True
+        class OwnUpstream(Module):
+            def update_upstream(self):
+                pass
+            def update(self):
+                with lock:
+                    seen_active.append(active[0])
+                time.sleep(0.02)
+                with lock:
+                    seen_active.append(active[0])
+                for connector in self.inputPorts.get('value', []):
+                    connector.obj.update()
+                self.computed = True
+
+        # 0 -> 1, 0 -> 2 (updated by 2 itself), 3 and 4 independent
+        objs = {}
+        for i, klass in enumerate([Slow, Slow, OwnUpstream, Slow, Slow]):
+            objs[i] = klass()
+            objs[i].id = i
+        graph = Graph()
+        for i in objs:
+            graph.add_vertex(i)
+        graph.add_edge(0, 1)
+        graph.add_edge(0, 2)
+        scheduler = ParallelScheduler(3)
+        scheduler.execute(graph, objs, [1, 2, 3, 4], lambda e: None)
+        self.assertEqual(seen_active, [0, 0])
+        self.assertTrue(all(obj.computed for obj in objs.itervalues()))
+
+
+class TestIterationPool(unittest.TestCase):
+    calc = 'org.vistrails.vistrails.pythoncalc'
+
+    @classmethod
+    def setUpClass(cls):
+        from vistrails.tests.utils import enable_package
+        enable_package(cls.calc)
+
+    def run_loop(self, nb_threads, values):
+        from vistrails.core.system import get_vistrails_basic_pkg_id
+        from vistrails.packages.pythonCalc.init import PythonCalc
+        from vistrails.tests.utils import execute, intercept_result
+
+        threads = set()
+        old_compute = PythonCalc.compute
+        def compute(module):
+            threads.add(threading.current_thread())
+            time.sleep(0.02)
+            old_compute(module)
+        PythonCalc.compute = compute
+        # iterate instead of computing the list at once
+        old_compute_batch = PythonCalc.__dict__['compute_batch']
+        PythonCalc.compute_batch = Module.compute_batch.im_func
+        try:
+            with loop_threads(nb_threads):
+                with intercept_result(PythonCalc, 'value') as results:
+                    result = execute([
+                            ('List', get_vistrails_basic_pkg_id(),
+                             [('value', [('List', repr(values))])]),
+                            ('PythonCalc', self.calc,
+                             [('op', [('String', '/')]),
+                              ('value1', [('Float', '12.0')])]),
+                        ],
+                        [(0, 'value', 1, 'value2')],
+                        full_results=True)
+        finally:
+            PythonCalc.compute = old_compute
+            PythonCalc.compute_batch = old_compute_batch
+        return result, results, threads
+
+    def test_results(self):
+        """Iterations on threads give the same, ordered, results.
+        """
+        values = [1.0, 2.0, 3.0, 4.0, 6.0, 12.0]
+        serial, serial_results, serial_threads = self.run_loop(0, values)
+        self.assertFalse(serial.errors)
+        self.assertEqual(len(serial_threads), 1)
+        parallel, parallel_results, parallel_threads = self.run_loop(3,
+                                                                     values)
+        self.assertFalse(parallel.errors)
+        self.assertEqual(serial_results[-1], [12.0, 6.0, 4.0, 3.0, 2.0, 1.0])
+        self.assertEqual(parallel_results[-1], serial_results[-1])
+        self.assertGreater(len(parallel_threads), 1)
+        self.assertNotIn(threading.current_thread(), parallel_threads)
+
+    def test_error(self):
+        """A failing iteration fails the module.
+        """
+        result, _, _ = self.run_loop(3, [1.0, 0.0, 2.0, 3.0, 4.0])
+        self.assertIn(1, result.errors)
+
+    def test_imap(self):
+        """imap() yields in order and forwards calls to the main thread.
+        """
+        pool = IterationPool(3)
+        main_threads = []
+        class Iteration(object):
+            def __init__(self, i):
+                self.i = i
+            def update(self):
+                time.sleep(0.01 * (5 - self.i % 5))
+                pool.call_in_main_thread(
+                    lambda: main_threads.append(threading.current_thread()))
+                if self.i == 7:
+                    raise ValueError
+        results = [(key, exc_info is not None and exc_info[0])
+                   for key, module, exc_info
+                   in pool.imap((i, Iteration(i)) for i in xrange(10))]
+        self.assertEqual(results, [(i, i == 7 and ValueError)
+                                   for i in xrange(10)])
+        self.assertEqual(main_threads, [threading.current_thread()] * 10)
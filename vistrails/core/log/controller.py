@@ -37,6 +37,9 @@
 from __future__ import division
 
 import copy
+import datetime
+import json
+import time
 
 from vistrails.core import debug
 from vistrails.core.log.workflow_exec import WorkflowExec
@@ -393,3 +396,279 @@ class LogWorkflowExecController(LogWorkflowController):
             self.workflow_exec.completed = -1
         else:
             self.workflow_exec.completed = 1
+
+
+class ExecutionTracer(object):
+    """Compact record of the module executions of a workflow.
+
+    Each execution is stored as a (module_id, module_name, ts_start, ts_end,
+    cached, completed) tuple, with float timestamps, in a ring buffer
+    preallocated to 'size' entries: once it is full, the oldest records are
+    overwritten. Per-module counts and timings are kept for all the
+    executions, including overwritten ones. ModuleExec objects are only
+    built on demand by module_execs().
+    """
+
+    def __init__(self, size=65536):
+        self.size = size
+        self.records = [None] * size
+        self.count = 0
+        self.modules = {}   # module_id -> [name, count, cached, errors, time]
+
+    def record(self, module_id, module_name, ts_start, ts_end, cached,
+               completed):
+        """record(module_id: int, module_name: str, ts_start: float,
+                  ts_end: float, cached: int, completed: int) -> None
+        """
+        self.records[self.count % self.size] = (module_id, module_name,
+                                                ts_start, ts_end, cached,
+                                                completed)
+        self.count += 1
+        try:
+            stats = self.modules[module_id]
+        except KeyError:
+            stats = self.modules[module_id] = [module_name, 0, 0, 0, 0.0]
+        stats[1] += 1
+        if cached:
+            stats[2] += 1
+        if completed != 1:
+            stats[3] += 1
+        stats[4] += ts_end - ts_start
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def __iter__(self):
+        """Iterates on the records still in the buffer, oldest first.
+        """
+        if self.count <= self.size:
+            return iter(self.records[:self.count])
+        start = self.count % self.size
+        return iter(self.records[start:] + self.records[:start])
+
+    def dropped(self):
+        """dropped() -> int
+        Returns the number of records that were overwritten.
+        """
+        return max(0, self.count - self.size)
+
+    def summary(self):
+        """summary() -> dict
+        Returns {module_id: {'name', 'count', 'cached', 'errors', 'time'}}
+        for all the recorded executions.
+        """
+        return dict((module_id, {'name': name, 'count': count,
+                                 'cached': cached, 'errors': errors,
+                                 'time': total})
+                    for module_id, (name, count, cached, errors, total)
+                    in self.modules.iteritems())
+
+    def module_execs(self, log, machine_id, records=None):
+        """module_execs(log: Log, machine_id: int, records: list)
+              -> [ModuleExec]
+        Builds ModuleExec objects from records (by default, all the records
+        still in the buffer), with ids from the log's id scope.
+        """
+        if records is None:
+            records = self
+        fromtimestamp = datetime.datetime.fromtimestamp
+        module_execs = []
+        for (module_id, module_name, ts_start, ts_end, cached,
+                completed) in records:
+            module_execs.append(ModuleExec(
+                    id=log.id_scope.getNewId(ModuleExec.vtType),
+                    machine_id=machine_id,
+                    module_id=module_id,
+                    module_name=module_name,
+                    cached=cached,
+                    ts_start=fromtimestamp(ts_start),
+                    ts_end=fromtimestamp(ts_end),
+                    completed=completed))
+        return module_execs
+
+
+class TracingLoopController(object):
+    """Loop controller of a TracingWorkflowController.
+
+    Only remembers the current iteration of the looped modules.
+    """
+    def __init__(self, controller):
+        self.controller = controller
+
+    def finish_loop_execution(self):
+        pass
+
+    def start_iteration(self, looped_module, iteration):
+        self.controller.iterations[id(looped_module)] = iteration
+
+    def finish_iteration(self, looped_module):
+        self.controller.iterations.pop(id(looped_module), None)
+
+
+class TracingLogController(LogController):
+    """Log controller for the 'summary' execution log level.
+
+    Workflow executions are logged as usual, but module executions are
+    recorded by an ExecutionTracer instead of as ModuleExec objects.
+    """
+    def __init__(self, log, machine=None, tracer_size=65536):
+        super(TracingLogController, self).__init__(log, machine)
+        self.tracer_size = tracer_size
+
+    def start_workflow_execution(self, parent_exec,
+                                 vistrail=None, pipeline=None,
+                                 currentVersion=None):
+        """Signals the start of the execution of a pipeline.
+        """
+        return TracingWorkflowController(self.log, self.machine, parent_exec,
+                                         vistrail, pipeline, currentVersion,
+                                         self.tracer_size)
+
+
+class TracingWorkflowController(LogWorkflowExecController):
+    """Workflow log controller recording module executions in a tracer.
+
+    When the workflow finishes, the per-module counts and timings are added
+    to the WorkflowExec as a JSON 'executionSummary' annotation, and the
+    module executions that failed or were suspended are added as ModuleExec
+    objects. Module annotations are discarded, and loops and groups are not
+    logged separately from the modules they execute.
+    """
+    def __init__(self, log, machine, parent_exec, vistrail=None,
+                 pipeline=None, currentVersion=None, tracer_size=65536):
+        super(TracingWorkflowController, self).__init__(
+                log, machine, parent_exec, vistrail, pipeline, currentVersion)
+        self.tracer = ExecutionTracer(tracer_size)
+        self.started = {}       # vistrails_module -> (id, name, cached, ts)
+        self.iterations = {}    # vistrails_module -> iteration
+        self.failed = []        # records of failed or suspended executions
+
+    def recursing(self, parent_exec):
+        return self
+
+    def get_iteration_from_module(self, module):
+        return self.iterations.get(id(module))
+
+    def start_execution(self, module, module_id, module_name, cached=0):
+        self.started[id(module)] = (module_id, module_name, cached,
+                                    time.time())
+
+    def start_loop_execution(self, loop_module, total_iterations=None):
+        return TracingLoopController(self)
+
+    def finish_execution(self, module, error, errorTrace=None,
+                         suspended=False):
+        try:
+            module_id, module_name, cached, ts_start = \
+                self.started.pop(id(module))
+        except KeyError:
+            return
+        if suspended:
+            completed = -2
+        elif error:
+            completed = -1
+        else:
+            completed = 1
+        record = (module_id, module_name, ts_start, time.time(), cached,
+                  completed)
+        self.tracer.record(*record)
+        if completed != 1:
+            self.failed.append((record, error, errorTrace))
+
+    def insert_module_annotations(self, module, a_dict):
+        pass
+
+    def finish_workflow_execution(self, errors, suspended=False):
+        super(TracingWorkflowController, self).finish_workflow_execution(
+                errors, suspended)
+        summary = self.tracer.summary()
+        if summary:
+            self.insert_workflow_exec_annotations({
+                    'executionSummary': json.dumps(summary, sort_keys=True)})
+        for (record, error, errorTrace), module_exec in zip(
+                self.failed,
+                self.tracer.module_execs(self.log, self.machine.id,
+                                         [r for r, e, t in self.failed])):
+            module_exec.error = error
+            if errorTrace:
+                a_id = self.log.id_scope.getNewId(Annotation.vtType)
+                module_exec.add_annotation(Annotation(id=a_id,
+                                                      key="errorTrace",
+                                                      value=errorTrace))
+            self.workflow_exec.add_item_exec(module_exec)
+        self.failed = []
+
+
+
+import unittest
+
+
+class TestTracingLogController(unittest.TestCase):
+    def run_workflow(self, controller):
+        from vistrails.core.log.log import Log
+        from vistrails.core.vistrail.pipeline import Pipeline
+        log = Log()
+        wf_controller = controller(log).start_workflow_execution(
+                None, pipeline=Pipeline(), currentVersion=1)
+        modules = [object() for i in xrange(3)]
+        wf_controller.start_execution(modules[2], 2, 'Float', cached=1)
+        wf_controller.finish_execution(modules[2], '')
+        wf_controller.start_execution(modules[0], 0, 'Map')
+        wf_controller.insert_module_annotations(modules[0], {'k': 'v'})
+        loop = wf_controller.start_loop_execution(modules[0])
+        for i in xrange(5):
+            loop.start_iteration(modules[1], i)
+            self.assertEqual(
+                    wf_controller.get_iteration_from_module(modules[1]), i)
+            wf_controller.start_execution(modules[1], 1, 'PythonCalc')
+            wf_controller.finish_execution(modules[1], '')
+            loop.finish_iteration(modules[1])
+        loop.finish_loop_execution()
+        wf_controller.finish_execution(modules[0], 'failed', 'trace')
+        wf_controller.finish_workflow_execution({0: 'failed'})
+        return log, wf_controller
+
+    def test_full(self):
+        log, wf_controller = self.run_workflow(LogController)
+        workflow_exec, = log.workflow_execs
+        self.assertEqual(workflow_exec.completed, -1)
+        self.assertEqual([e.module_id for e in workflow_exec.item_execs],
+                         [2, 0])
+        loop_exec, = workflow_exec.item_execs[1].loop_execs
+        self.assertEqual(len(loop_exec.loop_iterations), 5)
+
+    def test_summary(self):
+        log, wf_controller = self.run_workflow(TracingLogController)
+        workflow_exec, = log.workflow_execs
+        self.assertEqual(workflow_exec.completed, -1)
+        annotation, = workflow_exec.annotations
+        self.assertEqual(annotation.key, 'executionSummary')
+        summary = json.loads(annotation.value)
+        self.assertEqual(
+                dict((k, (v['name'], v['count'], v['cached'], v['errors']))
+                     for k, v in summary.iteritems()),
+                {'0': ('Map', 1, 0, 1), '1': ('PythonCalc', 5, 0, 0),
+                 '2': ('Float', 1, 1, 0)})
+        # only the failed execution is logged as a ModuleExec
+        module_exec, = workflow_exec.item_execs
+        self.assertEqual((module_exec.module_id, module_exec.completed,
+                          module_exec.error),
+                         (0, -1, 'failed'))
+        self.assertEqual([a.key for a in module_exec.annotations],
+                         ['errorTrace'])
+        self.assertEqual(len(wf_controller.tracer), 7)
+
+    def test_ring_buffer(self):
+        tracer = ExecutionTracer(4)
+        for i in xrange(10):
+            tracer.record(i % 2, 'Module', float(i), i + 0.5, 0, 1)
+        self.assertEqual(len(tracer), 4)
+        self.assertEqual(tracer.dropped(), 6)
+        self.assertEqual([r[2] for r in tracer], [6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(tracer.summary()[1]['count'], 5)
+        self.assertEqual(tracer.summary()[1]['time'], 2.5)
+        from vistrails.core.log.log import Log
+        module_execs = tracer.module_execs(Log(), -1)
+        self.assertEqual([m.module_id for m in module_execs], [0, 1, 0, 1])
+        self.assertEqual(module_execs[0].ts_start,
+                         datetime.datetime.fromtimestamp(6.0))
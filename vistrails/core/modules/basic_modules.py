@@ -51,12 +51,16 @@ from vistrails.core import debug
 
 from abc import ABCMeta
 from ast import literal_eval
+import array
+import collections
+import cPickle
 from itertools import izip
 import mimetypes
 import os
 import pickle
 import re
 import shutil
+import tempfile
 import zipfile
 import urllib
 
@@ -875,6 +879,9 @@ class Not(Module):
         value = self.get_input('input')
         self.set_output('value', not value)
 
+    def compute_batch(self, columns):
+        return {'value': [not value for value in columns['input']]}
+
 ##############################################################################
 
 # List
@@ -1157,6 +1164,15 @@ class Round(Converter):
             integ = int(fl + 0.5)   # nearest
         self.set_output('out_value', integ)
 
+    def compute_batch(self, columns):
+        if 'floor' in columns:
+            return NotImplemented
+        values = columns['in_value']
+        if self.get_input('floor'):
+            return {'out_value': [int(fl) for fl in values]}
+        else:
+            return {'out_value': [int(fl + 0.5) for fl in values]}
+
 
 class TupleToList(Converter):
     """Turns a Tuple into a List.
@@ -1199,12 +1215,13 @@ class Generator(object):
 
     generators = []
     def __init__(self, size=None, module=None, generator=None, port=None,
-                 accumulated=False):
+                 accumulated=False, chunk_size=1):
         self.module = module
         self.generator = generator
         self.port = port
         self.size = size
         self.accumulated = accumulated
+        self.chunk_size = chunk_size
         if generator and module not in Generator.generators:
             # add to global list of generators
             # they will be topologically ordered
@@ -1217,16 +1234,27 @@ class Generator(object):
         if isinstance(value, Generator):
             value = value.all()
         return value
-    
+
+    def next_chunk(self):
+        """ return the next values as a list, or None at the end of the stream
+
+        Streams with a chunk_size greater than 1 pass lists of up to
+        chunk_size values between modules instead of single values.
+        """
+        value = self.next()
+        if value is None or self.chunk_size > 1:
+            return value
+        return [value]
+
     def all(self):
         """ exhausts next() for Streams
         
         """
         items = []
-        item = self.next()
-        while item is not None:
-            items.append(item)
-            item = self.next()
+        chunk = self.next_chunk()
+        while chunk is not None:
+            items.extend(chunk)
+            chunk = self.next_chunk()
         return items
 
     @staticmethod
@@ -1243,6 +1271,86 @@ class Generator(object):
                 result = g.next()
         Generator.generators = []
 
+
+class SpooledList(collections.Sequence):
+    """
+    A list of values that moves them to a temporary file once it holds more
+    than max_size of them (0 keeps them in memory).
+
+    It is used to accumulate streams for modules that need all the values
+    at once. The values are pickled and read back when accessed, so they
+    need to be picklable.
+    """
+    def __init__(self, max_size=0, dir=None):
+        self.max_size = max_size
+        self.dir = dir
+        self._values = []
+        self._file = None
+        # 'd' holds file offsets past 4GB on every platform
+        self._offsets = array.array('d')
+
+    @property
+    def on_disk(self):
+        return self._file is not None
+
+    def append(self, value):
+        if self._file is not None:
+            self._write(value)
+        else:
+            self._values.append(value)
+            if self.max_size and len(self._values) > self.max_size:
+                self.rollover()
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def rollover(self):
+        """ moves the values held in memory to the temporary file """
+        if self._file is not None:
+            return
+        self._file = tempfile.TemporaryFile(prefix='vt_spool_', dir=self.dir)
+        values, self._values = self._values, None
+        for value in values:
+            self._write(value)
+
+    def close(self):
+        """ discards the values, deleting the temporary file """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._values = []
+        self._offsets = array.array('d')
+
+    def _write(self, value):
+        self._file.seek(0, os.SEEK_END)
+        self._offsets.append(self._file.tell())
+        cPickle.dump(value, self._file, cPickle.HIGHEST_PROTOCOL)
+
+    def _read(self, offset):
+        self._file.seek(int(offset))
+        return cPickle.load(self._file)
+
+    def __len__(self):
+        if self._file is None:
+            return len(self._values)
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        if self._file is None:
+            return self._values[index]
+        if isinstance(index, slice):
+            return [self._read(self._offsets[i])
+                    for i in xrange(*index.indices(len(self._offsets)))]
+        return self._read(self._offsets[index])
+
+    def __iter__(self):
+        if self._file is None:
+            return iter(self._values)
+        return (self._read(offset) for offset in self._offsets)
+
+ListType.register(SpooledList)
+
 ##############################################################################
 
 class Assert(Module):
@@ -1541,6 +1649,21 @@ class TestNot(unittest.TestCase):
         errors, results = self.run_pipeline([])
         self.assertTrue(errors)
 
+    def test_list(self):
+        from vistrails.tests.utils import execute, intercept_result
+        with intercept_result(Not, 'value') as results:
+            self.assertFalse(execute([
+                    ('List', 'org.vistrails.vistrails.basic', [
+                        ('value', [('List', '[True, False, True]')]),
+                    ]),
+                    ('Not', 'org.vistrails.vistrails.basic', []),
+                ],
+                [
+                    (0, 'value', 1, 'input'),
+                ]))
+        # computed as a batch, by the loop module only
+        self.assertEqual(results, [[False, True, False]])
+
 
 class TestList(unittest.TestCase):
     @staticmethod
@@ -1904,3 +2027,27 @@ class TestConstantMetaclass(unittest.TestCase):
             _output_ports = []
         self.assertEqual(Mod3._input_ports, [('value', Mod3)])
         self.assertEqual(Mod3._output_ports, [('value', Mod3)])
+
+
+class TestSpooledList(unittest.TestCase):
+    def test_memory(self):
+        values = SpooledList(3)
+        values.extend([1, 2, 3])
+        self.assertFalse(values.on_disk)
+        self.assertEqual(list(values), [1, 2, 3])
+        self.assertTrue(isinstance(values, ListType))
+
+    def test_rollover(self):
+        values = SpooledList(3)
+        values.extend(['a', (1, 2), None, 4.5])
+        self.assertTrue(values.on_disk)
+        values.append([6])
+        self.assertEqual(len(values), 5)
+        self.assertEqual(list(values), ['a', (1, 2), None, 4.5, [6]])
+        self.assertEqual(values[1], (1, 2))
+        self.assertEqual(values[-1], [6])
+        self.assertEqual(values[1:4:2], [(1, 2), 4.5])
+        self.assertIn(4.5, values)
+        values.close()
+        self.assertFalse(values.on_disk)
+        self.assertEqual(len(values), 0)
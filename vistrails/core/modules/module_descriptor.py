@@ -78,6 +78,10 @@ class ModuleDescriptor(DBModuleDescriptor):
     :attribute port_order: stores a map from names to numbers to order the
         ports in the GUI
 
+    :attribute is_lazy: whether the descriptor was registered from a package
+        manifest and its package still needs to be initialized; accessing
+        `module` initializes it
+
     :attribute _is_abstract: whether module is abstract
     :attribute _configuration_widget: reference to the Qt class that provides a
         custom configuration widget for the class.  Note that this can be a
@@ -135,6 +139,7 @@ class ModuleDescriptor(DBModuleDescriptor):
     def set_defaults(self, other=None):
         if other is None:
             self._abstraction_refs = 1
+            self.is_lazy = False
             self._is_abstract = False
             self._configuration_widget = None
             self._left_fringe = None
@@ -158,7 +163,8 @@ class ModuleDescriptor(DBModuleDescriptor):
             self.children = copy.copy(other.children)
             
             self._base_descriptor = other._base_descriptor
-            self.module = other.module
+            self._module = other._module
+            self.is_lazy = other.is_lazy
             self._port_count = other._port_count
             self._abstraction_refs = self._abstraction_refs
             self._is_abstract = other._is_abstract
@@ -218,7 +224,28 @@ class ModuleDescriptor(DBModuleDescriptor):
     version = DBModuleDescriptor.db_version
     base_descriptor_id = DBModuleDescriptor.db_base_descriptor_id
     port_specs_list = DBModuleDescriptor.db_portSpecs
-    
+
+    def _get_module(self):
+        if self._module is None and self.is_lazy:
+            self.initialize_lazy()
+        return self._module
+    def _set_module(self, module):
+        self._module = module
+    module = property(_get_module, _set_module)
+
+    def initialize_lazy(self):
+        """initialize_lazy() -> None
+
+        Initializes the package of a descriptor that was registered from a
+        package manifest, which replaces its placeholder ports and sets its
+        module. This is a NOP for other descriptors.
+        """
+        if self.is_lazy:
+            reg = vistrails.core.modules.module_registry.get_module_registry()
+            package = reg.get_package_by_name(self.identifier,
+                                              self.package_version)
+            package.initialize_lazy()
+
     def _get_base_descriptor(self):
         if self._base_descriptor is None and self.base_descriptor_id >= 0:
             from vistrails.core.modules.module_registry import get_module_registry
@@ -256,6 +283,7 @@ class ModuleDescriptor(DBModuleDescriptor):
         self._configuration_widget = configuration_widget_type
 
     def configuration_widget(self):
+        self.initialize_lazy()
         return self._configuration_widget
 
     def set_constant_config_widget(self, widget_class, widget_use, 
@@ -265,6 +293,7 @@ class ModuleDescriptor(DBModuleDescriptor):
         self._widget_classes[widget_use][widget_type] = widget_class
 
     def has_constant_config_widget(self, widget_use, widget_type):
+        self.initialize_lazy()
         return widget_use in self._widget_classes and \
             widget_type in self._widget_classes[widget_use]
 
@@ -274,6 +303,7 @@ class ModuleDescriptor(DBModuleDescriptor):
         return None
 
     def get_all_constant_config_widgets(self, widget_use):
+        self.initialize_lazy()
         if widget_use in self._widget_classes:
             return self._widget_classes[widget_use]
         return {}
@@ -324,6 +354,7 @@ class ModuleDescriptor(DBModuleDescriptor):
     def set_hasher_callable(self, callable_):
         self._hasher_callable = callable_
     def hasher_callable(self):
+        self.initialize_lazy()
         return self._hasher_callable
 
     ##########################################################################
@@ -505,6 +505,10 @@ class ModuleRegistry(DBRegistry):
     for the VisTrails modules of enabled packages.
     """
 
+    # incremented whenever descriptors or their port specs change, so that
+    # pipelines can tell if what they validated is still current
+    generation = 0
+
     ##########################################################################
     # Constructor and copy
 
@@ -544,7 +548,9 @@ class ModuleRegistry(DBRegistry):
                 self.packages[other._default_package.identifier]
 
     def setup_indices(self):
+        self.generation += 1
         self.descriptors_by_id = {}
+        self.reset_subclass_index()
         self.package_versions = self.db_packages_identifier_index
         self.packages = {}
         self._module_key_map = {}
@@ -625,6 +631,7 @@ class ModuleRegistry(DBRegistry):
         # self.descriptors[(desc.package, desc.name, desc.namespace)] = desc
         self.descriptors_by_id[desc.id] = desc
         package.add_descriptor(desc)
+        self.generation += 1
     def delete_descriptor(self, desc, package=None):
         if package is None:
             try:
@@ -636,8 +643,11 @@ class ModuleRegistry(DBRegistry):
         # del self.descriptors[(desc.package, desc.name, desc.namespace)]
         del self.descriptors_by_id[desc.id]
         package.delete_descriptor(desc)
+        self.generation += 1
+        self.reset_subclass_index()
     def add_package(self, package):
         DBRegistry.db_add_package(self, package)
+        self.generation += 1
         for key in chain(package.old_identifiers, [package.identifier]):
             if key in self.packages:
                 old_pkg = self.packages[key]
@@ -932,6 +942,44 @@ class ModuleRegistry(DBRegistry):
                                             package_version, version)
         return descriptor
 
+    def fill_lazy_descriptor(self, descriptor, module, base_descriptor):
+        """fill_lazy_descriptor(descriptor: ModuleDescriptor, module: class,
+                                base_descriptor: ModuleDescriptor)
+              -> ModuleDescriptor
+
+        Sets the module of a descriptor registered from a package manifest,
+        once its package is initialized. The port specs read from the
+        manifest are dropped, as the package adds them again.
+        """
+        if (base_descriptor is not None and
+                base_descriptor.id != descriptor.base_descriptor_id):
+            old_base = self.descriptors_by_id.get(
+                    descriptor.base_descriptor_id)
+            if old_base is not None and descriptor in old_base.children:
+                old_base.children.remove(descriptor)
+            descriptor.base_descriptor = base_descriptor
+            base_descriptor.children.append(descriptor)
+        for spec in list(descriptor.port_specs_list):
+            descriptor.delete_port_spec(spec)
+        descriptor.module = module
+        descriptor.is_lazy = False
+
+        if issubclass(module,
+                vistrails.core.modules.vistrails_module.Converter):
+            self._conversions = dict()
+            self._converters.add(descriptor)
+
+        package = self.package_versions[(descriptor.identifier,
+                                         descriptor.package_version)]
+        self._module_key_map[module] = (descriptor.identifier,
+                                        descriptor.name,
+                                        descriptor.namespace,
+                                        package.version,
+                                        descriptor.version)
+        self.generation += 1
+        self.reset_subclass_index()
+        return descriptor
+
     def convert_port_val(self, val, sig=None, cls=None):
         basic_pkg = get_vistrails_basic_pkg_id()
         if sig is None and cls is None:
@@ -1168,8 +1216,12 @@ class ModuleRegistry(DBRegistry):
 
         package = self.package_versions[(identifier, package_version)]
         desc_key = (name, namespace, version)
-        if desc_key in package.descriptor_versions:
-            raise ModuleAlreadyExists(identifier, name)
+        lazy_descriptor = package.descriptors.get((name, namespace or ''))
+        if (lazy_descriptor is None or not lazy_descriptor.is_lazy or
+                lazy_descriptor.version != (version or '')):
+            lazy_descriptor = None
+            if desc_key in package.descriptor_versions:
+                raise ModuleAlreadyExists(identifier, name)
 
         # We allow multiple inheritance as long as only one of the superclasses
         # is a subclass of Module.
@@ -1191,13 +1243,19 @@ class ModuleRegistry(DBRegistry):
             if identifier != 'local.abstractions':
                 raise DuplicateModule(self.get_descriptor(module), identifier,
                                       name, namespace)
+        elif lazy_descriptor is not None:
+            pass
         elif self.has_descriptor_with_name(identifier, name, namespace,
                                            package_version, version):
             raise DuplicateIdentifier(identifier, name, namespace,
                                       package_version, version)
-        descriptor = self.update_registry(base_descriptor, module, identifier,
-                                          name, namespace, package_version,
-                                          version)
+        if lazy_descriptor is not None:
+            descriptor = self.fill_lazy_descriptor(lazy_descriptor, module,
+                                                   base_descriptor)
+        else:
+            descriptor = self.update_registry(base_descriptor, module,
+                                              identifier, name, namespace,
+                                              package_version, version)
         if settings.is_root:
             self.root_descriptor = descriptor
 
@@ -1259,9 +1317,10 @@ class ModuleRegistry(DBRegistry):
         if settings.ghost_namespace:
             descriptor.ghost_namespace = settings.ghost_namespace
 
-        self.signals.emit_new_module(descriptor)
-        if self.is_abstraction(descriptor):
-            self.signals.emit_new_abstraction(descriptor)
+        if lazy_descriptor is None:
+            self.signals.emit_new_module(descriptor)
+            if self.is_abstraction(descriptor):
+                self.signals.emit_new_abstraction(descriptor)
         return descriptor
 
     def auto_add_subworkflow(self, subworkflow):
@@ -1492,6 +1551,7 @@ class ModuleRegistry(DBRegistry):
             raise InvalidPortSpec(descriptor, spec.name, spec.type, e)
 
         descriptor.add_port_spec(spec)
+        self.generation += 1
         if spec.type == 'input':
             self.signals.emit_new_input_port(descriptor.identifier,
                                              descriptor.name, spec.name, spec)
@@ -1644,6 +1704,12 @@ class ModuleRegistry(DBRegistry):
                 for module in modules:
                     self.auto_add_module(module)
 
+            # drop the manifest entries the package no longer registers
+            for descriptor in reversed(package.descriptor_list):
+                if descriptor.is_lazy:
+                    self.delete_module(descriptor.identifier,
+                                       descriptor.name, descriptor.namespace)
+
             # allow all modules to auto_add_ports!
             added_descriptors = set()
             for descriptor in package.descriptor_list:
@@ -1674,6 +1740,79 @@ class ModuleRegistry(DBRegistry):
         debug.splashMessage("Initializing " + package.codepath + '... done.')
         package._initialized = True
 
+    def add_lazy_package(self, package, manifest):
+        """add_lazy_package(package: Package, manifest: dict) -> bool
+
+        Registers the descriptors and port specs listed in a package
+        manifest (see :mod:`vistrails.core.modules.package_manifest`)
+        without initializing the package. The descriptors have no module
+        until the package gets initialized, which happens the first time
+        one of them is summoned or configured.
+
+        Returns False, registering nothing, if a base descriptor from
+        another package is missing.
+        """
+        known = set()
+        for m in manifest['modules']:
+            base = m['base']
+            if (base is not None and tuple(base) not in known and
+                    not self.has_descriptor_with_name(*base)):
+                return False
+            known.add((package.identifier, m['name'], m['namespace']))
+
+        debug.log("Registering " + package.codepath + " from its manifest")
+        if (package.identifier, package.version) not in self.package_versions:
+            self.add_package(package)
+        package._lazy = True
+        package._lazy_hooks = set(manifest['hooks'])
+        for m in manifest['modules']:
+            base_descriptor = None
+            if m['base'] is not None:
+                base_descriptor = self.get_descriptor_by_name(*m['base'])
+            descriptor_id = self.idScope.getNewId(ModuleDescriptor.vtType)
+            descriptor = ModuleDescriptor(id=descriptor_id,
+                                          package=package.identifier,
+                                          base_descriptor=base_descriptor,
+                                          name=m['name'],
+                                          namespace=m['namespace'],
+                                          package_version=package.version,
+                                          version=m['version'])
+            descriptor.is_lazy = True
+            descriptor.set_module_abstract(m['abstract'])
+            descriptor.is_hidden = m['hidden']
+            descriptor.namespace_hidden = m['namespace_hidden']
+            if m['color'] is not None:
+                descriptor.set_module_color(tuple(m['color']))
+            if m['fringe'] is not None:
+                left_fringe, right_fringe = m['fringe']
+                descriptor.set_module_fringe(
+                        [tuple(p) for p in left_fringe],
+                        [tuple(p) for p in right_fringe])
+            for p in m['ports']:
+                items = [PortSpecItem(id=self.idScope.getNewId(
+                                             PortSpecItem.vtType),
+                                      **item)
+                         for item in p['items']]
+                shape = p['shape']
+                if isinstance(shape, list):
+                    shape = [tuple(point) for point in shape]
+                spec = PortSpec(id=self.idScope.getNewId(PortSpec.vtType),
+                                name=p['name'],
+                                type=p['type'],
+                                optional=p['optional'],
+                                sort_key=p['sort_key'],
+                                min_conns=p['min_conns'],
+                                max_conns=p['max_conns'],
+                                depth=p['depth'],
+                                union=p['union'],
+                                docstring=p['docstring'],
+                                shape=shape,
+                                items=items)
+                descriptor.add_port_spec(spec)
+            self.add_descriptor(descriptor, package)
+            self.signals.emit_new_module(descriptor)
+        return True
+
     def delete_module(self, identifier, module_name, namespace=None):
         """Removes a module from the registry.
         """
@@ -1693,8 +1832,8 @@ class ModuleRegistry(DBRegistry):
             self.signals.emit_deleted_abstraction(descriptor)
         package = self.packages[descriptor.identifier]
         self.delete_descriptor(descriptor, package)
-        if descriptor.module is not None:
-            del self._module_key_map[descriptor.module]
+        if descriptor._module is not None:
+            del self._module_key_map[descriptor._module]
 
     def remove_package(self, package):
         """Removes an entire package from the registry.
@@ -1734,11 +1873,13 @@ class ModuleRegistry(DBRegistry):
         """Remove an input port by name.
         """
         descriptor.delete_input_port(port_name)
+        self.generation += 1
 
     def delete_output_port(self, descriptor, port_name):
         """Removes an output port by name.
         """
         descriptor.delete_output_port(port_name)
+        self.generation += 1
 
     def source_ports_from_descriptor(self, descriptor, sorted=True):
         ports = [p[1] for p in self.module_ports('output', descriptor)]
@@ -1870,14 +2011,14 @@ class ModuleRegistry(DBRegistry):
         return converters
 
     def is_descriptor_list_subclass(self, sub_descs, super_descs):
-        basic_pkg = get_vistrails_basic_pkg_id()
-        variant_desc = self.get_descriptor_by_name(basic_pkg, 'Variant')
-        module_desc = self.get_descriptor_by_name(basic_pkg, 'Module')
+        variant_desc = self.get_basic_descriptor('Variant')
+        module_desc = self.get_basic_descriptor('Module')
 
         for (sub_desc, super_desc) in izip(sub_descs, super_descs):
-            if sub_desc == variant_desc or super_desc == variant_desc:
+            # registered descriptors are unique, compare them by identity
+            if sub_desc is variant_desc or super_desc is variant_desc:
                 continue
-            if super_desc == module_desc and sub_desc != module_desc:
+            if super_desc is module_desc and sub_desc is not module_desc:
                 warnings.warn(
                         "Connecting any type on a Module input port is "
                         "deprecated\nPlease make the output port a Variant to "
@@ -1893,9 +2034,8 @@ class ModuleRegistry(DBRegistry):
         """Checks if specs of `sub` subclass `super`.
         """
         # For a connection, this gets called for sub -> super
-        basic_pkg = get_vistrails_basic_pkg_id()
-        variant_desc = self.get_descriptor_by_name(basic_pkg, 'Variant')
-        list_desc = self.get_descriptor_by_name(basic_pkg, 'List')
+        variant_desc = self.get_basic_descriptor('Variant')
+        list_desc = self.get_basic_descriptor('List')
         # sometimes sub is coming None
         # I don't know if this is expected, so I will put a test here
         sub_descs = []
@@ -1903,16 +2043,17 @@ class ModuleRegistry(DBRegistry):
             sub_descs = sub.descriptors()
         if sub_descs is None:
             return False
-        elif sub_descs == [variant_desc]:
+        elif len(sub_descs) == 1 and sub_descs[0] is variant_desc:
             return True
         super_descs = []
         if super:
             super_descs = super.descriptors()
         if super_descs is None:
             return False
-        elif super_descs == [variant_desc]:
+        elif len(super_descs) == 1 and super_descs[0] is variant_desc:
             return True
-        elif [list_desc] in [super_descs, sub_descs]:
+        elif ((len(super_descs) == 1 and super_descs[0] is list_desc) or
+                (len(sub_descs) == 1 and sub_descs[0] is list_desc)):
             # Allow Lists to connect to anything
             return True
         #elif super_descs == [list_desc] and sub_descs != [list_desc] \
@@ -1944,7 +2085,7 @@ class ModuleRegistry(DBRegistry):
         one for the root Module. It will thus not return mixins (which
         themselves don't subclass Module).
         """
-        if descriptor.module is None:
+        if descriptor._module is None:
             descriptors = [descriptor]
             base_id = descriptor.base_descriptor_id
             while base_id >= 0:
@@ -2060,9 +2201,63 @@ class ModuleRegistry(DBRegistry):
         descriptor.set_constant_config_widget(widget_class,
                                               widget_use, widget_type)
 
+    def reset_subclass_index(self):
+        """Drops the subclass index and the cached basic descriptors.
+
+        This is called when descriptors are removed; entries for new
+        descriptors are added as they get queried.
+        """
+        self._ancestor_keys = {}
+        self._basic_descriptors = {}
+
+    def get_basic_descriptor(self, name):
+        """get_basic_descriptor(name) -> ModuleDescriptor
+
+        Returns a descriptor from the basic_modules package, caching it
+        until the subclass index is reset.
+        """
+        try:
+            return self._basic_descriptors[name]
+        except KeyError:
+            descriptor = self.get_descriptor_by_name(
+                    get_vistrails_basic_pkg_id(), name)
+            self._basic_descriptors[name] = descriptor
+            return descriptor
+
+    def _get_ancestor_keys(self, descriptor):
+        """_get_ancestor_keys(descriptor) -> frozenset
+
+        Returns the keys of every ancestor of a registered descriptor,
+        including itself. The key of a descriptor is its module class if
+        it has one (so that descriptors sharing a class match like
+        issubclass() would), else its id.
+        """
+        try:
+            return self._ancestor_keys[descriptor.id]
+        except KeyError:
+            pass
+        if descriptor._module is not None:
+            keys = set(descriptor._module.mro())
+        else:
+            keys = set([descriptor.id])
+        base = self.descriptors_by_id.get(descriptor.base_descriptor_id)
+        if base is not None and base is not descriptor:
+            keys.update(self._get_ancestor_keys(base))
+        keys = frozenset(keys)
+        self._ancestor_keys[descriptor.id] = keys
+        return keys
+
     def is_descriptor_subclass(self, sub, super):
         """Checks whether a descriptor subclasses another.
         """
+        descriptors_by_id = self.descriptors_by_id
+        if descriptors_by_id.get(sub.id) is sub:
+            if super._module is not None:
+                return super._module in self._get_ancestor_keys(sub)
+            elif descriptors_by_id.get(super.id) is super:
+                return super.id in self._get_ancestor_keys(sub)
+
+        # unregistered descriptors, walk the hierarchy
         if sub.module is not None and super.module is not None:
             return issubclass(sub.module, super.module)
 
@@ -2121,6 +2316,7 @@ class ModuleRegistry(DBRegistry):
     def hide_module(self, descriptor):
         self.signals.emit_hide_module(descriptor)
     def update_module(self, old_descriptor, new_descriptor):
+        self.generation += 1
         self.signals.emit_module_updated(old_descriptor, new_descriptor)
 
     def expand_port_spec_string(self, p_string, cur_package=None,
@@ -2162,3 +2358,37 @@ class TestModuleRegistry(unittest.TestCase):
         t1 = PortSpec(signature=[Float, Integer])
         t2 = PortSpec(signature=[Integer, Float])
         self.assertNotEquals(t1, t2)
+
+    def test_subclass_index(self):
+        from vistrails.core.modules.basic_modules import Constant, Float, \
+            Integer, String
+        reg = get_module_registry()
+        float_desc = reg.get_descriptor(Float)
+        integer_desc = reg.get_descriptor(Integer)
+        string_desc = reg.get_descriptor(String)
+        constant_desc = reg.get_descriptor(Constant)
+        module_desc = reg.get_basic_descriptor('Module')
+        self.assertTrue(reg.is_descriptor_subclass(float_desc, constant_desc))
+        self.assertTrue(reg.is_descriptor_subclass(float_desc, module_desc))
+        self.assertTrue(reg.is_descriptor_subclass(float_desc, float_desc))
+        self.assertFalse(reg.is_descriptor_subclass(constant_desc,
+                                                    float_desc))
+        self.assertFalse(reg.is_descriptor_subclass(string_desc, float_desc))
+        self.assertEqual(reg.is_descriptor_subclass(integer_desc, float_desc),
+                         issubclass(Integer, Float))
+        self.assertIn(float_desc.id, reg._ancestor_keys)
+
+        # descriptors that are not the registry's own take the slow path
+        other_float = ModuleDescriptor(id=float_desc.id,
+                                       package=float_desc.package,
+                                       name=float_desc.name,
+                                       base_descriptor_id=constant_desc.id)
+        self.assertIsNone(other_float.module)
+        self.assertTrue(reg.is_descriptor_subclass(other_float,
+                                                   constant_desc))
+        self.assertFalse(reg.is_descriptor_subclass(other_float,
+                                                    string_desc))
+
+        reg.reset_subclass_index()
+        self.assertEqual(reg._ancestor_keys, {})
+        self.assertTrue(reg.is_descriptor_subclass(float_desc, constant_desc))
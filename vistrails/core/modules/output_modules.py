@@ -43,7 +43,8 @@ import unittest
 import warnings
 
 from vistrails.core.configuration import ConfigurationObject, ConfigField, ConfigPath, get_vistrails_persistent_configuration, get_vistrails_temp_configuration
-from vistrails.core.modules.vistrails_module import Module, NotCacheable, ModuleError
+from vistrails.core.modules.vistrails_module import Module, NotCacheable, \
+    NotThreadSafe, ModuleError
 from vistrails.core.modules.config import IPort, ModuleSettings
 import vistrails.core.system
 
@@ -224,7 +225,7 @@ class OutputModeConfig(dict):
         return (self.has_field(k) or dict.__hasitem__(self, k) or 
                 self.has_override(k) or self.has_global_setting(k))
 
-class OutputModule(NotCacheable, Module):
+class OutputModule(NotCacheable, NotThreadSafe, Module):
     """A configurable, pluggable sink module.
 
     OutputModule subclasses define different types that can be outputted. Each
@@ -140,6 +140,8 @@ class Package(DBPackage):
             self._init_module = None
             self._loaded = False
             self._initialized = False
+            self._lazy = False
+            self._lazy_hooks = set()
             self._abs_pkg_upgrades = {}
             self.package_dir = None
             self.prefix = None
@@ -152,6 +154,8 @@ class Package(DBPackage):
             self._init_module = other._init_module
             self._loaded = other._loaded
             self._initialized = other._initialized
+            self._lazy = other._lazy
+            self._lazy_hooks = copy.copy(other._lazy_hooks)
             self._abs_pkg_upgrades = copy.copy(other._abs_pkg_upgrades)
             self.package_dir = other.package_dir
             self.prefix = other.prefix
@@ -227,6 +231,7 @@ class Package(DBPackage):
     module = property(_get_module)
 
     def _get_init_module(self):
+        self.initialize_lazy()
         return self._init_module
     init_module = property(_get_init_module)
 
@@ -492,9 +497,13 @@ class Package(DBPackage):
             self.description = "(No description available)"
 
     def can_handle_all_errors(self):
+        if self._lazy:
+            return 'handle_all_errors' in self._lazy_hooks
         return hasattr(self._init_module, 'handle_all_errors')
 
     def can_handle_upgrades(self):
+        if self._lazy:
+            return 'handle_module_upgrade_request' in self._lazy_hooks
         return hasattr(self._init_module, 'handle_module_upgrade_request')
 
     def can_handle_identifier(self, identifier):
@@ -526,13 +535,15 @@ class Package(DBPackage):
             return False
 
     def can_handle_missing_modules(self):
+        if self._lazy:
+            return 'handle_missing_module' in self._lazy_hooks
         return hasattr(self._init_module, 'handle_missing_module')
 
     def handle_all_errors(self, *args, **kwargs):
-        return self._init_module.handle_all_errors(*args, **kwargs)
+        return self.init_module.handle_all_errors(*args, **kwargs)
 
     def handle_module_upgrade_request(self, *args, **kwargs):
-        return self._init_module.handle_module_upgrade_request(*args, **kwargs)
+        return self.init_module.handle_module_upgrade_request(*args, **kwargs)
         
     def handle_missing_module(self, *args, **kwargs):
         """report_missing_module(name, namespace):
@@ -541,7 +552,7 @@ class Package(DBPackage):
         present, to allow the package to dynamically add a missing
         module.
         """
-        return self._init_module.handle_missing_module(*args, **kwargs)
+        return self.init_module.handle_missing_module(*args, **kwargs)
 
     def add_abs_upgrade(self, new_desc, name, namespace, module_version):
         key = (name, namespace)
@@ -686,6 +697,25 @@ class Package(DBPackage):
     def initialized(self):
         return self._initialized
 
+    def is_lazy(self):
+        """is_lazy() -> bool
+
+        Whether the package was registered from its manifest and has not
+        been initialized yet.
+        """
+        return self._lazy
+
+    def initialize_lazy(self):
+        """initialize_lazy() -> None
+
+        Initializes a package registered from its manifest, along with its
+        dependencies. This is a NOP if the package is not lazy.
+        """
+        if self._lazy:
+            from vistrails.core.packagemanager import get_package_manager
+            get_package_manager().initialize_lazy_package(self.identifier,
+                                                          self.version)
+
     ##########################################################################
     # Configuration
 
@@ -0,0 +1,359 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Manifests of the modules and ports registered by packages.
+
+With the lazyPackageLoading option, the package manager writes a JSON
+manifest for every package version it initializes, listing its module
+descriptors and their port specs. On later startups the registry is
+populated from the manifest and the package's init module is only
+imported when one of its modules is actually used (see
+:meth:`ModuleRegistry.add_lazy_package`).
+
+A manifest is only used if it was written for the same package version,
+VisTrails version and package files (compared by size and modification
+time).
+"""
+
+from __future__ import division
+
+import hashlib
+import json
+import os
+import sys
+
+from vistrails.core import debug
+from vistrails.core.system import get_vistrails_basic_pkg_id, \
+    get_vistrails_directory, vistrails_version
+
+
+MANIFEST_VERSION = 1
+
+# init module functions that are only checked for until they are called;
+# lazy packages answer from the manifest and get initialized on the call
+LAZY_HOOKS = ['handle_all_errors', 'handle_module_upgrade_request',
+              'handle_missing_module']
+
+# init module attributes that are used at startup or on every file load;
+# packages that have them are always initialized
+EAGER_HOOKS = ['menu_items', 'context_menu', 'contextMenuName',
+               'callContextMenu', 'loadVistrailFileHook',
+               'saveVistrailFileHook', '_subworkflows']
+
+# these register the root descriptor or abstractions and are never lazy
+EAGER_PACKAGES = ['local.abstractions']
+
+
+def get_manifest_filename(package):
+    """get_manifest_filename(package: Package) -> str
+
+    Returns the path of the manifest for a package version, or None if
+    no manifest directory is configured.
+    """
+    dirname = get_vistrails_directory('packageManifestDir')
+    if dirname is None:
+        return None
+    name = '%s-%s.json' % (package.identifier, package.version)
+    name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+    return os.path.join(dirname, name)
+
+
+def compute_source_stamp(package):
+    """compute_source_stamp(package: Package) -> str
+
+    Hashes the name, size and modification time of the package's files,
+    along with the VisTrails and Python versions.
+    """
+    h = hashlib.sha1()
+    h.update(repr((MANIFEST_VERSION, vistrails_version(), sys.version,
+                   package.codepath, package.version)))
+    module = sys.modules.get((package.prefix or '') + package.codepath)
+    filename = getattr(module, '__file__', None)
+    if filename is None:
+        return None
+    if os.path.splitext(os.path.basename(filename))[0] == '__init__':
+        paths = []
+        root = os.path.dirname(filename)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            paths.extend(os.path.join(dirpath, f) for f in filenames
+                         if not f.endswith(('.pyc', '.pyo')))
+    else:
+        root = os.path.dirname(filename)
+        paths = [os.path.splitext(filename)[0] + '.py']
+    for path in sorted(paths):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        h.update(repr((os.path.relpath(path, root), st.st_size,
+                       st.st_mtime)))
+    return h.hexdigest()
+
+
+def port_spec_to_dict(spec):
+    """port_spec_to_dict(spec: PortSpec) -> dict
+    """
+    return {'name': spec.name,
+            'type': spec.type,
+            'optional': spec.optional,
+            'sort_key': spec.sort_key,
+            'min_conns': spec.min_conns,
+            'max_conns': spec.max_conns,
+            'depth': spec.depth,
+            'union': spec.union,
+            'docstring': spec.docstring(),
+            'shape': spec.shape(),
+            'items': [{'pos': item.pos,
+                       'package': item.package,
+                       'module': item.module,
+                       'namespace': item.namespace,
+                       'label': item.label,
+                       'default': item.default,
+                       'values': item.db_values,
+                       'entry_type': item.entry_type}
+                      for item in spec.port_spec_items]}
+
+
+def descriptor_to_dict(descriptor):
+    """descriptor_to_dict(descriptor: ModuleDescriptor) -> dict
+    """
+    base = descriptor.base_descriptor
+    if base is not None:
+        base = [base.identifier, base.name, base.namespace]
+    return {'name': descriptor.name,
+            'namespace': descriptor.namespace,
+            'version': descriptor.version,
+            'base': base,
+            'abstract': descriptor.module_abstract(),
+            'hidden': descriptor.is_hidden,
+            'namespace_hidden': descriptor.namespace_hidden,
+            'color': descriptor.module_color(),
+            'fringe': descriptor.module_fringe(),
+            'ports': [port_spec_to_dict(spec)
+                      for spec in descriptor.port_specs_list]}
+
+
+def build_manifest(registry, package):
+    """build_manifest(registry: ModuleRegistry, package: Package) -> dict
+
+    Describes an initialized package. The 'lazy' entry tells whether the
+    package can be registered from the manifest alone.
+    """
+    init_module = package.init_module
+    lazy = (package.identifier != get_vistrails_basic_pkg_id() and
+            package.identifier not in EAGER_PACKAGES and
+            not any(hasattr(init_module, attr) for attr in EAGER_HOOKS) and
+            not any(key[0] == package.identifier
+                    for key in registry._constant_hasher_map))
+    modules = []
+    if lazy:
+        for descriptor in package.descriptor_list:
+            if descriptor.module is None:
+                lazy = False
+                break
+            modules.append(descriptor_to_dict(descriptor))
+    return {'manifest_version': MANIFEST_VERSION,
+            'identifier': package.identifier,
+            'version': package.version,
+            'stamp': compute_source_stamp(package),
+            'lazy': lazy,
+            'hooks': [attr for attr in LAZY_HOOKS
+                      if hasattr(init_module, attr)],
+            'modules': modules if lazy else []}
+
+
+def save_manifest(registry, package):
+    """save_manifest(registry: ModuleRegistry, package: Package) -> None
+
+    Writes the manifest of an initialized package. Failures are only
+    reported as warnings.
+    """
+    filename = get_manifest_filename(package)
+    if filename is None:
+        return
+    try:
+        manifest = build_manifest(registry, package)
+        if manifest['stamp'] is None:
+            return
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            json.dump(manifest, f)
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp_filename, filename)
+    except Exception, e:
+        debug.warning("Couldn't save the manifest of package %s" %
+                      package.identifier, e)
+
+
+def _to_str(obj):
+    """Converts the unicode strings json returns back to str if they are
+    plain ASCII.
+    """
+    if isinstance(obj, unicode):
+        try:
+            return str(obj)
+        except UnicodeEncodeError:
+            return obj
+    elif isinstance(obj, list):
+        return [_to_str(o) for o in obj]
+    elif isinstance(obj, dict):
+        return dict((_to_str(k), _to_str(v)) for k, v in obj.iteritems())
+    return obj
+
+
+def load_manifest(package):
+    """load_manifest(package: Package) -> dict
+
+    Returns the manifest of a loaded package, or None if there is none
+    or it is out of date.
+    """
+    filename = get_manifest_filename(package)
+    if filename is None or not os.path.isfile(filename):
+        return None
+    try:
+        with open(filename, 'rb') as f:
+            manifest = _to_str(json.load(f))
+    except Exception, e:
+        debug.warning("Couldn't read the manifest of package %s" %
+                      package.identifier, e)
+        return None
+    if (manifest.get('manifest_version') != MANIFEST_VERSION or
+            manifest.get('identifier') != package.identifier or
+            manifest.get('version') != package.version or
+            manifest.get('stamp') != compute_source_stamp(package)):
+        return None
+    return manifest
+
+##############################################################################
+
+import unittest
+
+
+class TestPackageManifest(unittest.TestCase):
+    identifier = 'org.vistrails.vistrails.tests.lazy'
+
+    def make_manifest(self, base_name='Module'):
+        from vistrails.core.modules.module_registry import get_module_registry
+        reg = get_module_registry()
+        basic_pkg = get_vistrails_basic_pkg_id()
+        value = reg.create_port_spec('value', 'input',
+                                     sigstring='(%s:String)' % basic_pkg)
+        result = reg.create_port_spec('result', 'output',
+                                      sigstring='(%s:Integer)' % basic_pkg)
+        def module(name, base, ports):
+            return {'name': name, 'namespace': '', 'version': '',
+                    'base': base, 'abstract': False, 'hidden': False,
+                    'namespace_hidden': False, 'color': None,
+                    'fringe': None,
+                    'ports': [port_spec_to_dict(p) for p in ports]}
+        manifest = {'hooks': ['handle_module_upgrade_request'],
+                    'modules': [
+                        module('LazyBase', [basic_pkg, base_name, ''],
+                               [value]),
+                        module('LazyChild', [self.identifier, 'LazyBase', ''],
+                               [result])]}
+        # what is read back from the file
+        return _to_str(json.loads(json.dumps(manifest)))
+
+    def make_package(self):
+        from vistrails.core.modules.module_registry import get_module_registry
+        pkg = get_module_registry().create_package('lazy_test',
+                                                   load_configuration=False)
+        pkg.identifier = self.identifier
+        pkg.name = 'Lazy test'
+        pkg.version = '0.1'
+        return pkg
+
+    def test_missing_base(self):
+        from vistrails.core.modules.module_registry import get_module_registry
+        reg = get_module_registry()
+        pkg = self.make_package()
+        self.assertFalse(reg.add_lazy_package(
+                pkg, self.make_manifest('NoSuchModule')))
+        self.assertNotIn((pkg.identifier, pkg.version), reg.package_versions)
+        self.assertFalse(pkg.is_lazy())
+
+    def test_lazy_registration(self):
+        from vistrails.core.modules.module_registry import get_module_registry
+        from vistrails.core.modules.vistrails_module import Module
+        reg = get_module_registry()
+        pkg = self.make_package()
+        self.assertTrue(reg.add_lazy_package(pkg, self.make_manifest()))
+        try:
+            self.assertTrue(pkg.is_lazy())
+            self.assertTrue(pkg.can_handle_upgrades())
+            self.assertFalse(pkg.can_handle_missing_modules())
+            base = reg.get_descriptor_by_name(self.identifier, 'LazyBase')
+            child = reg.get_descriptor_by_name(self.identifier, 'LazyChild')
+            self.assertTrue(child.is_lazy)
+            self.assertIsNone(child._module)
+            self.assertTrue(reg.is_descriptor_subclass(child, base))
+            self.assertTrue(reg.is_descriptor_subclass(
+                    child, reg.get_basic_descriptor('Module')))
+            self.assertFalse(reg.is_descriptor_subclass(base, child))
+            self.assertEqual([d.name for d in reg.get_module_hierarchy(child)],
+                             ['LazyChild', 'LazyBase', 'Module'])
+            self.assertTrue(reg.has_port_spec_from_descriptor(
+                    child, 'value', 'input'))
+            spec = reg.get_port_spec_from_descriptor(child, 'result', 'output')
+            self.assertEqual(spec.sigstring,
+                             '(%s:Integer)' % get_vistrails_basic_pkg_id())
+
+            # initializing the package fills in the same descriptors
+            class LazyBase(Module):
+                _input_ports = [('value', 'basic:String')]
+            class LazyChild(LazyBase):
+                _output_ports = [('result', 'basic:Integer')]
+            pkg._lazy = False
+            reg.set_current_package(pkg)
+            try:
+                reg.add_module(LazyBase)
+                reg.add_module(LazyChild)
+                reg.auto_add_ports(LazyBase)
+                reg.auto_add_ports(LazyChild)
+            finally:
+                reg.set_current_package(None)
+            self.assertIs(reg.get_descriptor(LazyChild), child)
+            self.assertFalse(child.is_lazy)
+            self.assertIs(child.module, LazyChild)
+            self.assertEqual(len(child.port_specs_list), 1)
+            self.assertTrue(reg.is_descriptor_subclass(child, base))
+        finally:
+            reg.remove_package(pkg)
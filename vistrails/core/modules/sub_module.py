@@ -148,6 +148,9 @@ def group_signature(pipeline, module, chm):
             sig = Hasher.module_signature(input_module, chm)
         input_module._input_port_signature = sig
 
+    for input_module in module._input_remap.itervalues():
+        module.pipeline.mark_signatures_dirty(input_module.vtType,
+                                              input_module.id)
     module.pipeline.refresh_signatures()
 
     sig_list = []
@@ -237,6 +240,10 @@ class Group(Module):
     def is_cacheable(self):
         return all(m.is_cacheable() for m in self.persistent_modules)
 
+    def is_thread_safe(self):
+        # Sets up its subpipeline in the interpreter's persistent pipeline
+        return False
+
     def transfer_attrs(self, module):
         self.pipeline = module.pipeline
         if module._port_specs is None:
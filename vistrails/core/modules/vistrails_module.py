@@ -38,8 +38,9 @@ from __future__ import division
 import ast
 from base64 import b16encode, b16decode
 import copy
-from itertools import izip, product, chain
+from itertools import izip, islice, product, chain
 import json
+import sys
 import time
 import traceback
 import warnings
@@ -380,6 +381,18 @@ class Module(object):
         """
         return True
 
+    def is_thread_safe(self):
+        """Returns whether this Module can be updated from a worker thread.
+
+        When parallel execution is enabled (executionThreads configuration
+        option), the interpreter updates independent modules concurrently.
+        Modules that are not thread-safe, for instance because they use the
+        GUI, are always updated from the interpreter's thread; subclass from
+        the NotThreadSafe mixin to get this behavior.
+
+        """
+        return True
+
     def update_upstream_port(self, port_name):
         """Updates upstream of a single port instead of all ports.
 
@@ -642,11 +655,36 @@ class Module(object):
             return self.control_params[ModuleControlParam.LOOP_KEY]
         return default
 
+    def get_loop_threads(self):
+        """Returns the number of threads compute_all() iterates on.
+
+        This is the loop_threads control parameter if set, else the
+        loopThreads configuration option. Modules that are not thread-safe,
+        and the loops nested in an iteration that is already running on a
+        worker thread, iterate on the current thread.
+
+        """
+        from vistrails.core.interpreter.scheduler import in_iteration_worker
+        if not self.is_thread_safe() or in_iteration_worker():
+            return 1
+        if ModuleControlParam.LOOP_THREADS_KEY in self.control_params:
+            try:
+                return int(self.control_params[
+                        ModuleControlParam.LOOP_THREADS_KEY])
+            except ValueError:
+                raise ModuleError(self, "Invalid number of loop threads: %s" %
+                                  self.control_params[
+                                      ModuleControlParam.LOOP_THREADS_KEY])
+        return getattr(get_vistrails_configuration(), 'loopThreads', 0)
+
     def compute_all(self):
         """This method executes the module once for each input.
 
         Similarly to controlflow's fold, it calls update() in a loop to handle
-        lists of inputs.
+        lists of inputs. If get_loop_threads() is more than 1, the iterations
+        are updated on a pool of threads, but still logged and collected in
+        order. Modules implementing compute_batch() get the whole lists in a
+        single call instead.
 
         """
         from vistrails.core.modules.sub_module import InputPort
@@ -675,30 +713,67 @@ class Module(object):
 
         elements, port_names = self.do_combine(combine_type, inputs, port_names)
         num_inputs = len(elements)
+
+        type_checked = False
+        if (self.list_depth == 1 and self.has_compute_batch() and
+                ModuleControlParam.WHILE_COND_KEY not in self.control_params and
+                ModuleControlParam.WHILE_MAX_KEY not in self.control_params):
+            self.typeChecking(self, port_names, elements)
+            type_checked = True
+            if self.update_batch(port_names, elements):
+                return
+
         loop = self.logging.begin_loop_execution(self, num_inputs)
-        ## Update everything for each value inside the list
-        outputs = {}
-        for i in xrange(num_inputs):
-            self.logging.update_progress(self, float(i)/num_inputs)
-            module = copy.copy(self)
-            module.list_depth = self.list_depth - 1
-            module.had_error = False
-            module.was_suspended = False
-
-            if not self.upToDate: # pragma: no partial
-                ## Type checking if first iteration and last iteration level
-                if i == 0 and self.list_depth == 1:
-                    self.typeChecking(module, port_names, elements)
+        nb_threads = self.get_loop_threads()
+        pool = None
+        if nb_threads > 1 and num_inputs > 1:
+            from vistrails.core.interpreter.scheduler import IterationPool
+            pool = IterationPool(nb_threads)
+
+        def iterations():
+            for i in xrange(num_inputs):
+                self.logging.update_progress(self, float(i)/num_inputs)
+                module = copy.copy(self)
+                module.list_depth = self.list_depth - 1
+                module.had_error = False
+                module.was_suspended = False
+                if pool is not None:
+                    module.logging = pool.wrap_logging(self.logging)
 
-                module.upToDate = False
-                module.computed = False
-                self.setInputValues(module, port_names, elements[i], i)
+                if not self.upToDate: # pragma: no partial
+                    ## Type checking if first iteration and last iteration level
+                    if i == 0 and self.list_depth == 1 and not type_checked:
+                        self.typeChecking(module, port_names, elements)
 
-            loop.begin_iteration(module, i)
+                    module.upToDate = False
+                    module.computed = False
+                    self.setInputValues(module, port_names, elements[i], i)
 
-            try:
-                module.update()
-            except ModuleSuspended, e:
+                loop.begin_iteration(module, i)
+                yield i, module
+
+        def update_all():
+            for i, module in iterations():
+                try:
+                    module.update()
+                except ModuleSuspended:
+                    yield i, module, sys.exc_info()
+                else:
+                    yield i, module, None
+
+        if pool is not None:
+            updated = pool.imap(iterations())
+        else:
+            updated = update_all()
+
+        ## Update everything for each value inside the list
+        outputs = {}
+        for i, module, exc_info in updated:
+            if exc_info is not None:
+                e = exc_info[1]
+                if not isinstance(e, ModuleSuspended):
+                    updated.close()
+                    raise exc_info[0], exc_info[1], exc_info[2]
                 e.loop_iteration = i
                 module.logging.end_update(module, e, was_suspended=True)
                 suspended.append(e)
@@ -729,6 +804,61 @@ class Module(object):
             self.set_output(nameOutput, outputs[nameOutput])
         loop.end_loop_execution()
 
+    def has_compute_batch(self):
+        """Returns whether this module overrides compute_batch().
+
+        A compute_batch() inherited from a class whose compute() is
+        overridden doesn't count, since it would skip the subclass's
+        compute().
+
+        """
+        def defining_class(name):
+            for klass in type(self).__mro__:
+                if name in klass.__dict__:
+                    return klass
+        batch_class = defining_class('compute_batch')
+        return (batch_class is not Module and
+                issubclass(batch_class, defining_class('compute')))
+
+    def update_batch(self, port_names, elements):
+        """Computes the iterations of compute_all() with compute_batch().
+
+        port_names are the iterated ports and elements the tuples of their
+        values for each iteration. The list of values of each output port
+        are set as outputs. Returns False if compute_batch() declined, in
+        which case nothing was computed.
+
+        """
+        # read the other ports as the per-element copies would
+        self.list_depth -= 1
+        try:
+            return self.set_batch_outputs(port_names, elements)
+        finally:
+            self.list_depth += 1
+
+    def set_batch_outputs(self, port_names, elements):
+        """Calls compute_batch() with the columns of elements.
+
+        The lists of values it returns are set as outputs. Returns False if
+        compute_batch() declined.
+
+        """
+        columns = dict((port_name, [element[i] for element in elements])
+                       for i, port_name in enumerate(port_names))
+        outputs = self.compute_batch(columns)
+        if outputs is NotImplemented:
+            return False
+        for port_name, values in outputs.iteritems():
+            values = list(values)
+            if len(values) != len(elements):
+                raise ModuleError(self,
+                                  "compute_batch() returned %d values for "
+                                  "port %s instead of %d" % (
+                                          len(values), port_name,
+                                          len(elements)))
+            self.set_output(port_name, values)
+        return True
+
     def build_stream(self):
         """Determines and builds correct generator type.
 
@@ -737,7 +867,11 @@ class Module(object):
         if True in [g.accumulated for g in self.streamed_ports.values()]:
             # the module can only compute once the streaming is finished
             self.compute_after_streaming()
-        elif self.list_depth > 0:
+            return
+        if len(set(g.chunk_size for g in self.streamed_ports.values())) > 1:
+            raise ModuleError(self, "Cannot combine streams with different "
+                                    "chunk sizes")
+        if self.list_depth > 0:
             # iterate the module for each value in the stream
             self.compute_streaming()
         elif isinstance(self, Streaming) or\
@@ -755,6 +889,9 @@ class Module(object):
         """This method creates a generator object and sets the outputs as
         generators.
 
+        The stream is read one chunk of values at a time. When the module
+        implements compute_batch(), it is called once for each chunk.
+
         """
         from vistrails.core.modules.basic_modules import Generator
         type = self.control_params.get(ModuleControlParam.LOOP_KEY, 'pairwise')
@@ -767,22 +904,25 @@ class Module(object):
         ports = [port for port, depth, value in self.iterated_ports
                  if depth == self.list_depth]
         num_inputs = self.iterated_ports[0][2].size
+        chunk_size = self.iterated_ports[0][2].chunk_size
+        batch = (chunk_size > 1 and self.list_depth == 1 and
+                 self.has_compute_batch())
         # the generator will read next from each iterated input port and
         # compute the module again
         module = copy.copy(self)
         module.list_depth = self.list_depth - 1
-        if num_inputs:
-            milestones = [i*num_inputs//10 for i in xrange(1, 11)]
+        output_names = list(self.outputPorts)
         def generator(self):
             self.logging.begin_compute(module)
             i = 0
+            progress = 0
             while 1:
                 iter_dict = dict([(port, (depth, value))
                                   for port, depth, value in
                                   self.iterated_ports])
 
-                elements = [iter_dict[port][1].next() for port in ports]
-                if None in elements:
+                chunks = [iter_dict[port][1].next_chunk() for port in ports]
+                if None in chunks:
                     for name_output in module.outputPorts:
                         module.set_output(name_output, None)
                     if suspended:
@@ -796,37 +936,55 @@ class Module(object):
                     self.logging.end_update(module)
                     yield None
                 if num_inputs:
-                    if i in milestones:
-                        self.logging.update_progress(module, float(i)/num_inputs)
+                    if i * 10 // num_inputs > progress:
+                        progress = i * 10 // num_inputs
+                        self.logging.update_progress(module,
+                                                     float(i)/num_inputs)
                 else:
                     self.logging.update_progress(module, 0.5)
                 module.had_error = False
+                # streams stop with the shortest one
+                elements = zip(*chunks)
                 ## Type checking
                 if i == 0:
-                    self.typeChecking(module, ports, [elements])
+                    self.typeChecking(module, ports, elements[:1])
 
-                module.upToDate = False
-                module.computed = False
+                if batch and module.set_batch_outputs(ports, elements):
+                    i += len(elements)
+                    yield True
+                    continue
 
-                self.setInputValues(module, ports, elements, i)
+                outputs = dict((name, []) for name in output_names)
+                for element in elements:
+                    module.upToDate = False
+                    module.computed = False
 
-                try:
-                    module.compute()
-                except ModuleSuspended, e:
-                    e.loop_iteration = i
-                    suspended.append(e)
-                except Exception, e:
-                    raise ModuleError(module, str(e))
-                i += 1
+                    self.setInputValues(module, ports, element, i)
+
+                    try:
+                        module.compute()
+                    except ModuleSuspended, e:
+                        e.loop_iteration = i
+                        suspended.append(e)
+                    except Exception, e:
+                        raise ModuleError(module, str(e))
+                    if chunk_size > 1:
+                        for name, values in outputs.iteritems():
+                            values.append(module.outputPorts.get(name))
+                    i += 1
+                if chunk_size > 1:
+                    for name, values in outputs.iteritems():
+                        module.set_output(name, values)
                 yield True
 
         _generator = generator(self)
         # set streaming outputs
-        for name_output in self.outputPorts:
+        for name_output in output_names:
             iterator = Generator(size=num_inputs,
                                  module=module,
                                  generator=_generator,
-                                 port=name_output)
+                                 port=name_output,
+                                 chunk_size=chunk_size)
             self.set_output(name_output, iterator)
 
     def compute_accumulate(self):
@@ -835,7 +993,8 @@ class Module(object):
         support streaming.
 
         """
-        from vistrails.core.modules.basic_modules import Generator
+        from vistrails.core.modules.basic_modules import Generator, \
+            SpooledList
         suspended = []
         # max depth should be one
         ports = self.streamed_ports.keys()
@@ -847,18 +1006,24 @@ class Module(object):
         module.upToDate = False
         module.computed = False
 
-        inputs = dict([(port, []) for port in ports])
+        # values past this threshold are spilled to a temporary file
+        max_size = getattr(get_vistrails_configuration(),
+                           'streamSpillThreshold', 0)
+        inputs = dict([(port, SpooledList(max_size)) for port in ports])
         def generator(self):
             self.logging.begin_update(module)
             i = 0
             while 1:
-                elements = [self.streamed_ports[port].next() for port in ports]
-                if None in elements:
+                chunks = [self.streamed_ports[port].next_chunk()
+                          for port in ports]
+                if None in chunks:
                     self.logging.begin_compute(module)
                     # assembled all inputs so do the actual computation
-                    elements = [inputs[port] for port in ports]
+                    elements = [inputs[port] if inputs[port].on_disk
+                                else list(inputs[port])
+                                for port in ports]
                     ## Type checking
-                    self.typeChecking(module, ports, zip(*elements))
+                    self.typeChecking(module, ports, izip(*elements))
                     self.setInputValues(module, ports, elements, i)
                     try:
                         module.compute()
@@ -874,11 +1039,13 @@ class Module(object):
                     self.logging.end_update(module)
                     yield None
 
-                for port, value in zip(ports, elements):
-                    inputs[port].append(value)
+                # streams stop with the shortest one
+                length = min(len(chunk) for chunk in chunks)
+                for port, chunk in izip(ports, chunks):
+                    inputs[port].extend(chunk[:length])
                 for name_output in module.outputPorts:
                     module.set_output(name_output, None)
-                i += 1
+                i += length
                 yield True
 
         _generator = generator(self)
@@ -1112,6 +1279,11 @@ class Module(object):
         from vistrails.core.modules.basic_modules import get_module
         if not module.input_specs:
             return
+        # typecheck only if all params should be type-checked
+        skip_checks = dict(
+                (inputPort,
+                 False in self.get_type_checks(module.input_specs[inputPort]))
+                for inputPort in inputPorts)
         for elementList in inputList:
             if len(elementList) != len(inputPorts):
                 raise ModuleError(self,
@@ -1121,8 +1293,7 @@ class Module(object):
                 if isinstance(element, Generator):
                     raise ModuleError(self, "Generator is not allowed here")
                 port_spec = module.input_specs[inputPort]
-                # typecheck only if all params should be type-checked
-                if False in self.get_type_checks(port_spec):
+                if skip_checks[inputPort]:
                     break
                 v_module = get_module(element, port_spec.signature)
                 if v_module is not None:
@@ -1170,6 +1341,26 @@ class Module(object):
         """
         pass
 
+    def compute_batch(self, columns):
+        """This method can be overridden to compute the module for whole lists
+        of inputs at once.
+
+        When ports receive lists deeper than their spec, compute_all() calls
+        compute() once per element, on a copy of the module. A module
+        implementing compute_batch() instead gets called once, with columns
+        mapping the name of each iterated port to the list of its values, one
+        per iteration (combined according to the loop_type control
+        parameter). The other ports are read with get_input() as usual. It
+        should return a dict mapping output port names to the list of their
+        values, one per iteration; numeric modules can for instance convert
+        the columns to NumPy arrays and return arrays.
+
+        Returning NotImplemented falls back to calling compute() for each
+        element, e.g. for inputs the batch implementation can't handle.
+
+        """
+        return NotImplemented
+
     def get_input(self, port_name, allow_default=True):
         """Returns the value coming in on the input port named **port_name**.
 
@@ -1451,59 +1642,72 @@ class Module(object):
         ports = self.streamed_ports.keys()
         specs = []
         num_inputs = self.streamed_ports[ports[0]].size
+        chunk_size = self.streamed_ports[ports[0]].chunk_size
         module = copy.copy(self)
         module.list_depth = self.list_depth - 1
         module.had_error = False
         module.upToDate = False
         module.computed = False
-
-        if num_inputs:
-            milestones = [i*num_inputs//10 for i in xrange(1, 11)]
+        output_names = list(self.outputPorts)
 
         def _Generator(self):
             self.logging.begin_compute(module)
             i = 0
+            progress = 0
             # <initialize here>
             #intsum = 0
             userGenerator = UserGenerator(module)
             while 1:
-                elements = [self.streamed_ports[port].next() for port in ports]
-                if None in elements:
+                chunks = [self.streamed_ports[port].next_chunk()
+                          for port in ports]
+                if None in chunks:
                     self.logging.update_progress(self, 1.0)
                     self.logging.end_update(module)
                     for name_output in module.outputPorts:
                         module.set_output(name_output, None)
                     yield None
-                ## Type checking
-                self.typeChecking(module, ports, [elements])
-                self.setInputValues(module, ports, elements, i)
-
-                userGenerator.next()
-                # <compute here>
-                #intsum += dict(zip(ports, elements))['integerStream']
-                #print "Sum so far:", intsum
+                outputs = dict((name, []) for name in output_names)
+                # streams stop with the shortest one
+                for elements in izip(*chunks):
+                    ## Type checking
+                    self.typeChecking(module, ports, [elements])
+                    self.setInputValues(module, ports, elements, i)
 
-                # <set output here if any>
-                #module.set_output(name_output, intsum)
+                    userGenerator.next()
+                    # <compute here>
+                    #intsum += dict(zip(ports, elements))['integerStream']
+                    #print "Sum so far:", intsum
+
+                    # <set output here if any>
+                    #module.set_output(name_output, intsum)
+                    if chunk_size > 1:
+                        for name, values in outputs.iteritems():
+                            values.append(module.outputPorts.get(name))
+                    i += 1
+                if chunk_size > 1:
+                    for name, values in outputs.iteritems():
+                        module.set_output(name, values)
                 if num_inputs:
-                    if i in milestones:
-                        self.logging.update_progress(self, float(i)/num_inputs)
+                    if i * 10 // num_inputs > progress:
+                        progress = i * 10 // num_inputs
+                        self.logging.update_progress(self,
+                                                     float(i)/num_inputs)
                 else:
                     self.logging.update_progress(self, 0.5)
-                i += 1
                 yield True
 
         generator = _Generator(self)
         # sets streaming outputs for downstream modules
-        for name_output in self.outputPorts:
+        for name_output in output_names:
             iterator = Generator(size=num_inputs,
                                  module=module,
                                  generator=generator,
-                                 port=name_output)
+                                 port=name_output,
+                                 chunk_size=chunk_size)
 
             self.set_output(name_output, iterator)
 
-    def set_streaming_output(self, port, generator, size=0):
+    def set_streaming_output(self, port, generator, size=0, chunk_size=None):
         """This method is used to set a streaming output port.
 
         :param port: the name of the output port to be set
@@ -1511,42 +1715,58 @@ class Module(object):
         :param generator: An iterator object supporting .next()
         :param size: The number of values if known (default=0)
         :type size: int
+        :param chunk_size: The number of values passed downstream at once
+            (default is the streamChunkSize configuration option)
+        :type chunk_size: int
         """
         from vistrails.core.modules.basic_modules import Generator
         module = copy.copy(self)
+        if chunk_size is None:
+            chunk_size = getattr(get_vistrails_configuration(),
+                                 'streamChunkSize', 1)
+        chunk_size = max(1, chunk_size)
+        generator = iter(generator)
 
-        if size:
-            milestones = [i*size//10 for i in xrange(1, 11)]
         def _Generator():
             i = 0
+            progress = 0
+            source = generator
             while 1:
                 try:
-                    value = generator.next()
-                except StopIteration:
-                    module.set_output(port, None)
-                    self.logging.update_progress(self, 1.0)
-                    yield None
+                    values = list(islice(source, chunk_size))
                 except Exception, e:
                     me = ModuleError(self, "Error generating value: %s"% str(e),
                                       errorTrace=str(e))
                     raise me
-                if value is None:
+                # None also ends the stream; compared by identity since
+                # values like arrays don't compare to None as booleans
+                end = next((j for j, value in enumerate(values)
+                            if value is None), None)
+                if end is not None:
+                    values = values[:end]
+                    source = iter(())
+                if not values:
                     module.set_output(port, None)
                     self.logging.update_progress(self, 1.0)
                     yield None
-                module.set_output(port, value)
+                if chunk_size > 1:
+                    module.set_output(port, values)
+                else:
+                    module.set_output(port, values[0])
                 if size:
-                    if i in milestones:
+                    if i * 10 // size > progress:
+                        progress = i * 10 // size
                         self.logging.update_progress(self, float(i)/size)
                 else:
                     self.logging.update_progress(self, 0.5)
-                i += 1
+                i += len(values)
                 yield True
         _generator = _Generator()
         self.set_output(port, Generator(size=size,
                                         module=module,
                                         generator=_generator,
-                                        port=port))
+                                        port=port,
+                                        chunk_size=chunk_size))
 
     def job_monitor(self):
         """Returns the JobMonitor for the associated controller if it exists.
@@ -1631,6 +1851,16 @@ class NotCacheable(object):
 
 ################################################################################
 
+class NotThreadSafe(object):
+    """ A mixin for modules that must not be updated from worker threads
+
+    """
+
+    def is_thread_safe(self):
+        return False
+
+################################################################################
+
 class Streaming(object):
     """ A mixin indicating support for streamable inputs
 
@@ -1830,6 +2060,89 @@ def new_module(base_module, name, class_dict={}, docstring=None):
 
 import unittest
 
+class TestComputeBatch(unittest.TestCase):
+    calc = 'org.vistrails.vistrails.pythoncalc'
+
+    @classmethod
+    def setUpClass(cls):
+        from vistrails.tests.utils import enable_package
+        enable_package(cls.calc)
+
+    def run_calc(self, op, values):
+        from vistrails.core.system import get_vistrails_basic_pkg_id
+        from vistrails.packages.pythonCalc.init import PythonCalc
+        from vistrails.tests.utils import execute, intercept_result
+
+        calls = []
+        old_compute = PythonCalc.compute
+        old_compute_batch = PythonCalc.compute_batch
+        def compute(module):
+            calls.append('compute')
+            old_compute(module)
+        def compute_batch(module, columns):
+            calls.append('compute_batch')
+            return old_compute_batch(module, columns)
+        PythonCalc.compute = compute
+        PythonCalc.compute_batch = compute_batch
+        modules = [('List', get_vistrails_basic_pkg_id(),
+                    [('value', [('List', repr(values))])]),
+                   ('PythonCalc', self.calc,
+                    [('value1', [('Float', '10.0')])])]
+        connections = [(0, 'value', 1, 'value2')]
+        if isinstance(op, list):
+            modules.append(('List', get_vistrails_basic_pkg_id(),
+                            [('value', [('List', repr(op))])]))
+            connections.append((2, 'value', 1, 'op'))
+        else:
+            modules[1][2].append(('op', [('String', op)]))
+        try:
+            with intercept_result(PythonCalc, 'value') as results:
+                errors = execute(modules, connections)
+        finally:
+            PythonCalc.compute = old_compute
+            PythonCalc.compute_batch = old_compute_batch
+        return errors, results, calls
+
+    def test_batch(self):
+        """compute_batch() computes the whole lists in one call.
+        """
+        errors, results, calls = self.run_calc('-', [1.0, 2.0, 4.0])
+        self.assertFalse(errors)
+        self.assertEqual(calls, ['compute_batch'])
+        self.assertEqual(results, [[9.0, 8.0, 6.0]])
+
+    def test_fallback(self):
+        """compute() is called for each element if compute_batch() declines.
+        """
+        errors, results, calls = self.run_calc(['+', '*'], [1.0, 2.0])
+        self.assertFalse(errors)
+        self.assertEqual(calls, ['compute_batch'] + ['compute'] * 4)
+        self.assertEqual(results[-1], [11.0, 10.0, 12.0, 20.0])
+
+    def test_error(self):
+        errors, results, calls = self.run_calc('/', [1.0, 0.0])
+        self.assertEqual(calls, ['compute_batch'])
+        self.assertEqual(len(errors), 1)
+
+    def test_overridden_compute(self):
+        """A subclass overriding compute() doesn't inherit compute_batch().
+        """
+        from vistrails.packages.pythonCalc.init import PythonCalc
+
+        class Compute(PythonCalc):
+            def compute(self):
+                pass
+        class ComputeBatch(Compute):
+            def compute_batch(self, columns):
+                return None
+        class Other(PythonCalc):
+            pass
+        self.assertTrue(PythonCalc().has_compute_batch())
+        self.assertTrue(Other().has_compute_batch())
+        self.assertFalse(Compute().has_compute_batch())
+        self.assertTrue(ComputeBatch().has_compute_batch())
+        self.assertFalse(Module().has_compute_batch())
+
 class TestImplicitLooping(unittest.TestCase):
     def run_vt(self, vt_basename):
         from vistrails.core.system import vistrails_root_directory
@@ -1863,3 +2176,170 @@ class TestImplicitLooping(unittest.TestCase):
 
     def test_list_custom(self):
         self.run_vt("test-list-custom.vt")
+
+    def test_list_custom_threads(self):
+        from vistrails.core.interpreter.scheduler import loop_threads
+        with loop_threads(4):
+            self.run_vt("test-list-custom.vt")
+
+    def test_loop_threads(self):
+        from vistrails.core.interpreter.scheduler import loop_threads
+        module = Module()
+        with loop_threads(3):
+            self.assertEqual(module.get_loop_threads(), 3)
+            module.control_params[ModuleControlParam.LOOP_THREADS_KEY] = '2'
+            self.assertEqual(module.get_loop_threads(), 2)
+            module.is_thread_safe = lambda: False
+            self.assertEqual(module.get_loop_threads(), 1)
+
+
+class TestChunkedStreaming(unittest.TestCase):
+    calc = 'org.vistrails.vistrails.pythoncalc'
+
+    @classmethod
+    def setUpClass(cls):
+        from vistrails.tests.utils import enable_package
+        enable_package(cls.calc)
+
+    def setUp(self):
+        configuration = get_vistrails_configuration()
+        self.old_config = (configuration.streamChunkSize,
+                           configuration.streamSpillThreshold)
+
+    def tearDown(self):
+        configuration = get_vistrails_configuration()
+        (configuration.streamChunkSize,
+         configuration.streamSpillThreshold) = self.old_config
+
+    def run_stream(self, size, chunk_size, spill=0, sources=None,
+                   batch=True):
+        """Streams range(size) through PythonCalc('+', 10) into a sink.
+        """
+        import urllib
+        from vistrails.core.modules.basic_modules import PythonSource
+        from vistrails.core.system import get_vistrails_basic_pkg_id
+        from vistrails.packages.pythonCalc.init import PythonCalc
+        from vistrails.tests.utils import execute, intercept_result
+
+        configuration = get_vistrails_configuration()
+        configuration.streamChunkSize = chunk_size
+        configuration.streamSpillThreshold = spill
+
+        basic = get_vistrails_basic_pkg_id()
+        if sources is None:
+            sources = ["self.set_streaming_output('out', iter(range(%d)), "
+                       "%d)" % (size, size)]
+        sink = ("values = self.get_input('values')\n"
+                "r = [type(values).__name__, list(values)]")
+        modules = [('PythonSource', basic,
+                    [('source', [('String', urllib.quote(source))])])
+                   for source in sources]
+        modules.append(('PythonCalc', self.calc,
+                        [('value2', [('Float', '10')]),
+                         ('op', [('String', '+')])]))
+        modules.append(('PythonSource', basic,
+                        [('source', [('String', urllib.quote(sink))])]))
+        calc, sink = len(sources), len(sources) + 1
+        connections = [(0, 'out', calc, 'value1'),
+                       (calc, 'value', sink, 'values')]
+        if len(sources) > 1:
+            connections.append((1, 'out', calc, 'value2'))
+        specs = [(i, 'output', 'out', '(%s:List)' % basic)
+                 for i in xrange(len(sources))]
+        specs.extend([(sink, 'input', 'values', '(%s:List)' % basic),
+                      (sink, 'output', 'r', '(%s:List)' % basic)])
+
+        calls = []
+        old_compute = PythonCalc.compute
+        old_compute_batch = PythonCalc.compute_batch
+        def compute(module):
+            calls.append('compute')
+            old_compute(module)
+        def compute_batch(module, columns):
+            calls.append(len(next(columns.itervalues())))
+            if not batch:
+                return NotImplemented
+            return old_compute_batch(module, columns)
+        PythonCalc.compute = compute
+        PythonCalc.compute_batch = compute_batch
+        try:
+            with intercept_result(PythonSource, 'r') as results:
+                errors = execute(modules, connections, specs)
+        finally:
+            PythonCalc.compute = old_compute
+            PythonCalc.compute_batch = old_compute_batch
+        return errors, results, calls
+
+    def test_unchunked(self):
+        errors, results, calls = self.run_stream(4, 1)
+        self.assertFalse(errors)
+        self.assertEqual(results, [['list', [10.0, 11.0, 12.0, 13.0]]])
+        self.assertEqual(calls, ['compute'] * 4)
+
+    def test_chunks(self):
+        """Each chunk of the stream is computed with compute_batch().
+        """
+        errors, results, calls = self.run_stream(7, 3)
+        self.assertFalse(errors)
+        self.assertEqual(results, [['list', [float(i + 10)
+                                             for i in xrange(7)]]])
+        self.assertEqual(calls, [3, 3, 1])
+
+    def test_chunks_fallback(self):
+        errors, results, calls = self.run_stream(5, 3, batch=False)
+        self.assertFalse(errors)
+        self.assertEqual(results, [['list', [float(i + 10)
+                                             for i in xrange(5)]]])
+        self.assertEqual(calls, [3] + ['compute'] * 3 + [2] + ['compute'] * 2)
+
+    def test_spill(self):
+        """Accumulated streams past the threshold are read from disk.
+        """
+        errors, results, calls = self.run_stream(7, 2, spill=3)
+        self.assertFalse(errors)
+        self.assertEqual(results, [['SpooledList', [float(i + 10)
+                                                    for i in xrange(7)]]])
+
+    def test_array_values(self):
+        """Values that don't compare to None as booleans are streamed.
+        """
+        try:
+            import numpy
+        except ImportError: # pragma: no cover
+            self.skipTest("numpy is not available")
+        import urllib
+        from vistrails.core.modules.basic_modules import PythonSource
+        from vistrails.core.system import get_vistrails_basic_pkg_id
+        from vistrails.tests.utils import execute, intercept_result
+
+        configuration = get_vistrails_configuration()
+        configuration.streamChunkSize = 2
+        basic = get_vistrails_basic_pkg_id()
+        source = ("import numpy\n"
+                  "values = [numpy.array([i, i + 1]) for i in xrange(3)]\n"
+                  "values += [None, numpy.array([7, 8])]\n"
+                  "self.set_streaming_output('out', iter(values), 3)")
+        sink = ("r = [value.tolist() for value in "
+                "self.get_input('values')]")
+        with intercept_result(PythonSource, 'r') as results:
+            errors = execute([
+                    ('PythonSource', basic,
+                     [('source', [('String', urllib.quote(source))])]),
+                    ('PythonSource', basic,
+                     [('source', [('String', urllib.quote(sink))])]),
+                ], [
+                    (0, 'out', 1, 'values'),
+                ], [
+                    (0, 'output', 'out', '(%s:List)' % basic),
+                    (1, 'input', 'values', '(%s:List)' % basic),
+                    (1, 'output', 'r', '(%s:List)' % basic),
+                ])
+        self.assertFalse(errors)
+        self.assertEqual(results, [[[0, 1], [1, 2], [2, 3]]])
+
+    def test_mismatched_chunks(self):
+        sources = ["self.set_streaming_output('out', iter(range(4)), 4, 2)",
+                   "self.set_streaming_output('out', iter(range(4)), 4, 1)"]
+        errors, results, calls = self.run_stream(4, 1, sources=sources)
+        self.assertEqual(len(errors), 1)
+        self.assertIn("different chunk sizes", str(errors.values()[0]))
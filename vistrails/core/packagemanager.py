@@ -54,6 +54,7 @@ import vistrails.core.data_structures.graph
 from vistrails.core.modules.module_registry import MissingPackage, \
     MissingPackageVersion
 from vistrails.core.modules.package import Package
+from vistrails.core.modules import package_manifest
 from vistrails.core.requirements import MissingRequirement
 from vistrails.core.utils import VistrailsInternalError, \
     versions_increasing, VistrailsDeprecation
@@ -670,13 +671,25 @@ class PackageManager(object):
             raise self.DependencyCycle(e.back_edge[0],
                                        e.back_edge[1])
 
+        lazy = getattr(get_vistrails_configuration(), 'lazyPackageLoading',
+                       False)
         for name in sorted_packages:
             pkg = self.get_package(name)
-            if not pkg.initialized():
+            if not pkg.initialized() and not pkg.is_lazy():
                 #check_requirements is now called in pkg.initialize()
                 #pkg.check_requirements()
                 try:
-                    self._registry.initialize_package(pkg)
+                    manifest = None
+                    if lazy:
+                        manifest = package_manifest.load_manifest(pkg)
+                    if manifest is None or not manifest['lazy'] or \
+                            not self._registry.add_lazy_package(pkg,
+                                                                manifest):
+                        self.initialize_lazy_dependencies(pkg.identifier)
+                        self._registry.initialize_package(pkg)
+                        if lazy and (manifest is None or manifest['lazy']):
+                            package_manifest.save_manifest(self._registry,
+                                                           pkg)
                 except MissingRequirement, e:
                     if report_missing_dependencies:
                         debug.critical("Package <codepath %s> is missing a "
@@ -700,6 +713,41 @@ class PackageManager(object):
 
         self._startup.save_persisted_startup()
 
+    def initialize_lazy_dependencies(self, identifier):
+        """initialize_lazy_dependencies(identifier: str) -> None
+
+        Initializes the packages registered from their manifest that a
+        package depends on, since its code may import theirs.
+        """
+        for dep_id in self.all_dependencies(identifier):
+            if dep_id != identifier:
+                dep_pkg = self.get_package(dep_id)
+                if dep_pkg.is_lazy():
+                    self.initialize_lazy_package(dep_pkg.identifier,
+                                                 dep_pkg.version)
+
+    def initialize_lazy_package(self, identifier, version=None):
+        """initialize_lazy_package(identifier: str, version: str) -> None
+
+        Initializes a package that was registered from its manifest, after
+        its dependencies. If that fails, the package is disabled and the
+        error is raised again.
+        """
+        pkg = self.get_package(identifier, version)
+        if not pkg.is_lazy():
+            return
+        self.initialize_lazy_dependencies(pkg.identifier)
+        pkg._lazy = False
+        try:
+            self._registry.initialize_package(pkg)
+        except (MissingRequirement, Package.InitializationFailed), e:
+            debug.critical("Initialization of package <codepath %s> "
+                           "failed and will be disabled" % pkg.codepath,
+                           e)
+            self.late_disable_package(pkg.codepath)
+            raise
+        self.add_menu_items(pkg)
+
     def add_menu_items(self, pkg):
         """Emit the appropriate signal if the package has menu items.
 
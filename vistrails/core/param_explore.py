@@ -39,9 +39,23 @@ This module handles Parameter Exploration in VisTrails
 from __future__ import division
 
 from vistrails.core import debug
+from vistrails.core.cache.result_store import get_result_store
+from vistrails.core.configuration import get_vistrails_configuration
+from vistrails.core.db.io import serialize, unserialize
+from vistrails.core.interpreter.default import get_default_interpreter
+from vistrails.core.log.controller import DummyLogController
+from vistrails.core.log.log import Log
+from vistrails.core.modules.vistrails_module import ModuleError
+from vistrails.core.utils import InstanceObject, VistrailsInternalError
 from vistrails.core.vistrail.module_function import ModuleFunction
 from vistrails.core.vistrail.module_param import ModuleParam
+from vistrails.core.vistrail.pipeline import Pipeline
+from vistrails.core.vistrail.vistrail import Vistrail
+from vistrails.core.worker_pool import WorkerPool
 import copy
+import itertools
+import Queue
+import threading
 
 import unittest
 
@@ -74,6 +88,40 @@ class ParameterExploration(object):
             pipelineList = self.interpolateList(pipelineList, self.specs[i])
         return pipelineList
 
+    def iter_explore(self, pipeline):
+        """ iter_explore(pipeline: VisPipeline)
+                         -> iterator over (tuple, list[InterpolateDiscreteParam])
+        Lazy version of explore() that changes pipeline in place
+        instead of creating all the pipelines. It yields, in the same
+        order as explore(), the position of each cell (its step in each
+        dimension) and the interpolators whose step changed since the
+        previous cell. pipeline holds the values of the cell until the
+        next iteration
+
+        """
+        counts = [max(1, len(interpList) and interpList[0].stepCount)
+                  for interpList in self.specs]
+        added = {}
+        previous = None
+        for reversed_position in itertools.product(*[xrange(count)
+                                                     for count
+                                                     in reversed(counts)]):
+            position = reversed_position[::-1]
+            delta = []
+            for interpList, step, previous_step in itertools.izip_longest(
+                    self.specs, position, previous or ()):
+                if not interpList or step == previous_step:
+                    continue
+                for interp in interpList:
+                    m = pipeline.modules[interp.module.id]
+                    if interp in added:
+                        m.functions.remove(added[interp])
+                    interp.perform(pipeline, step)
+                    added[interp] = m.functions[-1]
+                    delta.append(interp)
+            previous = position
+            yield position, delta
+
     def interpolateList(self, pipelineList, interpList):
         """ interpolateList(pipeline: list[VisPipeLine],
                             interpList: InterpolateDiscreteParam)
@@ -176,6 +224,7 @@ class InterpolateDiscreteParam(object):
             p.strValue = str(v)
             f.params.append(p)
         m.functions.append(f)
+        pipeline.mark_signatures_dirty(m.vtType, m.id)
 
 class ActionBasedParameterExploration(object):
     """
@@ -209,39 +258,490 @@ class ActionBasedParameterExploration(object):
         """
         results = []
         resultActions = []
-        
-        def exploreDimension(pipeline, performedActions, dim):
-            """ exploreDimension(pipeline: Pipeline, performedActions: [actions],
-                                 dim: int) -> None
-            Start applying actions to the pipeline at dimension
-            dim. 'pipeline' will not be modified in the function
-            
-            """
-            if dim<0:
-                results.append(pipeline)
-                resultActions.append(performedActions)
-                return
-            currentActions = actions[dim]
-            if len(currentActions)==0:
-                # Ignore empty dimension
-                exploreDimension(pipeline, performedActions, dim-1)
-                return
-            for actionSet in currentActions:
-                currentPipeline = copy.copy(pipeline)
-                currentPeformedActions = copy.copy(performedActions)
-                for action in actionSet:
-                    currentPipeline.perform_action(action)
-                    currentPeformedActions.append(action)
-                exploreDimension(currentPipeline, currentPeformedActions, dim-1)
-        
-        # perform pre_actions
         currentPipeline = copy.copy(pipeline)
-        for action in pre_actions:
-            currentPipeline.perform_action(action)
-        
-        exploreDimension(currentPipeline, pre_actions, len(actions)-1)
+        for position, delta in self.iter_explore(currentPipeline, actions,
+                                                 pre_actions):
+            results.append(copy.copy(currentPipeline))
+            resultActions.append(self.cell_actions(actions, pre_actions,
+                                                   position))
         return (results, resultActions)
 
+    def iter_explore(self, pipeline, actions, pre_actions=[]):
+        """ iter_explore(pipeline: Pipeline, actions: [action set],
+                         pre_actions: [action set])
+                         -> iterator over (tuple, [Action])
+        Lazy version of explore() that performs the actions on pipeline
+        in place instead of creating all the pipelines, so that its
+        memory use does not depend on the number of cells. It yields,
+        in the same order as explore(), the position of each cell (the
+        index of its action set in each dimension, 0 for empty
+        dimensions) and the actions performed on pipeline since the
+        previous cell. pipeline holds the cell until the next iteration.
+
+        The action sets are expected to change parameters, as the ones
+        from ParameterExploration.collectParameterActions() do: moving
+        a dimension to another step changes the same parameters again.
+        
+        """
+        # parameters of the original pipeline -> id of their current value
+        param_ids = {}
+        previous = None
+        for reversed_position in itertools.product(
+                *[xrange(max(1, len(a))) for a in reversed(actions)]):
+            position = reversed_position[::-1]
+            delta = self.move_to_cell(pipeline, actions, pre_actions,
+                                      position, previous, param_ids)
+            previous = position
+            yield position, delta
+
+    def move_to_cell(self, pipeline, actions, pre_actions, position,
+                     previous, param_ids):
+        """ move_to_cell(pipeline: Pipeline, actions: [action set],
+                         pre_actions: [action set], position: tuple,
+                         previous: tuple, param_ids: dict) -> [Action]
+        Performs on pipeline, which holds the cell at position previous
+        (None for the original pipeline), the actions leading to the
+        cell at position, and returns them. The cells can be visited in
+        any order; param_ids is kept by the caller from one call to the
+        next (see perform_in_place())
+
+        """
+        if previous is None:
+            for action in pre_actions:
+                pipeline.perform_action(action)
+            delta = list(pre_actions)
+        else:
+            delta = []
+        for dim, step in enumerate(position):
+            if not actions[dim] or \
+                    (previous is not None and previous[dim] == step):
+                continue
+            for action in actions[dim][step]:
+                self.perform_in_place(pipeline, action, param_ids)
+                delta.append(action)
+        return delta
+
+    def perform_in_place(self, pipeline, action, param_ids):
+        """ perform_in_place(pipeline: Pipeline, action: Action,
+                             param_ids: dict) -> None
+        Performs action on pipeline, changing the current value of the
+        parameters it changes rather than the value it was created
+        from. param_ids maps the ids of the original parameters to their
+        current one
+
+        """
+        for op in action.operations:
+            if op.vtType == 'change' and op.what == ModuleParam.vtType:
+                old_id = param_ids.get(op.oldObjId, op.oldObjId)
+                pipeline.change_parameter(old_id, op.data,
+                                          op.parentObjType, op.parentObjId)
+                param_ids[op.oldObjId] = op.newObjId
+            else:
+                pipeline.perform_operation(op)
+
+    def cell_position(self, actions, i):
+        """ cell_position(actions: [action set], i: int) -> tuple
+        Returns the position of the i-th cell yielded by iter_explore()
+
+        """
+        position = []
+        for dimActions in actions:
+            count = max(1, len(dimActions))
+            position.append(i % count)
+            i //= count
+        return tuple(position)
+
+    def cell_actions(self, actions, pre_actions, position):
+        """ cell_actions(actions: [action set], pre_actions: [action set],
+                         position: tuple) -> [Action]
+        Returns the actions leading to the pipeline of the cell at
+        position, as explore() does
+
+        """
+        result = list(pre_actions)
+        for dim in reversed(xrange(len(actions))):
+            if actions[dim]:
+                result.extend(actions[dim][position[dim]])
+        return result
+
+class ParameterExplorationExecutor(object):
+    """
+    ParameterExplorationExecutor executes the cells of a parameter
+    exploration.
+
+    If processes is more than 1, the cells are executed by a pool of
+    worker processes (see vistrails.core.worker_pool), started afresh
+    rather than forked from this process. Each worker gets the pipeline
+    and the exploration actions once, then only the positions of the
+    cells to execute, and moves its own copy of the pipeline from cell to
+    cell. Cells whose pipelines have the same signature go to the same
+    worker, so that all but the first are found in its interpreter cache.
+    If results are stored on disk (resultCache), the modules that several
+    cells have in common (same subpipeline signature) are computed first,
+    in this process, and the workers load them from the store instead of
+    each computing them again. Otherwise, the cells are executed in order
+    in this process, where the interpreter cache already shares modules
+    between cells.
+
+    """
+    # the arguments to interpreter.execute() sent to the workers
+    WORKER_KWARGS = ['locator', 'current_version', 'reason', 'extra_info']
+
+    def __init__(self, interpreter, processes=0):
+        """ ParameterExplorationExecutor(interpreter: CachedInterpreter,
+                                          processes: int)
+                                          -> ParameterExplorationExecutor
+        """
+        self.interpreter = interpreter
+        self.processes = processes
+        self.explorer = ActionBasedParameterExploration()
+
+    def group_cells(self, pipeline, actions, pre_actions=[]):
+        """ group_cells(pipeline: Pipeline, actions: [action set],
+                         pre_actions: [action set]) -> ([[int]], dict)
+        Groups the indices of the cells whose pipelines are the same,
+        changing pipeline in place. Also returns the subpipeline
+        signatures of the modules of the first cell of each group, by
+        cell index
+
+        """
+        groups = {}
+        result = []
+        signatures = {}
+        for i, _ in enumerate(self.explorer.iter_explore(pipeline, actions,
+                                                         pre_actions)):
+            pipeline.refresh_signatures()
+            cell_signatures = dict((module_id,
+                                    pipeline.subpipeline_signature(module_id))
+                                   for module_id in pipeline.modules)
+            key = frozenset(cell_signatures.itervalues())
+            if key not in groups:
+                groups[key] = []
+                result.append(groups[key])
+                signatures[i] = cell_signatures
+            groups[key].append(i)
+        return result, signatures
+
+    def find_shared_modules(self, groups, signatures):
+        """ find_shared_modules(groups: [[int]], signatures: dict)
+                                 -> [(int, [module_id])]
+        Finds the modules that appear in the pipelines of several groups,
+        as a list of (cell index, ids of modules in that cell) so that each
+        is computed only once
+
+        """
+        counts = {}
+        for group in groups:
+            for signature in set(signatures[group[0]].itervalues()):
+                counts[signature] = counts.get(signature, 0) + 1
+        done = set()
+        result = []
+        for group in groups:
+            cell_signatures = signatures[group[0]]
+            module_ids = [module_id
+                          for module_id, signature
+                          in cell_signatures.iteritems()
+                          if counts[signature] > 1 and signature not in done]
+            if module_ids:
+                result.append((group[0], module_ids))
+                done.update(cell_signatures[module_id]
+                            for module_id in module_ids)
+        return result
+
+    def get_cell_kwargs(self, get_kwargs, actions, pre_actions, variables,
+                        i):
+        """ get_cell_kwargs(get_kwargs: function, actions: [action set],
+                             pre_actions: [action set], variables: dict,
+                             i: int) -> dict
+        Returns the arguments to interpreter.execute() for cell i
+
+        """
+        kwargs = get_kwargs(i)
+        kwargs['actions'] = self.explorer.cell_actions(
+            actions, pre_actions, self.explorer.cell_position(actions, i))
+        if variables is not None:
+            kwargs['vistrail_variables'] = variables.get
+        return kwargs
+
+    def execute(self, pipeline, actions, pre_actions, get_kwargs, log=None,
+                variables=None, cell_pipeline=None):
+        """ execute(pipeline: Pipeline, actions: [action set],
+                     pre_actions: [action set], get_kwargs: function,
+                     log: Log, variables: dict, cell_pipeline: function)
+                     -> iterator over (int, result)
+        Executes the cells of the exploration of pipeline, which is left
+        unchanged, yielding their index and interpreter result as they
+        complete. get_kwargs(i) returns the arguments to
+        interpreter.execute() for cell i, but for actions and
+        vistrail_variables, which are the actions leading to the cell and
+        the variables (uuid -> VistrailVariable) not explored.
+
+        In this process, the cells are created one after the other by
+        changing a single copy of pipeline in place, and
+        cell_pipeline(i, pipeline) can return the pipeline to execute
+        instead. Worker processes only get the arguments listed in
+        WORKER_KWARGS and the class of the logger, and their results only
+        have errors, executed and suspended; the workflow executions they
+        logged are added to log.
+
+        """
+        working = copy.copy(pipeline)
+        if self.processes > 1 and \
+                not any(m.is_abstraction()
+                        for m in iter_modules_recursive(pipeline)):
+            groups, signatures = self.group_cells(working, actions,
+                                                  pre_actions)
+        else:
+            # subworkflows are loaded from their own files, that the
+            # workers don't get
+            groups = None
+        if groups is None or len(groups) <= 1:
+            working = copy.copy(pipeline)
+            cells = self.explorer.iter_explore(working, actions, pre_actions)
+            for i, _ in enumerate(cells):
+                kwargs = self.get_cell_kwargs(get_kwargs, actions,
+                                              pre_actions, variables, i)
+                if cell_pipeline is not None:
+                    cell = cell_pipeline(i, working)
+                else:
+                    cell = working
+                yield i, self.interpreter.execute(cell, **kwargs)
+            return
+
+        if get_result_store() is not None:
+            previous = None
+            param_ids = {}
+            working = copy.copy(pipeline)
+            for i, module_ids in self.find_shared_modules(groups,
+                                                          signatures):
+                position = self.explorer.cell_position(actions, i)
+                self.explorer.move_to_cell(working, actions, pre_actions,
+                                           position, previous, param_ids)
+                previous = position
+                kwargs = self.get_cell_kwargs(get_kwargs, actions,
+                                              pre_actions, variables, i)
+                kwargs['sinks'] = module_ids
+                kwargs['reason'] = '%s (shared modules)' % (
+                    kwargs.get('reason') or 'Parameter Exploration')
+                self.interpreter.execute(working, **kwargs)
+        del working, signatures
+
+        requests = Queue.Queue()
+        for group in groups:
+            cells = []
+            for i in group:
+                kwargs = get_kwargs(i)
+                worker_kwargs = dict((k, kwargs[k])
+                                     for k in self.WORKER_KWARGS
+                                     if k in kwargs)
+                logger = kwargs.get('logger')
+                if logger is None or logger is DummyLogController:
+                    worker_kwargs['logger'] = None
+                else:
+                    worker_kwargs['logger'] = type(logger)
+                cells.append((i, self.explorer.cell_position(actions, i),
+                              worker_kwargs))
+            requests.put(cells)
+        packages = []
+        for module in iter_modules_recursive(pipeline):
+            if module.package not in packages:
+                packages.append(module.package)
+        pool = WorkerPool(debug.DebugPrint.getInstance().logger,
+                          min(self.processes, len(groups)),
+                          'vistrails.core.param_explore._init_exploration_worker',
+                          (get_vistrails_configuration(), packages,
+                           serialize(pipeline), actions, pre_actions,
+                           variables))
+
+        results = Queue.Queue()
+        def send_requests():
+            while True:
+                try:
+                    cells = requests.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    results.put(pool.execute('execute_cells', cells))
+                except Exception:
+                    results.put((debug.format_exc(), 0))
+        threads = [threading.Thread(target=send_requests)
+                   for _ in xrange(min(self.processes, len(groups)))]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in xrange(len(groups)):
+                cell_results, success = results.get()
+                if not success:
+                    raise VistrailsInternalError(
+                            "Parameter exploration worker failed: %s" %
+                            cell_results)
+                for i, errors, executed, suspended, workflow_execs \
+                        in cell_results:
+                    if log is not None:
+                        self.merge_workflow_execs(log, workflow_execs,
+                                                  get_kwargs(i))
+                    errors = dict((module_id,
+                                   ModuleError(None, msg, errorTrace=trace))
+                                  for module_id, (msg, trace)
+                                  in errors.iteritems())
+                    yield i, InstanceObject(objects={},
+                                            errors=errors,
+                                            executed=executed,
+                                            suspended=suspended,
+                                            parameter_changes=[],
+                                            modules_added=set(),
+                                            conns_added=set())
+        finally:
+            # cells not sent yet are dropped, the others complete
+            while True:
+                try:
+                    requests.get_nowait()
+                except Queue.Empty:
+                    break
+            for thread in threads:
+                thread.join()
+            pool.shutdown()
+
+    def merge_workflow_execs(self, log, workflow_execs, kwargs):
+        """ merge_workflow_execs(log: Log, workflow_execs: [WorkflowExec],
+                                  kwargs: dict) -> None
+        Adds the workflow executions logged by a worker to log
+
+        """
+        controller = kwargs.get('controller')
+        for workflow_exec in workflow_execs:
+            # the worker took the ids of every execution and annotation
+            # from the id scope of its own log
+            workflow_exec = workflow_exec.do_copy(True, log.id_scope, {})
+            if controller is not None:
+                # and didn't know the vistrail
+                workflow_exec.parent_type = Vistrail.vtType
+                workflow_exec.parent_id = controller.vistrail.id
+                workflow_exec.session = controller.vistrail.current_session
+            log.add_workflow_exec(workflow_exec)
+
+    def execute_worker_cell(self, i, pipeline, kwargs):
+        """ execute_worker_cell(i: int, pipeline: Pipeline, kwargs: dict)
+                                 -> tuple
+        Executes a cell in a worker process, returning what execute()
+        needs to rebuild its result
+
+        """
+        log = getattr(kwargs.get('logger'), 'log', None)
+        if log is not None:
+            nb_execs = len(log.workflow_execs)
+        result = self.interpreter.execute(pipeline, **kwargs)
+        errors = dict((module_id, (error.msg, error.errorTrace))
+                      for module_id, error in result.errors.iteritems())
+        suspended = dict((module_id, str(value))
+                         for module_id, value in result.suspended.iteritems()
+                         if value)
+        if log is not None:
+            workflow_execs = log.workflow_execs[nb_execs:]
+        else:
+            workflow_execs = []
+        return (i, errors, dict(result.executed), suspended, workflow_execs)
+
+def iter_modules_recursive(pipeline):
+    """ iter_modules_recursive(pipeline: Pipeline) -> iterator over Module
+    Iterates over the modules of pipeline and of its groups and
+    subworkflows
+
+    """
+    for module in pipeline.modules.itervalues():
+        if module.is_group() or module.is_abstraction():
+            for submodule in iter_modules_recursive(module.pipeline):
+                yield submodule
+        yield module
+
+class _ExplorationWorker(object):
+    """
+    Request handler of a parameter exploration worker process (see
+    _init_exploration_worker()), moving its own copy of the pipeline to
+    the cells it's asked to execute
+
+    """
+    def __init__(self, pipeline, actions, pre_actions, variables):
+        self.executor = ParameterExplorationExecutor(
+            get_default_interpreter())
+        self.pipeline = pipeline
+        self.actions = actions
+        self.pre_actions = pre_actions
+        self.variables = variables
+        self.position = None
+        self.param_ids = {}
+
+    def execute_cells(self, cells):
+        """ execute_cells(cells: [(int, tuple, dict)]) -> (list, int)
+        Executes the cells given as (index, position, kwargs) and returns
+        their results for ParameterExplorationExecutor.execute()
+
+        """
+        explorer = self.executor.explorer
+        log = Log()
+        results = []
+        for i, position, kwargs in cells:
+            explorer.move_to_cell(self.pipeline, self.actions,
+                                  self.pre_actions, position, self.position,
+                                  self.param_ids)
+            self.position = position
+            kwargs = dict(kwargs)
+            if kwargs['logger'] is None:
+                kwargs['logger'] = DummyLogController
+            else:
+                kwargs['logger'] = kwargs['logger'](log)
+            kwargs['actions'] = explorer.cell_actions(
+                self.actions, self.pre_actions, position)
+            if self.variables is not None:
+                kwargs['vistrail_variables'] = self.variables.get
+            results.append(self.executor.execute_worker_cell(
+                    i, self.pipeline, kwargs))
+        return results, 1
+
+def _init_exploration_worker(index, configuration, packages, pipeline_xml,
+                             actions, pre_actions, variables):
+    """ _init_exploration_worker(index: int,
+                                  configuration: ConfigurationObject,
+                                  packages: [str], pipeline_xml: str,
+                                  actions: [action set],
+                                  pre_actions: [action set],
+                                  variables: dict) -> tuple
+    Initializes a worker process of ParameterExplorationExecutor: starts
+    VisTrails with the configuration of the main process, enables the
+    packages of the pipeline and returns the request handler
+
+    """
+    from vistrails.core.application import init
+    from vistrails.core.modules.module_registry import MissingPackage
+    from vistrails.core.packagemanager import get_package_manager
+
+    init({'spawned': True, 'batch': True, 'loadPackages': False,
+          'installBundles': False}, [])
+    get_vistrails_configuration().update(configuration)
+    get_vistrails_configuration().batch = True
+
+    pm = get_package_manager()
+    for identifier in packages:
+        if pm.has_package(identifier):
+            continue
+        try:
+            dep_graph = pm.build_dependency_graph([identifier])
+            for pkg_id in pm.get_ordered_dependencies(dep_graph):
+                if not pm.has_package(pkg_id):
+                    pkg = pm.identifier_is_available(pkg_id)
+                    if pkg is None:
+                        raise MissingPackage(pkg_id)
+                    pm.late_enable_package(pkg.codepath)
+        except Exception, e:
+            debug.warning("Exploration worker %d couldn't enable package "
+                          "%s" % (index, identifier), e)
+
+    pipeline = unserialize(pipeline_xml, Pipeline)
+    # the actions find the objects they change through the index
+    pipeline.build_index()
+    handler = _ExplorationWorker(pipeline, actions, pre_actions, variables)
+    return handler, debug.DebugPrint.getInstance().logger
+
 def _pipelinePositions(sheetCount, rowCount, colCount,
                        pipelines):
     """ _pipelinePositions(sheetCount: int, rowCount: int,
@@ -254,13 +754,20 @@ def _pipelinePositions(sheetCount, rowCount, colCount,
 
     """
 
-    pipelinePositions = []
-    for pId in xrange(len(pipelines)):
-        col = pId % colCount
-        row = (pId // colCount) % rowCount
-        sheet = (pId // (colCount*rowCount)) % sheetCount
-        pipelinePositions.append((row, col, sheet))
-    return pipelinePositions
+    return [_pipelinePosition(sheetCount, rowCount, colCount, pId)
+            for pId in xrange(len(pipelines))]
+
+def _pipelinePosition(sheetCount, rowCount, colCount, pId):
+    """ _pipelinePosition(sheetCount: int, rowCount: int, colCount: int,
+                          pId: int) -> (int, int, int)
+    Returns the (row, col, sheet) position of the pId-th pipeline of a
+    parameter exploration
+
+    """
+    col = pId % colCount
+    row = (pId // colCount) % rowCount
+    sheet = (pId // (colCount*rowCount)) % sheetCount
+    return (row, col, sheet)
 
 
 ################################################################################
@@ -283,5 +790,164 @@ class TestParameterExploration(unittest.TestCase):
                           (5, 5.0, 'two'),
                           (10, 10.0, 'three')])
 
+    def testIterExplore(self):
+        from vistrails.core.system import get_vistrails_basic_pkg_id
+        from vistrails.core.vistrail.module import Module
+        from vistrails.core.vistrail.pipeline import Pipeline
+        module = Module(id=1, name='Integer',
+                        package=get_vistrails_basic_pkg_id())
+        pipeline = Pipeline()
+        pipeline.add_module(module)
+        explorer = ParameterExploration(
+            [[InterpolateDiscreteParam(module, 'value', [(0, 2)], 3)],
+             [],
+             [InterpolateDiscreteParam(module, 'value', [('a', 'b')], 2)]])
+        expected = [[f.params[0].strValue for f in p.modules[1].functions]
+                    for p in explorer.explore(pipeline)]
+        self.assertEqual(len(expected), 6)
+        working = copy.copy(pipeline)
+        cells = []
+        for position, delta in explorer.iter_explore(working):
+            cells.append(position)
+            self.assertEqual(
+                sorted(f.params[0].strValue
+                       for f in working.modules[1].functions),
+                sorted(expected[len(cells) - 1]))
+        self.assertEqual(cells, [(0, 0, 0), (1, 0, 0), (2, 0, 0),
+                                 (0, 0, 1), (1, 0, 1), (2, 0, 1)])
+
+def load_int_chain_exploration(values):
+    """ load_int_chain_exploration(values: [(str, int)])
+                                   -> (VistrailController, ParameterExploration)
+    Loads the 'int chain' pipeline of tests/resources/dummy.xml and
+    creates an exploration of the value of its Integer modules, the
+    i-th one taking the i-th list of values on the given dimension
+
+    """
+    from vistrails.core.db.io import load_vistrail
+    from vistrails.core.db.locator import XMLFileLocator
+    from vistrails.core.paramexplore.function import PEFunction
+    from vistrails.core.paramexplore.param import PEParam
+    from vistrails.core.paramexplore.paramexplore import \
+        ParameterExploration as PE
+    from vistrails.core.system import vistrails_root_directory
+    from vistrails.core.vistrail.controller import VistrailController
+
+    locator = XMLFileLocator(vistrails_root_directory() +
+                             '/tests/resources/dummy.xml')
+    (vistrail, abstractions, thumbnails, mashups) = load_vistrail(locator)
+    controller = VistrailController(vistrail, locator, abstractions,
+                                    thumbnails, mashups)
+    version = controller.vistrail.get_version_number('int chain')
+    controller.change_selected_version(version)
+    # module ids depend on the upgrade, the one with a value comes first
+    module_ids = sorted((not m.functions, m.id)
+                        for m in controller.current_pipeline.modules.values()
+                        if m.name == 'Integer')
+    dims = [1, 1, 1, 1]
+    functions = []
+    for (_, module_id), (value, dim) in zip(module_ids, values):
+        dims[dim] = len(eval(value))
+        functions.append(PEFunction(module_id=module_id, port_name='value',
+                                    is_alias=0,
+                                    parameters=[PEParam(pos=0,
+                                                        interpolator='List',
+                                                        value=value,
+                                                        dimension=dim)]))
+    pe = PE(action_id=version, dims=repr(dims), layout='{}',
+            functions=functions)
+    return controller, pe
+
+class TestActionBasedParameterExploration(unittest.TestCase):
+    def test_iter_explore(self):
+        controller, pe = load_int_chain_exploration([('["1", "2", "3"]', 0),
+                                                     ('["4", "5"]', 1)])
+        pipeline = controller.current_pipeline
+        module_ids = [f.module_id for f in pe.functions]
+        actions, pre_actions, _ = pe.collectParameterActions(pipeline)
+        explorer = ActionBasedParameterExploration()
+        def values(p):
+            return tuple(p.modules[module_id].functions[0].params[0].strValue
+                         for module_id in module_ids)
+
+        pipelines, performed_actions = explorer.explore(pipeline, actions,
+                                                        pre_actions)
+        self.assertEqual([values(p) for p in pipelines],
+                         [('1', '4'), ('2', '4'), ('3', '4'),
+                          ('1', '5'), ('2', '5'), ('3', '5')])
+        self.assertFalse(pipeline.modules[module_ids[1]].functions)
+
+        working = copy.copy(pipeline)
+        cells = list((position, values(working), len(delta))
+                     for position, delta
+                     in explorer.iter_explore(working, actions, pre_actions))
+        self.assertEqual([c[1] for c in cells],
+                         [values(p) for p in pipelines])
+        self.assertEqual([c[0][:2] for c in cells],
+                         [(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1)])
+        # the first cell adds the function, then only what changed
+        self.assertEqual([c[2] for c in cells], [3, 1, 1, 2, 1, 1])
+        for i, (position, _, _) in enumerate(cells):
+            self.assertEqual(explorer.cell_position(actions, i), position)
+            self.assertEqual(explorer.cell_actions(actions, pre_actions,
+                                                   position),
+                             performed_actions[i])
+
+class TestParameterExplorationExecutor(unittest.TestCase):
+    def test_group_cells(self):
+        controller, pe = load_int_chain_exploration(
+            [('["1", "2", "2", "3"]', 0)])
+        pipeline = controller.current_pipeline
+        actions, pre_actions, _ = pe.collectParameterActions(pipeline)
+        executor = ParameterExplorationExecutor(None)
+        groups, signatures = executor.group_cells(copy.copy(pipeline),
+                                                  actions, pre_actions)
+        self.assertEqual(groups, [[0], [1, 2], [3]])
+        self.assertEqual(sorted(signatures), [0, 1, 3])
+
+    def test_find_shared_modules(self):
+        executor = ParameterExplorationExecutor(None)
+        signatures = {0: {1: 'a', 2: 'b'}, 1: {1: 'a', 2: 'c'}}
+        shared = executor.find_shared_modules([[0, 2], [1]], signatures)
+        self.assertEqual(shared, [(0, [1])])
+
+    def run_exploration(self, processes):
+        from vistrails.core.configuration import get_vistrails_configuration
+
+        controller, pe = load_int_chain_exploration(
+            [('["1", "2", "2", "3"]', 0)])
+        configuration = get_vistrails_configuration()
+        old_processes = getattr(configuration, 'explorationProcesses', 0)
+        configuration.explorationProcesses = processes
+        try:
+            errors = controller.execute_parameter_exploration(pe)
+        finally:
+            configuration.explorationProcesses = old_processes
+        self.assertEqual(errors, [])
+        workflow_execs = controller.log.workflow_execs
+        reasons = [a.value for e in workflow_execs for a in e.annotations
+                   if a.key == '__reason__']
+        self.assertEqual(len([r for r in reasons
+                              if not r.endswith('(shared modules)')]), 4)
+        self.assertEqual(set(e.parent_type for e in workflow_execs),
+                         set([Vistrail.vtType]))
+        # executions list the machine they ran on, which can be the same
+        ids = [(controller.log.id_scope.remap.get(obj.vtType, obj.vtType),
+                obj.db_id)
+               for obj, _, _ in controller.log.db_children()
+               if obj.vtType not in ('log', 'machine')]
+        self.assertEqual(len(ids), len(set(ids)))
+        # nested executions and annotations were logged too
+        vtTypes = set(obj.vtType for obj, _, _
+                      in controller.log.db_children())
+        self.assertTrue(set(['workflow_exec', 'module_exec',
+                             'annotation']).issubset(vtTypes))
+
+    def test_serial(self):
+        self.run_exploration(0)
+
+    def test_processes(self):
+        self.run_exploration(2)
+
 if __name__ == '__main__':
     unittest.main()
@@ -53,7 +53,8 @@ from vistrails.core.interpreter.default import get_default_interpreter
 from vistrails.core.vistrail.job import JobMonitor
 from vistrails.core.layout.workflow_layout import WorkflowLayout, \
     Pipeline as LayoutPipeline, Defaults as LayoutDefaults
-from vistrails.core.log.controller import LogController, DummyLogController
+from vistrails.core.log.controller import LogController, \
+    DummyLogController, TracingLogController
 from vistrails.core.log.log import Log
 from vistrails.core.modules.abstraction import identifier as abstraction_pkg, \
     version as abstraction_ver
@@ -85,6 +86,8 @@ from vistrails.core.vistrail.module_control_param import ModuleControlParam
 from vistrails.core.vistrail.module_function import ModuleFunction
 from vistrails.core.vistrail.module_param import ModuleParam
 from vistrails.core.vistrail.pipeline import Pipeline
+from vistrails.core.vistrail.pipeline_cache import PipelineCache, \
+    pipeline_size
 from vistrails.core.vistrail.port import Port
 from vistrails.core.vistrail.port_spec import PortSpec
 from vistrails.core.vistrail.port_spec_item import PortSpecItem
@@ -207,13 +210,20 @@ class VistrailController(object):
     current_base_version = property(_get_current_base_version)
 
     def flush_pipeline_cache(self):
-        self._pipelines = {0: Pipeline()}
+        self._pipelines = PipelineCache(
+                get_vistrails_configuration().pipelineCacheSize)
+        self._pipelines.put(0, Pipeline(), 0, pinned=True)
 
     def logging_on(self):
-        return get_vistrails_configuration().check('executionLog')
+        configuration = get_vistrails_configuration()
+        return (configuration.check('executionLog') and
+                getattr(configuration, 'executionLogLevel', 'full') != 'off')
             
     def get_logger(self):
         if self.logging_on():
+            if getattr(get_vistrails_configuration(), 'executionLogLevel',
+                       'full') == 'summary':
+                return TracingLogController(self.log)
             return LogController(self.log)
         else:
             return DummyLogController
@@ -2722,6 +2732,59 @@ class VistrailController(object):
                 debug.unexpected_exception(e)
                 raise
 
+    def execute_parameter_exploration(self, pe, extra_info=None,
+                                      reason='Parameter Exploration'):
+        """ execute_parameter_exploration(pe: ParameterExploration,
+                                           extra_info: dict, reason: str)
+              -> list of ((int, int, int), ModuleError)
+        Executes the cells of a parameter exploration, on
+        explorationProcesses worker processes if set, and returns the
+        errors with the (column, row, sheet) of their cell.
+
+        """
+        from vistrails.core.param_explore import \
+            ParameterExplorationExecutor, _pipelinePosition
+
+        if pe.action_id != self.current_version:
+            self.change_selected_version(pe.action_id)
+        actions, pre_actions, vistrail_vars = \
+                        pe.collectParameterActions(self.current_pipeline)
+        if not self.current_pipeline or not actions:
+            return []
+        if extra_info is None:
+            extra_info = {}
+
+        pe_log_id = uuid.uuid1()
+        dim = [max(1, len(a)) for a in actions]
+        logger = self.get_logger()
+        variables = dict((v.uuid, v) for v in self.get_vistrail_variables()
+                         if v.uuid not in vistrail_vars)
+        processes = getattr(get_vistrails_configuration(),
+                            'explorationProcesses', 0)
+        executor = ParameterExplorationExecutor(get_default_interpreter(),
+                                                processes)
+
+        def get_kwargs(i):
+            position = _pipelinePosition(dim[2], dim[1], dim[0], i)
+            pe_cell_id = (pe_log_id,) + position
+            return {'locator': self.locator,
+                    'current_version': self.current_version,
+                    'controller': self,
+                    'reason': '%s %s %s_%s_%s' % ((reason,) + pe_cell_id),
+                    'logger': logger,
+                    'extra_info': extra_info}
+
+        errors = []
+        cells = executor.execute(self.current_pipeline, actions, pre_actions,
+                                 get_kwargs, self.log, variables or None)
+        for i, result in cells:
+            row, col, sheet = _pipelinePosition(dim[2], dim[1], dim[0], i)
+            for error in result.errors.itervalues():
+                errors.append(((col, row, sheet), error))
+        if self.logging_on():
+            self.set_changed(True)
+        return errors
+
     def prune_versions(self, versions):
         """ prune_versions(versions: list of version numbers) -> None
         Prune all versions in 'versions' out of the view
@@ -4051,10 +4114,15 @@ class VistrailController(object):
             locator.save_as(save_bundle)
 
     def read_log(self):
-        """ Returns the saved log from zip or DB
+        """ Returns the saved log from zip or DB, with the executions of the
+        versions of this vistrail (a segmented log only reads the segments
+        holding them)
         
         """
-        return self.vistrail.get_persisted_log()
+        # the root version is not in actionMap
+        versions = set(self.vistrail.actionMap)
+        versions.add(0)
+        return self.vistrail.get_persisted_log(versions)
  
     def write_registry(self, locator):
         registry = vistrails.core.modules.module_registry.get_module_registry()
@@ -4238,6 +4306,7 @@ class VistrailController(object):
         # The available pipelines are in self._pipelines, plus
         # the current pipeline.
         # Fast check: do we have to change anything?
+        build_cost = None
         if from_root:
             result = self.vistrail.getPipeline(version)
         elif use_current and version == self.current_version:
@@ -4249,14 +4318,14 @@ class VistrailController(object):
                 return result
         # Fast check: if target is cached, copy it and we're done.
         elif version in self._pipelines:
+            self._pipelines.record_access(version)
             result = copy.copy(self._pipelines[version])
         else:
-            # Find the closest upstream pipeline to the current one
-            cv = self._current_full_graph.inverse_immutable().closest_vertex
-            closest = cv(version, self._pipelines)
+            self._pipelines.record_access(version)
+            # Find the cached ancestor the pipeline is cheapest to build from
+            closest, cost_to_closest_version = \
+                self._pipelines.find_base(self.vistrail.actionMap, version)
             if use_current:
-                cost_to_closest_version = self.version_switch_cost(version,
-                                                                   closest)
                 # Now we have to decide between the closest pipeline
                 # to version and the current pipeline
                 shared_parent = getSharedRoot(self.vistrail,
@@ -4266,14 +4335,15 @@ class VistrailController(object):
                     self.current_version, shared_parent)
                 cost_common_to_new = self.version_switch_cost(version,
                                                               shared_parent)
-                cost_to_current_version = cost_common_to_old + \
-                    cost_common_to_new
-            else:
-                cost_to_closest_version = 0
-                cost_to_current_version = 1
-            # FIXME I'm assuming copying the pipeline has zero cost.
-            # Formulate a better cost model
-            if cost_to_closest_version < cost_to_current_version:
+                if self.current_version == -1 or self.current_version == 0:
+                    current_size = 0
+                else:
+                    current_size = pipeline_size(self.current_pipeline)
+                cost_to_current_version = self._pipelines.build_cost(
+                    cost_common_to_old + cost_common_to_new, current_size)
+            if (not use_current or
+                    cost_to_closest_version < cost_to_current_version):
+                build_cost = cost_to_closest_version
                 if closest == 0:
                     result = self.vistrail.getPipeline(version)
                 else:
@@ -4282,6 +4352,7 @@ class VistrailController(object):
                                                                 version)
                     result.perform_action(action)
             else:
+                build_cost = cost_to_current_version
                 action = \
                     self.vistrail.general_action_chain(self.current_version,
                                                        version)
@@ -4291,24 +4362,20 @@ class VistrailController(object):
                     result = copy.copy(self.current_pipeline)
                 result.perform_action(action)
 
-            if self._cache_pipelines and self.get_tag(long(version)):
-                # stash a copy for future use for tagged (and upgraded) pipelines
-                if do_validate:
-                    try:
-                        self.validate(result)
-                    except InvalidPipeline:
-                        if not allow_fail:
-                            raise
-                    else:
-                        self._pipelines[version] = copy.copy(result)
-                else:
-                    self._pipelines[version] = copy.copy(result)
+        is_valid = True
         if do_validate:
             try:
                 self.validate(result)
             except InvalidPipeline:
                 if not allow_fail:
                     raise
+                is_valid = False
+        if build_cost is not None and self._cache_pipelines and is_valid:
+            # stash a copy for future use; pipelines of tagged (and
+            # upgraded) versions are always kept
+            pinned = bool(self.get_tag(long(version)))
+            self._pipelines.put(version, copy.copy(result), build_cost,
+                                pinned)
         return result
 
     def get_tag(self, version_number):
@@ -4504,3 +4571,70 @@ class TestTerseGraph(unittest.TestCase):
             13L: [(14L, (False, False)), (17L, (False, False))],
             4L: [], 6L: [], 10L: [], 14L: [], 17L: [],
         })
+
+
+class TestGetPipeline(unittest.TestCase):
+    def test_pipeline_cache(self):
+        """Pipelines built from cached ones match the materialized ones"""
+        from vistrails.core.db.locator import XMLFileLocator
+        from vistrails.core.system import vistrails_root_directory
+
+        locator = XMLFileLocator(vistrails_root_directory() +
+                                 '/tests/resources/dummy.xml')
+        vistrail = locator.load()
+        controller = VistrailController(vistrail, locator)
+        versions = sorted(action.id for action in vistrail.actions)
+        for version in versions + versions[::-1]:
+            pipeline = controller.get_pipeline(version, do_validate=False)
+            self.assertEqual(pipeline, vistrail.getPipeline(version))
+        self.assertTrue(any(not controller.get_tag(version)
+                            for version in controller._pipelines
+                            if version != 0))
+
+class TestReadLog(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp(prefix='vt_log_')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_segments(self):
+        """Only the segments with executions of the tree's versions are read"""
+        import datetime
+        from vistrails.core.db.locator import XMLFileLocator, ZIPFileLocator
+        from vistrails.core.system import vistrails_root_directory
+        from vistrails.db.domain import DBLog
+        from vistrails.db.services.log_store import LogStore
+        import vistrails.db.services.io
+
+        vistrail = XMLFileLocator(vistrails_root_directory() +
+                                  '/tests/resources/dummy.xml').load()
+        version = max(action.id for action in vistrail.actions)
+        store = LogStore(os.path.join(self.dirname, 'logs'),
+                         max_segment_size=1)
+        for parent_version in [version, version + 1000]:
+            now = datetime.datetime(2016, 1, 1)
+            store.append(DBLog(workflow_execs=[DBWorkflowExec(
+                    id=1, user='alice', ip='', session=0, vt_version='2.2',
+                    ts_start=now, ts_end=now, parent_id=None,
+                    parent_type='vistrail', parent_version=parent_version,
+                    completed=1, name='')]))
+        vistrail.locator = ZIPFileLocator(os.path.join(self.dirname,
+                                                       'test.vt'))
+        vistrail.db_log_filename = store.dirname
+        controller = VistrailController(vistrail)
+
+        opened = []
+        old_open_log = vistrails.db.services.io.open_log_from_xml
+        def open_log_from_xml(filename, *args):
+            opened.append(os.path.basename(filename))
+            return old_open_log(filename, *args)
+        vistrails.db.services.io.open_log_from_xml = open_log_from_xml
+        try:
+            log = controller.read_log()
+        finally:
+            vistrails.db.services.io.open_log_from_xml = old_open_log
+        self.assertEqual([e.parent_version for e in log.workflow_execs],
+                         [version])
+        # the segment of a version that is not in the tree isn't parsed
+        self.assertEqual(opened, [store.segment_names()[0]])
@@ -89,6 +89,9 @@ class ModuleFunction(DBFunction):
         cp = DBFunction.do_copy(self, new_ids, id_scope, id_remap)
         cp.__class__ = ModuleFunction
         cp.set_defaults(self)
+        # Validated against the parameters' signatures when used
+        if '_signature' in self.__dict__:
+            cp._signature = self._signature
         return cp
 
     @staticmethod
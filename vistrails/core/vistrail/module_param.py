@@ -116,6 +116,7 @@ class ModuleParam(DBParameter):
         # cp.namespace = self.namespace
         # cp._type = self._type
         cp.parse_db_type()
+        cp._signature = self.__dict__.get('_signature')
 
         return cp
 
@@ -138,12 +139,39 @@ class ModuleParam(DBParameter):
 
     ##########################################################################
 
+    # The setters of the fields hashed by Hasher.parameter_signature() drop
+    # the memoized signature; type, identifier and namespace go through
+    # db_type
+
+    def _set_db_name(self, name):
+        DBParameter.db_name.fset(self, name)
+        self._signature = None
+    db_name = property(DBParameter.db_name.fget, _set_db_name)
+
+    def _set_db_type(self, type):
+        DBParameter.db_type.fset(self, type)
+        self._signature = None
+    db_type = property(DBParameter.db_type.fget, _set_db_type)
+
+    def _set_db_val(self, val):
+        DBParameter.db_val.fset(self, val)
+        self._signature = None
+    db_val = property(DBParameter.db_val.fget, _set_db_val)
+
+    def _get_evaluatedStrValue(self):
+        return self._evaluatedStrValue
+    def _set_evaluatedStrValue(self, value):
+        self._evaluatedStrValue = value
+        self._signature = None
+    evaluatedStrValue = property(_get_evaluatedStrValue,
+                                 _set_evaluatedStrValue)
+
     id = DBParameter.db_pos
     pos = DBParameter.db_pos
     real_id = DBParameter.db_id
-    name = DBParameter.db_name
-    typeStr = DBParameter.db_type
-    strValue = DBParameter.db_val
+    name = db_name
+    typeStr = db_type
+    strValue = db_val
     alias = DBParameter.db_alias
 
     def parse_db_type(self):
@@ -134,6 +134,11 @@ class Pipeline(DBWorkflow):
             self._subpipeline_signatures = Bidict()
             self._module_signatures = Bidict()
             self._connection_signatures = Bidict()
+            self._stale_signatures = None
+            self._signature_owners = {}
+            self._validated_generation = None
+            self._validated_modules = set()
+            self._validated_connections = set()
         else:
             self.is_valid = other.is_valid
             self.aliases = Bidict([(k,copy.copy(v))
@@ -147,6 +152,11 @@ class Pipeline(DBWorkflow):
             self._module_signatures = \
                 Bidict([(k,copy.copy(v))
                         for (k,v) in other._module_signatures.iteritems()])
+            self._stale_signatures = copy.copy(other._stale_signatures)
+            self._signature_owners = dict(other._signature_owners)
+            self._validated_generation = other._validated_generation
+            self._validated_modules = set(other._validated_modules)
+            self._validated_connections = set(other._validated_connections)
 
         self.graph = Graph()
         for module in self.module_list:
@@ -189,6 +199,12 @@ class Pipeline(DBWorkflow):
         cp = DBWorkflow.do_copy(self, new_ids, id_scope, id_remap)
         cp.__class__ = Pipeline
         cp.set_defaults(self)
+        if new_ids:
+            # signatures and validated objects are indexed by the old ids
+            cp._stale_signatures = None
+            cp._signature_owners = {}
+            cp._validated_modules = set()
+            cp._validated_connections = set()
         return cp
 
     @staticmethod
@@ -264,6 +280,11 @@ class Pipeline(DBWorkflow):
         self._subpipeline_signatures = Bidict()
         self._module_signatures = Bidict()
         self._connection_signatures = Bidict()
+        self._stale_signatures = None
+        self._signature_owners = {}
+        self._validated_generation = None
+        self._validated_modules = set()
+        self._validated_connections = set()
 
     def get_tmp_id(self, type):
         """get_tmp_id(type: str) -> long
@@ -349,8 +370,16 @@ class Pipeline(DBWorkflow):
                 msg = "Pipeline cannot execute '%s %s' operation" % \
                     (op.vtType, op.what)
                 raise VistrailsInternalError(msg)
+            self.mark_signatures_dirty(op.parentObjType, op.parentObjId)
 
         if op.vtType == 'add':
+            if (op.what == ModuleFunction.vtType and self._signature_owners
+                    and op.parentObjType in (Module.vtType,
+                                             Abstraction.vtType,
+                                             Group.vtType)):
+                # keeps the owners of new functions without a full rebuild
+                self._signature_owners[(ModuleFunction.vtType,
+                                        op.data.real_id)] = op.parentObjId
             f(op.data, op.parentObjType, op.parentObjId)
         elif op.vtType == 'delete':
             f(op.objectId, op.what, op.parentObjType, op.parentObjId)
@@ -369,6 +398,7 @@ class Pipeline(DBWorkflow):
 #             m.abstraction = self.abstraction_map[m.abstraction_id]
         self.db_add_object(m)
         self.graph.add_vertex(m.id)
+        self.mark_signatures_dirty(Module.vtType, m.id)
 
     def change_module(self, old_id, m, *args):
         if not self.has_module_with_id(old_id):
@@ -376,6 +406,8 @@ class Pipeline(DBWorkflow):
         self.db_change_object(old_id, m)
         self.graph.delete_vertex(old_id)
         self.graph.add_vertex(m.id)
+        self.mark_signatures_dirty(Module.vtType, old_id)
+        self.mark_signatures_dirty(Module.vtType, m.id)
 
     def delete_module(self, id, *args):
         """delete_module(id:int) -> None 
@@ -412,6 +444,7 @@ class Pipeline(DBWorkflow):
             assert(c.sourceId != c.destinationId)        
             self.graph.add_edge(c.sourceId, c.destinationId, c.id)
             self.ensure_connection_specs([c.id])
+            self.mark_signatures_dirty(Module.vtType, c.destinationId)
 
             source_name = c.source.name
             output_ports = self.modules[c.sourceId].connected_output_ports
@@ -435,6 +468,7 @@ class Pipeline(DBWorkflow):
 
         old_conn = self.connections[old_id]
         if old_conn.source is not None and old_conn.destination is not None:
+            self.mark_signatures_dirty(Module.vtType, old_conn.destinationId)
             self.graph.delete_edge(old_conn.sourceId, old_conn.destinationId,
                                    old_conn.id)
             if self.graph.out_degree(old_conn.sourceId) < 1:
@@ -452,6 +486,7 @@ class Pipeline(DBWorkflow):
             assert(c.sourceId != c.destinationId)
             self.graph.add_edge(c.sourceId, c.destinationId, c.id)
             self.ensure_connection_specs([c.id])
+            self.mark_signatures_dirty(Module.vtType, c.destinationId)
             self.modules[c.sourceId].connected_output_ports.add(c.source.name)
             self.modules[c.destinationId].connected_input_ports.add(
                 c.destination.name)
@@ -471,6 +506,7 @@ class Pipeline(DBWorkflow):
                 (conn.destinationId, conn.id) in \
                 self.graph.edges_from(conn.sourceId):
             self.graph.delete_edge(conn.sourceId, conn.destinationId, conn.id)
+            self.mark_signatures_dirty(Module.vtType, conn.destinationId)
 
             c = conn
             source_name = c.source.name
@@ -486,6 +522,7 @@ class Pipeline(DBWorkflow):
         
     def add_parameter(self, param, parent_type, parent_id):
         self.db_add_object(param, parent_type, parent_id)
+        self.mark_signatures_dirty(parent_type, parent_id)
         if not self.has_alias(param.alias):
             self.change_alias(param.alias, 
                               param.vtType, 
@@ -497,6 +534,7 @@ class Pipeline(DBWorkflow):
     def delete_parameter(self, param_id, param_type, parent_type, parent_id):
         self.db_delete_object(param_id, ModuleParam.vtType,
                               parent_type, parent_id)
+        self.mark_signatures_dirty(parent_type, parent_id)
         self.remove_alias(ModuleParam.vtType, param_id, parent_type, 
                           parent_id, None)
 
@@ -505,6 +543,7 @@ class Pipeline(DBWorkflow):
                           parent_type, parent_id, None)
         self.db_change_object(old_param_id, param,
                               parent_type, parent_id)
+        self.mark_signatures_dirty(parent_type, parent_id)
         if not self.has_alias(param.alias):
             self.change_alias(param.alias, 
                               param.vtType, 
@@ -518,6 +557,7 @@ class Pipeline(DBWorkflow):
         connection = self.connections[parent_id]
         if connection.source is not None and \
                 connection.destination is not None:
+            self.mark_signatures_dirty(Module.vtType, connection.destinationId)
             self.graph.add_edge(connection.sourceId, 
                                 connection.destinationId, 
                                 connection.id)
@@ -537,6 +577,7 @@ class Pipeline(DBWorkflow):
     def delete_port(self, port_id, port_type, parent_type, parent_id):
         conn = self.connections[parent_id]
         if len(conn.ports) >= 2:
+            self.mark_signatures_dirty(Module.vtType, conn.destinationId)
             self.graph.delete_edge(conn.sourceId, 
                                    conn.destinationId, 
                                    conn.id)
@@ -554,6 +595,7 @@ class Pipeline(DBWorkflow):
     def change_port(self, old_port_id, port, parent_type, parent_id):
         connection = self.connections[parent_id]
         if len(connection.ports) >= 2:
+            self.mark_signatures_dirty(Module.vtType, connection.destinationId)
             source_list = self.graph.adjacency_list[connection.sourceId]
             source_list.remove((connection.destinationId, connection.id))
             dest_list = \
@@ -561,6 +603,7 @@ class Pipeline(DBWorkflow):
             dest_list.remove((connection.sourceId, connection.id))
         self.db_change_object(old_port_id, port, parent_type, parent_id)
         if len(connection.ports) >= 2:
+            self.mark_signatures_dirty(Module.vtType, connection.destinationId)
             source_list = self.graph.adjacency_list[connection.sourceId]
             source_list.append((connection.destinationId, connection.id))
             dest_list = \
@@ -570,6 +613,7 @@ class Pipeline(DBWorkflow):
     def add_port_to_registry(self, portSpec, moduleId):
         m = self.get_module_by_id(moduleId)
         m.add_port_spec(portSpec)
+        self.mark_signatures_dirty(Module.vtType, moduleId)
 
     def add_portSpec(self, port_spec, parent_type, parent_id):
         # self.db_add_object(port_spec, parent_type, parent_id)
@@ -579,6 +623,7 @@ class Pipeline(DBWorkflow):
         m = self.get_module_by_id(moduleId)
         portSpec = m.port_specs[id]
         m.delete_port_spec(portSpec)
+        self.mark_signatures_dirty(Module.vtType, moduleId)
 
     def delete_portSpec(self, spec_id, portSpec_type, parent_type, parent_id):
         self.delete_port_from_registry(spec_id, parent_id)
@@ -681,6 +726,7 @@ class Pipeline(DBWorkflow):
                 # FIXME: check if a change parameter action needs to be generated
                 parameter = self.db_get_object(what, oId)
                 parameter.strValue = str(value)
+                self.mark_signatures_dirty(what, oId)
             else:
                 raise VistrailsInternalError("only parameters are supported")
         
@@ -828,11 +874,93 @@ class Pipeline(DBWorkflow):
         return signature in self._connection_signatures.inverse
 
     def refresh_signatures(self):
-        self._connection_signatures = {}
-        self._subpipeline_signatures = {}
-        self._module_signatures = {}
+        """refresh_signatures() -> None
+        Recomputes the signatures that changed since the last refresh.
+
+        Changes made through perform_action() are tracked, so only the
+        modules that were touched and the modules downstream from them are
+        rehashed. The first refresh of a pipeline recomputes everything.
+        """
+        if self._stale_signatures is None:
+            self._connection_signatures = Bidict()
+            self._subpipeline_signatures = Bidict()
+            self._module_signatures = Bidict()
+        else:
+            stale = set()
+            to_visit = [m_id for m_id in self._stale_signatures
+                        if m_id in self.modules]
+            while to_visit:
+                m_id = to_visit.pop()
+                if m_id in stale:
+                    continue
+                stale.add(m_id)
+                to_visit.extend(dest_id for (dest_id, _)
+                                in self.graph.edges_from(m_id))
+            for m_id in stale:
+                # Custom hashers can depend on the upstream subpipeline, so
+                # the module signature is recomputed as well
+                if m_id in self._module_signatures:
+                    del self._module_signatures[m_id]
+                if m_id in self._subpipeline_signatures:
+                    del self._subpipeline_signatures[m_id]
+                for (_, conn_id) in self.graph.edges_to(m_id):
+                    if conn_id in self._connection_signatures:
+                        del self._connection_signatures[conn_id]
+        self._stale_signatures = set()
         self.compute_signatures()
 
+    def mark_signatures_dirty(self, obj_type=None, obj_id=None):
+        """mark_signatures_dirty(obj_type: str, obj_id: long) -> None
+        Marks the signature of the module owning the given object (module,
+        connection, function or parameter) as stale, so that the next
+        refresh_signatures() recomputes it along with everything downstream.
+        The module also gets validated again by the next validate().
+        Without arguments, or if the owner can't be found, all signatures
+        are marked stale and the whole pipeline gets validated again.
+
+        perform_action() takes care of this; code changing the modules of a
+        pipeline directly has to call it.
+        """
+        if self._stale_signatures is None and not self._validated_modules:
+            return
+        module_id = None
+        if obj_type is not None:
+            module_id = self._signature_owner(obj_type, obj_id)
+        if module_id is None:
+            self._stale_signatures = None
+            self._validated_modules = set()
+            self._validated_connections = set()
+        else:
+            if self._stale_signatures is not None:
+                self._stale_signatures.add(module_id)
+            self._validated_modules.discard(module_id)
+
+    def _signature_owner(self, obj_type, obj_id):
+        if obj_type in (Module.vtType, Abstraction.vtType, Group.vtType):
+            return obj_id
+        elif obj_type == Connection.vtType:
+            try:
+                conn = self.connections[obj_id]
+            except KeyError:
+                return None
+            if conn.destination is None:
+                return None
+            return conn.destinationId
+        elif obj_type in (ModuleFunction.vtType, ModuleParam.vtType):
+            key = (obj_type, obj_id)
+            if key not in self._signature_owners:
+                owners = {}
+                for module in self.module_list:
+                    for function in module.functions:
+                        owners[(ModuleFunction.vtType, function.real_id)] = \
+                            module.id
+                        for param in function.params:
+                            owners[(ModuleParam.vtType, param.real_id)] = \
+                                module.id
+                self._signature_owners = owners
+            return self._signature_owners.get(key)
+        return None
+
     def compute_signatures(self):
         """compute_signatures(): compute all module and subpipeline signatures
         for this pipeline."""
@@ -848,22 +976,49 @@ class Pipeline(DBWorkflow):
         # want to check entire pipeline and reconcile it with the
         # registry - if anything fails, generate invalid pipeline with
         # the errors
+        # modules and connections that were validated against the same
+        # registry generation, and haven't changed since (see
+        # mark_signatures_dirty()), are not checked again
+        generation = get_module_registry().generation
+        if generation != self._validated_generation:
+            self._validated_generation = generation
+            self._validated_modules = set()
+            self._validated_connections = set()
+        module_ids = [m_id for m_id in self.modules.iterkeys()
+                      if m_id not in self._validated_modules]
+        connection_ids = set(c_id for c_id in self.connections.iterkeys()
+                             if c_id not in self._validated_connections)
+        for m_id in module_ids:
+            connection_ids.update(c_id for _, c_id
+                                  in self.graph.edges_from(m_id))
+            connection_ids.update(c_id for _, c_id
+                                  in self.graph.edges_to(m_id))
+        # modules whose list depth or cycles may have changed
+        changed = set(module_ids)
+        for c_id in connection_ids:
+            conn = self.connections[c_id]
+            if conn.destination is not None:
+                changed.add(conn.destinationId)
+        changed.intersection_update(self.graph.vertices)
+
         exceptions = set()
         try:
-            self.ensure_modules_are_on_registry()
+            self.ensure_modules_are_on_registry(module_ids)
         except InvalidPipeline, e:
             exceptions.update(e.get_exception_set())
 
-        # check for cycles
-        try:
-            self.graph.dfs(raise_if_cyclic=True)
-        except GraphContainsCycles, e:
-            exceptions.add(e)
+        # check for cycles; a new cycle goes through a changed module
+        if changed:
+            try:
+                self.graph.dfs(changed, raise_if_cyclic=True)
+            except GraphContainsCycles, e:
+                exceptions.add(e)
 
         # do this before we check connection specs because it is
         # possible that a subpipeline invalidates the module, meaning
         # we shouldn't check the connection specs
-        for module in self.modules.itervalues():
+        for m_id in module_ids:
+            module = self.modules[m_id]
             if module.is_valid and (module.is_group() or 
                                     module.is_abstraction()):
                 try:
@@ -884,15 +1039,15 @@ class Pipeline(DBWorkflow):
                     except Exception:
                         pass
         try:
-            self.ensure_port_specs()
+            self.ensure_port_specs(module_ids)
         except InvalidPipeline, e:
             exceptions.update(e.get_exception_set())
         try:
-            self.ensure_connection_specs()
+            self.ensure_connection_specs(connection_ids)
         except InvalidPipeline, e:
             exceptions.update(e.get_exception_set())
         try:
-            self.ensure_functions()
+            self.ensure_functions(module_ids)
         except InvalidPipeline, e:
             exceptions.update(e.get_exception_set())
         try:
@@ -909,8 +1064,14 @@ class Pipeline(DBWorkflow):
                 self.is_valid = False
                 return False
 
-        self.mark_list_depth()
+        if not self.is_valid:
+            self.mark_list_depth()
+        elif changed:
+            # only the depths downstream of the changes can differ
+            self.mark_list_depth(changed)
 
+        self._validated_modules.update(module_ids)
+        self._validated_connections.update(connection_ids)
         self.is_valid = True
         return True
 
@@ -1014,10 +1175,19 @@ class Pipeline(DBWorkflow):
         if len(exceptions) > 0:
             raise InvalidPipeline(exceptions, self)
 
-    def ensure_functions(self):
+    def ensure_functions(self, module_ids=None):
+        """ensure_functions(module_ids=None) -> None.
+
+        Checks the functions of the modules in module_ids against their port
+        specs and the registry. If module_ids is None, checks every module
+        in the pipeline.
+        """
         exceptions = set()
         reg = get_module_registry()
-        for module in self.modules.itervalues():
+        if module_ids is None:
+            module_ids = self.modules.iterkeys()
+        for m_id in module_ids:
+            module = self.modules[m_id]
             for function in module.functions:
                 is_valid = True
                 if module.is_valid and not module.has_port_spec(function.name, 
@@ -1080,9 +1250,17 @@ class Pipeline(DBWorkflow):
         if len(exceptions) > 0:
             raise InvalidPipeline(exceptions, self)
 
-    def ensure_port_specs(self):
+    def ensure_port_specs(self, module_ids=None):
+        """ensure_port_specs(module_ids=None) -> None.
+
+        Checks the custom port specs of the modules in module_ids. If
+        module_ids is None, checks every module in the pipeline.
+        """
         exceptions = set()
-        for module in self.modules.itervalues():
+        if module_ids is None:
+            module_ids = self.modules.iterkeys()
+        for m_id in module_ids:
+            module = self.modules[m_id]
             # if module.is_valid:
             try:
                 for port_spec in module.port_specs.itervalues():
@@ -1127,10 +1305,14 @@ class Pipeline(DBWorkflow):
         """
         from vistrails.core.modules.basic_modules import List, Variant
 
-        # TODO: module_ids is currently ignored, this is potentially suboptimal
+        if module_ids is not None:
+            module_ids = [m_id for m_id in module_ids
+                          if m_id in self.graph.vertices]
+            if not module_ids:
+                return []
         result = []
         # Might raise GraphContainsCycles
-        for module_id in self.graph.vertices_topological_sort():
+        for module_id in self.graph.vertices_topological_sort(module_ids):
             module = self.get_module_by_id(module_id)
             module.list_depth = 0
             ports = []
@@ -1459,6 +1641,129 @@ class TestPipeline(unittest.TestCase):
         self.assertNotEquals(c_sig_size_before, c_sig_size_after)
         self.assertNotEquals(p_sig_size_before, p_sig_size_after)
 
+    def test_incremental_signatures(self):
+        """Makes sure only changed signatures are recomputed."""
+        from vistrails.core.db.action import create_action
+        id_scope = IdScope()
+        p = self.create_default_pipeline(id_scope)
+        p.refresh_signatures()
+        m1_id, m2_id, m3_id = sorted(p.modules)
+        old_sigs = dict(p._subpipeline_signatures)
+        old_m2_sig = p._module_signatures[m2_id]
+
+        param = ModuleParam(id=id_scope.getNewId(ModuleParam.vtType),
+                            type='Float',
+                            val='3.0')
+        function = ModuleFunction(id=id_scope.getNewId(ModuleFunction.vtType),
+                                  name='value1',
+                                  parameters=[param])
+        action = create_action([('add', function, Module.vtType, m1_id)])
+        p.perform_action(action)
+        self.assertEqual(p._stale_signatures, set([m1_id]))
+        p.refresh_signatures()
+        self.assertEqual(p._stale_signatures, set())
+        # the module signature wasn't recomputed
+        self.assertIs(p._module_signatures[m2_id], old_m2_sig)
+        self.assertEqual(p._subpipeline_signatures[m2_id], old_sigs[m2_id])
+        self.assertNotEqual(p._subpipeline_signatures[m1_id], old_sigs[m1_id])
+        self.assertNotEqual(p._subpipeline_signatures[m3_id], old_sigs[m3_id])
+
+        # compare with a full refresh
+        p2 = copy.copy(p)
+        p2.mark_signatures_dirty()
+        p2.refresh_signatures()
+        self.assertEqual(p._subpipeline_signatures,
+                         p2._subpipeline_signatures)
+        self.assertEqual(p._connection_signatures,
+                         p2._connection_signatures)
+
+    def test_incremental_validation(self):
+        """Makes sure only changed modules and connections are validated."""
+        from vistrails.core.db.action import create_action
+        import vistrails.core.modules.basic_modules
+        basic_version = vistrails.core.modules.basic_modules.version
+        basic_pkg = vistrails.core.modules.basic_modules.identifier
+        id_scope = IdScope()
+        p = Pipeline()
+        modules = [Module(id=id_scope.getNewId(Module.vtType),
+                          name='String', package=basic_pkg,
+                          version=basic_version)
+                   for i in xrange(3)]
+        for module in modules:
+            p.add_module(module)
+        for src, dst in [(0, 2), (1, 2)]:
+            ports = [Port(id=id_scope.getNewId(Port.vtType), type='source',
+                          moduleId=modules[src].id, moduleName='String',
+                          name='value'),
+                     Port(id=id_scope.getNewId(Port.vtType),
+                          type='destination', moduleId=modules[dst].id,
+                          moduleName='String', name='value')]
+            p.add_connection(Connection(
+                    id=id_scope.getNewId(Connection.vtType), ports=ports))
+        checked = []
+        ensure_modules = p.ensure_modules_are_on_registry
+        ensure_connections = p.ensure_connection_specs
+        def ensure_modules_are_on_registry(module_ids=None):
+            checked.append(('modules', sorted(module_ids)))
+            ensure_modules(module_ids)
+        def ensure_connection_specs(connection_ids=None):
+            checked.append(('connections', sorted(connection_ids)))
+            ensure_connections(connection_ids)
+        p.ensure_modules_are_on_registry = ensure_modules_are_on_registry
+        p.ensure_connection_specs = ensure_connection_specs
+        m1_id, m2_id, m3_id = sorted(p.modules)
+
+        # mark_list_depth() also checks connections, one at a time
+        self.assertTrue(p.validate())
+        self.assertEqual(checked[:2], [('modules', [m1_id, m2_id, m3_id]),
+                                       ('connections', sorted(p.connections))])
+        del checked[:]
+        self.assertTrue(p.validate())
+        self.assertEqual(checked, [('modules', []), ('connections', [])])
+
+        del checked[:]
+        param = ModuleParam(id=id_scope.getNewId(ModuleParam.vtType),
+                            type='String',
+                            val='abc')
+        function = ModuleFunction(id=id_scope.getNewId(ModuleFunction.vtType),
+                                  name='value',
+                                  parameters=[param])
+        action = create_action([('add', function, Module.vtType, m1_id)])
+        p.perform_action(action)
+        self.assertTrue(p.validate())
+        self.assertEqual(checked[0], ('modules', [m1_id]))
+        self.assertEqual(checked[1],
+                         ('connections',
+                          sorted(c_id for c_id, c in p.connections.iteritems()
+                                 if m1_id in (c.sourceId, c.destinationId))))
+
+        # copies keep the validated objects
+        del checked[:]
+        p2 = copy.copy(p)
+        p2.ensure_modules_are_on_registry = ensure_modules_are_on_registry
+        p2.ensure_connection_specs = ensure_connection_specs
+        self.assertTrue(p2.validate())
+        self.assertEqual(checked, [('modules', []), ('connections', [])])
+
+        # a registry change invalidates everything
+        del checked[:]
+        get_module_registry().generation += 1
+        self.assertTrue(p.validate())
+        self.assertEqual(checked[0], ('modules', [m1_id, m2_id, m3_id]))
+
+        # errors are reported again until they are fixed
+        del checked[:]
+        action = create_action([('change', param,
+                                 ModuleParam(id=param.real_id,
+                                             type='Nonexistent',
+                                             val='abc'),
+                                 ModuleFunction.vtType, function.real_id)])
+        p.perform_action(action)
+        self.assertFalse(p.validate(False))
+        self.assertFalse(p.validate(False))
+        self.assertEqual(checked[0], ('modules', [m1_id]))
+        self.assertEqual(checked[2], ('modules', [m1_id]))
+
     def test_delete_connections(self):
         p = self.create_default_pipeline()
         p.delete_connection(0)
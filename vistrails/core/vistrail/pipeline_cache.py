@@ -0,0 +1,225 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Cache of materialized pipelines, used by the controller to switch
+between versions without replaying long action chains."""
+from __future__ import division
+
+import unittest
+
+
+class _CacheEntry(object):
+    def __init__(self, pipeline, size, cost, pinned):
+        self.pipeline = pipeline
+        self.size = size
+        self.cost = cost
+        self.pinned = pinned
+
+
+def pipeline_size(pipeline):
+    """pipeline_size(pipeline: Pipeline) -> int
+    Returns the number of objects (modules, connections, functions,
+    parameters...) in a pipeline.
+
+    """
+    return len(pipeline.objects)
+
+
+class PipelineCache(object):
+    """Pipelines materialized for some versions of a vistrail.
+
+    The cache holds at most max_size workflow objects (modules, connections,
+    functions, parameters...). When it is full, the pipeline with the lowest
+    value is evicted first; the value of a pipeline is the number of times
+    its version was requested times the cost of building it, divided by its
+    size. Pinned pipelines (the empty one and those of tagged versions) are
+    never evicted.
+
+    Costs are expressed in objects copied: getting a pipeline from a cached
+    one costs a copy of it plus ACTION_COST per action replayed.
+    """
+
+    ACTION_COST = 5
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._entries = {}
+        self._hits = {}
+        self._size = 0
+
+    def __contains__(self, version):
+        return version in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def size(self):
+        """size() -> int
+        Returns the number of objects in the unpinned pipelines.
+        """
+        return self._size
+
+    def __getitem__(self, version):
+        return self._entries[version].pipeline
+
+    def record_access(self, version):
+        """record_access(version: long) -> None
+        Counts a request for a version, cached or not.
+        """
+        self._hits[version] = self._hits.get(version, 0) + 1
+
+    def build_cost(self, nb_actions, base_size):
+        """build_cost(nb_actions: int, base_size: int) -> int
+        Returns the cost of building a pipeline by copying one of base_size
+        objects and replaying nb_actions actions on it.
+        """
+        return base_size + nb_actions * self.ACTION_COST
+
+    def find_base(self, action_map, version):
+        """find_base(action_map: dict, version: long) -> (long, int)
+
+        Returns the cached ancestor of version from which its pipeline is
+        the cheapest to build, with the cost of doing so. The empty pipeline
+        of version 0 is the fallback.
+        """
+        best = None
+        distance = 0
+        current = version
+        while True:
+            entry = self._entries.get(current)
+            if entry is not None:
+                cost = self.build_cost(distance, entry.size)
+                if best is None or cost < best[1]:
+                    best = (current, cost)
+            if current == 0:
+                break
+            distance += 1
+            if (best is not None and
+                    self.build_cost(distance, 0) >= best[1]):
+                break
+            current = action_map[current].parent
+        if best is None:
+            # version 0 isn't cached
+            best = (0, self.build_cost(distance, 0))
+        return best
+
+    def put(self, version, pipeline, cost, pinned=False):
+        """put(version: long, pipeline: Pipeline, cost: int,
+               pinned: bool) -> None
+        Adds a pipeline to the cache, evicting others if needed. cost is
+        what it took to build it.
+        """
+        self._remove(version)
+        entry = _CacheEntry(pipeline, pipeline_size(pipeline), cost, pinned)
+        self._entries[version] = entry
+        if not pinned:
+            self._size += entry.size
+            self._evict()
+
+    def discard(self, version):
+        self._remove(version)
+        self._hits.pop(version, None)
+
+    def _remove(self, version):
+        entry = self._entries.pop(version, None)
+        if entry is not None and not entry.pinned:
+            self._size -= entry.size
+
+    def set_max_size(self, max_size):
+        self.max_size = max_size
+        self._evict()
+
+    def _value(self, version):
+        entry = self._entries[version]
+        return self._hits.get(version, 0) * entry.cost / max(entry.size, 1)
+
+    def _evict(self):
+        while self._size > self.max_size:
+            candidates = [v for v, e in self._entries.iteritems()
+                          if not e.pinned]
+            if not candidates:
+                break
+            self.discard(min(candidates, key=self._value))
+
+
+################################################################################
+
+
+class TestPipelineCache(unittest.TestCase):
+    class FakePipeline(object):
+        def __init__(self, size):
+            self.objects = dict((i, None) for i in xrange(size))
+
+    class FakeAction(object):
+        def __init__(self, parent):
+            self.parent = parent
+
+    def test_find_base(self):
+        # chain 0 <- 1 <- 2 <- ... <- 20
+        action_map = dict((i, self.FakeAction(i - 1)) for i in xrange(1, 21))
+        cache = PipelineCache(1000)
+        cache.put(0, self.FakePipeline(0), 0, pinned=True)
+        self.assertEqual(cache.find_base(action_map, 20), (0, 100))
+        cache.put(15, self.FakePipeline(10), 75)
+        self.assertEqual(cache.find_base(action_map, 20), (15, 35))
+        # a big pipeline isn't worth copying
+        cache.put(18, self.FakePipeline(200), 90)
+        self.assertEqual(cache.find_base(action_map, 20), (15, 35))
+        cache.put(19, self.FakePipeline(10), 95)
+        self.assertEqual(cache.find_base(action_map, 20), (19, 15))
+        self.assertEqual(cache.find_base(action_map, 19), (19, 10))
+
+    def test_eviction(self):
+        cache = PipelineCache(100)
+        cache.put(0, self.FakePipeline(0), 0, pinned=True)
+        cache.put(1, self.FakePipeline(50), 100, pinned=True)
+        for version in (2, 3, 4):
+            cache.record_access(version)
+        cache.record_access(2)
+        cache.put(2, self.FakePipeline(40), 100)
+        cache.put(3, self.FakePipeline(40), 100)
+        cache.put(4, self.FakePipeline(40), 300)
+        # 3 was requested once and is the cheapest to rebuild
+        self.assertEqual(sorted(cache), [0, 1, 2, 4])
+        self.assertEqual(cache.size(), 80)
+        # the access counts of evicted pipelines are dropped
+        self.assertEqual(sorted(cache._hits), [2, 4])
+        cache.set_max_size(50)
+        self.assertEqual(sorted(cache), [0, 1, 4])
+        cache.set_max_size(0)
+        self.assertEqual(sorted(cache), [0, 1])
@@ -43,8 +43,12 @@ import getpass
 
 from vistrails.db.domain import DBVistrail
 from vistrails.db.services.io import open_vt_log_from_db, open_log_from_xml
+from vistrails.db.services.log_store import LogStore
+from vistrails.db.services.vistrail import WorkflowCheckpoints
+from vistrails.core.configuration import get_vistrails_configuration
 from vistrails.core.db.locator import DBLocator
 from vistrails.core.log.log import Log
+from vistrails.core.data_structures.compact_graph import CompactGraph
 from vistrails.core.data_structures.graph import Graph
 from vistrails.core.data_structures.bijectivedict import Bidict
 from vistrails.core import debug
@@ -121,6 +125,9 @@ class Vistrail(DBVistrail):
             self.is_abstraction = other.is_abstraction
             self.locator = other.locator
 
+        if self.db_checkpoints is None:
+            self.db_checkpoints = WorkflowCheckpoints()
+
         # object to keep explicit expanded 
         # version tree always updated
         self.tree = ExplicitExpandedVersionTree(self)
@@ -323,9 +330,26 @@ class Vistrail(DBVistrail):
         Returns a pipeline given a version number.
 
         """
+        self.update_checkpoints()
         workflow = vistrails.core.db.io.get_workflow(self, version)
         return workflow
 
+    def update_checkpoints(self):
+        """update_checkpoints() -> None
+        Applies the 'versionCheckpoints' configuration to the snapshots used
+        to materialize workflows.
+
+        """
+        conf = get_vistrails_configuration()
+        if conf is None or \
+                not conf.has_deep_value('versionCheckpoints.interval'):
+            return
+        checkpoints = self.db_checkpoints
+        checkpoints.interval = conf.get_deep_value('versionCheckpoints.interval')
+        checkpoints.persist = conf.get_deep_value('versionCheckpoints.save')
+        checkpoints.set_max_operations(
+                conf.get_deep_value('versionCheckpoints.maxOperations'))
+
     def get_pipeline_diff_with_connections(self, v1, v2):
         """like get_pipeline_diff but returns connection info
         Keyword arguments:
@@ -1023,17 +1047,28 @@ class Vistrail(DBVistrail):
     class InvalidAbstraction(Exception):
         pass
 
-    def get_persisted_log(self):
+    def get_persisted_log(self, versions=None):
         """
-        Returns the log object for this vistrail if available
+        Returns the log object for this vistrail if available. If versions
+        is given, only the executions of these versions are returned; with a
+        segmented log, only the segments holding them are read.
         """
         log = Log()
         if isinstance(self.locator, vistrails.core.db.locator.ZIPFileLocator):
             if self.db_log_filename is not None:
-                log = open_log_from_xml(self.db_log_filename, True)
+                if (versions is not None and
+                        LogStore.is_log_store(self.db_log_filename)):
+                    log = LogStore(self.db_log_filename).read(versions)
+                else:
+                    log = open_log_from_xml(self.db_log_filename, True)
         if isinstance(self.locator, vistrails.core.db.locator.DBLocator):
             connection = self.locator.get_connection()
             log = open_vt_log_from_db(connection, self.db_id)
+        if versions is not None:
+            versions = set(versions)
+            for workflow_exec in list(log.db_workflow_execs):
+                if workflow_exec.db_parent_version not in versions:
+                    log.db_delete_workflow_exec(workflow_exec)
         Log.convert(log)
         return log
     
@@ -1137,10 +1172,13 @@ class ExplicitExpandedVersionTree(object):
     """
     Keep explicit expanded and tersed version 
     trees.
+
+    The expanded tree holds every version, so it uses the array-backed
+    CompactGraph.
     """
     def __init__(self, vistrail):
         self.vistrail = vistrail
-        self.expandedVersionTree = Graph()
+        self.expandedVersionTree = CompactGraph()
         self.expandedVersionTree.add_vertex(0)
         self.tersedVersionTree = Graph()
 
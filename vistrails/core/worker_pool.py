@@ -0,0 +1,320 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Pool of worker processes executing requests, used by the XML-RPC server
+to run workflows outside of its own process.
+
+The workers are new Python interpreters, started with fork and exec, which
+initialize their own application through an initializer function given by
+name: nothing is inherited from the server, whose Qt application and request
+threads make forking unsafe. Requests and results are pickled over the
+standard input and output of the worker.
+"""
+from __future__ import division
+
+import cPickle as pickle
+import logging
+import os
+import Queue
+import subprocess
+import sys
+import time
+import traceback
+import unittest
+
+import vistrails
+
+
+def get_function(name):
+    """get_function(name: str) -> function
+    Imports a function given as 'package.module.function'.
+    """
+    module, function = name.rsplit('.', 1)
+    return getattr(__import__(module, globals(), locals(), [function]),
+                   function)
+
+
+class WorkerPool(object):
+    """WorkerPool executes requests in a pool of worker processes.
+
+    Each worker calls initializer(index, *args), the name of a function
+    returning a (handler, logger) pair, then executes the requests with the
+    methods of the handler, so that its state (e.g. the interpreter cache) is
+    kept between requests. index is the slot of the worker in the pool,
+    reused by the worker replacing it, so that it can e.g. log to its own
+    file. A request waits until a worker is free, so the pool size is the
+    number of requests that can execute at the same time. A worker is
+    replaced by a fresh one once it has served max_requests requests or its
+    resident memory, as reported by handler.memory_usage()['rss'] in
+    kilobytes, is above max_memory megabytes (0 disables the limit, and
+    the handler doesn't need memory_usage()).
+    """
+    def __init__(self, logger, size, initializer, args=(), max_memory=0,
+                 max_requests=0):
+        self.server_logger = logger
+        self.initializer = initializer
+        self.args = args
+        self.max_memory = max_memory
+        self.max_requests = max_requests
+        # (index, process) of the free workers, process being None if it
+        # couldn't be restarted, in which case the next request retries
+        self.idle_workers = Queue.Queue()
+        for i in xrange(size):
+            self.idle_workers.put((i, self.start_worker(i)))
+
+    def start_worker(self, index):
+        """start_worker(index: int) -> Popen
+        Starts a new worker process in the given slot of the pool.
+        """
+        env = dict(os.environ)
+        path = os.path.dirname(os.path.dirname(os.path.abspath(
+                vistrails.__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(
+                [path] + [p for p in [env.get('PYTHONPATH')] if p])
+        process = subprocess.Popen(
+                [sys.executable, '-c',
+                 'from vistrails.core.worker_pool import run_worker; '
+                 'run_worker()'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                close_fds=True, env=env)
+        try:
+            pickle.dump((self.initializer, index, self.args,
+                         self.max_memory, self.max_requests),
+                        process.stdin, 2)
+            process.stdin.flush()
+        except IOError:
+            process.kill()
+            process.wait()
+            raise
+        self.server_logger.info("Started worker process %s" % process.pid)
+        return process
+
+    def stop_worker(self, process):
+        """stop_worker(process: Popen) -> None
+        Asks a worker to exit and waits for it.
+        """
+        try:
+            process.stdin.close()
+        except IOError:
+            pass
+        process.stdout.close()
+        for i in xrange(150):
+            if process.poll() is not None:
+                return
+            time.sleep(0.1)
+        self.server_logger.error("Terminating worker process %s" %
+                                 process.pid)
+        process.terminate()
+        process.wait()
+
+    def execute(self, method, *args):
+        """execute(method: str, *args) -> result
+        Calls handler.method(*args) in the next free worker, waiting for one
+        if they are all busy, and returns its result.
+        """
+        index, process = self.idle_workers.get()
+        try:
+            if process is None:
+                process = self.start_worker(index)
+            try:
+                pickle.dump((method, args), process.stdin, 2)
+                process.stdin.flush()
+                result, recycle = pickle.load(process.stdout)
+            except (EOFError, IOError, pickle.UnpicklingError):
+                self.server_logger.error("Worker process %s failed" %
+                                         process.pid)
+                self.server_logger.error(traceback.format_exc())
+                result, recycle = ("Worker process failed", 0), True
+            if recycle:
+                self.stop_worker(process)
+                process = None
+                try:
+                    process = self.start_worker(index)
+                except EnvironmentError:
+                    self.server_logger.error("Couldn't restart worker %d" %
+                                             index)
+                    self.server_logger.error(traceback.format_exc())
+        finally:
+            # only a live worker goes back in the pool; the slot of a dead
+            # one is kept so that the next request starts a new worker
+            if process is not None and process.poll() is not None:
+                self.server_logger.error("Worker process %s exited" %
+                                         process.pid)
+                self.stop_worker(process)
+                process = None
+            self.idle_workers.put((index, process))
+        return result
+
+    def shutdown(self):
+        """shutdown() -> None
+        Stops the idle workers. Busy workers exit after their request once
+        the server has exited and closed their input.
+        """
+        while True:
+            try:
+                index, process = self.idle_workers.get_nowait()
+            except Queue.Empty:
+                break
+            if process is not None:
+                self.stop_worker(process)
+
+def run_worker():
+    """run_worker() -> None
+    Main function of a WorkerPool process: executes the requests read from
+    the standard input with the handler returned by the initializer, until
+    the input is closed or the worker has to be replaced.
+    """
+    # keep the pipes to the pool; what the workflows print goes to stderr
+    requests = os.fdopen(os.dup(0), 'rb')
+    responses = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    initializer, index, args, max_memory, max_requests = pickle.load(requests)
+    handler, logger = get_function(initializer)(index, *args)
+    nb_requests = 0
+    while True:
+        try:
+            method, args = pickle.load(requests)
+        except EOFError:
+            break
+        try:
+            result = getattr(handler, method)(*args)
+        except Exception, e:
+            logger.error(traceback.format_exc())
+            result = (str(e), 0)
+        nb_requests += 1
+        rss = 0
+        if max_memory > 0:
+            try:
+                rss = handler.memory_usage()['rss']
+            except EnvironmentError:
+                pass
+        recycle = ((max_requests > 0 and nb_requests >= max_requests) or
+                   (max_memory > 0 and rss > max_memory * 1024))
+        pickle.dump((result, recycle), responses, 2)
+        responses.flush()
+        if recycle:
+            logger.info("Replacing worker process %s after %d requests "
+                        "(memory usage: %d kB)" % (os.getpid(), nb_requests,
+                                                   rss))
+            break
+    responses.close()
+
+################################################################################
+
+class _TestHandler(object):
+    rss = 0
+
+    def memory_usage(self):
+        return {'peak': self.rss, 'rss': self.rss}
+
+    def pid(self):
+        return os.getpid()
+
+    def index(self):
+        return self.worker_index
+
+    def grow(self, rss):
+        self.rss = rss
+
+    def echo(self, *args):
+        return list(args)
+
+    def fail(self):
+        raise ValueError("request failed")
+
+    def exit(self):
+        os._exit(1)
+
+def _init_test_worker(index, prefix):
+    logger = logging.getLogger('%s.%d' % (prefix, index))
+    logger.addHandler(logging.NullHandler())
+    handler = _TestHandler()
+    handler.worker_index = index
+    return handler, logger
+
+
+class TestWorkerPool(unittest.TestCase):
+    def make_pool(self, size, max_memory=0, max_requests=0):
+        logger = logging.getLogger('vistrails.test.worker_pool')
+        logger.addHandler(logging.NullHandler())
+        pool = WorkerPool(logger, size,
+                          'vistrails.core.worker_pool._init_test_worker',
+                          ('worker',), max_memory=max_memory,
+                          max_requests=max_requests)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_round_trip(self):
+        pool = self.make_pool(1)
+        self.assertEqual(pool.execute('echo', 1, u'\xe9', {'a': [None]}),
+                         [1, u'\xe9', {'a': [None]}])
+        self.assertNotEqual(pool.execute('pid'), os.getpid())
+        self.assertEqual(pool.execute('fail'), ("request failed", 0))
+
+    def test_recycling(self):
+        pool = self.make_pool(1, max_requests=2)
+        pids = [pool.execute('pid') for i in xrange(5)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertEqual(pids[2], pids[3])
+        self.assertEqual(len(set(pids)), 3)
+
+    def test_failed_worker(self):
+        pool = self.make_pool(1)
+        pid = pool.execute('pid')
+        self.assertEqual(pool.execute('exit'), ("Worker process failed", 0))
+        self.assertNotEqual(pool.execute('pid'), pid)
+
+    def test_memory_recycling(self):
+        pool = self.make_pool(1, max_memory=10)
+        pid = pool.execute('pid')
+        pool.execute('grow', 5 * 1024)
+        self.assertEqual(pool.execute('pid'), pid)
+        pool.execute('grow', 20 * 1024)
+        self.assertNotEqual(pool.execute('pid'), pid)
+
+    def test_failed_restart(self):
+        pool = self.make_pool(1, max_requests=1)
+        start_worker = pool.start_worker
+        def failing_start_worker(index):
+            raise OSError("can't start worker")
+        pool.start_worker = failing_start_worker
+        self.assertEqual(pool.execute('index'), 0)
+        self.assertRaises(OSError, pool.execute, 'index')
+        pool.start_worker = start_worker
+        self.assertEqual(pool.execute('index'), 0)
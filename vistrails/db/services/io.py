@@ -114,6 +114,11 @@ class SaveBundle(object):
        thumbnails are intialized for convenience so that you can directly
        append to them when using this step-by-step bundle creation method.
 
+       file_format selects how the vistrail and log are written to a .vt
+       file, 'xml' or 'binary'; if it is None, the vtFileFormat
+       configuration option is used. Bundles read from .vt files get the
+       format of the file.
+
     """
 
     def __init__(self, bundle_type, *args, **kwargs):
@@ -126,6 +131,7 @@ class SaveBundle(object):
         self.abstractions = []
         self.thumbnails = []
         self.mashups = []
+        self.file_format = None
         # Make all args into attrs using vtType as attr name
         # This requires that attr names in this class match the vtTypes
         # i.e. if arg's vtType is 'vistrail', self.vistrail = arg, etc...
@@ -156,6 +162,7 @@ class SaveBundle(object):
         cp.log = copy.copy(self.log)
         cp.registry = copy.copy(self.registry)
         cp.opm_graph = copy.copy(self.opm_graph)
+        cp.file_format = self.file_format
         for a in self.abstractions:
             cp.abstractions.append(a)
         
@@ -684,6 +691,9 @@ def unserialize(str, obj_type):
 
 def open_vistrail_from_xml(filename):
     """open_vistrail_from_xml(filename) -> Vistrail"""
+    if isinstance(filename, basestring) and is_binary_file(filename):
+        with open(filename, 'rb') as f:
+            return open_vistrail_from_binary(f.read())
     tree = ElementTree.parse(filename)
     version = get_version_for_xml(tree.getroot())
     try:
@@ -702,6 +712,65 @@ def open_vistrail_from_xml(filename):
 
     return vistrail
 
+def open_vistrail_from_binary(data):
+    """open_vistrail_from_binary(data: str) -> Vistrail
+
+    Reads a vistrail from the contents of a file in the binary format.
+
+    """
+    version = get_version_for_binary(data)
+    try:
+        daoList = getVersionDAO(version)
+        vistrail = daoList.open_from_binary(data, DBVistrail.vtType)
+        vistrail = translate_vistrail(vistrail, version)
+        vistrails.db.services.vistrail.update_id_scope(vistrail)
+    except VistrailsDBException, e:
+        if str(e).startswith('VistrailsDBException: Cannot find DAO for'):
+            raise VistrailsDBException(
+                "This vistrail was created by a newer version of VisTrails "
+                "and cannot be opened.")
+        raise e
+
+    return vistrail
+
+def open_vistrail_from_zip_member(z, name):
+    """open_vistrail_from_zip_member(z: ZipFile, name: str) -> Vistrail
+
+    Reads a vistrail from a member of a zip file without extracting it.
+    If it is in the current format and lazyVistrailLoading is set, the
+    operations of the actions are only read when they are first needed.
+
+    """
+    from vistrails.core.configuration import get_vistrails_configuration
+    f = z.open(name)
+    try:
+        binary = get_version_for_binary(f.read(64)) is not None
+    finally:
+        f.close()
+    if binary:
+        return open_vistrail_from_binary(z.read(name))
+    f = z.open(name)
+    try:
+        version = None
+        for event, node in ElementTree.iterparse(f, events=('start',)):
+            version = get_version_for_xml(node)
+            break
+    finally:
+        f.close()
+    lazy = getattr(get_vistrails_configuration(), 'lazyVistrailLoading',
+                   False)
+    f = z.open(name)
+    try:
+        if not lazy or version != currentVersion:
+            return open_vistrail_from_xml(f)
+        vistrail = getVersionDAO(version).open_vistrail_deferred(f)
+        if vistrail is None:
+            raise VistrailsDBException("Couldn't read vistrail from XML")
+        vistrails.db.services.vistrail.update_id_scope(vistrail)
+        return vistrail
+    finally:
+        f.close()
+
 def open_vistrail_bundle_from_zip_xml(filename):
     """open_vistrail_bundle_from_zip_xml(filename) -> SaveBundle
     Open a vistrail from a zip compressed format.
@@ -713,15 +782,28 @@ def open_vistrail_bundle_from_zip_xml(filename):
     """
     vt_save_dir = tempfile.mkdtemp(prefix='vt_save')
 
+    # The vistrail is read from the archive directly, the other files are
+    # extracted
+    vistrail = None
+    file_format = 'xml'
     z = zipfile.ZipFile(filename)
     try:
-        z.extractall(vt_save_dir)
+        members = z.namelist()
+        if 'vistrail' in members:
+            vistrail = open_vistrail_from_zip_member(z, 'vistrail')
+            f = z.open('vistrail')
+            try:
+                if get_version_for_binary(f.read(64)) is not None:
+                    file_format = 'binary'
+            finally:
+                f.close()
+        z.extractall(vt_save_dir, [m for m in members if m != 'vistrail'])
     finally:
         z.close()
 
-    vistrail = None
     log = None
     log_fname = None
+    checkpoints_fname = None
     abstraction_files = []
     unknown_files = []
     thumbnail_files = []
@@ -729,15 +811,19 @@ def open_vistrail_bundle_from_zip_xml(filename):
     try:
         for root, dirs, files in os.walk(vt_save_dir):
             for fname in files:
-                if fname == 'vistrail' and root == vt_save_dir:
-                    vistrail = open_vistrail_from_xml(os.path.join(root, fname))
-                elif fname == 'log' and root == vt_save_dir:
+                if fname == 'log' and root == vt_save_dir:
                     # FIXME read log to get execution info
                     # right now, just ignore the file
                     log = None 
                     log_fname = os.path.join(root, fname)
                     # log = open_log_from_xml(os.path.join(root, fname))
                     # objs.append(DBLog.vtType, log)
+                elif root == os.path.join(vt_save_dir, 'logs'):
+                    # segmented log, read through a LogStore
+                    log = None
+                    log_fname = root
+                elif fname == 'checkpoints' and root == vt_save_dir:
+                    checkpoints_fname = os.path.join(root, fname)
                 elif fname.startswith('abstraction_'):
                     abstraction_file = os.path.join(root, fname)
                     abstraction_files.append(abstraction_file)
@@ -767,6 +853,14 @@ def open_vistrail_bundle_from_zip_xml(filename):
     if vistrail is None:
         raise VistrailsDBException("vt file does not contain vistrail")
     vistrail.db_log_filename = log_fname
+    if checkpoints_fname is not None:
+        checkpoints = vistrails.db.services.vistrail.WorkflowCheckpoints()
+        try:
+            checkpoints.load(checkpoints_fname)
+        except (IOError, ValueError, KeyError, TypeError), e:
+            debug.warning("Could not read workflow checkpoints", e)
+        else:
+            vistrail.db_checkpoints = checkpoints
 
     # call package hooks
     from vistrails.core.packagemanager import get_package_manager
@@ -776,7 +870,8 @@ def open_vistrail_bundle_from_zip_xml(filename):
 
     save_bundle = SaveBundle(DBVistrail.vtType, vistrail, log, 
                              abstractions=abstraction_files, 
-                             thumbnails=thumbnail_files, mashups=mashups)
+                             thumbnails=thumbnail_files, mashups=mashups,
+                             file_format=file_format)
     return (save_bundle, vt_save_dir)
 
 def open_vistrail_bundle_from_db(db_connection, vistrail_id, tmp_dir=None):
@@ -859,14 +954,41 @@ def save_vistrail_to_xml(vistrail, filename, version=None):
     vistrail.db_currentVersion = current_action
     return vistrail
 
-def save_vistrail_bundle_to_zip_xml(save_bundle, filename, vt_save_dir=None, version=None):
+def save_vistrail_to_binary(vistrail, filename, version=None):
+    """save_vistrail_to_binary(vistrail, filename: str, version: str)
+         -> Vistrail
+
+    Writes a vistrail in the binary format.
+
+    """
+    if version is None:
+        version = currentVersion
+    if not vistrail.db_version:
+        vistrail.db_version = currentVersion
+
+    current_action = 0L
+    if hasattr(vistrail, 'db_currentVersion'):
+        current_action = vistrail.db_currentVersion
+
+    vistrail = translate_vistrail(vistrail, vistrail.db_version, version)
+
+    daoList = getVersionDAO(version)
+    daoList.save_to_binary(vistrail, filename, version)
+    vistrail = translate_vistrail(vistrail, version)
+    vistrail.db_currentVersion = current_action
+    return vistrail
+
+def save_vistrail_bundle_to_zip_xml(save_bundle, filename, vt_save_dir=None,
+                                    version=None, file_format=None):
     """save_vistrail_bundle_to_zip_xml(save_bundle: SaveBundle, filename: str,
-                                vt_save_dir: str, version: str)
+                                vt_save_dir: str, version: str,
+                                file_format: str)
          -> (save_bundle: SaveBundle, vt_save_dir: str)
 
     save_bundle: a SaveBundle object containing vistrail data to save
     filename: filename to save to
     vt_save_dir: directory storing any previous files
+    file_format: 'xml' or 'binary', defaults to save_bundle.file_format
 
     Generates a zip compressed version of vistrail.
     It raises an Exception if there was an error.
@@ -876,6 +998,15 @@ def save_vistrail_bundle_to_zip_xml(save_bundle, filename, vt_save_dir=None, ver
     if save_bundle.vistrail is None:
         raise VistrailsDBException('save_vistrail_bundle_to_zip_xml failed, '
                                    'bundle does not contain a vistrail')
+    if file_format is None:
+        file_format = save_bundle.file_format
+    if file_format is None:
+        from vistrails.core.configuration import get_vistrails_configuration
+        file_format = getattr(get_vistrails_configuration(), 'vtFileFormat',
+                              'xml')
+    if file_format not in ('xml', 'binary'):
+        raise VistrailsDBException('save_vistrail_bundle_to_zip_xml failed, '
+                                   'unknown file format %r' % file_format)
     if not vt_save_dir:
         vt_save_dir = tempfile.mkdtemp(prefix='vt_save')
     # abstractions are saved in the root of the zip file
@@ -886,19 +1017,66 @@ def save_vistrail_bundle_to_zip_xml(save_bundle, filename, vt_save_dir=None, ver
     
     # Save Vistrail
     xml_fname = os.path.join(vt_save_dir, 'vistrail')
-    save_vistrail_to_xml(save_bundle.vistrail, xml_fname, version)
+    if file_format == 'binary':
+        save_vistrail_to_binary(save_bundle.vistrail, xml_fname, version)
+    else:
+        save_vistrail_to_xml(save_bundle.vistrail, xml_fname, version)
 
     # Save Log
+    # the log is either a single 'log' file or a 'logs' directory of
+    # segments (see log_store.LogStore)
     if save_bundle.vistrail.db_log_filename is not None:
-        xml_fname = os.path.join(vt_save_dir, 'log')
-        if save_bundle.vistrail.db_log_filename != xml_fname:
-            shutil.copyfile(save_bundle.vistrail.db_log_filename, xml_fname)
-            save_bundle.vistrail.db_log_filename = xml_fname
+        log_fname = save_bundle.vistrail.db_log_filename
+        if os.path.isdir(log_fname):
+            xml_fname = os.path.join(vt_save_dir, 'logs')
+            if log_fname != xml_fname:
+                if os.path.exists(xml_fname):
+                    shutil.rmtree(xml_fname)
+                shutil.copytree(log_fname, xml_fname)
+                save_bundle.vistrail.db_log_filename = xml_fname
+        else:
+            xml_fname = os.path.join(vt_save_dir, 'log')
+            if log_fname != xml_fname:
+                shutil.copyfile(log_fname, xml_fname)
+                save_bundle.vistrail.db_log_filename = xml_fname
 
     if save_bundle.log is not None:
         xml_fname = os.path.join(vt_save_dir, 'log')
-        save_log_to_xml(save_bundle.log, xml_fname, version, True)
-        save_bundle.vistrail.db_log_filename = xml_fname
+        logs_dir = os.path.join(vt_save_dir, 'logs')
+        from vistrails.core.configuration import get_vistrails_configuration
+        segment_size = getattr(get_vistrails_configuration(),
+                               'logSegmentSize', 0)
+        # executions are appended in the format of the existing log
+        if os.path.exists(xml_fname):
+            binary_log = is_binary_file(xml_fname)
+        else:
+            binary_log = file_format == 'binary'
+        if os.path.isdir(logs_dir) or segment_size > 0:
+            from vistrails.db.services.log_store import LogStore
+            store = LogStore(logs_dir,
+                             file_format=binary_log and 'binary' or 'xml')
+            if segment_size > 0:
+                store.max_segment_size = segment_size * 1024 * 1024
+            if os.path.exists(xml_fname):
+                # the single log file becomes the first segment
+                store.append(open_log_from_xml(xml_fname, True), version)
+                os.unlink(xml_fname)
+            store.append(save_bundle.log, version)
+            save_bundle.vistrail.db_log_filename = logs_dir
+        else:
+            if binary_log:
+                save_log_to_binary(save_bundle.log, xml_fname, version, True)
+            else:
+                save_log_to_xml(save_bundle.log, xml_fname, version, True)
+            save_bundle.vistrail.db_log_filename = xml_fname
+
+    # Save workflow checkpoints
+    checkpoints_fname = os.path.join(vt_save_dir, 'checkpoints')
+    checkpoints = getattr(save_bundle.vistrail, 'db_checkpoints', None)
+    if checkpoints is not None and checkpoints.persist and len(checkpoints):
+        checkpoints.save(save_bundle.vistrail, checkpoints_fname)
+    elif os.path.exists(checkpoints_fname):
+        os.unlink(checkpoints_fname)
 
     # Save Abstractions
     saved_abstractions = []
@@ -1000,7 +1178,7 @@ def save_vistrail_bundle_to_zip_xml(save_bundle, filename, vt_save_dir=None, ver
     save_bundle = SaveBundle(save_bundle.bundle_type, save_bundle.vistrail,
                              save_bundle.log, thumbnails=saved_thumbnails,
                              abstractions=saved_abstractions,
-                             mashups=saved_mashups)
+                             mashups=saved_mashups, file_format=file_format)
     return (save_bundle, vt_save_dir)
 
 def save_vistrail_bundle_to_db(save_bundle, db_connection, do_copy=False, version=None):
@@ -1197,6 +1375,11 @@ def get_saved_workflows(vistrail, db_connection):
 
 def open_log_from_xml(filename, was_appended=False):
     """open_log_from_xml(filename) -> DBLog"""
+    if isinstance(filename, basestring) and os.path.isdir(filename):
+        from vistrails.db.services.log_store import LogStore
+        return LogStore(filename).read()
+    if isinstance(filename, basestring) and is_binary_file(filename):
+        return open_log_from_binary(filename, was_appended)
     if was_appended:
         parser = ElementTree.XMLTreeBuilder()
         parser.feed("<log>\n")
@@ -1230,6 +1413,20 @@ def open_log_from_xml(filename, was_appended=False):
         vistrails.db.services.log.update_id_scope(log)
     return log
 
+def open_log_from_binary(filename, was_appended=False):
+    """open_log_from_binary(filename, was_appended: bool) -> DBLog"""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    version = get_version_for_binary(data)
+    daoList = getVersionDAO(version)
+    log = daoList.open_from_binary(data, DBLog.vtType)
+    log = translate_log(log, version)
+    if was_appended:
+        vistrails.db.services.log.update_ids(log)
+    else:
+        vistrails.db.services.log.update_id_scope(log)
+    return log
+
 def open_log_from_db(db_connection, id, lock=False, version=None):
     """open_log_from_db(db_connection, id : long: lock: bool, version: str) 
          -> DBLog 
@@ -1299,6 +1496,21 @@ def save_log_to_xml(log, filename, version=None, do_append=False):
     log = translate_log(log, version)
     return log
 
+def save_log_to_binary(log, filename, version=None, do_append=False):
+    if version is None:
+        version = currentVersion
+    if not log.db_version:
+        log.db_version = currentVersion
+    log = translate_log(log, log.db_version, version)
+
+    daoList = getVersionDAO(version)
+    if do_append:
+        daoList.append_to_binary(log, filename, version)
+    else:
+        daoList.save_to_binary(log, filename, version)
+    log = translate_log(log, version)
+    return log
+
 def save_log_bundle_to_xml(save_bundle, filename, version=None):
     if save_bundle.log is None:
         raise VistrailsDBException('save_log_bundle_to_xml failed, '
@@ -1779,6 +1991,25 @@ def delete_entity_from_db(db_connection, type, obj_id):
     dao_list.delete_from_db(db_connection, type, obj_id)
     db_connection.commit()
     
+def get_version_for_binary(data):
+    """get_version_for_binary(data: str) -> str
+
+    Returns the version from the start of a file in the binary format,
+    or None if data is not the start of such a file.
+
+    """
+    if not data.startswith('VTBIN '):
+        return None
+    fields = data.split('\n', 1)[0].split(' ')
+    if len(fields) != 3:
+        return None
+    return fields[2]
+
+def is_binary_file(filename):
+    """is_binary_file(filename: str) -> bool"""
+    with open(filename, 'rb') as f:
+        return get_version_for_binary(f.read(64)) is not None
+
 def get_version_for_xml(root):
     version = root.get('version', None)
     if version is not None:
@@ -1881,3 +2112,187 @@ class TestDBIO(unittest.TestCase):
                 self.fail(str(e))
         finally:
             os.rmdir(testdir)
+
+    def test_lazy_vt(self):
+        """test that a lazily read vt file matches the fully read one"""
+        from vistrails.core.configuration import get_vistrails_configuration
+        from vistrails.db.versions.v1_0_5.domain.vistrail import is_deferred
+
+        testdir = tempfile.mkdtemp(prefix='vt_')
+        filename = os.path.join(testdir, 'terminator.vt')
+        conf = get_vistrails_configuration()
+        old_lazy = conf.lazyVistrailLoading
+        try:
+            # write it in the current format
+            (save_bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType,
+                os.path.join(vistrails.core.system.vistrails_root_directory(),
+                             'tests/resources/terminator.vt'))
+            save_bundle_to_zip_xml(save_bundle, filename, vt_save_dir)
+            close_zip_xml(vt_save_dir)
+
+            conf.lazyVistrailLoading = False
+            (bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType, filename)
+            close_zip_xml(vt_save_dir)
+            full = bundle.vistrail
+            conf.lazyVistrailLoading = True
+            (bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType, filename)
+            close_zip_xml(vt_save_dir)
+            lazy = bundle.vistrail
+
+            self.assertTrue(all(is_deferred(a) for a in lazy.db_actions))
+            self.assertEqual(lazy.idScope.ids, full.idScope.ids)
+            self.assertEqual(
+                    sorted((t.db_id, t.db_name) for t in lazy.db_tags),
+                    sorted((t.db_id, t.db_name) for t in full.db_tags))
+            version = max(full.db_actions_id_index)
+            workflow = vistrails.db.services.vistrail.materializeWorkflow(
+                    lazy, version)
+            self.assertTrue(any(is_deferred(a) for a in lazy.db_actions))
+            self.assertTrue(lazy.db_deferred_actions)
+            # a miss loads the remaining actions, then costs a lookup
+            self.assertIsNone(lazy.db_get_object('module', -1))
+            self.assertFalse(any(is_deferred(a) for a in lazy.db_actions))
+            self.assertFalse(lazy.db_deferred_actions)
+            self.assertEqual(
+                    sorted((m.db_id, m.db_name) for m in workflow.db_modules),
+                    sorted((m.db_id, m.db_name) for m in
+                           vistrails.db.services.vistrail.materializeWorkflow(
+                               full, version).db_modules))
+            for action in full.db_actions:
+                self.assertEqual(
+                        [op.db_id for op in action.db_operations],
+                        [op.db_id for op in
+                         lazy.db_get_action_by_id(action.db_id).db_operations])
+            self.assertEqual(set(lazy.db_objects), set(full.db_objects))
+        finally:
+            conf.lazyVistrailLoading = old_lazy
+            shutil.rmtree(testdir)
+
+    def test_binary_vistrail(self):
+        """test that the binary format reads back what the xml one does"""
+        testdir = tempfile.mkdtemp(prefix='vt_')
+        try:
+            (save_bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType,
+                os.path.join(vistrails.core.system.vistrails_root_directory(),
+                             'tests/resources/terminator.vt'))
+            close_zip_xml(vt_save_dir)
+            vistrail = save_bundle.vistrail
+            xml_fname = os.path.join(testdir, 'vistrail.xml')
+            binary_fname = os.path.join(testdir, 'vistrail.bin')
+            save_vistrail_to_xml(vistrail, xml_fname)
+            save_vistrail_to_binary(vistrail, binary_fname)
+            self.assertTrue(is_binary_file(binary_fname))
+            self.assertFalse(is_binary_file(xml_fname))
+
+            read = open_vistrail_from_xml(binary_fname)
+            self.assertEqual(read.idScope.ids,
+                             open_vistrail_from_xml(xml_fname).idScope.ids)
+            xml2_fname = os.path.join(testdir, 'vistrail2.xml')
+            save_vistrail_to_xml(read, xml2_fname)
+            with open(xml_fname) as f1:
+                with open(xml2_fname) as f2:
+                    self.assertEqual(f1.read(), f2.read())
+        finally:
+            shutil.rmtree(testdir)
+
+    def test_binary_vt(self):
+        """test saving a vt file in the binary format, with its log"""
+        testdir = tempfile.mkdtemp(prefix='vt_')
+        filename = os.path.join(testdir, 'spx_loop.vt')
+        try:
+            (save_bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType,
+                os.path.join(vistrails.core.system.vistrails_root_directory(),
+                             'tests/resources/spx_loop.vt'))
+            self.assertEqual(save_bundle.file_format, 'xml')
+            xml_log = open_log_from_xml(save_bundle.vistrail.db_log_filename,
+                                        True)
+            n_actions = len(save_bundle.vistrail.db_actions)
+            # the log is new to the binary vt file
+            os.unlink(save_bundle.vistrail.db_log_filename)
+            save_bundle.vistrail.db_log_filename = None
+            save_bundle.log = xml_log
+            save_bundle = save_vistrail_bundle_to_zip_xml(
+                    save_bundle, filename, vt_save_dir,
+                    file_format='binary')[0]
+            close_zip_xml(vt_save_dir)
+            self.assertEqual(save_bundle.file_format, 'binary')
+
+            (bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType, filename)
+            try:
+                self.assertEqual(bundle.file_format, 'binary')
+                self.assertEqual(len(bundle.vistrail.db_actions), n_actions)
+                log_fname = bundle.vistrail.db_log_filename
+                self.assertTrue(is_binary_file(log_fname))
+                log = open_log_from_xml(log_fname, True)
+                self.assertEqual(
+                    [(e.db_id, e.db_parent_version, e.db_ts_start)
+                     for e in log.db_workflow_execs],
+                    [(e.db_id, e.db_parent_version, e.db_ts_start)
+                     for e in xml_log.db_workflow_execs])
+
+                # saving executions again appends them to the binary log
+                bundle.log = xml_log
+                bundle = save_bundle_to_zip_xml(bundle, filename,
+                                                vt_save_dir)[0]
+                log = open_log_from_xml(bundle.vistrail.db_log_filename, True)
+                self.assertEqual(len(log.db_workflow_execs),
+                                 2 * len(xml_log.db_workflow_execs))
+            finally:
+                close_zip_xml(vt_save_dir)
+        finally:
+            shutil.rmtree(testdir)
+
+    def test_segmented_log_vt(self):
+        """Saving executions with logSegmentSize moves the log to segments.
+        """
+        from vistrails.core.configuration import get_vistrails_configuration
+        from vistrails.db.services.log_store import LogStore
+        testdir = tempfile.mkdtemp(prefix='vt_')
+        filename = os.path.join(testdir, 'spx_loop.vt')
+        configuration = get_vistrails_configuration()
+        old_size = getattr(configuration, 'logSegmentSize', 0)
+        configuration.logSegmentSize = 1
+        try:
+            (save_bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType,
+                os.path.join(vistrails.core.system.vistrails_root_directory(),
+                             'tests/resources/spx_loop.vt'))
+            xml_log = open_log_from_xml(save_bundle.vistrail.db_log_filename,
+                                        True)
+            save_bundle.log = xml_log
+            save_bundle = save_vistrail_bundle_to_zip_xml(
+                    save_bundle, filename, vt_save_dir)[0]
+            close_zip_xml(vt_save_dir)
+
+            (bundle, vt_save_dir) = open_bundle_from_zip_xml(
+                DBVistrail.vtType, filename)
+            try:
+                log_fname = bundle.vistrail.db_log_filename
+                self.assertEqual(log_fname, os.path.join(vt_save_dir, 'logs'))
+                self.assertFalse(os.path.exists(
+                        os.path.join(vt_save_dir, 'log')))
+                store = LogStore(log_fname)
+                self.assertEqual(len(store.index_entries()), 2)
+                log = open_log_from_xml(log_fname, True)
+                n = len(xml_log.db_workflow_execs)
+                self.assertEqual(
+                    [(e.db_id, e.db_parent_version, e.db_ts_start)
+                     for e in log.db_workflow_execs[n:]],
+                    [(e.db_id + n, e.db_parent_version, e.db_ts_start)
+                     for e in log.db_workflow_execs[:n]])
+                version = xml_log.db_workflow_execs[0].db_parent_version
+                self.assertEqual(
+                    len(store.read(versions=[version]).db_workflow_execs),
+                    2 * len([e for e in xml_log.db_workflow_execs
+                             if e.db_parent_version == version]))
+            finally:
+                close_zip_xml(vt_save_dir)
+        finally:
+            configuration.logSegmentSize = old_size
+            shutil.rmtree(testdir)
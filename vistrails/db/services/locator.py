@@ -850,6 +850,14 @@ class DBLocator(BaseLocator):
         DBLocator.cache_timestamps[self._hash] = primary_obj.db_last_modified
         return save_bundle
 
+    def clear_cache(self):
+        """clear_cache() -> None
+        Removes the bundle of this locator from the cache of loaded bundles.
+        """
+        _hash = self.hash()
+        DBLocator.cache.pop(_hash, None)
+        DBLocator.cache_timestamps.pop(_hash, None)
+
     def save(self, save_bundle, do_copy=False, version=None):
         connection = self.get_connection()
         for obj in save_bundle.get_db_objs():
@@ -0,0 +1,384 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Segmented, append-only storage for execution logs.
+
+A LogStore is a directory of log segments. Each segment holds appended
+workflow executions, in the same format as the single 'log' file of .vt
+files, and a new segment is started once the current one reaches the
+maximum segment size. An append-only 'index' file records, for each
+append, the segment it went to and the versions, users and time span of
+the executions it added, so that readers only parse the segments that can
+contain the executions they are looking for.
+"""
+from __future__ import division, with_statement
+
+import datetime
+import json
+import os
+
+from vistrails.db import VistrailsDBException
+from vistrails.db.domain import DBLog, DBWorkflowExec
+import vistrails.db.services.io
+
+import unittest
+
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def time_str(t):
+    """time_str(t: datetime or str) -> str
+    Returns a time in the sortable format used by the index and queries.
+    """
+    if t is None:
+        return None
+    if isinstance(t, datetime.datetime):
+        return t.strftime(TIME_FORMAT)
+    return str(t)
+
+
+def match_workflow_exec(workflow_exec, versions=None, from_time=None,
+                        to_time=None, user=None):
+    """match_workflow_exec(workflow_exec: DBWorkflowExec, versions: set,
+                           from_time: str, to_time: str, user: str) -> bool
+    Checks an execution against the filters of runLogQuery: its version is
+    one of 'versions', it ends after 'from_time' and starts before
+    'to_time', and it was run by 'user'.
+    """
+    if versions is not None and workflow_exec.db_parent_version not in versions:
+        return False
+    if user is not None and workflow_exec.db_user != user:
+        return False
+    if from_time is not None:
+        ts_end = time_str(workflow_exec.db_ts_end)
+        if ts_end is not None and ts_end <= from_time:
+            return False
+    if to_time is not None:
+        ts_start = time_str(workflow_exec.db_ts_start)
+        if ts_start is not None and ts_start >= to_time:
+            return False
+    return True
+
+
+class LogStore(object):
+    """A directory of execution log segments with an index.
+
+    Executions are only ever appended: a segment is never rewritten, and the
+    index only gets new lines. read() with no filter returns the same log as
+    reading a single appended log file.
+    """
+
+    INDEX = 'index'
+    SEGMENT_PREFIX = 'segment_'
+
+    def __init__(self, dirname, max_segment_size=64 * 1024 * 1024,
+                 file_format=None):
+        self.dirname = dirname
+        self.max_segment_size = max_segment_size
+        self.file_format = file_format
+        self._entries = None
+
+    @staticmethod
+    def is_log_store(filename):
+        """is_log_store(filename: str) -> bool"""
+        return (os.path.isdir(filename) and
+                os.path.isfile(os.path.join(filename, LogStore.INDEX)))
+
+    def index_entries(self):
+        """index_entries() -> list of dict
+        Returns the index entries, one for each append, in order.
+        """
+        if self._entries is None:
+            entries = []
+            index_fname = os.path.join(self.dirname, self.INDEX)
+            if os.path.exists(index_fname):
+                with open(index_fname, 'rb') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            # partially written last line
+                            break
+            self._entries = entries
+        return self._entries
+
+    def segment_names(self):
+        """segment_names() -> list of str
+        Returns the names of all the segments, oldest first.
+        """
+        if not os.path.isdir(self.dirname):
+            return []
+        return sorted(f for f in os.listdir(self.dirname)
+                      if f.startswith(self.SEGMENT_PREFIX))
+
+    def segments(self, versions=None, from_time=None, to_time=None,
+                 user=None):
+        """segments(versions: list, from_time: str or datetime,
+                    to_time: str or datetime, user: str) -> list of str
+        Returns the names of the segments whose index entries can match the
+        filters, oldest first.
+        """
+        if (versions is None and from_time is None and to_time is None and
+                user is None):
+            return self.segment_names()
+        if versions is not None:
+            versions = set(versions)
+        from_time = time_str(from_time)
+        to_time = time_str(to_time)
+        selected = set()
+        for entry in self.index_entries():
+            if entry['segment'] in selected:
+                continue
+            if versions is not None and versions.isdisjoint(entry['versions']):
+                continue
+            if user is not None and user not in entry['users']:
+                continue
+            if (from_time is not None and entry['end'] is not None and
+                    entry['end'] <= from_time):
+                continue
+            if (to_time is not None and entry['start'] is not None and
+                    entry['start'] >= to_time):
+                continue
+            selected.add(entry['segment'])
+        return sorted(selected)
+
+    def _current_segment(self):
+        names = self.segment_names()
+        if names:
+            fname = os.path.join(self.dirname, names[-1])
+            if os.path.getsize(fname) < self.max_segment_size:
+                return names[-1]
+            number = int(names[-1][len(self.SEGMENT_PREFIX):]) + 1
+        else:
+            number = 0
+        return '%s%06d' % (self.SEGMENT_PREFIX, number)
+
+    def append(self, log, version=None):
+        """append(log: DBLog, version: str) -> None
+        Appends the workflow executions of a log to the current segment,
+        starting a new segment if it is full, and indexes them.
+        """
+        workflow_execs = log.db_workflow_execs
+        if not workflow_execs:
+            return
+        if not os.path.exists(self.dirname):
+            os.makedirs(self.dirname)
+        segment = self._current_segment()
+        fname = os.path.join(self.dirname, segment)
+        if os.path.exists(fname):
+            binary = vistrails.db.services.io.is_binary_file(fname)
+        else:
+            file_format = self.file_format
+            if file_format is None:
+                file_format = self._segment_format()
+            binary = file_format == 'binary'
+        if binary:
+            vistrails.db.services.io.save_log_to_binary(log, fname, version,
+                                                        True)
+        else:
+            vistrails.db.services.io.save_log_to_xml(log, fname, version, True)
+
+        starts = [time_str(e.db_ts_start) for e in workflow_execs
+                  if e.db_ts_start is not None]
+        ends = [time_str(e.db_ts_end) for e in workflow_execs]
+        entry = {'segment': segment,
+                 'count': len(workflow_execs),
+                 'versions': sorted(set(e.db_parent_version
+                                        for e in workflow_execs)),
+                 'users': sorted(set(e.db_user for e in workflow_execs)),
+                 'start': min(starts) if starts else None,
+                 # an execution that did not end matches any from_time
+                 'end': None if None in ends else max(ends)}
+        with open(os.path.join(self.dirname, self.INDEX), 'ab') as f:
+            f.write(json.dumps(entry, sort_keys=True))
+            f.write('\n')
+        if self._entries is not None:
+            self._entries.append(entry)
+
+    def _segment_format(self):
+        names = self.segment_names()
+        if names and vistrails.db.services.io.is_binary_file(
+                os.path.join(self.dirname, names[-1])):
+            return 'binary'
+        return 'xml'
+
+    def read(self, versions=None, from_time=None, to_time=None, user=None):
+        """read(versions: list, from_time: str or datetime,
+                to_time: str or datetime, user: str) -> DBLog
+        Reads the executions matching the filters, parsing only the
+        segments that can contain them. Executions are numbered as if the
+        whole log was read, so their ids do not depend on the filters.
+        """
+        if versions is not None:
+            versions = set(versions)
+        from_time = time_str(from_time)
+        to_time = time_str(to_time)
+        first_ids = {}
+        next_id = 1
+        for entry in self.index_entries():
+            first_ids.setdefault(entry['segment'], next_id)
+            next_id += entry['count']
+        workflow_execs = []
+        for segment in self.segments(versions, from_time, to_time, user):
+            fname = os.path.join(self.dirname, segment)
+            try:
+                seg_log = vistrails.db.services.io.open_log_from_xml(fname,
+                                                                     True)
+            except Exception, e:
+                raise VistrailsDBException("Could not read log segment "
+                                           "'%s': %s" % (fname, e))
+            if segment in first_ids:
+                first_id = first_ids[segment]
+            else:
+                # executions that were not indexed, numbered after the rest
+                first_id = next_id
+                next_id += len(seg_log.db_workflow_execs)
+            for i, workflow_exec in enumerate(seg_log.db_workflow_execs):
+                workflow_exec.db_id = first_id + i
+                if match_workflow_exec(workflow_exec, versions, from_time,
+                                       to_time, user):
+                    workflow_execs.append(workflow_exec)
+        log = DBLog(workflow_execs=workflow_execs)
+        log.id_scope.updateBeginId(DBWorkflowExec.vtType, next_id)
+        return log
+
+
+##############################################################################
+# Testing
+
+
+class TestLogStore(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.dirname = tempfile.mkdtemp(prefix='vt_logstore_')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.dirname)
+
+    def make_log(self, versions, day, user='alice'):
+        workflow_execs = []
+        for i, version in enumerate(versions):
+            start = datetime.datetime(2016, 1, day, 10, i)
+            workflow_execs.append(DBWorkflowExec(
+                    id=i + 1, user=user, ip='', session=0,
+                    vt_version='2.2', ts_start=start,
+                    ts_end=start + datetime.timedelta(seconds=30),
+                    parent_id=None, parent_type='vistrail',
+                    parent_version=version, completed=1, name=''))
+        return DBLog(workflow_execs=workflow_execs)
+
+    def test_segments(self):
+        store = LogStore(os.path.join(self.dirname, 'logs'),
+                         max_segment_size=1)
+        store.append(self.make_log([1, 2], 1))
+        store.append(self.make_log([3], 2, 'bob'))
+        store.append(self.make_log([2, 4], 3))
+        self.assertEqual(len(store.segment_names()), 3)
+        self.assertTrue(LogStore.is_log_store(store.dirname))
+
+        self.assertEqual(len(store.read().db_workflow_execs), 5)
+        self.assertEqual(store.segments(versions=[2]),
+                         ['segment_000000', 'segment_000002'])
+        self.assertEqual(
+                [e.db_parent_version
+                 for e in store.read(versions=[2]).db_workflow_execs],
+                [2, 2])
+        self.assertEqual(store.segments(user='bob'), ['segment_000001'])
+        self.assertEqual(store.segments(from_time='2016-01-02 12:00:00'),
+                         ['segment_000002'])
+        self.assertEqual(
+                store.segments(to_time=datetime.datetime(2016, 1, 2)),
+                ['segment_000000'])
+        log = store.read(from_time='2016-01-01 10:00:40',
+                         to_time='2016-01-02 00:00:00')
+        self.assertEqual([(e.db_id, e.db_parent_version)
+                          for e in log.db_workflow_execs],
+                         [(2, 2)])
+        self.assertEqual(log.id_scope.getNewId(DBWorkflowExec.vtType), 6)
+
+        # a reopened store reads the same index
+        store = LogStore(store.dirname)
+        self.assertEqual(store.segments(versions=[4]), ['segment_000002'])
+
+    def test_rollover(self):
+        store = LogStore(self.dirname)
+        store.append(self.make_log([1], 1))
+        store.append(self.make_log([2], 2))
+        self.assertEqual(store.segment_names(), ['segment_000000'])
+        self.assertEqual(len(store.index_entries()), 2)
+        log = vistrails.db.services.io.open_log_from_xml(
+                os.path.join(self.dirname, 'segment_000000'), True)
+        self.assertEqual(len(log.db_workflow_execs), 2)
+
+        store.max_segment_size = 1
+        store.append(self.make_log([3], 3))
+        self.assertEqual(store.segment_names(),
+                         ['segment_000000', 'segment_000001'])
+        self.assertEqual(
+                [e.db_id for e in store.read().db_workflow_execs],
+                [1, 2, 3])
+
+    def test_binary(self):
+        store = LogStore(self.dirname, file_format='binary')
+        store.append(self.make_log([1, 2], 1))
+        store.append(self.make_log([3], 2))
+        fname = os.path.join(self.dirname, 'segment_000000')
+        self.assertTrue(vistrails.db.services.io.is_binary_file(fname))
+        self.assertEqual(
+                [e.db_parent_version for e in store.read().db_workflow_execs],
+                [1, 2, 3])
+
+    def test_query(self):
+        from vistrails.db.services.query import runLogQuery
+        store = LogStore(self.dirname, max_segment_size=1)
+        store.append(self.make_log([1, 2], 1))
+        store.append(self.make_log([3, 2], 2, 'bob'))
+        rows, count = runLogQuery(store, version='2')
+        self.assertEqual(count, 2)
+        self.assertEqual([(r[3], r[5], r[8]) for r in rows],
+                         [(2, 2, 'alice'), (2, 4, 'bob')])
+        rows, count = runLogQuery(store, user='bob', limit=1)
+        self.assertEqual(count, 2)
+        self.assertEqual([r[5] for r in rows], [3])
+        rows = runLogQuery(store, user='bob', offset=1)
+        self.assertEqual([r[5] for r in rows], [4])
+        self.assertEqual(runLogQuery(store, completed='no'), ([], 0))
+        self.assertRaises(VistrailsDBException, runLogQuery, store,
+                          version='tag')
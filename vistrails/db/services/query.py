@@ -37,6 +37,7 @@ from __future__ import division
 
 from vistrails.db import VistrailsDBException
 from vistrails.db.services.io import open_db_connection, close_db_connection, get_db_lib
+from vistrails.db.services.log_store import LogStore
 
 def runWorkflowQuery(config, vistrail=None, version=None, fromTime=None,
         toTime=None, user=None, offset=0, limit=100, modules=[], thumbs=None):
@@ -159,6 +160,9 @@ def runLogQuery(config, vistrail=None, version=None, fromTime=None, toTime=None,
     # returns list of workflow executions:
     #         (vistrail name, vistrail id, log id, workflow id, workflow name,
     #          execution id, start time, end time, user, completed, thumb)
+    if isinstance(config, LogStore):
+        return runLogStoreQuery(config, vistrail, version, fromTime, toTime,
+                                user, completed, offset, limit, modules)
     result = []
     db = open_db_connection(config)
     select_part = \
@@ -263,3 +267,64 @@ def runLogQuery(config, vistrail=None, version=None, fromTime=None, toTime=None,
 
     close_db_connection(db)
     return result
+
+def runLogStoreQuery(store, vistrail=None, version=None, fromTime=None,
+                     toTime=None, user=None, completed=None, offset=0,
+                     limit=100, modules=[]):
+    """runLogStoreQuery(store: LogStore, ...) -> list or (list, int)
+    Runs runLogQuery on the segmented log of a .vt file. Only the segments
+    whose index matches the version, time and user filters are read.
+    The store does not know its vistrail, so the vistrail name and id,
+    log id, workflow name and thumbnail columns are None, and versions can
+    only be given by number.
+
+    """
+    if vistrail:
+        raise VistrailsDBException("A log store only holds the log of one "
+                                   "vistrail and cannot be queried by "
+                                   "vistrail")
+    versions = None
+    if version:
+        try:
+            versions = [int(version)]
+        except ValueError:
+            raise VistrailsDBException("A log store can only be queried by "
+                                       "version number")
+    completed_dict = {'no':0, 'yes':1, 'ok':1}
+    if completed is not None:
+        try:
+            completed = int(completed)
+        except ValueError:
+            completed = completed_dict.get(str(completed).lower(), -1)
+    module_filters = []
+    for module, mCompleted in modules:
+        if mCompleted is not None:
+            mCompleted = completed_dict.get(str(mCompleted).lower(), -1)
+        module_filters.append((module.lower(), mCompleted))
+
+    log = store.read(versions=versions, from_time=fromTime, to_time=toTime,
+                     user=user)
+    rows = []
+    for w in log.db_workflow_execs:
+        if completed is not None and w.db_completed != completed:
+            continue
+        # TODO nested module executions are not detected
+        module_execs = [(m.db_module_name.lower(), m.db_completed)
+                        for m in w.db_item_execs
+                        if m.vtType == 'module_exec' and m.db_module_name]
+        matched = True
+        for module, mCompleted in module_filters:
+            if not any(name == module and
+                       (mCompleted is None or c == mCompleted)
+                       for name, c in module_execs):
+                matched = False
+                break
+        if matched:
+            rows.append((None, None, None, w.db_parent_version, None,
+                         w.db_id, w.db_ts_start, w.db_ts_end, w.db_user,
+                         w.db_completed, None))
+    result = rows[int(offset):int(offset) + int(limit)]
+    # count all rows when offset = 0
+    if 0 == offset:
+        result = (result, len(rows))
+    return result
@@ -41,9 +41,11 @@ from vistrails.db.services.action_chain import getActionChain, getCurrentOperati
     getCurrentOperations, simplify_ops
 from vistrails.db import VistrailsDBException
 
+from collections import OrderedDict
 import copy
 import datetime
 import getpass
+import json
 
 import unittest
 import vistrails.core.system
@@ -76,8 +78,14 @@ def materializeWorkflow(vistrail, version):
         workflow = DBWorkflow()
         #for action in getActionChain(vistrail, version):
         #    oldPerformAction(action, workflow)
-        performActions(getActionChain(vistrail, version), 
-                            workflow)
+        checkpoints = getattr(vistrail, 'db_checkpoints', None)
+        if checkpoints is not None and checkpoints.interval > 0:
+            performAdds(getCheckpointedOperations(vistrail, version,
+                                                  checkpoints),
+                        workflow)
+        else:
+            performActions(getActionChain(vistrail, version), 
+                           workflow)
         workflow.db_id = version
         workflow.db_vistrailId = vistrail.db_id
         return workflow
@@ -86,6 +94,173 @@ def materializeWorkflow(vistrail, version):
     else:
         raise VistrailsDBException("invalid workflow version %s" % version)
 
+class WorkflowCheckpoints(object):
+    """Snapshots of the current operations at some versions of a vistrail.
+
+    When a vistrail has checkpoints, materializeWorkflow() replays the
+    action chain from the closest checkpointed ancestor instead of from the
+    root, recording a new checkpoint every 'interval' actions it replays.
+    Snapshots are evicted in least-recently-used order once the operations
+    they reference go over 'max_operations'.
+
+    Checkpoints can be saved along with the vistrail; they are written as
+    references to the operations of the vistrail's actions.
+    """
+
+    def __init__(self, interval=100, max_operations=200000):
+        self.interval = interval
+        self.max_operations = max_operations
+        self.persist = False
+        self._snapshots = OrderedDict()
+        self._size = 0
+        # checkpoints read from a file, resolved when first used
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._snapshots) + len(self._pending)
+
+    def __contains__(self, version):
+        return version in self._snapshots or version in self._pending
+
+    def size(self):
+        """size() -> int
+        Returns the number of operations referenced by the snapshots.
+        """
+        return self._size
+
+    def get(self, vistrail, version):
+        """get(vistrail: DBVistrail, version: long) -> dict
+        Returns the current operations dict at a checkpointed version, or
+        None. The returned dict must not be modified.
+        """
+        try:
+            snapshot = self._snapshots.pop(version)
+        except KeyError:
+            try:
+                refs = self._pending.pop(version)
+            except KeyError:
+                return None
+            snapshot = self._resolve(vistrail, refs)
+            if snapshot is None:
+                return None
+            self._size += len(snapshot)
+        self._snapshots[version] = snapshot
+        self._evict()
+        return snapshot
+
+    def add(self, version, operations):
+        """add(version: long, operations: dict) -> None
+        Records a copy of the current operations dict at a version.
+        """
+        if len(operations) > self.max_operations:
+            return
+        old = self._snapshots.pop(version, None)
+        if old is not None:
+            self._size -= len(old)
+        self._pending.pop(version, None)
+        self._snapshots[version] = dict(operations)
+        self._size += len(operations)
+        self._evict()
+
+    def set_max_operations(self, max_operations):
+        """set_max_operations(max_operations: int) -> None
+        Changes the size budget, evicting snapshots if needed.
+        """
+        self.max_operations = max_operations
+        self._evict()
+
+    def _evict(self):
+        while self._size > self.max_operations:
+            _, snapshot = self._snapshots.popitem(last=False)
+            self._size -= len(snapshot)
+
+    def clear(self):
+        self._snapshots.clear()
+        self._pending.clear()
+        self._size = 0
+
+    @staticmethod
+    def _operation_key(operation):
+        if operation.vtType == 'change':
+            return (operation.db_what, operation.db_newObjId)
+        return (operation.db_what, operation.db_objectId)
+
+    def _resolve(self, vistrail, refs):
+        snapshot = {}
+        for action_id, pos in refs:
+            if not vistrail.db_has_action_with_id(action_id):
+                return None
+            operations = vistrail.db_get_action_by_id(action_id).db_operations
+            if pos >= len(operations):
+                return None
+            operation = operations[pos]
+            snapshot[self._operation_key(operation)] = operation
+        return snapshot
+
+    def save(self, vistrail, filename):
+        """save(vistrail: DBVistrail, filename: str) -> None
+        Writes the checkpoints as references to the vistrail's operations.
+        """
+        index = {}
+        for action in vistrail.db_actions:
+            for pos, operation in enumerate(action.db_operations):
+                index[operation.db_id] = (action.db_id, pos)
+        checkpoints = dict((str(version), refs)
+                           for version, refs in self._pending.iteritems())
+        for version, snapshot in self._snapshots.iteritems():
+            try:
+                checkpoints[str(version)] = [index[operation.db_id]
+                                             for operation
+                                             in snapshot.itervalues()]
+            except KeyError:
+                # operations don't belong to this vistrail anymore
+                pass
+        with open(filename, 'wb') as f:
+            json.dump({'interval': self.interval,
+                       'checkpoints': checkpoints}, f)
+
+    def load(self, filename):
+        """load(filename: str) -> None
+        Reads checkpoints written by save().
+        """
+        with open(filename, 'rb') as f:
+            data = json.load(f)
+        for version, refs in data['checkpoints'].iteritems():
+            self._pending[long(version)] = [tuple(ref) for ref in refs]
+
+def getCheckpointedOperations(vistrail, version, checkpoints):
+    """getCheckpointedOperations(vistrail: DBVistrail, version: long,
+                                 checkpoints: WorkflowCheckpoints)
+         -> list of operations
+
+    Returns the operations making up the workflow at version, like
+    getCurrentOperations(getActionChain(vistrail, version)), replaying only
+    the actions after the closest checkpointed ancestor.
+
+    """
+    chain = []
+    snapshot = None
+    current_id = version
+    while current_id > 0:
+        snapshot = checkpoints.get(vistrail, current_id)
+        if snapshot is not None:
+            break
+        action = vistrail.db_get_action_by_id(current_id)
+        chain.append(action)
+        current_id = action.db_prevId
+    chain.reverse()
+    if snapshot is not None:
+        operations = dict(snapshot)
+    else:
+        operations = {}
+    for i, action in enumerate(chain):
+        getCurrentOperationDict([action], operations)
+        if (i + 1) % checkpoints.interval == 0:
+            checkpoints.add(action.db_id, operations)
+    sortedOperations = operations.values()
+    sortedOperations.sort(key=lambda x: x.db_id)
+    return sortedOperations
+
 def performAction(action, workflow):
     if action.actionType == 'add':
         for operation in action.db_operations:
@@ -1634,5 +1809,45 @@ class TestDBVistrailService(unittest.TestCase):
         # test parameter change inequality
         assert heuristicModuleMatch(module1, module5) == 0
 
+    def test_checkpoints(self):
+        """Makes sure workflows are the same when using checkpoints."""
+        import os
+        import tempfile
+        from vistrails.core.db.io import load_vistrail
+        from vistrails.core.db.locator import FileLocator
+        from vistrails.core.system import vistrails_root_directory
+
+        locator = FileLocator(os.path.join(vistrails_root_directory(),
+                                           'tests', 'resources',
+                                           'terminator.vt'))
+        vistrail = load_vistrail(locator)[0]
+        versions = sorted(action.db_id for action in vistrail.db_actions)
+
+        def check(checkpoints, versions):
+            for version in versions:
+                expected = getCurrentOperations(getActionChain(vistrail,
+                                                               version))
+                operations = getCheckpointedOperations(vistrail, version,
+                                                       checkpoints)
+                self.assertEqual([op.db_id for op in operations],
+                                 [op.db_id for op in expected])
+
+        checkpoints = WorkflowCheckpoints(interval=10, max_operations=5000)
+        check(checkpoints, reversed(versions))
+        check(checkpoints, versions)
+        self.assertGreater(len(checkpoints), 0)
+        self.assertLessEqual(checkpoints.size(), 5000)
+
+        fd, fname = tempfile.mkstemp(prefix='vt_checkpoints_')
+        os.close(fd)
+        try:
+            checkpoints.save(vistrail, fname)
+            loaded = WorkflowCheckpoints(interval=10, max_operations=5000)
+            loaded.load(fname)
+        finally:
+            os.unlink(fname)
+        self.assertEqual(len(loaded), len(checkpoints))
+        check(loaded, versions[::7])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,108 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+from __future__ import division
+
+from auto_gen import DBAction as _DBAction
+
+class DBAction(_DBAction):
+    """DBAction whose operations can be read on first use.
+
+    A loader can call db_defer_operations() instead of passing the
+    operations to the constructor; they are then created by the given
+    callable the first time the operations of the action are accessed.
+
+    """
+
+    def __get_operations(self):
+        d = self.__dict__
+        if d.get('_db_deferred') is not None:
+            self.db_load_operations()
+        return d['_db_operations']
+    def __set_operations(self, operations):
+        self.__dict__['_db_operations'] = operations
+    _db_operations = property(__get_operations, __set_operations)
+
+    def __get_operations_id_index(self):
+        d = self.__dict__
+        if d.get('_db_deferred') is not None:
+            self.db_load_operations()
+        return d['db_operations_id_index']
+    def __set_operations_id_index(self, index):
+        self.__dict__['db_operations_id_index'] = index
+    db_operations_id_index = property(__get_operations_id_index,
+                                      __set_operations_id_index)
+
+    def db_defer_operations(self, load, max_ids):
+        """db_defer_operations(load: callable, max_ids: dict) -> None
+
+        Sets the operations to be created by load(), the first time they
+        are accessed. max_ids maps object types to the highest id used by
+        the operations, so the id scope can be updated without loading them.
+
+        """
+        self.__dict__['_db_deferred'] = (load, max_ids)
+
+    def db_has_deferred_operations(self):
+        return self.__dict__.get('_db_deferred') is not None
+
+    def db_deferred_max_ids(self):
+        return self.__dict__['_db_deferred'][1]
+
+    def db_load_operations(self):
+        """db_load_operations() -> None
+
+        Creates the deferred operations, if any.
+
+        """
+        d = self.__dict__
+        deferred = d.get('_db_deferred')
+        if deferred is None:
+            return
+        d['_db_deferred'] = None
+        operations = deferred[0]()
+        d['_db_operations'] = operations
+        d['db_operations_id_index'] = dict((op.db_id, op)
+                                           for op in operations)
+        self.db_operations_loaded()
+
+    def db_operations_loaded(self):
+        """db_operations_loaded() -> None
+
+        Called after deferred operations were created; subclasses can
+        override it to convert them.
+
+        """
+        pass
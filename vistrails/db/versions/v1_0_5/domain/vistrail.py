@@ -41,8 +41,14 @@ import hashlib
 from auto_gen import DBVistrail as _DBVistrail
 from auto_gen import DBAdd, DBChange, DBDelete, DBAbstraction, DBGroup, \
     DBModule, DBAnnotation, DBActionAnnotation, DBParameterExploration
+from action import DBAction
 from id_scope import IdScope
 
+def is_deferred(action):
+    # Actions created by translations are instances of the generated class
+    return (isinstance(action, DBAction) and
+            action.db_has_deferred_operations())
+
 class DBVistrail(_DBVistrail):
     def __init__(self, *args, **kwargs):
         _DBVistrail.__init__(self, *args, **kwargs)
@@ -57,11 +63,16 @@ class DBVistrail(_DBVistrail):
         self.idScope.setBeginId('action', 1)
         self.idScope.setBeginId(DBParameterExploration.vtType, 1)
         self.db_objects = {}
+        # actions whose operations may still be deferred
+        self.db_deferred_actions = set()
 
         # keep a reference to the current logging information here
         self.db_log_filename = None
         self.log = None
 
+        # snapshots used to materialize workflows (WorkflowCheckpoints)
+        self.db_checkpoints = None
+
     def __copy__(self):
         return DBVistrail.do_copy(self)
 
@@ -71,7 +82,10 @@ class DBVistrail(_DBVistrail):
         
         cp.idScope = copy.copy(self.idScope)
         cp.db_objects = copy.copy(self.db_objects)
+        # copying the actions loaded their operations
+        cp.db_deferred_actions = set()
         cp.db_log_filename = self.db_log_filename
+        cp.db_checkpoints = None
         if self.log is not None:
             cp.log = copy.copy(self.log)
         else:
@@ -92,30 +106,31 @@ class DBVistrail(_DBVistrail):
         return new_obj
 
     def update_id_scope(self):
-        def getOldObjId(operation):
-            if operation.vtType == 'change':
-                return operation.db_oldObjId
-            return operation.db_objectId
-
         def getNewObjId(operation):
             if operation.vtType == 'change':
                 return operation.db_newObjId
             return operation.db_objectId
 
+        self.db_deferred_actions = set()
         for action in self.db_actions:
             self.idScope.updateBeginId('action', action.db_id+1)
             if action.db_session is not None:
                 self.idScope.updateBeginId('session', action.db_session + 1)
-            for operation in action.db_operations:
-                self.idScope.updateBeginId('operation', operation.db_id+1)
-                if operation.vtType == 'add' or operation.vtType == 'change':
-                    # update ids of data
-                    self.idScope.updateBeginId(operation.db_what, 
-                                               getNewObjId(operation)+1)
-                    if operation.db_data is None:
-                        if operation.vtType == 'change':
-                            operation.db_objectId = operation.db_oldObjId
-                    self.db_add_object(operation.db_data)
+            if is_deferred(action):
+                # operations get registered when they are loaded
+                self.db_deferred_actions.add(action)
+                for obj_type, max_id in \
+                        action.db_deferred_max_ids().iteritems():
+                    self.idScope.updateBeginId(obj_type, max_id+1)
+            else:
+                for operation in action.db_operations:
+                    self.idScope.updateBeginId('operation', operation.db_id+1)
+                    if (operation.vtType == 'add' or
+                            operation.vtType == 'change'):
+                        # update ids of data
+                        self.idScope.updateBeginId(operation.db_what, 
+                                                   getNewObjId(operation)+1)
+                self.db_add_operations(action.db_operations)
             for annotation in action.db_annotations:
                 self.idScope.updateBeginId('annotation', annotation.db_id+1)
         
@@ -127,11 +142,38 @@ class DBVistrail(_DBVistrail):
             self.idScope.updateBeginId('parameter_exploration',
                                        paramexp.db_id+1)
 
+    def db_add_operations(self, operations):
+        """db_add_operations(operations: list) -> None
+
+        Indexes the objects added or changed by the operations.
+
+        """
+        for operation in operations:
+            if operation.vtType == 'add' or operation.vtType == 'change':
+                if operation.db_data is None:
+                    if operation.vtType == 'change':
+                        operation.db_objectId = operation.db_oldObjId
+                self.db_add_object(operation.db_data)
+
+    def db_load_operations(self):
+        """db_load_operations() -> None
+
+        Loads the operations of all the actions that were deferred.
+
+        """
+        for action in self.db_deferred_actions:
+            action.db_load_operations()
+        self.db_deferred_actions.clear()
+
     def db_add_object(self, obj):
         self.db_objects[(obj.vtType, obj.db_id)] = obj
 
     def db_get_object(self, type, id):
-        return self.db_objects.get((type, id), None)
+        obj = self.db_objects.get((type, id), None)
+        if obj is None and self.db_deferred_actions:
+            self.db_load_operations()
+            obj = self.db_objects.get((type, id), None)
+        return obj
 
     def db_update_object(self, obj, **kwargs):
         # want to swap out old object with a new version
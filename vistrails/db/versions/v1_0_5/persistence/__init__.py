@@ -35,25 +35,41 @@
 ###############################################################################
 from __future__ import division
 
+from datetime import datetime
+
 from xml.auto_gen import XMLDAOListBase
 from sql.auto_gen import SQLDAOListBase
+from binary.binary_dao import BinaryDAO
 from vistrails.core.system import get_elementtree_library
 
 from vistrails.db import VistrailsDBException
 from vistrails.db.versions.v1_0_5 import version as my_version
+from vistrails.db.versions.v1_0_5 import domain
 from vistrails.db.versions.v1_0_5.domain import DBGroup, DBWorkflow, DBVistrail, DBLog, \
-    DBRegistry, DBMashuptrail
+    DBRegistry, DBMashuptrail, DBAction
 
 root_set = set([DBVistrail.vtType, DBWorkflow.vtType, 
                 DBLog.vtType, DBRegistry.vtType, DBMashuptrail.vtType])
 
 ElementTree = get_elementtree_library()
 
+_binary_dao = None
+
+def get_binary_dao():
+    global _binary_dao
+    if _binary_dao is None:
+        classes = [getattr(domain, name) for name in dir(domain)]
+        _binary_dao = BinaryDAO([c for c in classes
+                                 if isinstance(c, type) and
+                                 hasattr(c, 'vtType')])
+    return _binary_dao
+
 
 class DAOList(dict):
     def __init__(self):
         self['xml'] = XMLDAOListBase()
         self['sql'] = SQLDAOListBase()
+        self['binary'] = get_binary_dao()
 
     def parse_xml_file(self, filename):
         return ElementTree.parse(filename)
@@ -90,6 +106,131 @@ class DAOList(dict):
         vistrail = self.read_xml_object(vtType, tree.getroot())
         return vistrail
 
+    # Children of <vistrail> and the DAOs reading them, besides actions
+    vistrail_children = {'tag': ('tag', 'tags'),
+                         'annotation': ('annotation', 'annotations'),
+                         'controlParameter': ('controlParameter',
+                                              'controlParameters'),
+                         'vistrailVariable': ('vistrailVariable',
+                                              'vistrailVariables'),
+                         'parameterExploration': ('parameter_exploration',
+                                                  'parameter_explorations'),
+                         'actionAnnotation': ('actionAnnotation',
+                                              'actionAnnotations')}
+
+    def open_vistrail_deferred(self, source):
+        """open_vistrail_deferred(source: filename or file) -> DBVistrail
+
+        Reads a vistrail incrementally with iterparse. Actions are created
+        with their attributes and annotations only; the elements of their
+        operations are kept and only read when the operations of the
+        action are first accessed (see DBAction.db_defer_operations()).
+
+        """
+        xml_daos = self['xml']
+        root = None
+        attrs = None
+        depth = 0
+        actions = []
+        children = dict((name, []) for (_, name)
+                        in self.vistrail_children.itervalues())
+        vistrail_box = []
+        for event, node in ElementTree.iterparse(source,
+                                                 events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = node
+                    attrs = dict(node.items())
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            tag = node.tag.split('}')[-1]
+            if tag == 'action':
+                actions.append(self.read_deferred_action(node, vistrail_box))
+            elif tag in self.vistrail_children:
+                dao, name = self.vistrail_children[tag]
+                children[name].append(xml_daos[dao].fromXML(node))
+            elif node.text is not None and node.text.strip() != '':
+                print '*** ERROR *** tag = %s' % node.tag
+            # Free what was read
+            root.remove(node)
+        if root is None or root.tag.split('}')[-1] != 'vistrail':
+            return None
+
+        dao = xml_daos[DBVistrail.vtType]
+        vistrail = DBVistrail(id=dao.convertFromStr(attrs.get('id'), 'long'),
+                              version=dao.convertFromStr(attrs.get('version'),
+                                                         'str'),
+                              name=dao.convertFromStr(attrs.get('name'),
+                                                      'str'),
+                              actions=actions,
+                              **children)
+        vistrail.is_dirty = False
+        vistrail_box.append(vistrail)
+        return vistrail
+
+    def read_deferred_action(self, node, vistrail_box):
+        """read_deferred_action(node: Element, vistrail_box: list)
+              -> DBAction
+
+        Creates an action from its element, deferring its operations. Once
+        read, they get registered with vistrail_box[0].
+
+        """
+        xml_daos = self['xml']
+        dao = xml_daos[DBAction.vtType]
+        annotations = []
+        operations = []
+        max_ids = {}
+        def update_max(obj_type, obj_id):
+            try:
+                obj_id = long(obj_id)
+            except (TypeError, ValueError):
+                return
+            if obj_id > max_ids.get(obj_type, -1):
+                max_ids[obj_type] = obj_id
+        for child in node:
+            tag = child.tag.split('}')[-1]
+            if tag == 'annotation':
+                annotations.append(xml_daos['annotation'].fromXML(child))
+            elif tag in ('add', 'change', 'delete'):
+                operations.append((tag, child))
+                update_max('operation', child.get('id'))
+                if tag == 'add':
+                    update_max(child.get('what'), child.get('objectId'))
+                elif tag == 'change':
+                    update_max(child.get('what'), child.get('newObjId'))
+            elif child.text is not None and child.text.strip() != '':
+                print '*** ERROR *** tag = %s' % child.tag
+
+        date = node.get('date')
+        try:
+            # fast path for the format written by convertToStr()
+            date = datetime(int(date[0:4]), int(date[5:7]), int(date[8:10]),
+                            int(date[11:13]), int(date[14:16]),
+                            int(date[17:19]))
+        except (TypeError, ValueError):
+            date = dao.convertFromStr(date, 'datetime')
+        action = DBAction(id=dao.convertFromStr(node.get('id'), 'long'),
+                          prevId=dao.convertFromStr(node.get('prevId'),
+                                                    'long'),
+                          date=date,
+                          session=dao.convertFromStr(node.get('session'),
+                                                     'long'),
+                          user=dao.convertFromStr(node.get('user'), 'str'),
+                          annotations=annotations)
+        action.is_dirty = False
+
+        def load():
+            ops = [xml_daos[tag].fromXML(child) for tag, child in operations]
+            if vistrail_box:
+                vistrail_box[0].db_add_operations(ops)
+            return ops
+        action.db_defer_operations(load, max_ids)
+        return action
+
     def save_to_xml(self, obj, filename, tags, version=None):
         """save_to_xml(obj : object, filename: str, tags: dict,
                        version: str) -> None
@@ -104,6 +245,36 @@ class DAOList(dict):
         tree = ElementTree.ElementTree(root)
         self.write_xml_file(filename, tree)
 
+    def open_from_binary(self, data, vtType):
+        """open_from_binary(data: str, vtType: str) -> DB*
+
+        Reads an object from the contents of a binary file.
+
+        """
+        version, obj = self['binary'].read(data, vtType)
+        return obj
+
+    def save_to_binary(self, obj, filename, version=None):
+        """save_to_binary(obj: object, filename: str, version: str) -> None
+
+        """
+        if version is None:
+            version = my_version
+        with open(filename, 'wb') as f:
+            self['binary'].write(obj, f, version)
+
+    def append_to_binary(self, obj, filename, version=None):
+        """append_to_binary(obj: object, filename: str, version: str)
+              -> None
+
+        Appends the actions of a vistrail or the workflow executions of a
+        log to a binary file.
+
+        """
+        if version is None:
+            version = my_version
+        self['binary'].append(obj, filename, version)
+
     def open_from_db(self, db_connection, vtType, id=None, lock=False, 
                      global_props=None):
         all_objects = {}
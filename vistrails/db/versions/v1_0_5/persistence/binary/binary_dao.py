@@ -0,0 +1,835 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+"""Binary format for vistrails and logs.
+
+A binary file starts with the header line 'VTBIN <format> <version>\\n'
+and is followed by chunks, an index and a trailer::
+
+    chunk   := kind (uint8) | length (uint32) | payload
+    trailer := offset of the index chunk (uint64) | 'VTIX'
+
+Payloads are values encoded by dumps(): each value is a tag byte
+followed by its little-endian encoding, 32 or 64-bit integers, 64-bit
+floats, length-prefixed byte and UTF-8 strings, and count-prefixed lists
+and tuples. loads() checks every length against the payload. Objects are
+encoded as tuples (type code, field values...), with the fields in the
+order of the arguments of the constructor of their class; datetimes and
+dates are tuples with a negative code. The types chunk gives the vtType
+and fields of every type code, so that a file stays readable when fields
+are added.
+
+The object chunk holds the root object without its children listed in
+BinaryDAO.chunked_fields (e.g. the actions of a vistrail), which are
+stored in item chunks of at most BinaryDAO.chunk_size children. Item
+chunks can be appended to an existing file (see BinaryDAO.append()), and
+a file that only has item chunks is read as a root object holding them.
+
+The index lists (kind, offset, length, field, count) for every chunk. If
+the trailer is missing, e.g. because writing was interrupted, the chunks
+are found by walking the file from the header.
+
+"""
+
+from __future__ import division
+
+from datetime import date, datetime
+import inspect
+import os
+import struct
+
+from vistrails.db import VistrailsDBException
+
+MAGIC = 'VTBIN'
+FORMAT_VERSION = 2
+
+CHUNK_TYPES = 1
+CHUNK_OBJECT = 2
+CHUNK_ITEMS = 3
+CHUNK_INDEX = 4
+
+DATETIME = -1
+DATE = -2
+
+chunk_header = struct.Struct('<BI')
+trailer = struct.Struct('<Q4s')
+TRAILER_TAG = 'VTIX'
+
+# Value tags
+V_NONE = 0
+V_FALSE = 1
+V_TRUE = 2
+V_INT32 = 3
+V_INT64 = 4
+V_LONG32 = 5
+V_LONG64 = 6
+V_BIGLONG = 7
+V_FLOAT = 8
+V_STR8 = 9
+V_STR = 10
+V_UNICODE8 = 11
+V_UNICODE = 12
+V_LIST = 13
+V_TUPLE = 14
+
+tag_uint8 = struct.Struct('<BB')
+tag_int32 = struct.Struct('<Bi')
+tag_int64 = struct.Struct('<Bq')
+tag_float = struct.Struct('<Bd')
+tag_length = struct.Struct('<BI')
+int32 = struct.Struct('<i')
+int64 = struct.Struct('<q')
+float64 = struct.Struct('<d')
+uint32 = struct.Struct('<I')
+
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+def dump_value(value, out, codes=None):
+    """dump_value(value, out: list, codes: dict) -> None
+
+    Appends the encoding of value to out. value is built from None, bool,
+    int, long, float, str, unicode, lists, tuples, datetimes and dates,
+    and from domain objects if codes maps their vtType to (type code,
+    attribute names).
+
+    """
+    t = type(value)
+    if t is str:
+        n = len(value)
+        if n < 256:
+            out.append(tag_uint8.pack(V_STR8, n))
+        else:
+            out.append(tag_length.pack(V_STR, n))
+        out.append(value)
+    elif t is int or t is long:
+        if INT32_MIN <= value <= INT32_MAX:
+            out.append(tag_int32.pack(V_INT32 if t is int else V_LONG32,
+                                      value))
+        elif INT64_MIN <= value <= INT64_MAX:
+            out.append(tag_int64.pack(V_INT64 if t is int else V_LONG64,
+                                      value))
+        else:
+            digits = str(value)
+            out.append(tag_length.pack(V_BIGLONG, len(digits)))
+            out.append(digits)
+    elif value is None:
+        out.append(chr(V_NONE))
+    elif t is list or t is tuple:
+        out.append(tag_length.pack(V_TUPLE if t is tuple else V_LIST,
+                                   len(value)))
+        for v in value:
+            dump_value(v, out, codes)
+    elif t is unicode:
+        value = value.encode('utf-8')
+        n = len(value)
+        if n < 256:
+            out.append(tag_uint8.pack(V_UNICODE8, n))
+        else:
+            out.append(tag_length.pack(V_UNICODE, n))
+        out.append(value)
+    elif t is float:
+        out.append(tag_float.pack(V_FLOAT, value))
+    elif t is bool:
+        out.append(chr(V_TRUE if value else V_FALSE))
+    elif t is datetime:
+        dump_value((DATETIME, value.year, value.month, value.day, value.hour,
+                    value.minute, value.second, value.microsecond), out)
+    elif t is date:
+        dump_value((DATE, value.year, value.month, value.day), out)
+    else:
+        try:
+            code, attrs = codes[value.vtType]
+        except (AttributeError, KeyError, TypeError):
+            raise VistrailsDBException("Cannot encode value of type '%s'" %
+                                       t.__name__)
+        out.append(tag_length.pack(V_TUPLE, len(attrs) + 1))
+        out.append(tag_int32.pack(V_INT32, code))
+        for attr in attrs:
+            dump_value(getattr(value, attr), out, codes)
+
+def dumps(value, codes=None):
+    """dumps(value, codes: dict) -> str"""
+    out = []
+    dump_value(value, out, codes)
+    return ''.join(out)
+
+def load_value(data, pos, end, make=None):
+    """load_value(data: str, pos: int, end: int, make: function)
+          -> (value, int)
+
+    Decodes the value at pos in data, which must end before end, and
+    returns it with the position following it. Tuples starting with an
+    integer are passed to make as a list, if it is given, to build
+    objects. Raises ValueError if the data is invalid.
+
+    """
+    # lists and tuples being read: items, count and tag of the innermost
+    # one, the others on the stack
+    stack = []
+    items = None
+    count = kind = 0
+    while True:
+        if pos >= end:
+            raise ValueError("truncated value")
+        tag = ord(data[pos])
+        pos += 1
+        if tag == V_STR8 or tag == V_UNICODE8:
+            if pos >= end:
+                raise ValueError("truncated length")
+            n = ord(data[pos])
+            pos += 1
+            if pos + n > end:
+                raise ValueError("string longer than its chunk")
+            value = data[pos:pos + n]
+            pos += n
+            if tag == V_UNICODE8:
+                value = value.decode('utf-8')
+        elif tag == V_INT32 or tag == V_LONG32:
+            if pos + 4 > end:
+                raise ValueError("truncated integer")
+            value = int32.unpack_from(data, pos)[0]
+            pos += 4
+            if tag == V_LONG32:
+                value = long(value)
+        elif tag == V_TUPLE or tag == V_LIST:
+            if pos + 4 > end:
+                raise ValueError("truncated length")
+            n = uint32.unpack_from(data, pos)[0]
+            pos += 4
+            # every value takes at least one byte
+            if pos + n > end:
+                raise ValueError("sequence longer than its chunk")
+            if n:
+                stack.append((items, count, kind))
+                items, count, kind = [], n, tag
+                continue
+            value = () if tag == V_TUPLE else []
+        elif tag == V_NONE:
+            value = None
+        elif tag == V_STR or tag == V_UNICODE or tag == V_BIGLONG:
+            if pos + 4 > end:
+                raise ValueError("truncated length")
+            n = uint32.unpack_from(data, pos)[0]
+            pos += 4
+            if pos + n > end:
+                raise ValueError("string longer than its chunk")
+            value = data[pos:pos + n]
+            pos += n
+            if tag == V_UNICODE:
+                value = value.decode('utf-8')
+            elif tag == V_BIGLONG:
+                value = long(value)
+        elif tag == V_INT64 or tag == V_LONG64:
+            if pos + 8 > end:
+                raise ValueError("truncated integer")
+            value = int64.unpack_from(data, pos)[0]
+            pos += 8
+            if tag == V_LONG64:
+                value = long(value)
+        elif tag == V_FLOAT:
+            if pos + 8 > end:
+                raise ValueError("truncated float")
+            value = float64.unpack_from(data, pos)[0]
+            pos += 8
+        elif tag == V_FALSE:
+            value = False
+        elif tag == V_TRUE:
+            value = True
+        else:
+            raise ValueError("invalid value tag %d" % tag)
+
+        # add the value to its sequence, closing the complete ones
+        while items is not None:
+            items.append(value)
+            if len(items) < count:
+                break
+            value = items
+            if kind == V_TUPLE:
+                if make is not None and type(value[0]) is int:
+                    value = make(value)
+                else:
+                    value = tuple(value)
+            items, count, kind = stack.pop()
+        else:
+            return value, pos
+
+def load_fields(data, pos, end, make=None):
+    """load_fields(data: str, pos: int, end: int, make: function)
+          -> (list, int)
+
+    Decodes the tuple at pos as a list, without passing it to make.
+
+    """
+    if pos + 5 > end or ord(data[pos]) != V_TUPLE:
+        raise ValueError("expected an object")
+    n = uint32.unpack_from(data, pos + 1)[0]
+    pos += 5
+    if pos + n > end:
+        raise ValueError("sequence longer than its chunk")
+    fields = []
+    for i in xrange(n):
+        value, pos = load_value(data, pos, end, make)
+        fields.append(value)
+    return fields, pos
+
+def loads(data, pos=0, end=None, make=None, load=load_value):
+    """loads(data: str, pos: int, end: int, make: function,
+             load: function) -> value
+
+    Decodes the single value stored in data[pos:end] with load_value(),
+    or load. Raises VistrailsDBException if it is not a valid encoding.
+
+    """
+    if end is None:
+        end = len(data)
+    try:
+        value, pos = load(data, pos, end, make)
+    except (ValueError, OverflowError, UnicodeDecodeError), e:
+        raise VistrailsDBException("Invalid binary file: %s" % e)
+    if pos != end:
+        raise VistrailsDBException("Invalid binary file: trailing data in "
+                                   "chunk")
+    return value
+
+
+def read_header(data):
+    """read_header(data: str) -> (format: int, version: str, offset: int)
+
+    Parses the header line of a binary file. offset is the position of
+    the first chunk. Raises VistrailsDBException if data does not start
+    with a valid header.
+
+    """
+    end = data.find('\n', 0, 64)
+    fields = data[:end].split(' ') if end != -1 else []
+    if len(fields) != 3 or fields[0] != MAGIC:
+        raise VistrailsDBException("Not a binary VisTrails file")
+    try:
+        format_version = int(fields[1])
+    except ValueError:
+        raise VistrailsDBException("Not a binary VisTrails file")
+    if format_version != FORMAT_VERSION:
+        raise VistrailsDBException("Binary file format %d is not the "
+                                   "supported format %d" %
+                                   (format_version, FORMAT_VERSION))
+    return format_version, fields[2], end + 1
+
+def check_index_entry(entry, start, end):
+    """check_index_entry(entry, start: int, end: int) -> None
+
+    Checks that an index entry describes a chunk between start and end.
+
+    """
+    if (not isinstance(entry, tuple) or len(entry) != 5 or
+            entry[0] not in (CHUNK_TYPES, CHUNK_OBJECT, CHUNK_ITEMS) or
+            not isinstance(entry[1], (int, long)) or
+            not isinstance(entry[2], (int, long)) or
+            not start <= entry[1] or
+            entry[1] + chunk_header.size + entry[2] > end):
+        raise VistrailsDBException("Invalid binary file: bad index entry")
+
+def check_items(value):
+    """check_items(value) -> (field: str, items: list)
+
+    Checks the decoded payload of an items chunk.
+
+    """
+    if (not isinstance(value, tuple) or len(value) != 2 or
+            not isinstance(value[0], str) or not isinstance(value[1], list)):
+        raise VistrailsDBException("Invalid binary file: bad items chunk")
+    return value
+
+def get_fields(cls):
+    """get_fields(cls: type) -> tuple(str)
+
+    Returns the fields of a domain class, i.e. the arguments of the
+    constructor of its generated base class.
+
+    """
+    for base in cls.__mro__:
+        if base.__module__.endswith('auto_gen'):
+            return tuple(inspect.getargspec(base.__init__).args[1:])
+    raise VistrailsDBException("'%s' is not a domain class" % cls.__name__)
+
+
+class ChunkWriter(object):
+    """Writes chunks to a file, recording them for the index."""
+
+    def __init__(self, f, index=None):
+        self.f = f
+        if index is None:
+            index = []
+        self.index = index
+
+    def write(self, kind, value, field=None, count=0, codes=None):
+        self.write_payload(kind, dumps(value, codes), field, count)
+
+    def write_payload(self, kind, payload, field=None, count=0):
+        offset = self.f.tell()
+        self.f.write(chunk_header.pack(kind, len(payload)))
+        self.f.write(payload)
+        self.index.append((kind, offset, len(payload), field, count))
+
+    def close(self):
+        offset = self.f.tell()
+        payload = dumps(self.index)
+        self.f.write(chunk_header.pack(CHUNK_INDEX, len(payload)))
+        self.f.write(payload)
+        self.f.write(trailer.pack(offset, TRAILER_TAG))
+
+
+class BinaryDAO(object):
+    """Reads and writes domain objects in the binary format.
+
+    The encoding is derived from the domain classes, so a single DAO
+    handles every vtType.
+
+    """
+
+    # Children of root objects that are written in item chunks
+    chunked_fields = {'vistrail': 'actions',
+                      'log': 'workflow_execs'}
+    chunk_size = 500
+
+    def __init__(self, classes):
+        self.classes = {}
+        self.fields = {}
+        for cls in classes:
+            self.classes[cls.vtType] = cls
+            self.fields[cls.vtType] = get_fields(cls)
+        self.type_table = [(vtType, self.fields[vtType])
+                           for vtType in sorted(self.classes)]
+        self.codes = dict((vtType, (code, ['db_' + f for f in fields]))
+                          for code, (vtType, fields)
+                          in enumerate(self.type_table))
+
+    def get_decoder(self, type_table):
+        """get_decoder(type_table: list) -> function
+
+        Returns the function building the objects and dates of a file with
+        the given type table from their decoded tuples, for loads().
+
+        """
+        if not isinstance(type_table, list):
+            raise VistrailsDBException("Invalid binary file: bad types chunk")
+        types = []
+        for entry in type_table:
+            if (not isinstance(entry, tuple) or len(entry) != 2 or
+                    not isinstance(entry[0], str) or
+                    not isinstance(entry[1], tuple) or
+                    not all(isinstance(f, str) for f in entry[1])):
+                raise VistrailsDBException("Invalid binary file: bad types "
+                                           "chunk")
+            vtType, fields = entry
+            if vtType not in self.classes:
+                # only fails if such an object is actually read
+                types.append((None, vtType, 0))
+                continue
+            own_fields = self.fields[vtType]
+            if fields == own_fields:
+                types.append((self.classes[vtType], None, len(fields) + 1))
+            else:
+                types.append((self.classes[vtType],
+                              [(i + 1, f) for i, f in enumerate(fields)
+                               if f in own_fields],
+                              len(fields) + 1))
+
+        def make(value):
+            code = value[0]
+            if code >= 0:
+                if code >= len(types):
+                    raise VistrailsDBException("Invalid binary file: bad "
+                                               "type code %d" % code)
+                cls, names, length = types[code]
+                if cls is None:
+                    raise VistrailsDBException("Unknown object type '%s'" %
+                                               names)
+                if len(value) != length:
+                    raise VistrailsDBException("Invalid binary file: bad "
+                                               "'%s' object" % cls.vtType)
+                try:
+                    if names is None:
+                        obj = cls(*value[1:])
+                    else:
+                        obj = cls(**dict((f, value[i]) for i, f in names))
+                except (TypeError, AttributeError):
+                    # children of the wrong type
+                    raise VistrailsDBException("Invalid binary file: bad "
+                                               "'%s' object" % cls.vtType)
+                obj.is_dirty = False
+                return obj
+            try:
+                if code == DATETIME:
+                    return datetime(*value[1:])
+                elif code == DATE:
+                    return date(*value[1:])
+            except (TypeError, ValueError, OverflowError), e:
+                raise VistrailsDBException("Invalid binary file: %s" % e)
+            raise VistrailsDBException("Invalid value code %d" % code)
+        return make
+
+    def write_items(self, writer, field, items):
+        for i in xrange(0, len(items), self.chunk_size):
+            chunk = items[i:i + self.chunk_size]
+            writer.write(CHUNK_ITEMS, (field, chunk), field, len(chunk),
+                         self.codes)
+
+    def write(self, obj, f, version):
+        """write(obj: DB*, f: file, version: str) -> None
+
+        Writes a complete binary file for obj.
+
+        """
+        f.write('%s %d %s\n' % (MAGIC, FORMAT_VERSION, version))
+        writer = ChunkWriter(f)
+        writer.write(CHUNK_TYPES, self.type_table)
+        field = self.chunked_fields.get(obj.vtType)
+        code, attrs = self.codes[obj.vtType]
+        out = [tag_length.pack(V_TUPLE, len(attrs) + 1),
+               tag_int32.pack(V_INT32, code)]
+        for attr in attrs:
+            if field is not None and attr == 'db_' + field:
+                dump_value([], out)
+            else:
+                dump_value(getattr(obj, attr), out, self.codes)
+        writer.write_payload(CHUNK_OBJECT, ''.join(out))
+        if field is not None:
+            self.write_items(writer, field, getattr(obj, 'db_' + field))
+        writer.close()
+
+    def append(self, obj, filename, version):
+        """append(obj: DB*, filename: str, version: str) -> None
+
+        Appends the chunked children of obj to a binary file, creating it
+        if it doesn't exist. The other fields of obj are not saved.
+
+        """
+        field = self.chunked_fields[obj.vtType]
+        items = getattr(obj, 'db_' + field)
+        if not os.path.exists(filename) or not os.path.getsize(filename):
+            with open(filename, 'wb') as f:
+                f.write('%s %d %s\n' % (MAGIC, FORMAT_VERSION, version))
+                writer = ChunkWriter(f)
+                writer.write(CHUNK_TYPES, self.type_table)
+                self.write_items(writer, field, items)
+                writer.close()
+            return
+
+        with open(filename, 'r+b') as f:
+            header = f.read(64)
+            _, file_version, start = read_header(header)
+            if file_version != version:
+                raise VistrailsDBException("Cannot append version %s objects "
+                                           "to a version %s binary file" %
+                                           (version, file_version))
+            f.seek(0, os.SEEK_END)
+            index = self.read_index(f.read, f.seek, f.tell(), start)
+            types = [entry for entry in index if entry[0] == CHUNK_TYPES]
+            f.seek(types[0][1] + chunk_header.size)
+            if loads(f.read(types[0][2])) != self.type_table:
+                # codes could differ from the ones used by this DAO
+                raise VistrailsDBException("Cannot append to a binary file "
+                                           "with different object types")
+            if index:
+                kind, offset, length, _, _ = index[-1]
+                f.seek(offset + chunk_header.size + length)
+            else:
+                f.seek(start)
+            f.truncate()
+            writer = ChunkWriter(f, index)
+            self.write_items(writer, field, items)
+            writer.close()
+
+    def read_index(self, read, seek, size, start):
+        """read_index(read, seek: functions, size: int, start: int) -> list
+
+        Reads the index of a file using its read() and seek() functions,
+        walking through the chunks if the index is missing.
+
+        """
+        if size >= start + trailer.size:
+            seek(size - trailer.size)
+            offset, tag = trailer.unpack(read(trailer.size))
+            if tag == TRAILER_TAG and start <= offset < size:
+                seek(offset)
+                kind, length = chunk_header.unpack(read(chunk_header.size))
+                if kind == CHUNK_INDEX and \
+                        offset + chunk_header.size + length <= size:
+                    index = loads(read(length))
+                    if not isinstance(index, list):
+                        raise VistrailsDBException("Invalid binary file: "
+                                                   "bad index")
+                    for entry in index:
+                        check_index_entry(entry, start, offset)
+                    return index
+
+        index = []
+        offset = start
+        while offset + chunk_header.size <= size:
+            seek(offset)
+            kind, length = chunk_header.unpack(read(chunk_header.size))
+            end = offset + chunk_header.size + length
+            if kind == CHUNK_INDEX or end > size:
+                break
+            if kind == CHUNK_ITEMS:
+                field, items = check_items(loads(read(length)))
+                index.append((kind, offset, length, field, len(items)))
+            else:
+                index.append((kind, offset, length, None, 0))
+            offset = end
+        return index
+
+    def read(self, data, vtType):
+        """read(data: str, vtType: str) -> (version: str, obj: DB*)
+
+        Reads the object stored in the contents of a binary file.
+
+        """
+        _, version, start = read_header(data)
+        pos = [0]
+        def read(n):
+            s = data[pos[0]:pos[0] + n]
+            pos[0] += n
+            return s
+        def seek(offset):
+            pos[0] = offset
+        index = self.read_index(read, seek, len(data), start)
+
+        def load(entry, load=load_value):
+            offset = entry[1] + chunk_header.size
+            return loads(data, offset, offset + entry[2], make, load)
+        type_table = None
+        make = None
+        root = None
+        items = []
+        for entry in index:
+            kind = entry[0]
+            if kind == CHUNK_TYPES:
+                type_table = load(entry)
+                make = self.get_decoder(type_table)
+            elif make is None:
+                raise VistrailsDBException("Binary file has no types chunk")
+            elif kind == CHUNK_OBJECT:
+                # the chunked field is filled before building the root
+                root = load(entry, load_fields)
+                if (not root or type(root[0]) is not int or
+                        not 0 <= root[0] < len(type_table)):
+                    raise VistrailsDBException("Invalid binary file: bad "
+                                               "root object")
+            elif kind == CHUNK_ITEMS:
+                items.extend(check_items(load(entry))[1])
+        if make is None:
+            raise VistrailsDBException("Binary file has no types chunk")
+
+        field = self.chunked_fields.get(vtType)
+        if root is None:
+            if field is None:
+                raise VistrailsDBException("Binary file does not contain "
+                                           "a '%s'" % vtType)
+            try:
+                obj = self.classes[vtType](**{field: items})
+            except (TypeError, AttributeError):
+                raise VistrailsDBException("Invalid binary file: bad "
+                                           "'%s' items" % field)
+        else:
+            fields = list(type_table[root[0]][1])
+            if field is not None and field in fields:
+                root[fields.index(field) + 1] = items
+            obj = make(root)
+            if obj.vtType != vtType:
+                raise VistrailsDBException("Binary file contains a '%s', "
+                                           "not a '%s'" % (obj.vtType, vtType))
+        obj.is_dirty = False
+        return version, obj
+
+
+import unittest
+
+class TestBinaryDAO(unittest.TestCase):
+    def make_log(self, n):
+        from vistrails.db.versions.v1_0_5.domain import DBLog, \
+            DBWorkflowExec, DBModuleExec, DBAnnotation
+        execs = []
+        for i in xrange(n):
+            module_exec = DBModuleExec(id=i, module_id=i, module_name=u'm\xe9',
+                                       ts_start=datetime(2014, 1, 2, 3, 4, 5,
+                                                         6),
+                                       completed=1, cached=0)
+            execs.append(DBWorkflowExec(
+                    id=i, user='user', ip='127.0.0.1', vt_version='2.2',
+                    ts_start=datetime(2014, 1, 2), ts_end=None,
+                    parent_version=i, completed=1, item_execs=[module_exec],
+                    annotations=[DBAnnotation(id=i, key='k', value=str(i))]))
+        return DBLog(id=1, name='log', workflow_execs=execs)
+
+    def get_dao(self):
+        from vistrails.db.versions.v1_0_5.persistence import get_binary_dao
+        dao = get_binary_dao()
+        # get several item chunks
+        self.addCleanup(setattr, dao, 'chunk_size', dao.chunk_size)
+        dao.chunk_size = 3
+        return dao
+
+    def check_log(self, log, ids):
+        self.assertEqual([e.db_id for e in log.db_workflow_execs], ids)
+        for workflow_exec in log.db_workflow_execs:
+            module_exec, = workflow_exec.db_item_execs
+            self.assertEqual(module_exec.db_module_name, u'm\xe9')
+            self.assertEqual(module_exec.db_ts_start,
+                             datetime(2014, 1, 2, 3, 4, 5, 6))
+            self.assertEqual(workflow_exec.db_annotations[0].db_value,
+                             str(workflow_exec.db_id))
+            self.assertFalse(workflow_exec.is_dirty)
+
+    def test_write_read(self):
+        import StringIO
+        dao = self.get_dao()
+        f = StringIO.StringIO()
+        dao.write(self.make_log(7), f, '1.0.5')
+        version, log = dao.read(f.getvalue(), 'log')
+        self.assertEqual(version, '1.0.5')
+        self.assertEqual((log.db_id, log.db_name), (1, 'log'))
+        self.check_log(log, range(7))
+        self.assertRaises(VistrailsDBException,
+                          dao.read, f.getvalue(), 'vistrail')
+        self.assertRaises(VistrailsDBException,
+                          dao.read, 'VTBIN 99 1.0.5\n', 'log')
+        self.assertRaises(VistrailsDBException,
+                          dao.read, '<log version="1.0.5"/>', 'log')
+
+    def test_append(self):
+        import tempfile
+        import shutil
+        dao = self.get_dao()
+        tmpdir = tempfile.mkdtemp(prefix='vt_binary')
+        try:
+            fname = os.path.join(tmpdir, 'log')
+            dao.append(self.make_log(4), fname, '1.0.5')
+            dao.append(self.make_log(2), fname, '1.0.5')
+            with open(fname, 'rb') as f:
+                data = f.read()
+            version, log = dao.read(data, 'log')
+            self.check_log(log, [0, 1, 2, 3, 0, 1])
+            self.assertRaises(VistrailsDBException,
+                              dao.append, self.make_log(1), fname, '1.0.4')
+
+            # interrupted while writing the last chunk: the index is lost
+            # and the partial chunk is dropped
+            index_offset = trailer.unpack(data[-trailer.size:])[0]
+            with open(fname, 'r+b') as f:
+                f.truncate(index_offset - 10)
+            with open(fname, 'rb') as f:
+                version, log = dao.read(f.read(), 'log')
+            self.check_log(log, [0, 1, 2, 3])
+            dao.append(self.make_log(1), fname, '1.0.5')
+            with open(fname, 'rb') as f:
+                version, log = dao.read(f.read(), 'log')
+            self.check_log(log, [0, 1, 2, 3, 0])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_changed_fields(self):
+        """test reading objects whose fields differ from the domain"""
+        dao = self.get_dao()
+        code = dao.codes['annotation'][0]
+        type_table = list(dao.type_table)
+        type_table[code] = ('annotation', ('value', 'unknown', 'id'))
+        make = dao.get_decoder(type_table)
+        annotation = loads(dumps((code, 'v', 42, 7)), make=make)
+        self.assertEqual((annotation.db_id, annotation.db_key,
+                          annotation.db_value), (7, None, 'v'))
+
+        type_table[code] = ('newType', ('id',))
+        make = dao.get_decoder(type_table)
+        self.assertRaises(VistrailsDBException, loads, dumps((code, 1)),
+                          make=make)
+
+    def test_values(self):
+        """test encoding and decoding the payload values"""
+        values = [None, True, False, 0, -1, INT32_MAX, INT32_MIN,
+                  INT32_MAX + 1, INT64_MAX, INT64_MIN, 7L, INT64_MAX + 1,
+                  2 ** 70, -2 ** 70, 1.5, float('inf'), '', 'a\x00\xff',
+                  u'\xe9\u20ac', [], (), [1, (2, [u'3', None])],
+                  ('x' * 100000,), u'\xe9' * 300]
+        for value in values:
+            decoded = loads(dumps(value))
+            self.assertEqual(decoded, value)
+            self.assertIs(type(decoded), type(value))
+        self.assertRaises(VistrailsDBException, dumps, set([1]))
+
+    def test_invalid(self):
+        """test that corrupted payloads and files are rejected"""
+        import StringIO
+        payload = dumps([1, 'abc', (u'd', 2.0)])
+        for i in xrange(len(payload)):
+            self.assertRaises(VistrailsDBException, loads, payload[:i])
+        self.assertRaises(VistrailsDBException, loads, payload + '\x00')
+        # lengths larger than the chunk
+        self.assertRaises(VistrailsDBException, loads,
+                          tag_length.pack(V_STR, 2 ** 31) + 'abc')
+        self.assertRaises(VistrailsDBException, loads,
+                          tag_length.pack(V_LIST, 2 ** 31) + '\x00')
+        self.assertRaises(VistrailsDBException, loads, chr(99))
+
+        dao = self.get_dao()
+        f = StringIO.StringIO()
+        dao.write(self.make_log(7), f, '1.0.5')
+        data = f.getvalue()
+        # the previous format used marshal
+        self.assertRaises(VistrailsDBException, dao.read,
+                          data.replace('VTBIN 2 ', 'VTBIN 1 ', 1), 'log')
+        # an index entry past the end of the file
+        index_offset = trailer.unpack(data[-trailer.size:])[0]
+        index = loads(data, index_offset + chunk_header.size,
+                      len(data) - trailer.size)
+        index[-1] = index[-1][:2] + (len(data),) + index[-1][3:]
+        payload = dumps(index)
+        self.assertRaises(VistrailsDBException, dao.read,
+                          data[:index_offset] +
+                          chunk_header.pack(CHUNK_INDEX, len(payload)) +
+                          payload + trailer.pack(index_offset, TRAILER_TAG),
+                          'log')
+        # any corrupted byte is either harmless or detected
+        _, _, start = read_header(data)
+        index_offset = trailer.unpack(data[-trailer.size:])[0]
+        for offset in xrange(start, index_offset, 97):
+            corrupted = data[:offset] + '\xfe' + data[offset + 1:]
+            try:
+                dao.read(corrupted, 'log')
+            except VistrailsDBException:
+                pass
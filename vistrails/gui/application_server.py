@@ -65,6 +65,8 @@ import vistrails.core.application
 from vistrails.gui import qt
 from vistrails.core.db.locator import DBLocator, ZIPFileLocator, FileLocator
 from vistrails.core.db import io
+from vistrails.core.db.vistrail_cache import VistrailCache
+from vistrails.core.worker_pool import WorkerPool
 import vistrails.core.db.action
 
 from vistrails.core.vistrail.vistrail import Vistrail
@@ -121,10 +123,14 @@ class RequestHandler(object):
     """This class will handle all the requests sent to the server.
     Add new methods here and they will be exposed through the XML-RPC interface
     """
-    def __init__(self, logger, instances):
+    def __init__(self, logger, instances, worker_pool=None, keep_cache=False,
+                 vistrail_cache=None):
         self.server_logger = logger
         self.instances = instances
         self.proxies_queue = None
+        self.worker_pool = worker_pool
+        self.keep_cache = keep_cache
+        self.vistrail_cache = vistrail_cache
         self.instantiate_proxies()
 
     #proxies
@@ -166,6 +172,26 @@ class RequestHandler(object):
                 status.close()
         return result
 
+    def load_vistrail(self, locator):
+        """load_vistrail(locator: DBLocator) -> (Vistrail, list, list, list)
+        Same as io.load_vistrail(), using the vistrail cache if the server
+        has one. The vistrail may be shared and must not be modified.
+        """
+        if self.vistrail_cache is not None:
+            return self.vistrail_cache.get_vistrail(locator)
+        return io.load_vistrail(locator)
+
+    def get_pipelines(self, locator, versions):
+        """get_pipelines(locator: DBLocator, versions: list) -> list
+        Returns the pipelines of some versions of the vistrail of locator,
+        using the vistrail cache if the server has one. The pipelines may
+        be shared and must not be modified.
+        """
+        if self.vistrail_cache is not None:
+            return self.vistrail_cache.get_pipelines(locator, versions)
+        vistrail = io.load_vistrail(locator)[0]
+        return [vistrail.getPipeline(version) for version in versions]
+
     def path_exists_and_not_empty(self, path):
         """path_exists_and_not_empty(path:str) -> boolean
         Returns True if given path exists and it's not empty, otherwise returns
@@ -202,8 +228,7 @@ class RequestHandler(object):
                                 obj_type=None,
                                 connection_id=None)
 
-            v = locator.load().vistrail
-            p = v.getPipeline(long(version))
+            p = self.get_pipelines(locator, [long(version)])[0]
 
             if p:
                 result = []
@@ -255,7 +280,7 @@ class RequestHandler(object):
                                 obj_type=None,
                                 connection_id=None)
             (vistrail, abstractions, thumbnails, mashups) = \
-                                                      io.load_vistrail(locator)
+                                                   self.load_vistrail(locator)
             for mashuptrail in mashups:
                 # Find tagged mashups for this version
                 if mashuptrail.vtVersion == version:
@@ -547,6 +572,13 @@ class RequestHandler(object):
             conn = vistrails.db.services.io.open_db_connection(config)
             vistrails.db.services.io.delete_entity_from_db(conn,'vistrail', vt_id)
             vistrails.db.services.io.close_db_connection(conn)
+            if self.vistrail_cache is not None:
+                self.vistrail_cache.discard(DBLocator(host=host,
+                                                      port=int(port),
+                                                      database=db_name,
+                                                      user=db_write_user,
+                                                      passwd=db_write_pass,
+                                                      obj_id=int(vt_id)))
             return (1, 1)
         except Exception, e:
             self.server_logger.error(str(e))
@@ -564,7 +596,7 @@ class RequestHandler(object):
                                 obj_id=int(vt_id),
                                 obj_type=None,
                                 connection_id=None)
-            (vistrail, _, _, _)  = io.load_vistrail(locator)
+            (vistrail, _, _, _)  = self.load_vistrail(locator)
 
             # get server packages
             local_packages = [x.identifier for x in \
@@ -575,8 +607,10 @@ class RequestHandler(object):
             local_data_modules = ['File', 'FileSink', 'Path']
 
             # find runnable workflows
-            for version_id, version_tag in vistrail.get_tagMap().iteritems():
-                pipeline = vistrail.getPipeline(version_id)
+            version_ids = vistrail.get_tagMap().keys()
+            for version_id, pipeline in zip(version_ids,
+                                            self.get_pipelines(locator,
+                                                               version_ids)):
                 workflow_packages = set()
                 on_repo = True
                 has_python_source = False
@@ -630,6 +664,12 @@ class RequestHandler(object):
     def run_from_db_webgl(self, host, port, db_name, vt_id, path_to_figures,
                         version=None,  pdf=False, vt_tag='', build_always=False,
                         parameters='', is_local=True):
+        if self.worker_pool is not None:
+            return self.worker_pool.execute('run_from_db_webgl', host, port,
+                                            db_name, vt_id, path_to_figures,
+                                            version, pdf, vt_tag,
+                                            build_always, parameters,
+                                            is_local)
         # get vistrail
         locator = DBLocator(host=host,
                             port=int(port),
@@ -740,6 +780,14 @@ class RequestHandler(object):
                     self.server_logger.error(str(e))
                     return (str(e), 0)
 
+            if (not self.path_exists_and_not_empty(path_to_images) and
+                self.worker_pool is not None):
+                self.server_logger.info("Sending request to worker pool")
+                if extra_info is not None:
+                    return self.worker_pool.execute('executeMedley',
+                                                    xml_medley, extra_info)
+                return self.worker_pool.execute('executeMedley', xml_medley)
+
             if extra_info is None:
                 extra_info = {}
 
@@ -793,7 +841,8 @@ class RequestHandler(object):
                                                     update_vistrail=False,
                                                     extra_info=extra_info)
                                     self.server_logger.info("Memory usage: %s"% self.memory_usage())
-                                    interpreter.cached.CachedInterpreter.flush()
+                                    if not self.keep_cache:
+                                        interpreter.cached.CachedInterpreter.flush()
                                 except Exception, e:
                                     self.server_logger.error(str(e))
                                     return (str(e), 0)
@@ -946,6 +995,15 @@ class RequestHandler(object):
                 self.server_logger.error(str(e))
                 return (str(e), 0)
 
+        if ((not self.path_exists_and_not_empty(path_to_figures) or
+             build_always) and self.worker_pool is not None):
+            self.server_logger.info("Sending request to worker pool")
+            return self.worker_pool.execute('run_from_db', host, port,
+                                            db_name, vt_id, path_to_figures,
+                                            version, pdf, vt_tag,
+                                            build_always, parameters,
+                                            is_local)
+
         extra_info = {}
         extra_info['pathDumpCells'] = path_to_figures
         self.server_logger.debug(path_to_figures)
@@ -1053,8 +1111,7 @@ class RequestHandler(object):
                                 obj_type=None,
                                 connection_id=None)
 
-            v = locator.load().vistrail
-            p = v.getPipeline(long(version))
+            p = self.get_pipelines(locator, [long(version)])[0]
 
             if p:
                 result = []
@@ -1096,7 +1153,7 @@ class RequestHandler(object):
                                 obj_type=None,
                                 connection_id=None)
 
-            (v, _ , _, _)  = io.load_vistrail(locator)
+            (v, _ , _, _)  = self.load_vistrail(locator)
             if v.has_tag_str(vt_tag):
                 version = v.get_tag_str(vt_tag).action_id
             self.server_logger.info("Answer: %s" % version)
@@ -1130,7 +1187,7 @@ class RequestHandler(object):
                                 obj_type=None,
                                 connection_id=None)
 
-            (v, _ , _, _)  = io.load_vistrail(locator)
+            (v, _ , _, _)  = self.load_vistrail(locator)
             result = io.serialize(v)
             return (result, 1)
         except xmlrpclib.ProtocolError, err:
@@ -1160,8 +1217,7 @@ class RequestHandler(object):
                                 obj_type=None,
                                 connection_id=None)
 
-            (v, _ , _, _)  = io.load_vistrail(locator)
-            p = v.getPipeline(long(version))
+            p = self.get_pipelines(locator, [long(version)])[0]
             if p:
                 result = io.serialize(p)
                 self.server_logger.info("success")
@@ -1612,8 +1668,7 @@ class RequestHandler(object):
                                 obj_type=None,
                                 connection_id=None)
 
-            (v, _ , _, _)  = io.load_vistrail(locator)
-            p = v.getPipeline(long(version))
+            p = self.get_pipelines(locator, [long(version)])[0]
             if p:
                 vistrail = Vistrail()
                 action_list = []
@@ -1717,7 +1772,7 @@ class RequestHandler(object):
                                 connection_id=None)
 
             result = []
-            v = locator.load().vistrail
+            v = self.load_vistrail(locator)[0]
             for elem, tag in v.get_tagMap().iteritems():
                 action_map = v.actionMap[long(elem)]
                 thumbnail_fname = ""
@@ -2091,6 +2146,8 @@ class VistrailsServerSingleton(VistrailsApplicationInterface,
 
         self.rpcserver = None
         self.pingserver = None
+        self.worker_pool = None
+        self.vistrail_cache = None
         self.images_url = "http://vistrails.sci.utah.edu/medleys/images/"
         qt.allowQObjects()
 
@@ -2239,18 +2296,30 @@ class VistrailsServerSingleton(VistrailsApplicationInterface,
                                    "Please populate it with the correct values and use it" %
                                    (filename, new_filename))
 
-    def init(self, optionsDict=None, args=[]):
-        """ init(optionDict: dict) -> boolean
-        Create the application with a dict of settings
+    def init(self, optionsDict=None, args=[], worker=None):
+        """ init(optionDict: dict, args: list, worker: int) -> boolean
+        Create the application with a dict of settings. worker is the index
+        of the worker process this application runs in, if any: it logs to
+        its own file and doesn't start other instances.
 
         """
         VistrailsApplicationInterface.init(self,optionsDict, args)
+        # the worker processes are initialized with the same settings
+        self.init_args = (optionsDict, args)
 
         # self.vistrailsStartup.init()
-        self.server_logger = self.make_logger(self.temp_configuration.check('rpcLogFile'),
-                                              self.temp_configuration.check('rpcPort'))
+        log_file = self.temp_configuration.check('rpcLogFile')
+        label = self.temp_configuration.check('rpcPort')
+        if worker is not None:
+            # the processes can't share a rotating log file
+            log_file = '%s.worker%d' % (log_file, worker)
+            label = '%s/worker%d' % (label, worker)
+        self.server_logger = self.make_logger(log_file, label)
         self.load_config(self.temp_configuration.check('rpcConfig'))
-        self.start_other_instances(self.temp_configuration.check('rpcInstances'))
+        if worker is not None:
+            self.others = []
+        else:
+            self.start_other_instances(self.temp_configuration.check('rpcInstances'))
         self._initialized = True
         return True
 
@@ -2293,6 +2362,17 @@ class VistrailsServerSingleton(VistrailsApplicationInterface,
         self.server_logger.info("Server is running on http://%s:%s"%(
                                    self.temp_configuration.check('rpcServer'),
                                    self.temp_configuration.check('rpcPort')))
+        cache_size = self.temp_configuration.check('rpcCacheSize')
+        if cache_size:
+            self.vistrail_cache = VistrailCache(cache_size)
+        nb_workers = self.temp_configuration.check('rpcWorkers')
+        if nb_workers:
+            self.worker_pool = WorkerPool(
+                    self.server_logger, nb_workers,
+                    'vistrails.vistrails_server.init_worker', self.init_args,
+                    self.temp_configuration.check('rpcWorkerMaxMemory'),
+                    self.temp_configuration.check('rpcWorkerMaxRequests'))
+            self.server_logger.info("    %d worker processes" % nb_workers)
         if self.temp_configuration.check('multithread'):
             self.rpcserver = ThreadedXMLRPCServer(
                                   (self.temp_configuration.check('rpcServer'),
@@ -2312,8 +2392,10 @@ class VistrailsServerSingleton(VistrailsApplicationInterface,
             """
             self.server_logger.info("    singlethreaded instance")
         #self.rpcserver.register_introspection_functions()
-        self.rpcserver.register_instance(RequestHandler(self.server_logger,
-                                                        self.others))
+        self.rpcserver.register_instance(RequestHandler(
+                                     self.server_logger, self.others,
+                                     self.worker_pool,
+                                     vistrail_cache=self.vistrail_cache))
         if self.pingserver:
             self.pingserver.register_instance(RequestHandler(
                                                       self.server_logger, []))
@@ -2337,6 +2419,8 @@ class VistrailsServerSingleton(VistrailsApplicationInterface,
     def quit_server(self):
         result = "Vistrails XML RPC Server is quitting."
         self.stop_other_instances()
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
         self.server_logger.info(result)
         self.rpcserver.stop = True
         return result
@@ -2344,7 +2428,7 @@ class VistrailsServerSingleton(VistrailsApplicationInterface,
 # The initialization must be explicitly signalled. Otherwise, any
 # modules importing vis_application will try to initialize the entire
 # app.
-def start_server(optionsDict=None, args=[]):
+def start_server(optionsDict=None, args=[], worker=None):
     """Initializes the application singleton."""
     global VistrailsServer
     if VistrailsServer:
@@ -2353,11 +2437,21 @@ def start_server(optionsDict=None, args=[]):
     VistrailsServer = VistrailsServerSingleton()
     vistrails.gui.theme.initializeCurrentTheme()
     vistrails.core.application.set_vistrails_application(VistrailsServer)
-    if VistrailsServer.init(optionsDict, args):
+    if VistrailsServer.init(optionsDict, args, worker):
         return 0
     else:
         return 1
 
+def init_worker(index, optionsDict=None, args=[]):
+    """init_worker(index: int, optionsDict: dict, args: list)
+           -> (RequestHandler, Logger)
+    Initializes the application of a server worker process, see
+    WorkerPool, and returns the handler executing its requests.
+    """
+    start_server(optionsDict, args, worker=index)
+    logger = VistrailsServer.server_logger
+    return RequestHandler(logger, [], keep_cache=True), logger
+
 VistrailsServer = None
 
 def stop_server():
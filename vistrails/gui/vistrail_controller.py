@@ -54,7 +54,8 @@ from vistrails.core.log.opm_graph import OpmGraph
 from vistrails.core.log.prov_document import ProvDocument
 from vistrails.core.modules.abstraction import identifier as abstraction_pkg
 from vistrails.core.modules.module_registry import get_module_registry
-from vistrails.core.param_explore import ActionBasedParameterExploration
+from vistrails.core.param_explore import ParameterExplorationExecutor, \
+    _pipelinePosition
 from vistrails.core.query.version import TrueSearch
 from vistrails.core.query.visual import VisualQuery
 from vistrails.core.utils import DummyView, VistrailsInternalError, InvalidPipeline
@@ -1290,30 +1291,26 @@ class VistrailController(QtCore.QObject, BaseController):
 
         if self.current_pipeline and actions:
             pe_log_id = uuid.uuid1()
-            explorer = ActionBasedParameterExploration()
-            (pipelines, performedActions) = explorer.explore(
-                self.current_pipeline, actions, pre_actions)
             
             dim = [max(1, len(a)) for a in actions]
+            cellCount = 1
+            for d in dim:
+                cellCount *= d
             if use_spreadsheet:
-                from vistrails.gui.paramexplore.virtual_cell import positionPipelines, assembleThumbnails
+                from vistrails.gui.paramexplore.virtual_cell import positionPipeline, assembleThumbnails
                 from vistrails.gui.paramexplore.pe_view import QParamExploreView
-                modifiedPipelines, pipelinePositions = positionPipelines(
-                    'PE#%d %s' % (QParamExploreView.explorationId, self.name),
-                    dim[2], dim[1], dim[0], pipelines, pe.layout, self)
+                sheetPrefix = 'PE#%d %s' % (QParamExploreView.explorationId,
+                                            self.name)
                 QParamExploreView.explorationId += 1
+                def cellPipeline(pi, pipeline):
+                    return positionPipeline(sheetPrefix, dim[2], dim[1],
+                                            dim[0], pi, pipeline,
+                                            pe.layout)[0]
             else:
-                from vistrails.core.param_explore import _pipelinePositions
-                modifiedPipelines = pipelines
-                pipelinePositions = _pipelinePositions(
-                    dim[2], dim[1], dim[0], pipelines)
-
-            mCount = []
-            for p in modifiedPipelines:
-                if len(mCount) == 0:
-                    mCount.append(0)
-                else:
-                    mCount.append(len(p.modules)+mCount[len(mCount)-1])
+                def cellPipeline(pi, pipeline):
+                    return pipeline
+            def pipelinePosition(pi):
+                return _pipelinePosition(dim[2], dim[1], dim[0], pi)
 
             from vistrails.gui.job_monitor import QJobView
             jobView = QJobView.instance()
@@ -1327,53 +1324,65 @@ class VistrailController(QtCore.QObject, BaseController):
                 # Now execute the pipelines
 
                 if showProgress:
-                    totalProgress = sum([len(p.modules) for p in modifiedPipelines])
+                    # all the cells have the same modules
+                    cellModules = len(cellPipeline(
+                        0, self.current_pipeline).modules)
+                    totalProgress = cellModules * cellCount
                     self.progress = PEProgressDialog(self.vistrail_view, totalProgress)
                     self.progress.show()
 
                 interpreter = get_default_interpreter()
+                if use_spreadsheet:
+                    # spreadsheet cells have to be displayed by this process
+                    processes = 0
+                else:
+                    processes = getattr(get_vistrails_configuration(),
+                                        'explorationProcesses', 0)
+                executor = ParameterExplorationExecutor(interpreter,
+                                                        processes)
+                # worker processes don't report to the view nor the jobs
+                in_process = executor.processes <= 1
+                variables = None
+                if self.get_vistrail_variables():
+                    # remove vars used in pe
+                    variables = dict([(v.uuid, v)
+                                      for v in self.get_vistrail_variables()
+                                      if v.uuid not in vistrail_vars])
 
                 images = {}
                 errors = []
-                for pi in xrange(len(modifiedPipelines)):
-                    if showProgress:
-                        self.progress.setValue(mCount[pi])
+                running_job = []
+                def moduleExecuted(objId):
+                    if not self.progress.wasCanceled():
+                        self.progress.setValue(self.progress.value()+1)
                         QtCore.QCoreApplication.processEvents()
-                        if self.progress.wasCanceled():
-                            break
-                        def moduleExecuted(objId):
-                            if not self.progress.wasCanceled():
-                                self.progress.setValue(self.progress.value()+1)
-                                QtCore.QCoreApplication.processEvents()
+                def get_kwargs(pi):
                     if use_spreadsheet:
                         name = os.path.splitext(self.name)[0] + \
-                                             ("_%s_%s_%s" % pipelinePositions[pi])
+                                             ("_%s_%s_%s" % pipelinePosition(pi))
                         extra_info['nameDumpCells'] = name
                         if 'pathDumpCells' in extra_info:
-                            images[pipelinePositions[pi]] = \
+                            images[pipelinePosition(pi)] = \
                                        os.path.join(extra_info['pathDumpCells'], name)
-                    pe_cell_id = (pe_log_id,) + pipelinePositions[pi]
+                    pe_cell_id = (pe_log_id,) + pipelinePosition(pi)
                     kwargs = {'locator': self.locator,
-                              'job_monitor': self.jobMonitor,
                               'current_version': self.current_version,
                               'reason': 'Parameter Exploration %s %s_%s_%s' % pe_cell_id,
                               'logger': self.get_logger(),
-                              'actions': performedActions[pi],
                               'extra_info': extra_info
                               }
-                    if view:
+                    if view and in_process:
                         kwargs['view'] = view
-                    if showProgress:
+                    if showProgress and in_process:
                         kwargs['module_executed_hook'] = [moduleExecuted]
-                    if self.get_vistrail_variables():
-                        # remove vars used in pe
-                        vars = dict([(v.uuid, v) for v in self.get_vistrail_variables()
-                                if v.uuid not in vistrail_vars])
-                        kwargs['vistrail_variables'] = lambda x: vars.get(x, None)
+
+                    if not in_process:
+                        return kwargs
 
                     # Create job
                     # check if a job exist for this workflow
-                    job_id = 'Parameter Exploration %s %s %s_%s_%s' % ((self.current_version, pe.id) + pipelinePositions[pi])
+                    kwargs['job_monitor'] = self.jobMonitor
+                    job_id = 'Parameter Exploration %s %s %s_%s_%s' % ((self.current_version, pe.id) + pipelinePosition(pi))
 
                     current_workflow = None
                     for wf in self.jobMonitor.workflows.itervalues():
@@ -1384,17 +1393,36 @@ class VistrailController(QtCore.QObject, BaseController):
                     if not current_workflow:
                         current_workflow = JobWorkflow(job_id)
                         self.jobMonitor.startWorkflow(current_workflow)
-                    try:
-                        result = interpreter.execute(modifiedPipelines[pi], **kwargs)
-                    finally:
-                        self.jobMonitor.finishWorkflow()
+                    running_job.append(current_workflow)
+                    return kwargs
 
-                    for error in result.errors.itervalues():
-                        if use_spreadsheet:
-                            pp = pipelinePositions[pi]
-                            errors.append(((pp[1], pp[0], pp[2]), error))
-                        else:
-                            errors.append(((0,0,0), error))
+                if showProgress:
+                    QtCore.QCoreApplication.processEvents()
+                done_modules = 0
+                cells = executor.execute(self.current_pipeline, actions,
+                                         pre_actions, get_kwargs, self.log,
+                                         variables, cellPipeline)
+                try:
+                    for pi, result in cells:
+                        if running_job:
+                            running_job.pop()
+                            self.jobMonitor.finishWorkflow()
+                        for error in result.errors.itervalues():
+                            if use_spreadsheet:
+                                pp = pipelinePosition(pi)
+                                errors.append(((pp[1], pp[0], pp[2]), error))
+                            else:
+                                errors.append(((0,0,0), error))
+                        if showProgress:
+                            done_modules += cellModules
+                            self.progress.setValue(done_modules)
+                            QtCore.QCoreApplication.processEvents()
+                            if self.progress.wasCanceled():
+                                break
+                finally:
+                    cells.close()
+                    if running_job:
+                        self.jobMonitor.finishWorkflow()
 
             finally:
                 jobView.updating_now = False
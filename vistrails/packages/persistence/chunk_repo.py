@@ -0,0 +1,420 @@
+###############################################################################
+##
+## Copyright (C) 2014-2016, New York University.
+## Copyright (C) 2011-2014, NYU-Poly.
+## Copyright (C) 2006-2011, University of Utah.
+## All rights reserved.
+## Contact: contact@vistrails.org
+##
+## This file is part of VisTrails.
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are met:
+##
+##  - Redistributions of source code must retain the above copyright notice,
+##    this list of conditions and the following disclaimer.
+##  - Redistributions in binary form must reproduce the above copyright
+##    notice, this list of conditions and the following disclaimer in the
+##    documentation and/or other materials provided with the distribution.
+##  - Neither the name of the New York University nor the names of its
+##    contributors may be used to endorse or promote products derived from
+##    this software without specific prior written permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+## AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+## THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+## PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR
+## CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+## EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+## PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+## OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY,
+## WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR
+## OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF
+## ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+##
+###############################################################################
+
+"""Content-addressed store for persistent files, alternative to GitRepo.
+
+Files are split into content-defined chunks, each stored once under the SHA-1
+of its content, so versions of a file that only differ in a few places share
+most of their storage. Chunk boundaries are placed where the buzhash of the
+last CHUNK_WINDOW bytes has the bits of CHUNK_MASK unset, which does not depend
+on the position in the file: an insertion only changes the chunks around it.
+
+Blobs (lists of chunks), trees and commits are recorded in an SQLite database
+next to the chunks. Blob and tree ids are the same as git's, so the hashes
+computed by GitRepo.compute_hash() can be compared with the stored ones.
+"""
+
+from __future__ import division
+
+import binascii
+import hashlib
+from itertools import izip
+import json
+import os
+import sqlite3
+import stat
+import tempfile
+import time
+import uuid
+import zlib
+
+from repo import GitRepo
+
+# chunks are cut between MIN_CHUNK and MAX_CHUNK bytes, after a window of
+# CHUNK_WINDOW bytes whose buzhash has all the bits of CHUNK_MASK unset, which
+# makes them AVG_CHUNK bytes long on average
+MIN_CHUNK = 1 << 14
+AVG_CHUNK = 1 << 15
+MAX_CHUNK = 1 << 17
+CHUNK_WINDOW = 48
+CHUNK_MASK = AVG_CHUNK - MIN_CHUNK - 1
+
+# buzhash of a byte, and that value rotated by the window size to remove the
+# byte leaving the window; derived from SHA-1 so they never change
+BUZHASH = [int(hashlib.sha1(chr(i)).hexdigest()[:8], 16) for i in xrange(256)]
+BUZHASH_OUT = [(h << CHUNK_WINDOW % 32 | h >> 32 - CHUNK_WINDOW % 32) &
+               0xffffffff for h in BUZHASH]
+
+# header byte of the stored chunks
+RAW = 'r'
+ZLIB = 'z'
+
+
+def find_cut(data, start):
+    """find_cut(data: str, start: int) -> int
+
+    Returns the end of the chunk of data starting at start.
+    """
+    limit = min(len(data), start + MAX_CHUNK)
+    if limit - start <= MIN_CHUNK:
+        return limit
+    # only hash from the first window that can end a chunk
+    window = bytearray(data[start + MIN_CHUNK - CHUNK_WINDOW:limit])
+    table, table_out = BUZHASH, BUZHASH_OUT
+    h = 0
+    for c in window[:CHUNK_WINDOW]:
+        h = (h << 1 & 0xffffffff | h >> 31) ^ table[c]
+    pos = start + MIN_CHUNK
+    if not h & CHUNK_MASK:
+        return pos
+    for out, c in izip(window, window[CHUNK_WINDOW:]):
+        h = (h << 1 & 0xffffffff | h >> 31) ^ table_out[out] ^ table[c]
+        pos += 1
+        if not h & CHUNK_MASK:
+            return pos
+    return limit
+
+
+def iter_chunks(f, read_size=1 << 22):
+    """iter_chunks(f: file) -> iterator over str
+
+    Splits the content of f into content-defined chunks.
+    """
+    data = ''
+    start = 0
+    eof = False
+    while True:
+        if not eof and len(data) - start < MAX_CHUNK:
+            block = f.read(read_size)
+            if block:
+                data = data[start:] + block
+                start = 0
+            else:
+                eof = True
+            continue
+        if start >= len(data):
+            return
+        end = find_cut(data, start)
+        yield data[start:end]
+        start = end
+
+
+def tree_id(entries):
+    """tree_id(entries: list of (name, mode, id)) -> str
+
+    Returns the git id of the tree with these entries.
+    """
+    def key(entry):
+        name, mode, _ = entry
+        if stat.S_ISDIR(mode):
+            return name + '/'
+        return name
+    content = ''.join('%04o %s\0%s' % (mode, name, binascii.unhexlify(id))
+                      for name, mode, id in sorted(entries, key=key))
+    return hashlib.sha1('tree %d\0%s' % (len(content), content)).hexdigest()
+
+
+class ChunkRepo(object):
+    """Versioned store of the persistent files, deduplicating their chunks.
+
+    It has the interface of GitRepo used by the persistence package: files
+    or directories copied to path are recorded with add_commit() and
+    retrieved with get_path().
+    """
+
+    compute_hash = staticmethod(GitRepo.compute_hash)
+
+    def __init__(self, path, compress=False):
+        if os.path.exists(path) and not os.path.isdir(path):
+            raise IOError('Chunk repository "%s" must be a directory.' %
+                          path)
+        self.path = path
+        self.store_dir = os.path.join(path, '.chunks')
+        self.compress = compress
+        if not os.path.exists(self.store_dir):
+            os.makedirs(self.store_dir)
+        self.conn = sqlite3.connect(os.path.join(self.store_dir, 'store.db'))
+        cur = self.conn.cursor()
+        cur.execute("CREATE TABLE IF NOT EXISTS object (id text PRIMARY KEY, "
+                    "type text, entries text);")
+        cur.execute("CREATE TABLE IF NOT EXISTS commit_log ("
+                    "seq integer PRIMARY KEY AUTOINCREMENT, version text, "
+                    "name text, type text, object text, date real);")
+        cur.execute("CREATE INDEX IF NOT EXISTS commit_version_idx "
+                    "ON commit_log(version);")
+        cur.execute("CREATE INDEX IF NOT EXISTS commit_name_idx "
+                    "ON commit_log(name, seq);")
+        self.conn.commit()
+
+        self.temp_persist_files = []
+
+    def _chunk_path(self, chunk_id):
+        return os.path.join(self.store_dir, chunk_id[:2], chunk_id[2:])
+
+    def _write_chunk(self, chunk):
+        chunk_id = hashlib.sha1(chunk).hexdigest()
+        fname = self._chunk_path(chunk_id)
+        if os.path.exists(fname):
+            return chunk_id
+        data = RAW + chunk
+        if self.compress:
+            compressed = zlib.compress(chunk, 1)
+            if len(compressed) < len(chunk):
+                data = ZLIB + compressed
+        dirname = os.path.dirname(fname)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        # write then rename so that a chunk file is always complete
+        tmp_fname = '%s.%s' % (fname, uuid.uuid1().hex)
+        with open(tmp_fname, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_fname, fname)
+        return chunk_id
+
+    def _read_chunk(self, chunk_id):
+        with open(self._chunk_path(chunk_id), 'rb') as f:
+            data = f.read()
+        if data[0] == ZLIB:
+            return zlib.decompress(data[1:])
+        return data[1:]
+
+    def _store_blob(self, fname):
+        size = os.path.getsize(fname)
+        hasher = hashlib.sha1('blob %d\0' % size)
+        chunk_ids = []
+        with open(fname, 'rb') as f:
+            for chunk in iter_chunks(f):
+                hasher.update(chunk)
+                chunk_ids.append(self._write_chunk(chunk))
+        blob_id = hasher.hexdigest()
+        self.conn.execute("INSERT OR IGNORE INTO object(id, type, entries) "
+                          "VALUES (?, 'blob', ?);",
+                          (blob_id, json.dumps(chunk_ids)))
+        return blob_id
+
+    def _store_tree(self, dirname):
+        entries = []
+        for entry in sorted(os.listdir(dirname)):
+            fname = os.path.join(dirname, entry)
+            if os.path.isdir(fname):
+                entries.append((entry, stat.S_IFDIR,
+                                self._store_tree(fname)))
+            elif os.path.isfile(fname):
+                entries.append((entry, os.stat(fname)[stat.ST_MODE],
+                                self._store_blob(fname)))
+        id = tree_id(entries)
+        self.conn.execute("INSERT OR IGNORE INTO object(id, type, entries) "
+                          "VALUES (?, 'tree', ?);",
+                          (id, json.dumps(entries)))
+        return id
+
+    def _get_object(self, id):
+        cur = self.conn.execute("SELECT type, entries FROM object "
+                                "WHERE id=?;", (id,))
+        res = cur.fetchone()
+        if res is None:
+            raise KeyError('Cannot find object "%s"' % id)
+        return str(res[0]), json.loads(res[1])
+
+    def _get_commit(self, name, version="HEAD"):
+        """Returns the (type, object id) of name as of version.
+        """
+        if version is None or version == "HEAD":
+            cur = self.conn.execute("SELECT type, object FROM commit_log "
+                                    "WHERE name=? ORDER BY seq DESC "
+                                    "LIMIT 1;", (name,))
+        else:
+            cur = self.conn.execute("SELECT type, object FROM commit_log "
+                                    "WHERE name=? AND seq <= (SELECT seq "
+                                    "FROM commit_log WHERE version=?) "
+                                    "ORDER BY seq DESC LIMIT 1;",
+                                    (name, version))
+        res = cur.fetchone()
+        if res is None:
+            raise KeyError('Cannot find object "%s"' % name)
+        return str(res[0]), str(res[1])
+
+    def get_type(self, name, version="HEAD"):
+        return self._get_commit(name, version)[0]
+
+    def get_hash(self, name, version="HEAD", path_type=None):
+        return self._get_commit(name, version)[1]
+
+    def get_path(self, name, version="HEAD", path_type=None, out_name=None,
+                 out_suffix=''):
+        path_type, id = self._get_commit(name, version)
+        if path_type == 'tree':
+            return self.get_dir(name, version, out_name, out_suffix)
+        elif path_type == 'blob':
+            return self.get_file(name, version, out_name, out_suffix)
+
+        raise TypeError("Unknown path type '%s'" % path_type)
+
+    def _write_blob(self, blob_id, out_fname=None, out_suffix=''):
+        if out_fname is None:
+            # create a temporary file
+            (fd, out_fname) = tempfile.mkstemp(suffix=out_suffix,
+                                               prefix='vt_persist')
+            os.close(fd)
+            self.temp_persist_files.append(out_fname)
+        else:
+            out_dirname = os.path.dirname(out_fname)
+            if out_dirname and not os.path.exists(out_dirname):
+                os.makedirs(out_dirname)
+
+        _, chunk_ids = self._get_object(blob_id)
+        with open(out_fname, "wb") as f:
+            for chunk_id in chunk_ids:
+                f.write(self._read_chunk(chunk_id))
+        return out_fname
+
+    def _write_tree(self, tree_id, out_dirname):
+        if not os.path.exists(out_dirname):
+            os.makedirs(out_dirname)
+        _, entries = self._get_object(tree_id)
+        for name, mode, id in entries:
+            out_fname = os.path.join(out_dirname, name)
+            if stat.S_ISDIR(mode):
+                self._write_tree(id, out_fname)
+            else:
+                self._write_blob(id, out_fname)
+
+    def get_file(self, name, version="HEAD", out_fname=None,
+                 out_suffix=''):
+        path_type, blob_id = self._get_commit(name, version)
+        if path_type != 'blob':
+            raise KeyError('Cannot find blob "%s"' % name)
+        return self._write_blob(blob_id, out_fname, out_suffix)
+
+    def get_dir(self, name, version="HEAD", out_dirname=None,
+                out_suffix=''):
+        path_type, tree_id = self._get_commit(name, version)
+        if path_type != 'tree':
+            raise KeyError('Cannot find tree "%s"' % name)
+        if out_dirname is None:
+            # create a temporary directory
+            out_dirname = tempfile.mkdtemp(suffix=out_suffix,
+                                           prefix='vt_persist')
+            self.temp_persist_files.append(out_dirname)
+        self._write_tree(tree_id, out_dirname)
+        return out_dirname
+
+    def get_latest_version(self, name):
+        cur = self.conn.execute("SELECT version FROM commit_log WHERE name=? "
+                                "ORDER BY seq DESC LIMIT 1;", (name,))
+        res = cur.fetchone()
+        if res is None:
+            raise KeyError('Cannot find object "%s"' % name)
+        return str(res[0])
+
+    def add_commit(self, filename):
+        fullpath = os.path.join(self.path, filename)
+        try:
+            if os.path.isdir(fullpath):
+                path_type, id = 'tree', self._store_tree(fullpath)
+            else:
+                path_type, id = 'blob', self._store_blob(fullpath)
+            version = uuid.uuid1().hex
+            self.conn.execute("INSERT INTO commit_log(version, name, type, "
+                              "object, date) VALUES (?, ?, ?, ?, ?);",
+                              (version, filename, path_type, id, time.time()))
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        return version
+
+
+import unittest
+
+class TestChunkRepo(unittest.TestCase):
+    def setUp(self):
+        import shutil
+        self.tmpdir = tempfile.mkdtemp(prefix='vt_chunks')
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.repo = ChunkRepo(os.path.join(self.tmpdir, 'repo'))
+
+    def make_data(self, size, seed=0):
+        import random
+        rng = random.Random(seed)
+        return ''.join(chr(rng.getrandbits(8)) for i in xrange(size))
+
+    def commit(self, name, data):
+        with open(os.path.join(self.repo.path, name), 'wb') as f:
+            f.write(data)
+        return self.repo.add_commit(name)
+
+    def read(self, name, version):
+        with open(self.repo.get_file(name, version), 'rb') as f:
+            return f.read()
+
+    def get_chunks(self, name):
+        _, blob_id = self.repo._get_commit(name)
+        return self.repo._get_object(blob_id)[1]
+
+    def test_round_trip(self):
+        text = ''.join('line %d\n' % i for i in xrange(40000))
+        self.repo.compress = True
+        version = self.commit('text', text)
+        self.assertEqual(self.read('text', version), text)
+        self.assertEqual(self.repo.get_hash('text'),
+                         GitRepo.compute_hash(os.path.join(self.repo.path,
+                                                           'text')))
+        self.assertEqual(self.read('empty', self.commit('empty', '')), '')
+
+    def test_binary(self):
+        from StringIO import StringIO
+        # no newlines, and runs of the same byte
+        data = self.make_data(300000).replace('\n', '\0') + '\0' * 200000
+        version = self.commit('binary', data)
+        self.assertEqual(self.read('binary', version), data)
+        chunks = list(iter_chunks(StringIO(data)))
+        self.assertEqual(''.join(chunks), data)
+        self.assertTrue(len(chunks) > 3)
+        self.assertTrue(all(MIN_CHUNK <= len(chunk) <= MAX_CHUNK
+                            for chunk in chunks[:-1]))
+
+    def test_insertion(self):
+        """Only the chunks around an insertion change."""
+        data = self.make_data(1000000)
+        self.commit('data', data)
+        old_chunks = self.get_chunks('data')
+        inserted = data[:500000] + 'inserted' + data[500000:]
+        version = self.commit('data', inserted)
+        self.assertEqual(self.read('data', version), inserted)
+        new_chunks = self.get_chunks('data')
+        self.assertTrue(len(old_chunks) > 10)
+        self.assertTrue(len(set(new_chunks) - set(old_chunks)) <= 2)
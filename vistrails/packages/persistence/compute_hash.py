@@ -48,7 +48,7 @@ def compute_hash(persistent_path, is_dir=None):
     def hash_file(filename, hasher):
         f = open(filename, 'rb')
         while True:
-            block = f.read(8192)
+            block = f.read(1 << 20)
             if not block:
                 break
             hasher.update(block)
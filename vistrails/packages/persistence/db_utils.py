@@ -36,9 +36,19 @@
 
 from __future__ import division
 
+from contextlib import contextmanager
 import os
 import sqlite3
 
+def get_inode(path):
+    """ Returns the inode of path as stored in the hash index, or None if
+        it doesn't exist
+    """
+    try:
+        return str(os.stat(path).st_ino)
+    except OSError:
+        return None
+
 class DatabaseAccessSingleton(object):
     def __new__(cls, *args, **kw):
         if DatabaseAccess._instance is None:
@@ -55,6 +65,11 @@ class DatabaseAccess(object):
         if not os.path.exists(db_file):
             run_schema = True
         self.conn = sqlite3.connect(db_file)
+        # commits only wait for the disk on checkpoints with a write-ahead
+        # log, which is still safe from corruption
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self._transaction_depth = 0
         if run_schema:
             #print 'running schema'
             #print 'schema file:', os.path.join(os.path.dirname(
@@ -63,6 +78,8 @@ class DatabaseAccess(object):
             self.run_sql_file(cur, os.path.join(os.path.dirname(
                         os.path.abspath(__file__)), 'schema.sql'))
         self.ensure_deleted_column_exist()
+        self.ensure_hash_index_exist()
+        self.ensure_indexes_exist()
         self.model = None
 
     def ensure_deleted_column_exist(self):
@@ -76,6 +93,96 @@ class DatabaseAccess(object):
                         "deleted bool NOT NULL DEFAULT False;")
             self.conn.commit()
 
+    def ensure_hash_index_exist(self):
+        """ Add the "hash_index" table if not already exist
+            It caches the content hashes of files, see get_file_hashes()
+        """
+        cur = self.conn.cursor()
+        cur.execute("CREATE TABLE IF NOT EXISTS hash_index (path text, "
+                    "hash_type text, size integer, mtime real, inode text, "
+                    "hash text, PRIMARY KEY (path, hash_type));")
+        cur.execute("CREATE INDEX IF NOT EXISTS hash_inode_idx "
+                    "ON hash_index(inode);")
+        self.conn.commit()
+
+    def ensure_indexes_exist(self):
+        """ Add the indexes used by the lookups if not already exist
+            Databases created before they were in schema.sql lack them
+        """
+        cur = self.conn.cursor()
+        cur.execute("CREATE INDEX IF NOT EXISTS signature_idx "
+                    "ON file(signature);")
+        cur.execute("CREATE INDEX IF NOT EXISTS id_version_idx "
+                    "ON file(id, version);")
+        self.conn.commit()
+
+    @contextmanager
+    def transaction(self):
+        """ Groups the writes made in the block in a single transaction
+            They are committed at the end of the outermost block, or rolled
+            back if it raises
+        """
+        self._transaction_depth += 1
+        try:
+            yield
+        except:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                self.conn.rollback()
+            raise
+        else:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                self.conn.commit()
+
+    def commit(self):
+        """ Commits unless inside a transaction() block
+        """
+        if not self._transaction_depth:
+            self.conn.commit()
+
+    def get_file_hashes(self, keys, hash_type):
+        """ Returns a dict mapping the (path, size, mtime, inode) keys
+            found in the hash index to the stored hash of that type
+            The rows of the other keys are deleted, with the rows of files
+            that had their inode but were moved or deleted since
+        """
+        cur = self.conn.cursor()
+        hashes = {}
+        with self.transaction():
+            for key in keys:
+                path, size, mtime, inode = key
+                cur.execute("SELECT size, mtime, inode, hash FROM hash_index "
+                            "WHERE path=? AND hash_type=?;",
+                            (path, hash_type))
+                res = cur.fetchone()
+                if res and (res[0], res[1], res[2]) == (size, mtime, inode):
+                    hashes[key] = str(res[3])
+                    continue
+                if res:
+                    cur.execute("DELETE FROM hash_index WHERE path=? AND "
+                                "hash_type=?;", (path, hash_type))
+                cur.execute("SELECT path FROM hash_index WHERE inode=? AND "
+                            "hash_type=?;", (inode, hash_type))
+                stale = [(other, hash_type) for other, in cur.fetchall()
+                         if get_inode(other) != inode]
+                cur.executemany("DELETE FROM hash_index WHERE path=? AND "
+                                "hash_type=?;", stale)
+        return hashes
+
+    def set_file_hashes(self, hashes, hash_type):
+        """ Stores the hashes, a dict mapping (path, size, mtime, inode)
+            keys to hashes of that type, in the hash index
+        """
+        cur = self.conn.cursor()
+        with self.transaction():
+            cur.executemany("INSERT OR REPLACE INTO hash_index(path, "
+                            "hash_type, size, mtime, inode, hash) "
+                            "VALUES (?, ?, ?, ?, ?, ?);",
+                            [(path, hash_type, size, mtime, inode, file_hash)
+                             for (path, size, mtime, inode), file_hash
+                             in hashes.iteritems()])
+
     def set_model(self, model):
         self.model = model
 
@@ -103,11 +210,18 @@ class DatabaseAccess(object):
         cur.execute("INSERT INTO file(%s) VALUES (%s);" % \
                         (col_str, ','.join(['?'] * len(vals))),
                     vals)
-        self.conn.commit()
+        self.commit()
 
         if self.model:
             self.model.add_data(value_dict)
 
+    def write_database_many(self, value_dicts):
+        """ Inserts a row for each dict of value_dicts in one transaction
+        """
+        with self.transaction():
+            for value_dict in value_dicts:
+                self.write_database(value_dict)
+
     #         cur.execute("SELECT id, name, tags, user, date_created, "
     #                     "date_modified, content_hash, version, signature "
     #                     "FROM file;")
@@ -167,8 +281,104 @@ class DatabaseAccess(object):
             where_str = '=? AND '.join(where_cols) + '=?'
             cur.execute("UPDATE file SET deleted='True' WHERE %s;" %
                            where_str, where_vals)
-        self.conn.commit()
+        self.commit()
         if self.model:
             self.model.remove_data(where_dict)
         # return cur.fetchall()
                      
+
+
+import unittest
+
+class TestDatabaseAccess(unittest.TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp(prefix='vt_persistence')
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.db = DatabaseAccess(os.path.join(self.tmpdir, 'files.db'))
+        self.addCleanup(self.db.finalize)
+
+    def make_file(self, name, content):
+        fname = os.path.join(self.tmpdir, name)
+        with open(fname, 'wb') as f:
+            f.write(content)
+        return fname
+
+    def get_key(self, fname):
+        st = os.stat(fname)
+        return (os.path.abspath(fname), st.st_size, st.st_mtime,
+                str(st.st_ino))
+
+    def count_hashes(self):
+        return self.db.conn.execute(
+                "SELECT COUNT(*) FROM hash_index;").fetchone()[0]
+
+    def test_hash_hit(self):
+        key = self.get_key(self.make_file('a', 'abc'))
+        self.db.set_file_hashes({key: 'h1'}, 'blob')
+        self.assertEqual(self.db.get_file_hashes([key], 'blob'), {key: 'h1'})
+        self.assertEqual(self.db.get_file_hashes([key], 'tree'), {})
+        self.assertEqual(self.count_hashes(), 1)
+
+    def test_hash_changed(self):
+        fname = self.make_file('a', 'abc')
+        key = self.get_key(fname)
+        self.db.set_file_hashes({key: 'h1'}, 'blob')
+        st = os.stat(fname)
+        os.utime(fname, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(self.db.get_file_hashes([self.get_key(fname)],
+                                                 'blob'), {})
+        self.assertEqual(self.count_hashes(), 0)
+
+        self.db.set_file_hashes({key: 'h1'}, 'blob')
+        self.make_file('a', 'abcd')
+        self.assertEqual(self.db.get_file_hashes([self.get_key(fname)],
+                                                 'blob'), {})
+        self.assertEqual(self.count_hashes(), 0)
+
+    def test_hash_moved(self):
+        fname = self.make_file('a', 'abc')
+        other = self.make_file('b', 'def')
+        self.db.set_file_hashes({self.get_key(fname): 'h1',
+                                 self.get_key(other): 'h2'}, 'blob')
+        moved = os.path.join(self.tmpdir, 'c')
+        os.rename(fname, moved)
+        key = self.get_key(moved)
+        self.assertEqual(self.db.get_file_hashes([key], 'blob'), {})
+        # the row of the old path is gone, the other file's is kept
+        self.assertEqual(self.db.conn.execute(
+                "SELECT path FROM hash_index;").fetchall(),
+                [(os.path.abspath(other),)])
+
+    def make_row(self, id, version):
+        return {'id': id, 'name': 'file', 'version': version,
+                'signature': 'sig%s' % version, 'type': 'blob'}
+
+    def test_wal(self):
+        self.assertEqual(self.db.conn.execute(
+                "PRAGMA journal_mode;").fetchone()[0], 'wal')
+
+    def test_id_version_lookup(self):
+        self.db.write_database_many([self.make_row('a', v)
+                                     for v in ('1', '2')])
+        self.assertTrue(self.db.ref_exists('a', '2'))
+        self.assertFalse(self.db.ref_exists('a', '3'))
+        self.assertEqual(self.db.get_signature('a', '1'), 'sig1')
+        plan = self.db.conn.execute(
+                "EXPLAIN QUERY PLAN SELECT signature FROM file "
+                "WHERE id=? AND version=?;", ('a', '1')).fetchall()
+        self.assertTrue(any('id_version_idx' in row[-1] for row in plan))
+
+    def test_transaction_rollback(self):
+        self.db.write_database(self.make_row('a', '1'))
+        with self.assertRaises(ValueError):
+            with self.db.transaction():
+                self.db.write_database(self.make_row('b', '1'))
+                with self.db.transaction():
+                    self.db.delete_from_database({'id': 'a'})
+                raise ValueError
+        self.assertEqual(self.db.read_database(['id']), [('a',)])
+        with self.assertRaises(ValueError):
+            self.db.write_database_many([self.make_row('c', '1'), {}])
+        self.assertEqual(self.db.read_database(['id']), [('a',)])
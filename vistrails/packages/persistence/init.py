@@ -49,7 +49,8 @@ from vistrails.core.modules.basic_modules import Path, PathObject, Directory, Bo
     String, Constant
 from vistrails.core.modules.module_registry import get_module_registry, MissingModule, \
     MissingPackageVersion, MissingModuleVersion
-from vistrails.core.modules.vistrails_module import Module, ModuleError, NotCacheable
+from vistrails.core.modules.vistrails_module import Module, ModuleError, \
+    NotCacheable, NotThreadSafe
 from vistrails.core.system import current_dot_vistrails, execute_cmdline2, \
     execute_piped_cmdlines, systemType, \
     current_user, current_time, get_executable_path
@@ -78,6 +79,8 @@ git_bin = "@executable_path/git"
 tar_bin = "@executable_path/tar"
 compress_by_default = False
 debug = False
+hash_threads = 4
+repo_type = 'git'
 
 def debug_print(*args):
     global debug
@@ -141,7 +144,9 @@ class PersistentRef(Constant):
     _input_ports = [('value', '(PersistentRef)')]
     _output_ports = [('value', '(PersistentRef)')]
 
-class PersistentPath(Module):
+class PersistentPath(NotThreadSafe, Module):
+    # The database connection and the repository are used from the thread
+    # that opened them
     def __init__(self):
         Module.__init__(self)
 
@@ -343,7 +348,8 @@ class PersistentPath(Module):
                 path = self.get_input('value').name
             # this is a static method so we need to add module ourselves
             try:
-                new_hash = repo.get_current_repo().compute_hash(path)
+                new_hash = repo.get_current_repo().compute_hash(
+                        path, db_access, hash_threads)
             except ModuleError, e:
                 e.module = self
                 raise e
@@ -556,7 +562,7 @@ _modules = [PersistentRef, PersistentPath, PersistentFile, PersistentDir,
 
 def initialize():
     global global_db, local_db, search_dbs, compress_by_default, db_access, \
-        git_bin, debug
+        git_bin, debug, hash_threads, repo_type
     
     if configuration.check('git_bin'):
         git_bin = configuration.git_bin
@@ -573,6 +579,10 @@ def initialize():
         compress_by_default = configuration.compress_by_default
     if configuration.check('debug'):
         debug = configuration.debug
+    if configuration.check('hash_threads'):
+        hash_threads = configuration.hash_threads
+    if configuration.check('repo_type'):
+        repo_type = configuration.repo_type
     if configuration.check('global_db'):
         global_db = configuration.global_db
     if configuration.check('local_db'):
@@ -587,7 +597,7 @@ def initialize():
             except OSError:
                 raise RuntimeError('local_db "%s" does not exist' % local_db)
 
-    local_repo = repo.get_repo(local_db)
+    local_repo = repo.get_repo(local_db, repo_type, compress_by_default)
     repo.set_current_repo(local_repo)
 
     debug_print('creating DatabaseAccess')
@@ -49,11 +49,13 @@ from dulwich.repo import Repo
 from dulwich.objects import Commit, Blob, Tree, object_header
 from dulwich.pack import iter_sha1
 from dulwich.walk import Walker
-from itertools import chain
+from itertools import chain, izip
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
 import stat
 import tempfile
+import time
 
 class GitRepo(object):
     def __init__(self, path):
@@ -154,7 +156,7 @@ class GitRepo(object):
         return tree[name][1]
 
     @staticmethod
-    def compute_blob_hash(fname, chunk_size=1<<16):
+    def compute_blob_hash(fname, chunk_size=1<<20):
         obj_len = os.path.getsize(fname)
         head = object_header(Blob.type_num, obj_len)
         with open(fname, "rb") as f:
@@ -164,26 +166,80 @@ class GitRepo(object):
             return iter_sha1(my_iter)
 
     @staticmethod
-    def compute_tree_hash(dirname):
+    def compute_blob_hashes(fnames, index=None, threads=1):
+        """Returns a dict mapping each file of fnames to its blob hash.
+
+        index is a DatabaseAccess whose hash index holds the hashes of
+        files by path, size, mtime and inode: unchanged files are not read
+        again, and the hashes of the others are stored there. Those are
+        hashed on up to threads threads.
+        """
+        keys = {}
+        for fname in fnames:
+            st = os.stat(fname)
+            keys[fname] = (os.path.abspath(fname), st.st_size, st.st_mtime,
+                           str(st.st_ino))
+        hashes = {}
+        if index is not None:
+            indexed = index.get_file_hashes(keys.values(), 'blob')
+            for fname, key in keys.iteritems():
+                if key in indexed:
+                    hashes[fname] = indexed[key]
+        changed = [fname for fname in fnames if fname not in hashes]
+
+        start = time.time()
+        threads = min(threads, len(changed))
+        if threads > 1:
+            pool = ThreadPool(threads)
+            try:
+                new_hashes = pool.map(GitRepo.compute_blob_hash, changed)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            new_hashes = map(GitRepo.compute_blob_hash, changed)
+        hashes.update(izip(changed, new_hashes))
+
+        if index is not None and changed:
+            # a file modified again within the timestamp resolution would
+            # keep the same key, so only index the ones that are settled
+            index.set_file_hashes(
+                    dict((keys[fname], bhash)
+                         for fname, bhash in izip(changed, new_hashes)
+                         if keys[fname][2] < start - 2),
+                    'blob')
+        return hashes
+
+    @staticmethod
+    def compute_tree_hash(dirname, index=None, threads=1, blob_hashes=None):
+        if blob_hashes is None:
+            fnames = []
+            for root, _, files in os.walk(dirname, followlinks=True):
+                for entry in files:
+                    fname = os.path.join(root, entry)
+                    if os.path.isfile(fname):
+                        fnames.append(fname)
+            blob_hashes = GitRepo.compute_blob_hashes(fnames, index, threads)
         tree = Tree()
         for entry in sorted(os.listdir(dirname)):
             fname = os.path.join(dirname, entry)
             if os.path.isdir(fname):
-                thash = GitRepo.compute_tree_hash(fname)
+                thash = GitRepo.compute_tree_hash(fname,
+                                                  blob_hashes=blob_hashes)
                 mode = stat.S_IFDIR # os.stat(fname)[stat.ST_MODE]
                 tree.add(entry, mode, thash)
             elif os.path.isfile(fname):
-                bhash = GitRepo.compute_blob_hash(fname)
+                bhash = blob_hashes[fname]
                 mode = os.stat(fname)[stat.ST_MODE]
                 tree.add(entry, mode, bhash)
         return tree.id
 
     @staticmethod
-    def compute_hash(path):
+    def compute_hash(path, index=None, threads=1):
         if os.path.isdir(path):
-            return GitRepo.compute_tree_hash(path)
+            return GitRepo.compute_tree_hash(path, index, threads)
         elif os.path.isfile(path):
-            return GitRepo.compute_blob_hash(path)
+            return GitRepo.compute_blob_hashes([path], index)[path]
         raise TypeError("Do not support this type of path")
 
     def get_latest_version(self, path):
@@ -233,7 +289,10 @@ def set_current_repo(repo):
     global current_repo
     current_repo = repo
 
-def get_repo(path):
+def get_repo(path, repo_type='git', compress=False):
+    if repo_type == 'chunks':
+        from chunk_repo import ChunkRepo
+        return ChunkRepo(path, compress)
     return GitRepo(path)
 
 def run_get_file_test():
@@ -35,4 +35,5 @@
 --#############################################################################
 
 create table file (id text, name text, tags text, user text, date_created text, date_modified text, content_hash text, version text, signature text, type text);
-create index signature_idx on file(signature);
\ No newline at end of file
+create index signature_idx on file(signature);
+create index id_version_idx on file(id, version);
\ No newline at end of file
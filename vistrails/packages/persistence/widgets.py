@@ -1169,15 +1169,16 @@ class PersistentConfiguration(QtGui.QDialog):
         db_access = DatabaseAccessSingleton()
         # FIXME keep entry in database with flag for deleted?
         # NEED TO update the model...
-        for info in info_list:
-            delete_where = {'id': info[0]}
-            if info[1] is None:
-                git_util.git_remove_path(info[0])
-                db_access.delete_from_database(delete_where)
-            else:
-                # FIXME implement delete for versions...
-                delete_where['version'] = info[1]
-                print "NOT IMPLEMENTED FOR VERSIONS!!"
+        with db_access.transaction():
+            for info in info_list:
+                delete_where = {'id': info[0]}
+                if info[1] is None:
+                    git_util.git_remove_path(info[0])
+                    db_access.delete_from_database(delete_where)
+                else:
+                    # FIXME implement delete for versions...
+                    delete_where['version'] = info[1]
+                    print "NOT IMPLEMENTED FOR VERSIONS!!"
                 
                 
         
@@ -36,6 +36,8 @@
 
 from __future__ import division
 
+from itertools import izip
+
 from vistrails.core.modules.vistrails_module import Module, ModuleError
 from vistrails.core.modules.config import IPort, OPort
 
@@ -101,8 +103,24 @@ class PythonCalc(Module):
         # clear in further examples that use these more complicated data.
         self.set_output("value", self.op(v1, v2))
 
-    def op(self, v1, v2):
+    # Modules can also implement compute_batch(), that VisTrails calls
+    # instead of compute() when ports receive lists of values: it gets
+    # the lists of the values of these ports (its "columns") and returns
+    # the lists of the results, without the overhead of computing the
+    # module once per element.
+    def compute_batch(self, columns):
+        if 'op' in columns:
+            # Let VisTrails call compute() for each operation
+            return NotImplemented
+        count = len(next(columns.itervalues()))
+        v1 = columns.get("value1") or [self.get_input("value1")] * count
+        v2 = columns.get("value2") or [self.get_input("value2")] * count
         op = self.get_input("op")
+        return {"value": [self.op(a, b, op) for a, b in izip(v1, v2)]}
+
+    def op(self, v1, v2, op=None):
+        if op is None:
+            op = self.get_input("op")
         if op == '+':
             return v1 + v2
         elif op == '-':
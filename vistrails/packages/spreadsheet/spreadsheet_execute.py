@@ -184,6 +184,8 @@ def assignPipelineCellLocations(pipeline, sheetName,
         config_function = create_function(id_scope, m,
                                           'configuration', [repr(config)])
         m.add_function(config_function)
+        # the functions were changed on the module directly
+        pipeline.mark_signatures_dirty(m.vtType, m.id)
 
         # replace the getNewId method
         pipeline.tmp_id.__class__.getNewId = orig_getNewId
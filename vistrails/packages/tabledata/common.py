@@ -35,6 +35,8 @@
 
 from __future__ import division
 
+from itertools import izip
+
 from vistrails.core.bundles.pyimport import py_import
 from vistrails.core.modules.basic_modules import List, ListType
 from vistrails.core.modules.config import ModuleSettings
@@ -262,6 +264,27 @@ class ExtractColumn(Module):
         except ValueError, e:
             raise ModuleError(self, e.message)
 
+    def compute_batch(self, columns):
+        # Extracts several columns of the same table at once
+        if 'table' in columns or 'numeric' in columns:
+            return NotImplemented
+        table = self.get_input('table')
+        numeric = self.get_input('numeric', allow_default=True)
+        count = len(next(columns.itervalues()))
+        names = columns.get('column_name') or \
+                [self.force_get_input('column_name', None)] * count
+        indexes = columns.get('column_index') or \
+                  [self.force_get_input('column_index', None)] * count
+        try:
+            return {'value': [table.get_column(
+                                      choose_column(table.columns,
+                                                    column_names=table.names,
+                                                    name=name, index=index),
+                                      numeric)
+                              for name, index in izip(names, indexes)]}
+        except ValueError, e:
+            raise ModuleError(self, e.message)
+
 
 class BuildTable(Module):
     """Builds a table by putting together columns from multiple sources.
@@ -419,3 +442,37 @@ class TableOutput(OutputModule):
 _modules = [(Table, {'abstract': True}), ExtractColumn, BuildTable,
             (SingleColumnTable, {'hide_descriptor': True}),
             TableOutput]
+
+
+###############################################################################
+
+import unittest
+
+
+class TestExtractColumn(unittest.TestCase):
+    def test_column_list(self):
+        """Extracts a list of columns, in a single compute_batch() call.
+        """
+        from vistrails.tests.utils import execute, intercept_result
+        from .identifiers import identifier
+        with intercept_result(ExtractColumn, 'value') as results:
+            self.assertFalse(execute([
+                    ('BuildTable', identifier, [
+                        ('a', [('List', '[1, 2, 3]')]),
+                        ('b', [('List', '[4, 5, 6]')]),
+                    ]),
+                    ('List', 'org.vistrails.vistrails.basic', [
+                        ('value', [('List', '[1, 0, 1]')]),
+                    ]),
+                    ('ExtractColumn', identifier, []),
+                ], [
+                    (0, 'value', 2, 'table'),
+                    (1, 'value', 2, 'column_index'),
+                ],
+                add_port_specs=[
+                    (0, 'input', 'a',
+                     'org.vistrails.vistrails.basic:List'),
+                    (0, 'input', 'b',
+                     'org.vistrails.vistrails.basic:List'),
+                ]))
+        self.assertEqual(results, [[[4, 5, 6], [1, 2, 3], [4, 5, 6]]])
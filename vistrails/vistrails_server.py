@@ -59,6 +59,21 @@ def fix_paths():
     if vistrails_dir not in sys.path:
         sys.path.insert(0, vistrails_dir)
 
+def init_worker(index, optionsDict, args):
+    """Initializes a worker process of the server like the server itself,
+    see vistrails.core.worker_pool.
+
+    """
+    import locale
+    locale.setlocale(locale.LC_ALL, 'C')
+
+    import vistrails.gui.requirements
+    vistrails.gui.requirements.require_pyqt4_api2()
+
+    import vistrails.gui.application_server
+    return vistrails.gui.application_server.init_worker(index, optionsDict,
+                                                       args)
+
 if __name__ == '__main__':
     fix_paths()
 